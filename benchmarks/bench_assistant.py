@@ -0,0 +1,49 @@
+"""
+Benchmark: per-turn CPU overhead of the complete assistant.
+
+Compares rebuilding the assistant on every message (the old
+chat_with_assistant behaviour) against one long-lived CompleteAssistant,
+using a no-op LLM so only LangChain/prompt overhead is measured.
+
+Usage:
+    python benchmarks/bench_assistant.py [turns]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.assistant import CompleteAssistant
+from src.memory import memory_store
+
+noop_llm = RunnableLambda(lambda _: AIMessage(content="ok"))
+
+
+def run(turns, rebuild):
+    """Run turns across 10 sessions and return CPU microseconds per turn."""
+    memory_store.clear()
+    assistant = CompleteAssistant(noop_llm)
+    start = time.process_time()
+    for i in range(turns):
+        if rebuild:
+            assistant = CompleteAssistant(noop_llm)
+        assistant.chat("What is the weather like?", session_id=f"s{i % 10}")
+    return (time.process_time() - start) / turns * 1e6
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    run(20, rebuild=False)  # warm imports and caches
+    before = run(turns, rebuild=True)
+    after = run(turns, rebuild=False)
+
+    print(f"Turns: {turns} (no-op LLM)")
+    print(f"Rebuild per message: {before:8.1f} µs/turn")
+    print(f"Long-lived assistant: {after:7.1f} µs/turn")
+    print(f"Saved: {before - after:.1f} µs/turn ({(1 - after / before) * 100:.0f}%)")
@@ -0,0 +1,63 @@
+"""
+Benchmark: lookup cost in a large record/replay cassette.
+
+Fills a cassette with recorded calls, then times replay lookups (hits and
+misses) and a cold reopen. Lookups go through the memory-mapped index, so
+their cost should not grow with the cassette's size.
+
+Usage:
+    python benchmarks/bench_cassette.py [--records 100000] [--record-bytes 2000]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cassette import Cassette
+
+
+def key(n):
+    return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.cassette")
+        cassette = Cassette(path)
+        record = {"response": {"content": "x" * args.record_bytes}}
+        started = time.perf_counter()
+        for n in range(args.records):
+            cassette.put(key(n), record)
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(path)
+        print(f"record      {seconds / args.records * 1e6:7.1f} us/call  ({size / 1e6:.0f} MB, {len(cassette)} calls)")
+        cassette.close()
+
+        started = time.perf_counter()
+        cassette = Cassette(path)
+        print(f"reopen      {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+        keys = [key(n) for n in range(0, args.records, max(1, args.records // 10000))]
+        started = time.perf_counter()
+        for k in keys:
+            cassette.get(k)
+        print(f"hit         {(time.perf_counter() - started) / len(keys) * 1e6:7.1f} us/lookup")
+
+        missing = [key(-n - 1) for n in range(len(keys))]
+        started = time.perf_counter()
+        for k in missing:
+            cassette.get(k)
+        print(f"miss        {(time.perf_counter() - started) / len(missing) * 1e6:7.1f} us/lookup")
+        cassette.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100_000, help="calls in the cassette")
+    parser.add_argument("--record-bytes", type=int, default=2000, help="response size per call")
+    main(parser.parse_args())
@@ -0,0 +1,58 @@
+"""
+Benchmark: memory-chat throughput with 1..N worker processes.
+
+Runs many sessions against a ClusterSupervisor whose workers use the fake
+model with cpu_work, so every turn is GIL-bound Python work. One process
+tops out at one core; throughput should grow with workers up to the
+number of cores (on a 1-core machine it stays flat).
+
+Usage:
+    python benchmarks/bench_cluster.py [--workers 1 2 4 8] [--sessions 200] [--turns 5]
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cluster import ClusterSupervisor, fake_chatbot
+
+
+async def run(cluster, sessions, turns, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def session(n):
+        async with slots:
+            for turn in range(turns):
+                await cluster.achat(f"session-{n}", f"turn {turn} of session {n}")
+
+    await asyncio.gather(*(session(n) for n in range(sessions)))
+
+
+def main(args):
+    factory = functools.partial(fake_chatbot, cpu_work=args.cpu_work)
+    print(f"{os.cpu_count()} CPUs, {args.sessions} sessions x {args.turns} turns, cpu_work={args.cpu_work}")
+    baseline = None
+    for workers in args.workers:
+        with ClusterSupervisor(workers, chatbot_factory=factory) as cluster:
+            asyncio.run(run(cluster, workers * 4, 1, args.concurrency))  # warm up every worker
+            started = time.perf_counter()
+            asyncio.run(run(cluster, args.sessions, args.turns, args.concurrency))
+            seconds = time.perf_counter() - started
+        rate = args.sessions * args.turns / seconds
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {rate:8.1f} turns/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to compare")
+    parser.add_argument("--sessions", type=int, default=200, help="chat sessions per run")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--concurrency", type=int, default=64, help="sessions in progress at once")
+    parser.add_argument("--cpu-work", type=int, default=200_000, help="fake model loop iterations per call")
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""
+Benchmark: tail latency of the serial research chain, with and without hedging.
+
+Runs build_research_chain (three LLM calls in a row) against a fake model
+where a small fraction of calls hit a slow backend, and reports chain
+latency percentiles plus how many calls were hedged.
+
+Usage:
+    python benchmarks/bench_hedging.py [--runs 300] [--tail-rate 0.03] [--tail-delay 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chains import get_chain
+from src.fake_llm import FakeStreamingChatModel
+from src.hedging import HedgedChatModel, Hedger
+
+
+async def measure(llm, runs, concurrency):
+    """Run the research chain `runs` times and return sorted latencies."""
+    chain = get_chain("research", llm)
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with slots:
+            started = time.perf_counter()
+            await chain.ainvoke({"topic": f"topic {i}"})
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[one(i) for i in range(runs)])
+    return sorted(latencies)
+
+
+def report(label, latencies):
+    pct = statistics.quantiles(latencies, n=100)
+    print(f"{label:<10} p50 {pct[49] * 1000:6.0f} ms  p95 {pct[94] * 1000:6.0f} ms  "
+          f"p99 {pct[98] * 1000:6.0f} ms  max {latencies[-1] * 1000:6.0f} ms")
+
+
+async def main(args):
+    model = FakeStreamingChatModel(first_token_delay=0.02, tail_rate=args.tail_rate, tail_delay=args.tail_delay)
+    report("plain", await measure(model, args.runs, args.concurrency))
+
+    hedged = HedgedChatModel(llm=model, hedger=Hedger(percentile=95, budget_ratio=0.05))
+    await measure(hedged, 100, args.concurrency)  # warm up the latency window
+    report("hedged", await measure(hedged, args.runs, args.concurrency))
+    stats = hedged.stats()["hedging"]
+    print(f"Hedged {stats['hedged']} of {stats['requests']} calls ({stats['hedge_rate']:.1%}), "
+          f"{stats['hedge_wins']} won by the duplicate")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Research chain tail latency with and without hedging")
+    parser.add_argument("--runs", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--tail-rate", type=float, default=0.03)
+    parser.add_argument("--tail-delay", type=float, default=0.5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""
+Benchmark: import time of the lab modules (python -X importtime).
+
+Doubles as a regression check: exits non-zero if importing a lab module
+pulls in boto3/botocore/langchain_aws (they must load lazily on first
+model use) or if the cumulative import time exceeds --max-ms.
+
+Usage:
+    python benchmarks/bench_import.py [--max-ms 1500] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["langchain_chatbot_lab", "day2_lab", "src.tools", "src.chains", "src.memory"]
+
+# Must not be imported until a model is actually needed
+LAZY_MODULES = ("boto3", "botocore", "langchain_aws")
+
+
+def import_profile(module):
+    """Import module in a fresh interpreter; return (cumulative µs, imported module names)."""
+    env = dict(os.environ)
+    env.pop("AWS_PROFILE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+    imported = set()
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name)
+        if name == module:
+            total_us = int(cumulative)
+    return total_us, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if any module takes longer")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per module (best is reported)")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<25} {'best ms':>9}  lazy deps")
+    for module in MODULES:
+        best_us = None
+        for _ in range(args.runs):
+            total_us, imported = import_profile(module)
+            best_us = total_us if best_us is None else min(best_us, total_us)
+
+        leaked = sorted(m for m in imported if m.split(".")[0] in LAZY_MODULES)
+        print(f"{module:<25} {best_us / 1000:9.1f}  {'LEAKED: ' + leaked[0] if leaked else 'ok'}")
+
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked[:3])}")
+        if args.max_ms is not None and best_us / 1000 > args.max_ms:
+            failures.append(f"{module} took {best_us / 1000:.1f} ms (limit {args.max_ms} ms)")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Benchmark: BM25 history retrieval on long sessions.
+
+Builds sessions of 100 to 5000 turns and times the index update for one
+new turn and the selection of a prompt history, and reports how much of
+the transcript is sent. Selection should stay well under a millisecond.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--turns 100 1000 5000] [--vocabulary 3000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.retrieval import HistoryRetriever
+
+
+def main(args):
+    rng = random.Random(0)
+    words = [f"term{n}" for n in range(args.vocabulary)]
+
+    def sentence(length):
+        return " ".join(rng.choices(words, k=length))
+
+    for turns in args.turns:
+        messages = []
+        for _ in range(turns):
+            messages += [HumanMessage(sentence(20)), AIMessage(sentence(60))]
+        retriever = HistoryRetriever()
+        retriever.select("s", messages, "warm up")
+
+        messages += [HumanMessage(sentence(20)), AIMessage(sentence(60))]
+        started = time.perf_counter()
+        retriever.index_for("s", messages)
+        update = time.perf_counter() - started
+
+        queries = [sentence(15) for _ in range(200)]
+        started = time.perf_counter()
+        for query in queries:
+            selected = retriever.select("s", messages, query)
+        select = (time.perf_counter() - started) / len(queries)
+        print(f"turns={turns:<6} update {update * 1e6:7.1f} us  select {select * 1e6:7.1f} us  "
+              f"sends {len(selected)}/{len(messages)} messages")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[100, 1000, 5000], help="session lengths")
+    parser.add_argument("--vocabulary", type=int, default=3000, help="distinct words in the synthetic chat")
+    main(parser.parse_args())
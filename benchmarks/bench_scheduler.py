@@ -0,0 +1,85 @@
+"""
+Benchmark: interactive latency while a batch job saturates the model.
+
+A fake model that serves at most --quota calls at once (like a Bedrock
+quota) takes --latency seconds per call. A batch job keeps --batch-threads
+calls queued while interactive calls arrive one at a time. Without the
+scheduler, interactive calls wait behind the batch backlog; with it, they
+take a reserved slot or the next free one.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--quota 8] [--latency 0.05] [--batch-threads 32] [--calls 40]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fake_llm import FakeStreamingChatModel
+from src.scheduler import PriorityScheduler, ScheduledChatModel, priority
+
+_quota = threading.Semaphore(1)
+
+
+class QuotaModel(FakeStreamingChatModel):
+    """Fake model that serves a limited number of calls at once"""
+
+    latency: float = 0.05
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with _quota:
+            time.sleep(self.latency)
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+def measure(llm, args) -> list:
+    stop = threading.Event()
+
+    def batch_worker():
+        with priority("batch"):
+            while not stop.is_set():
+                llm.invoke("summarize this document")
+                time.sleep(0.001)  # per-document work between calls
+
+    workers = [threading.Thread(target=batch_worker, daemon=True) for _ in range(args.batch_threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(args.latency * 4)  # let the batch backlog build up
+
+    latencies = []
+    for _ in range(args.calls):
+        started = time.perf_counter()
+        llm.invoke("hi")
+        latencies.append(time.perf_counter() - started)
+        time.sleep(args.latency / 2)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return latencies
+
+
+def main(args):
+    global _quota
+    model = QuotaModel(reply="ok", latency=args.latency)
+    scheduler = PriorityScheduler(capacity=args.quota, reserved_interactive=max(1, args.quota // 4))
+    for label, llm in (("unscheduled", model), ("scheduled", ScheduledChatModel(llm=model, scheduler=scheduler))):
+        _quota = threading.Semaphore(args.quota)
+        latencies = sorted(measure(llm, args))
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{label:<12} interactive p50 {statistics.median(latencies) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms")
+    batch = scheduler.stats()["classes"]["batch"]
+    print(f"batch calls while scheduled: {batch['granted']}, wait p95 {batch['wait_p95'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=int, default=8, help="model calls served at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per model call")
+    parser.add_argument("--batch-threads", type=int, default=32, help="batch calls kept in flight")
+    parser.add_argument("--calls", type=int, default=40, help="interactive calls measured")
+    main(parser.parse_args())
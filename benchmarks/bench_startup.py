@@ -0,0 +1,94 @@
+"""
+Benchmark: time-to-ready and first-request latency, with and without warm-up.
+
+Each run starts a fresh interpreter that builds the server on get_llm()
+against a local Bedrock stub (no AWS credentials required), optionally
+warms it up, then times its first requests: /chat, /chain/research and
+/summarize, and then the same requests again (steady state). The stub has no TLS, so against real Bedrock the connection
+step saves more than it does here.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 3] [--prime]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRST_REQUESTS = [
+    ("/chat", {"message": "hello", "session_id": "s"}),
+    ("/chain/research", {"topic": "solar power"}),
+    ("/summarize", {"length": "brief", "text": "Solar panels turn sunlight into electricity. " * 20}),
+]
+
+
+def child(warm: bool, prime: bool) -> dict:
+    """Runs in the fresh interpreter: start a server, time its first requests."""
+    started = time.perf_counter()
+    from langchain_chatbot_lab import get_prompt
+    from src.llm import configure_bedrock_client, get_llm
+    from src.server import LabServer
+    from tests.bedrock_stub import BedrockStub
+    from tests.test_server import request
+
+    stub = BedrockStub(reply="ok", delay=0.005).start()
+    configure_bedrock_client(endpoint_url=stub.url)
+
+    async def main():
+        server = LabServer(get_llm(), get_prompt, port=0, warm_up=warm, prime=prime)
+        await server.start()
+        ready = time.perf_counter() - started
+        latencies = {"first": {}, "second": {}}
+        for attempt in ("first", "second"):
+            for path, payload in FIRST_REQUESTS:
+                request_started = time.perf_counter()
+                status, _ = await request(server.port, "POST", path, dict(payload, session_id=attempt))
+                assert status == 200, (path, status)
+                latencies[attempt][path] = time.perf_counter() - request_started
+        await server.shutdown()
+        return {"ready": ready, **latencies}
+
+    result = asyncio.run(main())
+    stub.stop()
+    return result
+
+
+def run(warm: bool, prime: bool) -> dict:
+    env = dict(os.environ, AWS_ACCESS_KEY_ID="bench", AWS_SECRET_ACCESS_KEY="bench")
+    env.pop("AWS_PROFILE", None)
+    command = [sys.executable, __file__, "--child"] + (["--warm"] if warm else []) + (["--prime"] if prime else [])
+    output = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    for warm in (False, True):
+        results = [run(warm, args.prime and warm) for _ in range(args.runs)]
+        label = ("warm-up" + (" + prime" if args.prime else "")) if warm else "cold"
+        ready = statistics.median(r["ready"] for r in results)
+        print(f"{label:<16} time-to-ready {ready * 1000:7.1f} ms")
+        for path, _ in FIRST_REQUESTS:
+            first = statistics.median(r["first"][path] for r in results)
+            second = statistics.median(r["second"][path] for r in results)
+            print(f"{'':<16} {path:<16} first {first * 1000:6.1f} ms  second {second * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per mode (median reported)")
+    parser.add_argument("--prime", action="store_true", help="also send a priming request during warm-up")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.warm, args.prime)))
+    else:
+        main(args)
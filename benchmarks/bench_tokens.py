@@ -0,0 +1,61 @@
+"""
+Benchmark: throughput of the local token estimator.
+
+Measures count_tokens() on a large document (uncached, so the counting
+itself is timed), on word-sized strings as split_text() uses it, and the
+pre-flight check of a long chat history (cached per message).
+
+Usage:
+    python benchmarks/bench_tokens.py [--megabytes 8]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.tokens import TokenEstimator, fit_messages
+
+SAMPLE = ("The Bedrock runtime returned 3 results in 1.25s (p99: 4.1s); see https://example.com/docs?id=42. "
+          "Naïve café owners said: \"it's fine\" — mostly. ")
+
+
+def best_of(fn, repeat=5):
+    """Best wall-clock time of `repeat` runs of fn()."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(args):
+    document = SAMPLE * (args.megabytes * 1_000_000 // len(SAMPLE))
+    size = len(document.encode())
+
+    seconds = best_of(lambda: TokenEstimator().count(document))
+    print(f"document    {size / seconds / 1e6:7.0f} MB/s  ({size / 1e6:.1f} MB in {seconds * 1000:.1f} ms)")
+
+    words = document[:1_000_000].split()
+    estimator = TokenEstimator()
+    seconds = best_of(lambda: [estimator.count(w) for w in words])
+    print(f"words       {seconds / len(words) * 1e9:7.0f} ns/word")
+
+    history = []
+    for i in range(200):
+        history += [HumanMessage(content=f"Question {i}: {SAMPLE * 4}"), AIMessage(content=f"Answer {i}: {SAMPLE * 8}")]
+    estimator = TokenEstimator()
+    fit_messages(history, 4000, estimator)  # fill the per-message cache
+    seconds = best_of(lambda: fit_messages(history, 4000, estimator), repeat=20)
+    print(f"preflight   {seconds * 1e6:7.0f} us for a {len(history)}-message history")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=int, default=8, help="size of the uncached document")
+    main(parser.parse_args())
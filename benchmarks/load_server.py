@@ -0,0 +1,80 @@
+"""
+Load test: thousands of concurrent SSE streams against the HTTP server.
+
+Starts a LabServer in-process with the fake streaming LLM and opens
+--streams concurrent /chatbot streaming requests, each reading until the
+`done` event. Reports completions, 429s, errors and latency percentiles.
+
+Usage:
+    python benchmarks/load_server.py [--streams 2000] [--token-delay 0.02]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_chatbot_lab import get_prompt
+from src.fake_llm import FakeStreamingChatModel
+from src.server import LabServer
+
+
+async def stream_once(port, results):
+    """Run one streaming request and record (status, latency, tokens)."""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps({"language": "English", "text": "Tell me something", "stream": True}).encode()
+        writer.write(b"POST /chatbot HTTP/1.1\r\nHost: bench\r\nContent-Length: "
+                     + str(len(body)).encode() + b"\r\n\r\n" + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        tokens = 0
+        async for line in reader:
+            if line.startswith(b"data: {\"token\""):
+                tokens += 1
+        writer.close()
+        results.append((status, time.perf_counter() - started, tokens))
+    except (OSError, ValueError, IndexError) as e:
+        results.append((type(e).__name__, time.perf_counter() - started, 0))
+
+
+async def main(args):
+    llm = FakeStreamingChatModel(token_delay=args.token_delay,
+                                 reply=" ".join(f"word{i}" for i in range(args.tokens)))
+    server = LabServer(llm, get_prompt, port=0, max_concurrency=args.max_concurrency, max_queue=args.max_queue)
+    await server.start()
+
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*[stream_once(server.port, results) for _ in range(args.streams)])
+    elapsed = time.perf_counter() - started
+    stats = server.stats()
+    await server.shutdown()
+
+    ok = sorted(latency for status, latency, _ in results if status == 200)
+    rejected = sum(1 for status, _, _ in results if status == 429)
+    errors = len(results) - len(ok) - rejected
+
+    print(f"Streams: {args.streams} ({args.tokens} tokens, {args.token_delay * 1000:.0f} ms/token)")
+    print(f"Completed: {len(ok)}  429: {rejected}  errors: {errors}  in {elapsed:.2f}s")
+    print(f"Peak concurrent streams on server: {stats['peak_active']}")
+    if ok:
+        pct = statistics.quantiles(ok, n=100)
+        print(f"Latency p50 {pct[49]:.2f}s  p95 {pct[94]:.2f}s  p99 {pct[98]:.2f}s  max {ok[-1]:.2f}s")
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent SSE load test against the fake LLM")
+    parser.add_argument("--streams", type=int, default=2000)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--max-concurrency", type=int, default=4096)
+    parser.add_argument("--max-queue", type=int, default=4096)
+    sys.exit(asyncio.run(main(parser.parse_args())))
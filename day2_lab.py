@@ -1,40 +1,43 @@
-from langchain_aws import ChatBedrock
 from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
 from langchain_core.runnables import RunnableSequence, RunnablePassthrough
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.tools import tool
+from langchain_core.tools import tool
 from datetime import datetime
+from functools import lru_cache
 from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
-import boto3
-import os
+import threading
+
+from src.assistant import CompleteAssistant, ToolChain
+from src.llm import get_bedrock_client, get_llm
+from src.router import ModelRouter
 
 # Load variables from .env into environment
 load_dotenv()
 
-# Define the AWS CLI Profile to use through env permission
-os.environ["AWS_PROFILE"] = os.getenv("AWS_PROFILE")
-
-# Create a Bedrock Client
-bedrock_client = boto3.client(
-    service_name="bedrock-runtime",
-    region_name="us-east-1"
-)
-
 # Choose a Foundation Model to use from AWS Bedrock
 modelID = "us.amazon.nova-lite-v1:0"
 
-# Defining a Model to use in LangChain
-llm = ChatBedrock(
-    model_id=modelID,
-    client=bedrock_client,
-    model_kwargs={
-        "max_tokens_to_sample": 2000,
-        "temperature": 0.7
-    }
-)
+def get_model():
+    """Get the lab's LangChain model (Bedrock client created lazily on first use)"""
+    return get_llm(model_id=modelID, temperature=0.7)
+
+@lru_cache(maxsize=1)
+def get_router():
+    """Get the lab's model router (picks a model and max_tokens per request, see src/router.py)"""
+    return ModelRouter(
+        get_model=lambda model_id, max_tokens: get_llm(model_id=model_id, temperature=0.7, max_tokens=max_tokens)
+    )
+
+def __getattr__(name):
+    """Lazily resolve the legacy module-level bedrock_client and llm attributes"""
+    if name == "bedrock_client":
+        return get_bedrock_client()
+    if name == "llm":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ===========================================
 # PART 1: SIMPLE SEQUENTIAL CHAIN
@@ -42,6 +45,7 @@ llm = ChatBedrock(
 
 def build_simple_sequential_chain():
     """Build a two-step chain: generate ideas, then evaluate them"""
+    llm = get_model()
     
     idea_prompt = ChatPromptTemplate.from_template(
     "Generate 3 creative app ideas for: {topic}. List them numbered 1-3."
@@ -80,6 +84,7 @@ def test_simple_chain():
 
 def build_research_chain():
     """Build a three-step research chain with named inputs/outputs"""
+    llm = get_model()
     
     # Chain 1: Research the topic
     research_prompt = ChatPromptTemplate.from_template(
@@ -133,15 +138,18 @@ def test_research_chain():
 
 # Global memory store (in production, use a database)
 memory_store = {}
+memory_lock = threading.Lock()
 
 def get_session_history(session_id: str):
     """Get or create memory for a session"""
-    if session_id not in memory_store:
-        memory_store[session_id] = InMemoryChatMessageHistory()
-    return memory_store[session_id]
+    with memory_lock:
+        if session_id not in memory_store:
+            memory_store[session_id] = InMemoryChatMessageHistory()
+        return memory_store[session_id]
 
 def build_memory_chatbot():
     """Build a chatbot that remembers conversations"""
+    llm = get_model()
     
     # Create prompt with memory placeholder
     prompt = ChatPromptTemplate.from_messages([
@@ -300,6 +308,7 @@ from langchain_core.prompts import PromptTemplate
 
 def build_tool_chain():
     """Build a chain that can use tools (modern API)"""
+    llm = get_model()
     
     # Modern tools: use the decorated functions directly
     tools = [calculator, get_current_time, word_counter]
@@ -329,36 +338,16 @@ def build_tool_chain():
     return chain, {t.name: t for t in tools}
 
 
+@lru_cache(maxsize=1)
+def get_tool_chain():
+    """Get the shared tool chain (built once, reused for every question)"""
+    return ToolChain(get_router().model("tools"), tools=[calculator, get_current_time, word_counter])
+
+
 def process_with_tools(question: str) -> str:
     """Process a question, using tools if needed (modern API)"""
     
-    chain, tools = build_tool_chain()
-    
-    # Modern API: invoke instead of run
-    response = chain.invoke({"question": question})
-    text = response.content  # <-- only grab the text
-    
-    # Check if AI wants to use a tool
-    if "TOOL:" in text and "INPUT:" in text:
-        lines = text.strip().split("\n")
-        tool_name = None
-        tool_input = None
-        
-        for line in lines:
-            if line.startswith("TOOL:"):
-                tool_name = line.replace("TOOL:", "").strip()
-            if line.startswith("INPUT:"):
-                tool_input = line.replace("INPUT:", "").strip()
-        
-        if tool_name and tool_name in tools:
-            # Modern API: invoke the StructuredTool
-            tool_obj = tools[tool_name]
-            # get the first argument name dynamically
-            arg_name = list(tool_obj.args_schema.model_json_schema()['properties'].keys())[0]
-            tool_result = tool_obj.invoke({arg_name: tool_input})
-            return f"🔧 Used {tool_name}: {tool_result}"  # grab only content
-    
-    return text
+    return get_tool_chain().ask(question)
 
 def test_tool_chain():
     """Test the tool-integrated chain"""
@@ -384,6 +373,7 @@ def test_tool_chain():
 
 def build_complete_assistant():
     """Build an assistant with both memory and tool awareness"""
+    llm = get_model()
     
     tools = [calculator, get_current_time, word_counter]
     tool_descriptions = "\n".join([f"- {t.name}: {t.description}" for t in tools])
@@ -420,48 +410,25 @@ def build_complete_assistant():
     return assistant, {t.name: t for t in tools}
 
 
-def chat_with_assistant(message: str, session_id: str = "default") -> str:
-    """Chat with the complete assistant (memory + tools)"""
-    
-    assistant, tools = build_complete_assistant()
-    config = {"configurable": {"session_id": session_id}}
-    
-    # Invoke the assistant
-    response = assistant.invoke({"input": message}, config=config)
-    text = response if isinstance(response, str) else getattr(response, "content", str(response))
-    
-    # Check if the AI wants to use a tool
-    if "TOOL:" in text and "INPUT:" in text:
-        lines = text.strip().split("\n")
-        tool_name = None
-        tool_input = None
-        
-        for line in lines:
-            if line.startswith("TOOL:"):
-                tool_name = line.replace("TOOL:", "").strip()
-            if line.startswith("INPUT:"):
-                tool_input = line.replace("INPUT:", "").strip()
-        
-        if tool_name and tool_name in tools:
-            tool_obj = tools[tool_name]
-            
-            # Dynamically get first argument name (modern Pydantic v2)
-            arg_name = list(tool_obj.args_schema.model_json_schema()['properties'].keys())[0]
-            
-            # Invoke the tool properly
-            tool_result = tool_obj.invoke({arg_name: tool_input})
-            
-            # Ensure result is a string
-            tool_text = tool_result if isinstance(tool_result, str) else getattr(tool_result, "content", str(tool_result))
-            
-            # Ask assistant to provide a natural response using the tool result
-            followup = assistant.invoke(
-                {"input": f"The {tool_name} returned: {tool_text}. Please give me a natural response."},
-                config=config
-            )
-            return followup if isinstance(followup, str) else getattr(followup, "content", str(followup))
-    
-    return text
+@lru_cache(maxsize=None)
+def get_complete_assistant(tool_calling: str = "text"):
+    """Get the shared complete assistant (serves every session and thread)"""
+    return CompleteAssistant(
+        get_model(),
+        tools=[calculator, get_current_time, word_counter],
+        get_session_history=get_session_history,
+        tool_calling=tool_calling
+    )
+
+
+def chat_with_assistant(message: str, session_id: str = "default", tool_calling: str = "text") -> str:
+    """Chat with the complete assistant (memory + tools)
+
+    tool_calling="native" uses the model's structured tool calls (bind_tools)
+    instead of TOOL:/INPUT: parsing, keeping the stored history compact.
+    """
+    
+    return get_complete_assistant(tool_calling).chat(message, session_id)
 
 def test_complete_assistant():
     """Test the complete assistant with memory and tools"""
@@ -1,36 +1,60 @@
-from langchain_aws import ChatBedrock
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from dotenv import load_dotenv
-import boto3
-import os
+import argparse
+import asyncio
+import functools
+import json
+import sys
+
+from src.batch import DEFAULT_MAX_CONCURRENCY, run_batch
+from src.cluster import ClusterSupervisor, default_chatbot, fake_chatbot
+from src.fake_llm import FakeStreamingChatModel
+from src.hedging import HedgedChatModel
+from src.llm import get_bedrock_client, get_llm
+from src.loadgen import format_report, load_conversations, run_load, synthetic_conversations
+from src.memory import build_memory_chatbot
+from src.profiling import profiled
+from src.router import ModelRouter
+from src.server import DEFAULT_MAX_CONCURRENCY as DEFAULT_SERVER_CONCURRENCY, DEFAULT_MAX_QUEUE, LabServer
+from src.singleflight import SingleFlightChatModel
+from src.streaming import StreamStats, stream_text
+from src.summarize import LONG_DOCUMENT_TOKENS, estimate_tokens, map_reduce_summarize, reduce_text
+from src.tokens import with_token_budget
 
 # Load variables from .env into environment
 load_dotenv()
 
-# Define the AWS CLI Profile to use through env permission
-aws_profile = os.getenv("AWS_PROFILE")
-if aws_profile:
-    os.environ["AWS_PROFILE"] = aws_profile
-
-# Create a Bedrock Client
-bedrock_client = boto3.client(
-    service_name="bedrock-runtime",
-    region_name="us-east-1"
-)
-
 # Choose a Foundation Model to use from AWS Bedrock
 modelID = "us.amazon.nova-lite-v1:0"
 
-# Defining a Model to use in LangChain
-llm = ChatBedrock(
-    model_id=modelID,
-    client=bedrock_client,
-    model_kwargs={
-        "max_tokens_to_sample": 2000,
-        "temperature": 0.9
-    }
-)
+def get_model():
+    """
+    Get the chatbot's LangChain model.
+
+    The Bedrock client and chat model are created on first use
+    (not at import time) and cached; inject a fake with src.llm.set_llm().
+    """
+    return get_llm(model_id=modelID, temperature=0.9)
+
+@functools.lru_cache(maxsize=None)
+def get_router():
+    """
+    Get the router that picks a model and max_tokens for each chatbot and
+    summarizer request (see src/router.py); an injected model is used for every route.
+    """
+    return ModelRouter(
+        get_model=lambda model_id, max_tokens: get_llm(model_id=model_id, temperature=0.9, max_tokens=max_tokens)
+    )
+
+def __getattr__(name):
+    """Lazily resolve the legacy module-level bedrock_client and llm attributes"""
+    if name == "bedrock_client":
+        return get_bedrock_client()
+    if name == "llm":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def create_assistant_prompt():
     """General multilingual assistant prompt"""
@@ -91,8 +115,8 @@ def my_chatbot(language, freeform_text):
     # Get our prompt template
     prompt = get_prompt("assistant")
 
-    # Chain using LCEL: prompt → model → output parser
-    chain = prompt | llm | StrOutputParser()
+    # Chain using LCEL: prompt → routed model → output parser
+    chain = prompt | get_router().model("chatbot") | StrOutputParser()
 
     # Invoke chain with our inputs - returns clean string directly
     response = chain.invoke({
@@ -102,21 +126,39 @@ def my_chatbot(language, freeform_text):
 
     return response
 
-def my_summarizer(length, text):
+def my_summarizer(length, text, long_document=None, profile=None):
     """
     Summarizer function that summarizes text
 
+    Long documents are split into chunks that are summarized concurrently
+    and then merged (map-reduce), so they never exceed the context window.
+
     Args:
         length (str): Either "brief" or "detailed"
         text (str): The text to summarize
+        long_document (bool): Force (True) or disable (False) map-reduce mode;
+            by default it is used when the text exceeds LONG_DOCUMENT_TOKENS
+        profile (bool): Profile this call (True), never (False) or when sampled (None; see src/profiling.py)
 
     Returns:
         str: The summarized text
     """
+    with profiled("summarize", profile):
+        return _summarize(length, text, long_document)
+
+def _summarize(length, text, long_document):
+    """my_summarizer without the profiling hook"""
     prompt = get_prompt("summarizer")
 
-    # Chain using LCEL: prompt → model → output parser
-    chain = prompt | llm | StrOutputParser()
+    # Chain using LCEL: prompt → token budget check → routed model → output parser
+    chain = prompt | with_token_budget(get_router().model(f"summarize_{length}")) | StrOutputParser()
+
+    if long_document is None:
+        long_document = estimate_tokens(text) > LONG_DOCUMENT_TOKENS
+    if long_document:
+        # Intermediate summaries are detailed whatever the final length
+        reducer = prompt | with_token_budget(get_router().model("summarize_detailed")) | StrOutputParser()
+        return map_reduce_summarize(reducer, length, text, final_chain=chain)
 
     # Returns clean string directly (no need for .content)
     response = chain.invoke({
@@ -125,6 +167,74 @@ def my_summarizer(length, text):
     })
     return response
 
+def stream_chatbot(language, freeform_text, stats=None):
+    """
+    Streaming version of my_chatbot - yields the response as it is generated
+
+    Args:
+        language (str): The language for the chatbot to respond in
+        freeform_text (str): The user's input/question
+        stats (StreamStats): Optional, filled in with time to first token, total time and tokens
+
+    Yields:
+        str: Chunks of the AI's response
+    """
+    # Stop at the model (no output parser) so token usage metadata comes through
+    chain = get_prompt("assistant") | get_router().model("chatbot")
+
+    yield from stream_text(chain, {
+        'language': language,
+        'freeform_text': freeform_text
+    }, stats)
+
+def stream_summarizer(length, text, stats=None, long_document=None):
+    """
+    Streaming version of my_summarizer - yields the summary as it is generated
+
+    Long documents go through the same map-reduce and token budget as
+    my_summarizer; only the final summary is streamed.
+
+    Args:
+        length (str): Either "brief" or "detailed"
+        text (str): The text to summarize
+        stats (StreamStats): Optional, filled in with time to first token, total time and tokens
+        long_document (bool): Force (True) or disable (False) map-reduce mode, as for my_summarizer
+
+    Yields:
+        str: Chunks of the summary
+    """
+    prompt = get_prompt("summarizer")
+
+    # Stop at the model (no output parser) so token usage metadata comes through
+    chain = prompt | with_token_budget(get_router().model(f"summarize_{length}"))
+
+    if long_document is None:
+        long_document = estimate_tokens(text) > LONG_DOCUMENT_TOKENS
+    if long_document:
+        # Intermediate summaries are detailed whatever the final length
+        reducer = prompt | with_token_budget(get_router().model("summarize_detailed")) | StrOutputParser()
+
+        def reduce_inputs(inputs):
+            return {**inputs, 'text': reduce_text(reducer, inputs['text'])}
+
+        # The map and reduce steps run first (counted in time to first token), then the final summary streams
+        chain = RunnableLambda(reduce_inputs, name="map_reduce") | chain
+
+    yield from stream_text(chain, {
+        'length': length,
+        'text': text
+    }, stats)
+
+def print_stream(label, chunks, stats):
+    """Write streamed chunks to the terminal as they arrive, then a timing footer"""
+    sys.stdout.write(label)
+    sys.stdout.flush()
+    for chunk in chunks:
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+    print()
+    print(stats.footer())
+
 def test_chatbot():
     """Test function to try out different scenarios"""
 
@@ -169,8 +279,8 @@ def interactive_mode():
             if user_input.lower() == 'quit':
                 break
             try:
-                response = my_chatbot(language, user_input)
-                print(f"🤖 Bot: {response}")
+                stats = StreamStats()
+                print_stream("🤖 Bot: ", stream_chatbot(language, user_input, stats), stats)
             except Exception as e:
                 print(f"❌ Error: {str(e)}")
 
@@ -182,8 +292,8 @@ def interactive_mode():
             if text.lower() == 'quit':
                 break
             try:
-                response = my_summarizer(length, text)
-                print(f"📄 Summary: {response}")
+                stats = StreamStats()
+                print_stream("📄 Summary: ", stream_summarizer(length, text, stats), stats)
             except Exception as e:
                 print(f"❌ Error: {str(e)}")
 
@@ -192,7 +302,108 @@ def interactive_mode():
 
     print("👋 Goodbye!")
 
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    With no arguments, starts interactive_mode. The `batch` command
+    summarizes a JSONL file or directory of documents, resuming from its
+    checkpoint if an earlier run was interrupted. The `serve` command runs
+    the HTTP server (see src/server.py). The `loadtest` command replays
+    conversations across many memory-chatbot sessions against the fake
+    model (see src/loadgen.py).
+    """
+    parser = argparse.ArgumentParser(description="Multilingual chatbot and text summarizer")
+    commands = parser.add_subparsers(dest="command")
+
+    batch = commands.add_parser("batch", help="Summarize a JSONL file or a directory of .txt/.md files")
+    batch.add_argument("input", help="JSONL file ({\"id\", \"text\"} per line) or directory")
+    batch.add_argument("output", help="JSONL results file (appended to)")
+    batch.add_argument("--length", choices=["brief", "detailed"], default="brief")
+    batch.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                       help="Documents summarized at once")
+    batch.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.checkpoint)")
+
+    serve = commands.add_parser("serve", help="Serve the chatbot, summarizer, memory chat and chains over HTTP")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8000)
+    serve.add_argument("--max-concurrency", type=int, default=DEFAULT_SERVER_CONCURRENCY,
+                       help="Requests processed at once")
+    serve.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                       help="Requests waiting for a slot before returning 429")
+    serve.add_argument("--fake-llm", action="store_true", help="Use the offline fake model (no AWS)")
+    serve.add_argument("--coalesce", action="store_true",
+                       help="Share one model call between identical concurrent requests")
+    serve.add_argument("--hedge", action="store_true",
+                       help="Race a duplicate call when a model call is slower than its recent p95")
+    serve.add_argument("--no-warm-up", dest="warm_up", action="store_false",
+                       help="Skip the startup warm-up (connections, prompts, chains, tool schemas)")
+    serve.add_argument("--prime", action="store_true", help="Send one tiny model request during warm-up")
+    serve.add_argument("--workers", type=int, default=0,
+                       help="Run /chat sessions in N worker processes (0: in the server process)")
+
+    loadtest = commands.add_parser("loadtest", help="Replay multi-turn conversations across many chat sessions")
+    loadtest.add_argument("--sessions", type=int, default=1000, help="Synthetic sessions to run")
+    loadtest.add_argument("--conversations", help="JSONL of recorded conversations ({\"session_id\", \"turns\"})")
+    loadtest.add_argument("--turns", type=int, nargs=2, default=(2, 8), metavar=("MIN", "MAX"),
+                          help="User turns per synthetic session")
+    loadtest.add_argument("--concurrency", type=int, default=100, help="Sessions in progress at once")
+    loadtest.add_argument("--arrival-rate", type=float, help="New sessions per second (default: as fast as possible)")
+    loadtest.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between a session's turns")
+    loadtest.add_argument("--latency", type=float, default=0.05, help="Fake model time to first token, in seconds")
+    loadtest.add_argument("--json", help="Also write the full report (with the timeline) to this file")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "loadtest":
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True, first_token_delay=args.latency))
+        if args.conversations:
+            conversations = load_conversations(args.conversations)
+        else:
+            conversations = synthetic_conversations(args.sessions, turns=tuple(args.turns))
+        report = asyncio.run(run_load(chatbot, conversations, concurrency=args.concurrency,
+                                      arrival_rate=args.arrival_rate, think_time=args.think_time))
+        print(format_report(report))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return 1 if report["errors"] else 0
+
+    if args.command == "serve":
+        def wrap(llm):
+            if args.hedge:
+                llm = HedgedChatModel(llm=llm)
+            if args.coalesce:
+                llm = SingleFlightChatModel(llm=llm)
+            return llm
+
+        llm = wrap(FakeStreamingChatModel(echo=True, token_delay=0.02) if args.fake_llm else get_model())
+        # Chains run on their routes' models (src/router.py), wrapped the same way
+        models = None if args.fake_llm else lambda mode: wrap(get_router().model(mode))
+        cluster = None
+        if args.workers:
+            factory = functools.partial(fake_chatbot, token_delay=0.02) if args.fake_llm else default_chatbot
+            cluster = ClusterSupervisor(args.workers, chatbot_factory=factory, warm_up=args.warm_up,
+                                        prime=args.prime)
+        server = LabServer(llm, get_prompt, host=args.host, port=args.port,
+                           max_concurrency=args.max_concurrency, max_queue=args.max_queue, cluster=cluster,
+                           warm_up=args.warm_up, prime=args.prime, models=models)
+        try:
+            asyncio.run(server.serve_forever())
+        finally:
+            if cluster is not None:
+                cluster.close()
+        return 0
+
+    if args.command == "batch":
+        progress = run_batch(args.input, args.output, my_summarizer, length=args.length,
+                             checkpoint_path=args.checkpoint, max_concurrency=args.concurrency)
+        return 1 if progress.failed else 0
+
+    interactive_mode()
+    return 0
+
 if __name__ == "__main__":
     # test_chatbot()  # Comment out for interactive mode
-    interactive_mode()
+    sys.exit(main())
 
@@ -0,0 +1,419 @@
+"""
+Accounting module for LangChain application.
+Token and cost accounting per session and tenant, with budgets.
+
+Every model call's input and output tokens (from the response's usage
+metadata) and its cost (at MODEL_PRICES) are charged to the session_id
+and tenant_id in the call's config (configurable or metadata):
+
+    chatbot.invoke({"input": "hi"}, config={"configurable": {"session_id": "s1", "tenant_id": "acme"}})
+
+Recording never takes a lock: a call appends one event to a deque (an
+atomic operation), and pending events are folded into the per-session and
+per-tenant totals whenever usage is read (budget checks, stats, saves).
+
+Budgets are checked before a call is issued, against the usage so far
+plus the prompt's estimated tokens. A session or tenant past downgrade_at
+of a limit is sent to a cheaper model (when one is configured); a call
+that would exceed a limit is rejected with BudgetExceededError. Clearing a
+session's history does not reset its usage.
+
+With a path, usage is saved to a JSON file at most every flush_interval
+seconds (and at exit) and loaded again on start, so restarts keep the
+counters. Set LLM_USAGE_FILE or call configure_accounting() to account
+every get_llm() model.
+"""
+
+import atexit
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.runnables.config import ensure_config
+
+from src.router import MODEL_PRICES, NOVA_MICRO
+from src.tokens import count_message_tokens, model_id_of
+from src.wrappers import DelegatingChatModel, ainvoke_model, astream_model, invoke_model, stream_model
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTING_DEFAULTS = {
+    "path": None,               # JSON file usage is saved to (default: LLM_USAGE_FILE)
+    "flush_interval": 30.0,     # seconds between saves
+    "session_tokens": None,     # per-session limit on input + output tokens
+    "session_cost_usd": None,   # per-session limit on cost
+    "tenant_tokens": None,      # per-tenant limits, unless tenant_budgets has the tenant
+    "tenant_cost_usd": None,
+    "tenant_budgets": None,     # {tenant_id: {"tokens": ..., "cost_usd": ...}}
+    "downgrade_at": 0.8,        # fraction of a limit past which calls are downgraded
+    "downgrade_model": NOVA_MICRO,
+    "downgrade_max_tokens": 512,
+}
+
+MEASURES = ("input_tokens", "output_tokens", "cost_usd", "calls")
+
+
+class BudgetExceededError(RuntimeError):
+    """A call would take a session or tenant past its budget."""
+
+    def __init__(self, scope: str, key: str, measure: str, used: float, limit: float):
+        super().__init__(f"{scope} {key!r} is over its {measure} budget ({used:g} used of {limit:g})")
+        self.scope = scope
+        self.key = key
+        self.measure = measure
+        self.used = used
+        self.limit = limit
+
+
+def _empty() -> dict:
+    return dict.fromkeys(MEASURES, 0)
+
+
+class UsageLedger:
+    """
+    Token and cost totals per session, tenant and model, with budgets.
+
+    Args:
+        path: JSON file to load usage from and save it to (None keeps it in memory)
+        flush_interval: Seconds between saves, triggered by recorded calls
+        prices: USD per 1,000 tokens per model, (input, output)
+        session_tokens, session_cost_usd: Per-session limits (None = unlimited)
+        tenant_tokens, tenant_cost_usd: Per-tenant limits (None = unlimited)
+        tenant_budgets: Per-tenant overrides, {tenant_id: {"tokens": ..., "cost_usd": ...}}
+        downgrade_at: Fraction of a limit past which check() returns "downgrade" (counted in downgraded)
+        clock: Time source (monotonic seconds)
+    """
+
+    def __init__(self, path: str = None, flush_interval: float = 30.0, prices: dict = None,
+                 session_tokens: int = None, session_cost_usd: float = None,
+                 tenant_tokens: int = None, tenant_cost_usd: float = None, tenant_budgets: dict = None,
+                 downgrade_at: float = 0.8, clock=time.monotonic):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self.session_limits = {"tokens": session_tokens, "cost_usd": session_cost_usd}
+        self.tenant_limits = {"tokens": tenant_tokens, "cost_usd": tenant_cost_usd}
+        self.tenant_budgets = tenant_budgets or {}
+        self.downgrade_at = downgrade_at
+        self.clock = clock
+
+        self._events = collections.deque()  # appended without a lock, folded by readers
+        self._fold_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed = clock()
+        self.totals = {"sessions": {}, "tenants": {}, "models": {}, "total": _empty()}
+        self.rejected = 0
+        self.downgraded = 0
+        if path and os.path.exists(path):
+            self._load(path)
+
+    # ---- recording -------------------------------------------------------
+
+    def price(self, model_id: str, input_tokens: int, output_tokens: int = 0) -> float:
+        """Cost in USD of a call to model_id (0 for models without a price)."""
+        input_price, output_price = self.prices.get(model_id, (0.0, 0.0))
+        return (input_tokens * input_price + output_tokens * output_price) / 1000
+
+    def record(self, session_id: str, tenant_id: str, model_id: str, usage: dict) -> None:
+        """
+        Charge one finished call to its session and tenant.
+
+        Args:
+            session_id: The call's session, or None
+            tenant_id: The call's tenant, or None
+            model_id: The model that served the call
+            usage: The response's usage metadata (input_tokens, output_tokens)
+        """
+        if not usage:
+            return
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cost = self.price(model_id, input_tokens, output_tokens)
+        self._events.append((session_id, tenant_id, model_id, input_tokens, output_tokens, cost))
+        if self.path and self.clock() - self._flushed >= self.flush_interval:
+            self.flush(wait=False)
+
+    def _fold(self) -> None:
+        """Add pending events to the totals (called with the fold lock held)."""
+        totals = self.totals
+        while True:
+            try:
+                session_id, tenant_id, model_id, input_tokens, output_tokens, cost = self._events.popleft()
+            except IndexError:
+                return
+            rows = [totals["total"], totals["models"].setdefault(model_id or "unknown", _empty())]
+            if session_id is not None:
+                rows.append(totals["sessions"].setdefault(str(session_id), _empty()))
+            if tenant_id is not None:
+                rows.append(totals["tenants"].setdefault(str(tenant_id), _empty()))
+            for row in rows:
+                row["input_tokens"] += input_tokens
+                row["output_tokens"] += output_tokens
+                row["cost_usd"] += cost
+                row["calls"] += 1
+
+    # ---- budgets ---------------------------------------------------------
+
+    def usage(self, scope: str, key: str) -> dict:
+        """
+        Usage so far for one session or tenant.
+
+        Args:
+            scope: "sessions", "tenants" or "models"
+            key: The session id, tenant id or model id
+
+        Returns:
+            dict: input_tokens, output_tokens, cost_usd and calls
+        """
+        with self._fold_lock:
+            self._fold()
+            return dict(self.totals[scope].get(str(key), _empty()))
+
+    def _budgets(self, session_id, tenant_id):
+        if session_id is not None:
+            yield "session", "sessions", str(session_id), self.session_limits
+        if tenant_id is not None:
+            yield "tenant", "tenants", str(tenant_id), self.tenant_budgets.get(tenant_id, self.tenant_limits)
+
+    def check(self, session_id: str, tenant_id: str, prompt_tokens: int, model_id: str = None) -> str:
+        """
+        Check a call against its session and tenant budgets before it is issued.
+
+        Args:
+            session_id: The call's session, or None
+            tenant_id: The call's tenant, or None
+            prompt_tokens: Estimated input tokens of the call
+            model_id: The model the call would use (prices the prompt)
+
+        Returns:
+            str: "ok", or "downgrade" past downgrade_at of a limit
+
+        Raises:
+            BudgetExceededError: If the call would exceed a limit
+        """
+        prompt_cost = self.price(model_id, prompt_tokens)
+        fraction = 0.0
+        with self._fold_lock:
+            self._fold()
+            for scope, totals_key, key, limits in self._budgets(session_id, tenant_id):
+                row = self.totals[totals_key].get(key) or _empty()
+                used = {"tokens": row["input_tokens"] + row["output_tokens"], "cost_usd": row["cost_usd"]}
+                needed = {"tokens": prompt_tokens, "cost_usd": prompt_cost}
+                for measure, limit in limits.items():
+                    if limit is None:
+                        continue
+                    if used[measure] + needed[measure] > limit:
+                        self.rejected += 1
+                        raise BudgetExceededError(scope, key, measure, used[measure], limit)
+                    fraction = max(fraction, (used[measure] + needed[measure]) / limit if limit else 1.0)
+            if fraction < self.downgrade_at:
+                return "ok"
+            self.downgraded += 1
+            return "downgrade"
+
+    # ---- persistence -----------------------------------------------------
+
+    def _load(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        for scope in ("sessions", "tenants", "models"):
+            self.totals[scope] = {key: dict(_empty(), **row) for key, row in saved.get(scope, {}).items()}
+        self.totals["total"] = dict(_empty(), **saved.get("total", {}))
+
+    def flush(self, wait: bool = True) -> None:
+        """
+        Save usage to the ledger's path (atomically, so a crash never leaves a half-written file).
+
+        Args:
+            wait: Wait for a save in progress (False skips this save instead)
+        """
+        if not self.path or not self._flush_lock.acquire(blocking=wait):
+            return
+        try:
+            self._flushed = self.clock()
+            with self._fold_lock:
+                self._fold()
+                payload = json.dumps(self.totals)
+            temp = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(temp, self.path)
+        except OSError as e:
+            logger.warning("could not save usage to %s: %s", self.path, e)
+        finally:
+            self._flush_lock.release()
+
+    def stats(self) -> dict:
+        """Usage totals per session, tenant and model, and budget decisions."""
+        with self._fold_lock:
+            self._fold()
+            totals = json.loads(json.dumps(self.totals))
+        return {**totals, "rejected": self.rejected, "downgraded": self.downgraded}
+
+
+def _caller(config) -> tuple:
+    """The call's (session_id, tenant_id), from its config's configurable or metadata."""
+    config = ensure_config(config)  # merged with the enclosing run's config, as LangChain does
+    configurable, metadata = config.get("configurable", {}), config.get("metadata", {})
+    return (configurable.get("session_id", metadata.get("session_id")),
+            configurable.get("tenant_id", metadata.get("tenant_id")))
+
+
+class AccountingChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that checks budgets before each call and records its usage.
+
+    Calls over the downgrade threshold go to `downgrade` (a cheaper model)
+    when it is set; otherwise they proceed on the inner model.
+    """
+
+    ledger: Any
+    downgrade: Any = None
+    model_id: str = None  # priced model; found from the inner model when not given
+    downgrade_id: str = None  # likewise for the downgrade model
+
+    def _plan(self, messages, caller):
+        """Check the budgets; returns the model and model id to call."""
+        session_id, tenant_id = caller
+        model_id = self.model_id or model_id_of(self.llm)
+        action = self.ledger.check(session_id, tenant_id, count_message_tokens(messages), model_id)
+        if action == "downgrade" and self.downgrade is not None:
+            downgrade_id = self.downgrade_id or model_id_of(self.downgrade)
+            logger.info("downgrading call session=%s tenant=%s to %s", session_id, tenant_id, downgrade_id)
+            return self.downgrade, downgrade_id
+        return self.llm, model_id
+
+    def _call(self, messages, caller=None, **kwargs):
+        caller = caller or _caller(None)
+        llm, model_id = self._plan(messages, caller)
+        message = invoke_model(llm, messages, **kwargs)
+        self.ledger.record(*caller, model_id, message.usage_metadata)
+        return message
+
+    async def _acall(self, messages, caller=None, **kwargs):
+        caller = caller or _caller(None)
+        llm, model_id = self._plan(messages, caller)
+        message = await ainvoke_model(llm, messages, **kwargs)
+        self.ledger.record(*caller, model_id, message.usage_metadata)
+        return message
+
+    def _call_stream(self, messages, caller=None, **kwargs):
+        caller = caller or _caller(None)
+        llm, model_id = self._plan(messages, caller)
+        usage = None
+        for chunk in stream_model(llm, messages, **kwargs):
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        self.ledger.record(*caller, model_id, usage)
+
+    async def _acall_stream(self, messages, caller=None, **kwargs):
+        caller = caller or _caller(None)
+        llm, model_id = self._plan(messages, caller)
+        usage = None
+        async for chunk in astream_model(llm, messages, **kwargs):
+            usage = chunk.usage_metadata or usage
+            yield chunk
+        self.ledger.record(*caller, model_id, usage)
+
+    # The session and tenant are read from the config each call is made with. Outer
+    # wrappers reach the hooks through _generate/_stream without it, so the hooks
+    # fall back to the enclosing run's config.
+    def invoke(self, input, config=None, **kwargs: Any):
+        return super().invoke(input, config, caller=_caller(config), **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs: Any):
+        return await super().ainvoke(input, config, caller=_caller(config), **kwargs)
+
+    def stream(self, input, config=None, **kwargs: Any):
+        return super().stream(input, config, caller=_caller(config), **kwargs)
+
+    def astream(self, input, config=None, **kwargs: Any):
+        return super().astream(input, config, caller=_caller(config), **kwargs)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "accounting": self.ledger.stats()}
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools on the inner and downgrade models, keeping this wrapper around them."""
+        downgrade = self.downgrade.bind_tools(tools, **kwargs) if self.downgrade is not None else None
+        return self.model_copy(update={"llm": self.llm.bind_tools(tools, **kwargs), "downgrade": downgrade})
+
+
+_settings = dict(ACCOUNTING_DEFAULTS)
+_configured = False
+_ledger = None
+_lock = threading.Lock()
+
+
+def _drop_ledger() -> None:
+    """Save and forget the shared ledger (called with the lock held)."""
+    global _ledger
+    if _ledger is not None:
+        _ledger.flush()
+        atexit.unregister(_ledger.flush)
+        _ledger = None
+
+
+def configure_accounting(**settings) -> dict:
+    """
+    Enable accounting for every get_llm() model and update its settings.
+
+    The shared ledger is rebuilt on its next use (saving the current one
+    first); models already created keep the ledger they were built with,
+    so call this before get_llm().
+
+    Args:
+        **settings: Any of the ACCOUNTING_DEFAULTS keys
+
+    Returns:
+        dict: The settings now in effect
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    global _configured
+    unknown = set(settings) - set(ACCOUNTING_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown accounting setting(s): {sorted(unknown)}. Available: {list(ACCOUNTING_DEFAULTS)}")
+    with _lock:
+        _drop_ledger()
+        _settings.update(settings)
+        _configured = True
+        return dict(_settings)
+
+
+def accounting_settings() -> dict:
+    """The settings get_ledger() builds the ledger from."""
+    return dict(_settings, path=_settings["path"] or os.environ.get("LLM_USAGE_FILE"))
+
+
+def get_ledger():
+    """
+    Get the process-wide ledger, creating it on first use, or None if accounting is off.
+
+    Accounting is on once configure_accounting() was called or LLM_USAGE_FILE is set.
+    """
+    global _ledger
+    with _lock:
+        if _ledger is None and (_configured or os.environ.get("LLM_USAGE_FILE")):
+            settings = accounting_settings()
+            for key in ("downgrade_model", "downgrade_max_tokens"):
+                settings.pop(key)
+            _ledger = UsageLedger(**settings)
+            if _ledger.path:
+                atexit.register(_ledger.flush)
+        return _ledger
+
+
+def reset_accounting() -> None:
+    """Turn accounting off, restoring the default settings (the current ledger is saved first)."""
+    global _configured
+    with _lock:
+        _drop_ledger()
+        _settings.clear()
+        _settings.update(ACCOUNTING_DEFAULTS)
+        _configured = False
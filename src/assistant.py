@@ -0,0 +1,262 @@
+"""
+Assistant module for LangChain application.
+Contains long-lived tool chain and complete assistant (memory + tools) objects.
+"""
+
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate
+)
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from src.memory import get_session_history as default_session_history
+from src.profiling import profiled
+from src.tools import get_all_tools, get_tool_arg_name, parse_tool_call
+
+
+TOOL_CHAIN_TEMPLATE = """You have access to these tools:
+        {tool_descriptions}
+
+        If you need to use a tool, respond ONLY with:
+        TOOL: [tool_name]
+        INPUT: [input_for_tool]
+
+        If you don't need to use a tool, answer directly.
+
+        Question: {{question}}"""
+
+ASSISTANT_SYSTEM_TEMPLATE = """You are a helpful assistant with memory and tools.
+
+            Available tools:
+            {tool_descriptions}
+
+            To use a tool, respond with:
+            TOOL: [tool_name]
+            INPUT: [input]
+
+            Otherwise, answer naturally. Remember what the user tells you."""
+
+NATIVE_SYSTEM_PROMPT = "You are a helpful assistant with memory and tools. Remember what the user tells you."
+
+TOOL_CALLING_MODES = ("text", "native")
+
+
+def _response_text(response) -> str:
+    """Extract the text from a string or message response."""
+    if isinstance(response, str):
+        return response
+    return getattr(response, "content", str(response))
+
+
+class _ToolUser:
+    """
+    Shared tool handling for the assistants.
+
+    Builds the name->tool map, descriptions and argument names once.
+    """
+
+    def __init__(self, tools=None):
+        tools = get_all_tools() if tools is None else list(tools)
+        self.tools = {t.name: t for t in tools}
+        self.tool_descriptions = "\n".join([f"- {t.name}: {t.description}" for t in tools])
+        self._arg_names = {t.name: get_tool_arg_name(t) for t in tools}
+
+    def run_tool(self, tool_name: str, tool_input: str) -> str:
+        """
+        Invoke one of this assistant's tools.
+
+        Args:
+            tool_name: Name of the tool to invoke
+            tool_input: Input string for the tool
+
+        Returns:
+            str: The tool result
+        """
+        tool_obj = self.tools[tool_name]
+        with profiled(f"tool.{tool_name}"):
+            result = tool_obj.invoke({self._arg_names[tool_name]: tool_input})
+        return _response_text(result)
+
+
+class ToolChain(_ToolUser):
+    """
+    A stateless question answerer that can use tools.
+
+    The prompt and chain are compiled once; a single instance can be
+    shared across threads.
+    """
+
+    def __init__(self, llm, tools=None):
+        """
+        Args:
+            llm: The language model to use
+            tools: Tools to expose (defaults to get_all_tools())
+        """
+        super().__init__(tools)
+        self.prompt = ChatPromptTemplate.from_messages([
+            HumanMessagePromptTemplate.from_template(
+                TOOL_CHAIN_TEMPLATE.format(tool_descriptions=self.tool_descriptions)
+            )
+        ])
+        self.chain = self.prompt | llm
+
+    def ask(self, question: str) -> str:
+        """
+        Process a question, using tools if needed.
+
+        Args:
+            question: The user's question
+
+        Returns:
+            str: The answer or tool result
+        """
+        text = _response_text(self.chain.invoke({"question": question}))
+
+        tool_name, tool_input = parse_tool_call(text)
+        if tool_name and tool_name in self.tools:
+            tool_result = self.run_tool(tool_name, tool_input)
+            return f"🔧 Used {tool_name}: {tool_result}"
+
+        return text
+
+
+class CompleteAssistant(_ToolUser):
+    """
+    An assistant with both memory and tool awareness.
+
+    Owns its compiled prompt, tool map and history wrapper so one instance
+    serves many sessions (and threads) without per-message setup.
+
+    Two tool-calling modes are supported:
+    - "text": the model replies with TOOL:/INPUT: lines, and the tool result
+      is fed back as a synthetic human message.
+    - "native": the model's structured tool-calling interface (bind_tools)
+      is used, and history stores the AI tool calls and compact ToolMessages.
+    """
+
+    def __init__(self, llm, tools=None, get_session_history=None, tool_calling="text", max_tool_rounds=3):
+        """
+        Args:
+            llm: The language model to use
+            tools: Tools to expose (defaults to get_all_tools())
+            get_session_history: Session history factory (defaults to src.memory)
+            tool_calling: Either "text" or "native"
+            max_tool_rounds: Maximum model->tool round trips per message in native mode
+
+        Raises:
+            ValueError: If tool_calling is not recognized
+        """
+        if tool_calling not in TOOL_CALLING_MODES:
+            raise ValueError(f"Unknown tool calling mode: {tool_calling}. Available: {list(TOOL_CALLING_MODES)}")
+
+        super().__init__(tools)
+        self.llm = llm
+        self.get_session_history = get_session_history or default_session_history
+        self.tool_calling = tool_calling
+        self.max_tool_rounds = max_tool_rounds
+
+        if tool_calling == "native":
+            self.prompt = ChatPromptTemplate.from_messages([
+                ("system", NATIVE_SYSTEM_PROMPT),
+                MessagesPlaceholder(variable_name="history"),
+                MessagesPlaceholder(variable_name="turn")
+            ])
+            self.chain = self.prompt | llm.bind_tools(list(self.tools.values()))
+            self.runnable = None
+            return
+
+        self.prompt = ChatPromptTemplate.from_messages([
+            SystemMessagePromptTemplate.from_template(
+                ASSISTANT_SYSTEM_TEMPLATE.format(tool_descriptions=self.tool_descriptions)
+            ),
+            MessagesPlaceholder(variable_name="history"),
+            HumanMessagePromptTemplate.from_template("{input}")
+        ])
+        self.chain = self.prompt | llm
+        self.runnable = RunnableWithMessageHistory(
+            self.chain,
+            self.get_session_history,
+            input_messages_key="input",
+            history_messages_key="history"
+        )
+
+    def chat(self, message: str, session_id: str = "default", profile: bool = None) -> str:
+        """
+        Send a message to the assistant and get a response.
+
+        Args:
+            message: The user's message
+            session_id: The session identifier
+            profile: Profile this call (True), never (False) or when sampled (None; see src/profiling.py)
+
+        Returns:
+            str: The assistant's response
+        """
+        with profiled("assistant.chat", profile):
+            return self._chat(message, session_id)
+
+    def _chat(self, message: str, session_id: str) -> str:
+        """Run one turn: a model call, then at most one text-mode tool call."""
+        if self.tool_calling == "native":
+            return self._chat_native(message, session_id)
+
+        config = {"configurable": {"session_id": session_id}}
+        text = _response_text(self.runnable.invoke({"input": message}, config=config))
+
+        tool_name, tool_input = parse_tool_call(text)
+        if tool_name and tool_name in self.tools:
+            tool_text = self.run_tool(tool_name, tool_input)
+
+            # Ask assistant to provide a natural response using the tool result
+            followup = self.runnable.invoke(
+                {"input": f"The {tool_name} returned: {tool_text}. Please give me a natural response."},
+                config=config
+            )
+            return _response_text(followup)
+
+        return text
+
+    def _chat_native(self, message: str, session_id: str) -> str:
+        """Run a bounded model/tool loop using structured tool calls."""
+        history = self.get_session_history(session_id)
+        turn = [HumanMessage(content=message)]
+
+        for round_num in range(self.max_tool_rounds + 1):
+            response = self.chain.invoke({"history": history.messages, "turn": turn})
+            turn.append(response)
+            if not response.tool_calls:
+                history.add_messages(turn)
+                return _response_text(response)
+            if round_num == self.max_tool_rounds:
+                break
+            for tool_call in response.tool_calls:
+                turn.append(self._run_tool_call(tool_call))
+
+        # Out of rounds: answer the pending calls so the stored history stays well-formed
+        limit_error = f"Error: tool call limit ({self.max_tool_rounds}) reached"
+        for tool_call in response.tool_calls:
+            turn.append(ToolMessage(content=limit_error, tool_call_id=tool_call["id"], status="error"))
+        history.add_messages(turn)
+        return limit_error
+
+    def _run_tool_call(self, tool_call) -> ToolMessage:
+        """Execute one structured tool call and wrap the result as a ToolMessage."""
+        tool_obj = self.tools.get(tool_call["name"])
+        if tool_obj is None:
+            return ToolMessage(
+                content=f"Error: Unknown tool '{tool_call['name']}'",
+                tool_call_id=tool_call["id"],
+                status="error"
+            )
+        try:
+            with profiled(f"tool.{tool_call['name']}"):
+                return tool_obj.invoke(tool_call)
+        except Exception as e:
+            return ToolMessage(
+                content=f"Error invoking tool: {str(e)}",
+                tool_call_id=tool_call["id"],
+                status="error"
+            )
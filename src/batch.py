@@ -0,0 +1,227 @@
+"""
+Batch module for LangChain application.
+Bulk summarization over JSONL files or directories, with checkpoint/resume.
+
+Documents are streamed from the input (never loaded all at once), summarized
+with bounded concurrency, and written as JSONL as they complete. Every
+finished document id is appended to a checkpoint file, so a crashed job
+resumes without redoing finished items. Results are written before their
+checkpoint entry, so a crash can at worst repeat one in-flight document
+(at-least-once output). An id repeated in the input is summarized once per
+run. Model calls run at "batch" priority, so with the
+scheduler enabled (src/scheduler.py) interactive calls in the same
+process go first.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.scheduler import BATCH, priority
+
+DEFAULT_MAX_CONCURRENCY = 8
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+
+
+def iter_documents(path: str):
+    """
+    Stream documents from a JSONL file or a directory of text files.
+
+    JSONL lines need a "text" field and may carry "id" (defaults to the line
+    number) and "length". Directory documents use their relative path as id.
+
+    Args:
+        path: A .jsonl file or a directory
+
+    Yields:
+        dict: {"id", "text"} plus any "length" override
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith(DOCUMENT_EXTENSIONS):
+                    continue
+                file_path = os.path.join(root, name)
+                with open(file_path, encoding="utf-8") as f:
+                    yield {"id": os.path.relpath(file_path, path), "text": f.read()}
+        return
+
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            doc = {"id": str(record.get("id", line_number)), "text": record["text"]}
+            if "length" in record:
+                doc["length"] = record["length"]
+            yield doc
+
+
+def count_documents(path: str) -> int:
+    """
+    Count documents without reading their text (for progress/ETA).
+
+    Args:
+        path: A .jsonl file or a directory
+
+    Returns:
+        int: Number of documents
+    """
+    if os.path.isdir(path):
+        return sum(
+            1 for _, _, files in os.walk(path) for name in files if name.endswith(DOCUMENT_EXTENSIONS)
+        )
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    """
+    Load the ids of documents finished by earlier runs.
+
+    Args:
+        checkpoint_path: Append-only checkpoint file (one id per line)
+
+    Returns:
+        set: Finished document ids
+    """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as f:
+        # A torn last line (crash mid-write) has no newline and is ignored
+        return {line[:-1] for line in f if line.endswith("\n")}
+
+
+class BatchProgress:
+    """
+    Progress reporting: documents per second and ETA.
+
+    Only documents processed in this run count towards the rate, so a
+    resumed job does not report an inflated speed.
+    """
+
+    def __init__(self, total: int = None, skipped: int = 0, stream=None, interval: float = 2.0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        self._last_report = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Documents per second processed in this run."""
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds until the job finishes, or None if unknown."""
+        if self.total is None or self.rate == 0:
+            return None
+        return max(self.total - self.skipped - self.done, 0) / self.rate
+
+    def line(self) -> str:
+        """
+        Format the current progress.
+
+        Returns:
+            str: e.g. "📦 120/1000 docs · 4.2 docs/s · ETA 3m29s"
+        """
+        finished = self.skipped + self.done
+        total = f"/{self.total}" if self.total is not None else ""
+        eta = self.eta
+        eta_text = f"{int(eta // 60)}m{int(eta % 60):02d}s" if eta is not None else "?"
+        failed = f" · {self.failed} failed" if self.failed else ""
+        return f"📦 {finished}{total} docs · {self.rate:.1f} docs/s · ETA {eta_text}{failed}"
+
+    def update(self, failed: bool = False, force: bool = False) -> None:
+        """Record one finished document and report if the interval has passed."""
+        self.done += 1
+        self.failed += int(failed)
+        now = time.perf_counter()
+        if force or now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.line(), file=self.stream, flush=True)
+
+
+def run_batch(input_path: str, output_path: str, summarize, length: str = "brief",
+              checkpoint_path: str = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+              progress: BatchProgress = None, priority_class: str = BATCH) -> BatchProgress:
+    """
+    Summarize every document in input_path, writing JSONL results to output_path.
+
+    Args:
+        input_path: A .jsonl file or a directory of .txt/.md files
+        output_path: JSONL output, appended to (one {"id", "summary"|"error"} per document)
+        summarize: Function (length, text) -> summary, e.g. my_summarizer
+        length: Default summary length ("brief" or "detailed")
+        checkpoint_path: Append-only checkpoint (defaults to output_path + ".checkpoint")
+        max_concurrency: Maximum documents summarized at once
+        progress: Optional BatchProgress (one is created if omitted)
+        priority_class: Scheduler priority class of the model calls
+
+    Returns:
+        BatchProgress: Final counts and rate
+    """
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    finished = load_checkpoint(checkpoint_path)
+    if progress is None:
+        progress = BatchProgress(total=count_documents(input_path))
+    progress.skipped = len(finished)
+
+    write_lock = threading.Lock()
+
+    def process(doc):
+        try:
+            with priority(priority_class):
+                record = {"id": doc["id"], "summary": summarize(doc.get("length", length), doc["text"])}
+        except Exception as e:
+            record = {"id": doc["id"], "error": str(e)}
+        return record
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+
+        def record_result(future):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                # Failed documents are retried on the next run
+                if "error" not in record:
+                    checkpoint.write(record["id"] + "\n")
+                    checkpoint.flush()
+            progress.update(failed="error" in record)
+
+        def record_done(futures, timeout=None):
+            done, pending = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                record_result(future)
+            return pending
+
+        # Keep at most 2x max_concurrency documents in memory at once, and
+        # record every result as soon as it completes (not in input order)
+        in_flight = set()
+        for doc in iter_documents(input_path):
+            if doc["id"] in finished:
+                continue
+            # A repeated id in the input is summarized once per run
+            finished.add(doc["id"])
+            in_flight = record_done(in_flight, timeout=0)
+            if len(in_flight) >= 2 * max_concurrency:
+                in_flight = record_done(in_flight)
+            in_flight.add(pool.submit(process, doc))
+
+        while in_flight:
+            in_flight = record_done(in_flight)
+
+    print(progress.line(), file=progress.stream, flush=True)
+    return progress
@@ -0,0 +1,453 @@
+"""
+Breaker module for LangChain application.
+A circuit breaker in front of each Bedrock model, with a fallback model or cached answers.
+
+When Bedrock degrades, every call otherwise waits out its timeout and
+retries. A CircuitBreaker watches a rolling window of call outcomes:
+
+- closed: calls go through. Once at least min_calls calls are in the
+  window and the share that failed (throttles, 5xx, timeouts, connection
+  errors) reaches error_rate, or the share slower than slow_call_seconds
+  reaches slow_call_rate, it opens.
+- open: calls do not reach the model. They go to the fallback model if
+  one is configured, or get the last good answer to the same prompt, or
+  fail fast with CircuitOpenError.
+- half-open: after open_seconds, up to half_open_calls trial calls go
+  through. If they all succeed the breaker closes; a failure reopens it.
+
+Every state change starts a new generation. allow() returns the current
+one and record() takes it back, so a call that started in an earlier
+state (e.g. allowed while closed, finishing while half-open) is counted
+but does not move the breaker.
+
+Models from get_llm() get a breaker (shared per model id) once
+configure_breaker() is called or LLM_BREAKER is set. The breaker sits
+inside the rate limiter, so each failed attempt counts, and once it is
+open the limiter's retries fail fast instead of backing off.
+State transitions are counted in stats() (GET /health shows them under llm).
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.ratelimit import is_transient
+from src.wrappers import DelegatingChatModel, ainvoke_model, astream_model, invoke_model, stream_model
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+BREAKER_DEFAULTS = {
+    "window": 30.0,              # seconds of call outcomes considered
+    "min_calls": 10,             # outcomes needed in the window before it can open
+    "error_rate": 0.5,           # failed share that opens it
+    "slow_call_seconds": 15.0,   # calls (or time to first token) slower than this are slow
+    "slow_call_rate": 0.8,       # slow share that opens it
+    "open_seconds": 15.0,        # time open before trial calls
+    "half_open_calls": 2,        # trial calls that must succeed to close
+    "cache_size": 1000,          # last good answers kept for prompts (0 = none)
+    "fallback_model": None,      # model id served while open
+    "fallback_region": None,     # its region (default: the primary's)
+}
+
+
+class CircuitOpenError(RuntimeError):
+    """A call was refused because the circuit is open and there is no fallback."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_failure(error) -> bool:
+    """Whether an error counts against the model's health (client errors do not)."""
+    return is_transient(error) or isinstance(error, TimeoutError)
+
+
+class CircuitBreaker:
+    """
+    Tracks a model's rolling error rate and latency and decides whether calls may go through.
+
+    Args:
+        name: Name in errors and metrics (e.g. the model id)
+        window: Seconds of outcomes considered
+        min_calls: Outcomes needed before the circuit can open
+        error_rate: Failed share that opens the circuit
+        slow_call_seconds: Calls slower than this count as slow
+        slow_call_rate: Slow share that opens the circuit
+        open_seconds: Time open before trial calls are let through
+        half_open_calls: Trial calls that must succeed to close
+        clock: Time source (monotonic seconds)
+    """
+
+    def __init__(self, name: str = "model", window: float = 30.0, min_calls: int = 10, error_rate: float = 0.5,
+                 slow_call_seconds: float = 15.0, slow_call_rate: float = 0.8, open_seconds: float = 15.0,
+                 half_open_calls: int = 2, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        self.state = CLOSED
+        self._outcomes = collections.deque()  # (time, failed, slow)
+        self._failed = 0
+        self._slow = 0
+        self._opened_at = 0.0
+        self._generation = 1  # bumped on every state change
+        self._trials = 0  # trial calls started while half-open
+        self._trial_successes = 0
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.transitions = collections.Counter()  # "closed->open": count
+        self.history = collections.deque(maxlen=50)  # (time, from, to) of recent transitions
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _move(self, state: str, now: float) -> None:
+        self.transitions[f"{self.state}->{state}"] += 1
+        self.history.append((time.time(), self.state, state))
+        self.state = state
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = now
+        if state == HALF_OPEN:
+            self._trials = self._trial_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+            self._failed = self._slow = 0
+
+    def _expire(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, failed, slow = self._outcomes.popleft()
+            self._failed -= failed
+            self._slow -= slow
+
+    def allow(self):
+        """
+        Whether a call may go to the model now (claims a trial slot when half-open).
+
+        Every allowed call must be followed by record(), passing the generation
+        returned here.
+
+        Returns:
+            int: The breaker's generation (always truthy) if allowed, else None
+        """
+        with self._lock:
+            now = self.clock()
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._move(HALF_OPEN, now)
+            if self.state == CLOSED or (self.state == HALF_OPEN and self._trials < self.half_open_calls):
+                self._trials += self.state == HALF_OPEN
+                return self._generation
+            self.rejected += 1
+            return None
+
+    def record(self, failed: bool, seconds: float, generation: int = None) -> None:
+        """
+        Record an allowed call's outcome and duration.
+
+        Args:
+            failed: Whether the call failed (see is_failure)
+            seconds: Call duration (or time to first token)
+            generation: What allow() returned for the call; calls from an earlier
+                generation are counted but do not change the state (default: current)
+        """
+        with self._lock:
+            now = self.clock()
+            slow = seconds >= self.slow_call_seconds
+            self.calls += 1
+            self.failures += failed
+            if generation is not None and generation != self._generation:
+                return  # started before the last state change
+            if self.state == HALF_OPEN:
+                if failed or slow:
+                    self._move(OPEN, now)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        self._move(CLOSED, now)
+                return
+            if self.state != CLOSED:  # a call started before the circuit opened
+                return
+            self._outcomes.append((now, failed, slow))
+            self._failed += failed
+            self._slow += slow
+            self._expire(now)
+            total = len(self._outcomes)
+            unhealthy = self._failed / total >= self.error_rate or self._slow / total >= self.slow_call_rate
+            if total >= self.min_calls and unhealthy:
+                self._move(OPEN, now)
+
+    def retry_after(self) -> float:
+        """Seconds until trial calls are let through (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (self.clock() - self._opened_at))
+
+    def stats(self) -> dict:
+        """State, rolling rates and transition counts."""
+        with self._lock:
+            self._expire(self.clock())
+            total = len(self._outcomes)
+            return {
+                "state": self.state,
+                "window_calls": total,
+                "error_rate": self._failed / total if total else 0.0,
+                "slow_rate": self._slow / total if total else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "fallbacks": self.fallbacks,
+                "cache_hits": self.cache_hits,
+                "transitions": dict(self.transitions),
+            }
+
+
+class AnswerCache:
+    """The last good answer per prompt, least recently used evicted first."""
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self._answers = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(messages) -> str:
+        text = json.dumps([(m.type, m.content) for m in messages], sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, messages):
+        with self._lock:
+            key = self.key(messages)
+            answer = self._answers.get(key)
+            if answer is not None:
+                self._answers.move_to_end(key)
+            return answer
+
+    def put(self, messages, answer) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            key = self.key(messages)
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.size:
+                self._answers.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+
+class _Call:
+    """Timing and outcome of one call through a breaker."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first = None
+        self.failed = False
+
+    def first_chunk(self) -> None:
+        if self.first is None:
+            self.first = time.monotonic() - self.started
+
+    def seconds(self) -> float:
+        return self.first if self.first is not None else time.monotonic() - self.started
+
+
+class CircuitBreakerChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that sends calls through a CircuitBreaker.
+
+    While the circuit is open, calls go to `fallback` if set, else get the
+    answer cached in `answers` for the same prompt, else raise CircuitOpenError.
+    """
+
+    breaker: Any
+    fallback: Any = None
+    answers: Any = None  # AnswerCache ("cache" is taken by BaseChatModel)
+
+    def _served_while_open(self, messages):
+        """The fallback model to call, or a cached AIMessage; raises CircuitOpenError if neither."""
+        if self.fallback is not None:
+            self.breaker.count("fallbacks")
+            return self.fallback, None
+        answer = self.answers.get(messages) if self.answers is not None else None
+        if answer is not None:
+            self.breaker.count("cache_hits")
+            return None, answer
+        raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+
+    def _remember(self, messages, message) -> None:
+        if self.answers is not None:
+            self.answers.put(messages, message)
+
+    @contextmanager
+    def _recorded(self, generation: int):
+        """Record the enclosed call's outcome; the latency is up to the first chunk if marked."""
+        call = _Call()
+        try:
+            yield call
+        except Exception as e:
+            call.failed = is_failure(e)
+            raise
+        finally:  # also when a stream is abandoned, so half-open trial slots are released
+            self.breaker.record(call.failed, call.seconds(), generation)
+
+    def _call(self, messages, **kwargs):
+        generation = self.breaker.allow()
+        if not generation:
+            fallback, answer = self._served_while_open(messages)
+            return answer if fallback is None else invoke_model(fallback, messages, **kwargs)
+        with self._recorded(generation):
+            message = self._invoke_inner(messages, **kwargs)
+        self._remember(messages, message)
+        return message
+
+    async def _acall(self, messages, **kwargs):
+        generation = self.breaker.allow()
+        if not generation:
+            fallback, answer = self._served_while_open(messages)
+            return answer if fallback is None else await ainvoke_model(fallback, messages, **kwargs)
+        with self._recorded(generation):
+            message = await self._ainvoke_inner(messages, **kwargs)
+        self._remember(messages, message)
+        return message
+
+    def _call_stream(self, messages, **kwargs):
+        generation = self.breaker.allow()
+        if not generation:
+            fallback, answer = self._served_while_open(messages)
+            if fallback is None:
+                yield AIMessageChunk(content=answer.content)
+            else:
+                yield from stream_model(fallback, messages, **kwargs)
+            return
+        chunks = []
+        with self._recorded(generation) as call:
+            for chunk in self._stream_inner(messages, **kwargs):
+                call.first_chunk()
+                chunks.append(chunk)
+                yield chunk
+        self._remember_chunks(messages, chunks)
+
+    async def _acall_stream(self, messages, **kwargs):
+        generation = self.breaker.allow()
+        if not generation:
+            fallback, answer = self._served_while_open(messages)
+            if fallback is None:
+                yield AIMessageChunk(content=answer.content)
+            else:
+                async for chunk in astream_model(fallback, messages, **kwargs):
+                    yield chunk
+            return
+        chunks = []
+        with self._recorded(generation) as call:
+            async for chunk in self._astream_inner(messages, **kwargs):
+                call.first_chunk()
+                chunks.append(chunk)
+                yield chunk
+        self._remember_chunks(messages, chunks)
+
+    def _remember_chunks(self, messages, chunks) -> None:
+        if self.answers is not None and chunks:
+            text = "".join(chunk.text for chunk in chunks)
+            self.answers.put(messages, AIMessage(content=text))
+
+    def stats(self) -> dict:
+        """Breaker metrics, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "breaker": self.breaker.stats()}
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools on the inner and fallback models."""
+        fallback = self.fallback.bind_tools(tools, **kwargs) if self.fallback is not None else None
+        return self.model_copy(update={"llm": self.llm.bind_tools(tools, **kwargs), "fallback": fallback})
+
+
+_breakers = {}
+_settings = dict(BREAKER_DEFAULTS)
+_configured = False
+_lock = threading.Lock()
+
+
+def configure_breaker(**settings) -> dict:
+    """
+    Enable circuit breakers for every get_llm() model and update their settings.
+
+    Breakers are rebuilt on their next use. Models already created keep
+    the breaker they were built with, so call this before get_llm().
+
+    Args:
+        **settings: Any of the BREAKER_DEFAULTS keys
+
+    Returns:
+        dict: The settings now in effect
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    global _configured
+    unknown = set(settings) - set(BREAKER_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown breaker setting(s): {sorted(unknown)}. Available: {list(BREAKER_DEFAULTS)}")
+    with _lock:
+        _settings.update(settings)
+        _breakers.clear()
+        _configured = True
+        return dict(_settings)
+
+
+def breaker_settings() -> dict:
+    """The settings breakers are built from (fallback_model falls back to LLM_BREAKER_FALLBACK)."""
+    return dict(_settings, fallback_model=_settings["fallback_model"] or os.environ.get("LLM_BREAKER_FALLBACK"))
+
+
+def breakers_enabled() -> bool:
+    """Whether get_llm() models get breakers (configure_breaker() was called or LLM_BREAKER is set)."""
+    return _configured or os.environ.get("LLM_BREAKER", "").lower() in ("1", "true", "yes", "on")
+
+
+def get_breaker(name: str):
+    """
+    Get the shared breaker for a model, creating it on first use, or None if breakers are off.
+
+    Args:
+        name: The model id (every model with this id shares the breaker)
+    """
+    if not breakers_enabled():
+        return None
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            settings = {key: value for key, value in _settings.items()
+                        if key not in ("cache_size", "fallback_model", "fallback_region")}
+            breaker = _breakers[name] = CircuitBreaker(name, **settings)
+        return breaker
+
+
+def reset_breaker() -> None:
+    """Turn breakers off, restoring the default settings."""
+    global _configured
+    with _lock:
+        _settings.clear()
+        _settings.update(BREAKER_DEFAULTS)
+        _breakers.clear()
+        _configured = False
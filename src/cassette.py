@@ -0,0 +1,393 @@
+"""
+Cassette module for LangChain application.
+Record model calls once, then replay them offline and deterministically.
+
+A CassetteChatModel wraps a model and stores every call (the rendered
+prompt, the response and, for streams, each chunk with its arrival time)
+in a cassette file. On replay the response is looked up by a hash of the
+rendered prompt and call options, so production traffic and benchmarks
+can be re-run with no network or credentials. With realtime=True, replay
+reproduces the recorded latency and per-token timing.
+
+A cassette is two files:
+
+    <path>       append-only records, one "<key>\\t<compact json>" per line
+    <path>.idx   an open-addressing hash table (key -> offset, length),
+                 memory-mapped, so a lookup is O(1) however large the
+                 cassette grows
+
+If the index is missing or behind the data file (e.g. after a crash), the
+unindexed tail is scanned once when the cassette is opened. A cassette
+supports one writing process at a time.
+
+Set LLM_CASSETTE (and optionally LLM_CASSETTE_MODE, LLM_CASSETTE_REALTIME)
+to make every get_llm() model use a cassette; see cassette_from_env().
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import reduce
+from typing import Any
+
+from langchain_core.messages import AIMessage, AIMessageChunk, message_chunk_to_message, messages_to_dict
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import model_validator
+
+from src.wrappers import DelegatingChatModel
+
+MODES = ("auto", "record", "replay")
+
+_INDEX_MAGIC = b"LLMCIDX1"
+_HEADER = struct.Struct("<8sQQQ")   # magic, capacity, entries, bytes of the data file indexed
+_SLOT = struct.Struct("<16sQI4x")   # key digest, record offset, record length (0 = empty slot)
+_MIN_CAPACITY = 1024
+_MAX_LOAD = 0.6
+_KEY_CHARS = 64
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when a call was never recorded."""
+
+
+class Cassette:
+    """
+    An indexed, append-only store of recorded calls.
+
+    Keys are 64 hex characters (a sha256 digest, see CassetteChatModel.key);
+    the index stores their first 16 bytes.
+
+    Args:
+        path: The data file (created if missing); the index is path + ".idx"
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._lock = threading.Lock()
+        self._data = open(path, "a+b")
+        self._index_file = None
+        self._index = None
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._open_index()
+
+    # ---- index -----------------------------------------------------------
+
+    def _open_index(self) -> None:
+        data_size = os.path.getsize(self.path)
+        try:
+            self._map_index()
+            magic, _, _, indexed = self._header()
+            if magic != _INDEX_MAGIC or indexed > data_size:
+                raise ValueError("stale index")
+        except (OSError, ValueError, struct.error):
+            self._create_index(_MIN_CAPACITY)
+            indexed = 0
+        if indexed < data_size:
+            self._scan(indexed)
+
+    def _map_index(self) -> None:
+        self._index_file = open(self.index_path, "r+b")
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+            self._index = self._index_file = None
+
+    def _create_index(self, capacity: int, entries=()) -> None:
+        """Write a new index with the given (digest, offset, length) entries and map it."""
+        self._close_index()
+        temp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.truncate(_HEADER.size + capacity * _SLOT.size)
+        with open(temp, "r+b") as f:
+            table = mmap.mmap(f.fileno(), 0)
+            table[:_HEADER.size] = _HEADER.pack(_INDEX_MAGIC, capacity, 0, 0)
+            count = 0
+            for digest, offset, length in entries:
+                count += self._put_slot(table, capacity, digest, offset, length)
+            magic, capacity, _, indexed = _HEADER.unpack_from(table, 0)
+            _HEADER.pack_into(table, 0, magic, capacity, count, indexed)
+            table.flush()
+            table.close()
+        os.replace(temp, self.index_path)
+        self._map_index()
+
+    def _header(self):
+        return _HEADER.unpack_from(self._index, 0)
+
+    @staticmethod
+    def _put_slot(table, capacity: int, digest: bytes, offset: int, length: int) -> int:
+        """Insert or overwrite a slot; returns 1 if the key is new."""
+        slot = int.from_bytes(digest[:8], "little") % capacity
+        while True:
+            position = _HEADER.size + slot * _SLOT.size
+            existing, _, existing_length = _SLOT.unpack_from(table, position)
+            if existing_length == 0 or existing == digest:
+                _SLOT.pack_into(table, position, digest, offset, length)
+                return 1 if existing_length == 0 else 0
+            slot = (slot + 1) % capacity
+
+    def _entries(self):
+        _, capacity, _, _ = self._header()
+        for slot in range(capacity):
+            digest, offset, length = _SLOT.unpack_from(self._index, _HEADER.size + slot * _SLOT.size)
+            if length:
+                yield digest, offset, length
+
+    def _index_record(self, key: str, offset: int, length: int) -> None:
+        magic, capacity, count, indexed = self._header()
+        if count + 1 > capacity * _MAX_LOAD:
+            self._create_index(capacity * 2, list(self._entries()))
+            magic, capacity, count, _ = self._header()
+        count += self._put_slot(self._index, capacity, bytes.fromhex(key)[:16], offset, length)
+        _HEADER.pack_into(self._index, 0, magic, capacity, count, max(indexed, offset + length))
+
+    def _scan(self, start: int) -> None:
+        """Index the records of the data file from byte `start` on."""
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._index_record(line[:_KEY_CHARS].decode(), offset, len(line))
+                offset += len(line)
+        if offset < os.path.getsize(self.path):
+            os.truncate(self.path, offset)  # drop a torn final write so the next record starts cleanly
+
+    # ---- records ---------------------------------------------------------
+
+    def get(self, key: str):
+        """The record stored under key, or None."""
+        digest = bytes.fromhex(key)[:16]
+        with self._lock:
+            _, capacity, _, _ = self._header()
+            slot = int.from_bytes(digest[:8], "little") % capacity
+            while True:
+                existing, offset, length = _SLOT.unpack_from(self._index, _HEADER.size + slot * _SLOT.size)
+                if length == 0:
+                    self.misses += 1
+                    return None
+                if existing == digest:
+                    break
+                slot = (slot + 1) % capacity
+            self._data.seek(offset)
+            line = self._data.read(length)
+            self.hits += 1
+        return json.loads(line[_KEY_CHARS + 1:])
+
+    def put(self, key: str, record: dict) -> None:
+        """Append a record under key (replacing any earlier one in the index)."""
+        line = f"{key}\t{json.dumps(record, separators=(',', ':'), default=str)}\n".encode()
+        with self._lock:
+            offset = self._data.seek(0, os.SEEK_END)
+            self._data.write(line)
+            self._data.flush()
+            self._index_record(key, offset, len(line))
+            self.recorded += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._header()[2]
+
+    def stats(self) -> dict:
+        """Lookups served and missed, records written and distinct keys stored."""
+        return {"hits": self.hits, "misses": self.misses, "recorded": self.recorded, "entries": len(self)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_index()
+            self._data.close()
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def open_cassette(path: str) -> Cassette:
+    """The process-wide Cassette for a path (one writer per file)."""
+    path = os.path.abspath(path)
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
+
+
+def cassette_from_env() -> dict:
+    """
+    Cassette settings from the environment, or None if LLM_CASSETTE is unset.
+
+    LLM_CASSETTE: cassette path
+    LLM_CASSETTE_MODE: "auto" (default: replay if recorded, else call and record),
+        "record" (always call and record) or "replay" (never call the model)
+    LLM_CASSETTE_REALTIME: "1" to replay with the recorded timing
+
+    Returns:
+        dict: cassette, mode and realtime, as CassetteChatModel fields
+    """
+    path = os.environ.get("LLM_CASSETTE")
+    if not path:
+        return None
+    mode = os.environ.get("LLM_CASSETTE_MODE", "auto")
+    if mode not in MODES:
+        raise ValueError(f"Unknown LLM_CASSETTE_MODE: {mode}. Available: {list(MODES)}")
+    realtime = os.environ.get("LLM_CASSETTE_REALTIME", "") not in ("", "0", "false")
+    return {"cassette": open_cassette(path), "mode": mode, "realtime": realtime}
+
+
+def _pack(message) -> dict:
+    """A message's content and other non-empty fields (type aside), as JSON-ready data."""
+    return {key: value for key, value in message.model_dump().items()
+            if key == "content" or key != "type" and value not in (None, "", [], {})}
+
+
+def _as_chunk(message: AIMessage) -> AIMessageChunk:
+    tool_call_chunks = [
+        {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": index}
+        for index, call in enumerate(message.tool_calls)
+    ]
+    return AIMessageChunk(content=message.content, id=message.id, response_metadata=message.response_metadata,
+                          usage_metadata=message.usage_metadata, tool_call_chunks=tool_call_chunks)
+
+
+class CassetteChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that records calls to a cassette and replays them.
+
+    Usage:
+        llm = CassetteChatModel(llm=get_llm(), cassette=open_cassette("calls.cassette"))   # record
+        llm = CassetteChatModel(cassette=open_cassette("calls.cassette"), mode="replay")   # offline
+
+    Modes: "auto" replays recorded calls and records new ones, "record"
+    always calls the model, "replay" never does (an unrecorded call raises
+    CassetteMissError). `scope` (e.g. the model id) is part of the key.
+    """
+
+    llm: Any = None
+    cassette: Any
+    mode: str = "auto"
+    realtime: bool = False
+    scope: str = ""
+    tools: Any = None  # tool schemas from bind_tools(), part of the key
+
+    @model_validator(mode="after")
+    def _check_mode(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {self.mode}. Available: {list(MODES)}")
+        if self.llm is None and self.mode != "replay":
+            raise ValueError(f"Cassette mode {self.mode!r} needs a model to record from")
+        return self
+
+    def key(self, messages, **kwargs) -> str:
+        """The cassette key of a call: scope, bound tools, rendered prompt and call options."""
+        payload = json.dumps([self.scope, self.tools, messages_to_dict(messages), kwargs],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _lookup(self, key: str):
+        if self.mode == "record":
+            return None
+        record = self.cassette.get(key)
+        if record is None and self.mode == "replay":
+            raise CassetteMissError(f"No recorded call for key {key} in {self.cassette.path}")
+        return record
+
+    def _record(self, key: str, messages, record: dict) -> None:
+        self.cassette.put(key, {"messages": messages_to_dict(messages), **record})
+
+    @staticmethod
+    def _message(record: dict) -> AIMessage:
+        if "response" in record:
+            return AIMessage(**record["response"])
+        chunks = [AIMessageChunk(**data) for _, data in record["chunks"]]
+        return message_chunk_to_message(reduce(lambda a, b: a + b, chunks))
+
+    @staticmethod
+    def _chunks(record: dict):
+        """(seconds after the call started, chunk) pairs to replay."""
+        if "chunks" in record:
+            return [(t, AIMessageChunk(**data)) for t, data in record["chunks"]]
+        return [(record.get("elapsed", 0.0), _as_chunk(AIMessage(**record["response"])))]
+
+    # ---- hooks -----------------------------------------------------------
+
+    def _call(self, messages, **kwargs):
+        key = self.key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            if self.realtime:
+                time.sleep(record.get("elapsed", 0.0))
+            return self._message(record)
+        started = time.perf_counter()
+        message = self._invoke_inner(messages, **kwargs)
+        self._record(key, messages, {"elapsed": time.perf_counter() - started, "response": _pack(message)})
+        return message
+
+    async def _acall(self, messages, **kwargs):
+        key = self.key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            if self.realtime:
+                await asyncio.sleep(record.get("elapsed", 0.0))
+            return self._message(record)
+        started = time.perf_counter()
+        message = await self._ainvoke_inner(messages, **kwargs)
+        self._record(key, messages, {"elapsed": time.perf_counter() - started, "response": _pack(message)})
+        return message
+
+    def _call_stream(self, messages, **kwargs):
+        key = self.key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            started = time.perf_counter()
+            for t, chunk in self._chunks(record):
+                if self.realtime:
+                    time.sleep(max(0.0, t - (time.perf_counter() - started)))
+                yield chunk
+            return
+        started = time.perf_counter()
+        chunks = []
+        for chunk in self._stream_inner(messages, **kwargs):
+            chunks.append([time.perf_counter() - started, _pack(chunk)])
+            yield chunk
+        # Only complete streams are recorded
+        self._record(key, messages, {"elapsed": time.perf_counter() - started, "chunks": chunks})
+
+    async def _acall_stream(self, messages, **kwargs):
+        key = self.key(messages, **kwargs)
+        record = self._lookup(key)
+        if record is not None:
+            started = time.perf_counter()
+            for t, chunk in self._chunks(record):
+                if self.realtime:
+                    await asyncio.sleep(max(0.0, t - (time.perf_counter() - started)))
+                yield chunk
+            return
+        started = time.perf_counter()
+        chunks = []
+        async for chunk in self._astream_inner(messages, **kwargs):
+            chunks.append([time.perf_counter() - started, _pack(chunk)])
+            yield chunk
+        self._record(key, messages, {"elapsed": time.perf_counter() - started, "chunks": chunks})
+
+    def stats(self) -> dict:
+        """Cassette hits and recordings, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "cassette": self.cassette.stats()}
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools on the inner model (if any); their schemas become part of the key."""
+        update = {"tools": [[convert_to_openai_tool(tool) for tool in tools], kwargs]}
+        if self.llm is not None:
+            update["llm"] = self.llm.bind_tools(tools, **kwargs)
+        return self.model_copy(update=update)
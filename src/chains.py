@@ -1,11 +1,19 @@
 """
 Chain building module for LangChain application.
 Contains functions for creating sequential and research chains.
+
+Multi-step chains are DAGs of named steps (see src/dag.py); steps that do
+not depend on each other run concurrently.
 """
 
+import inspect
+
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableSequence, RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableSequence
+
+from src.dag import DagChain, Step, topological_order
+from src.profiling import profile_runnable
+from src.tokens import with_token_budget
 
 
 def build_simple_sequential_chain(llm):
@@ -18,6 +26,9 @@ def build_simple_sequential_chain(llm):
     Returns:
         RunnableSequence: A chain that generates and evaluates app ideas
     """
+    # Oversize prompts are rejected before any call is made
+    llm = with_token_budget(llm, on_overflow="reject")
+
     # Step 1: Generate ideas
     idea_prompt = ChatPromptTemplate.from_template(
         "Generate 3 creative app ideas for: {topic}. List them numbered 1-3."
@@ -36,7 +47,25 @@ def build_simple_sequential_chain(llm):
     return idea_eval_chain
 
 
-def build_research_chain(llm):
+# The research chain as a DAG: each step reads the outputs it names
+RESEARCH_STEPS = [
+    Step("research_data", "Research {topic} and provide 3 key facts. Be concise."),
+    Step("outline", "Create a 3-point outline for an article about {topic} using this research:\n\n{research_data}"),
+    Step("summary", "Write a 2-paragraph summary about {topic} following this outline:\n\n{outline}"),
+]
+
+# Researches three angles of the topic concurrently, then outlines and summarizes
+DEEP_RESEARCH_STEPS = [
+    Step("facts", "Research {topic} and provide 3 key facts. Be concise."),
+    Step("history", "Summarize the history of {topic} in 3 sentences."),
+    Step("challenges", "List the 3 biggest open challenges in {topic}. Be concise."),
+    Step("outline", "Create a 3-point outline for an article about {topic} using this research:\n\n"
+                    "Facts:\n{facts}\n\nHistory:\n{history}\n\nChallenges:\n{challenges}"),
+    Step("summary", "Write a 2-paragraph summary about {topic} following this outline:\n\n{outline}"),
+]
+
+
+def build_research_chain(llm, cache=None):
     """
     Build a three-step research chain with named inputs/outputs.
 
@@ -47,59 +76,88 @@ def build_research_chain(llm):
 
     Args:
         llm: The language model to use
+        cache (StepCache): Optional; steps whose prompt and inputs are unchanged are not re-run
 
     Returns:
-        Runnable: A chain that produces research_data, outline, and summary
+        DagChain: A chain that produces research_data, outline, and summary
     """
-    # Chain 1: Research the topic
-    research_prompt = ChatPromptTemplate.from_template(
-        "Research {topic} and provide 3 key facts. Be concise."
-    )
-    research_chain = research_prompt | llm | StrOutputParser()
+    return DagChain(RESEARCH_STEPS, llm, name="research", cache=cache)
 
-    # Chain 2: Create an outline using the research
-    outline_prompt = ChatPromptTemplate.from_template(
-        "Create a 3-point outline for an article about {topic} using this research:\n\n{research_data}"
-    )
-    outline_chain = outline_prompt | llm | StrOutputParser()
 
-    # Chain 3: Write a summary using the outline
-    summary_prompt = ChatPromptTemplate.from_template(
-        "Write a 2-paragraph summary about {topic} following this outline:\n\n{outline}"
-    )
-    summary_chain = summary_prompt | llm | StrOutputParser()
-
-    # Advanced sequential chain with named state/outputs
-    full_chain = (
-        RunnablePassthrough()
-        .assign(research_data=research_chain)
-        .assign(outline=outline_chain)
-        .assign(summary=summary_chain)
-    )
+def build_deep_research_chain(llm, cache=None):
+    """
+    Build a research chain that looks at a topic from three angles at once.
+
+    The facts, history and challenges steps run concurrently; the outline
+    waits for all three, then the summary follows.
+
+    Args:
+        llm: The language model to use
+        cache (StepCache): Optional; steps whose prompt and inputs are unchanged are not re-run
 
-    return full_chain
+    Returns:
+        DagChain: A chain that produces facts, history, challenges, outline, and summary
+    """
+    return DagChain(DEEP_RESEARCH_STEPS, llm, name="deep_research", cache=cache)
+
+
+# Chain type -> builder(llm); extend with register_chain()
+CHAINS = {
+    "simple": build_simple_sequential_chain,
+    "research": build_research_chain,
+    "deep_research": build_deep_research_chain,
+}
+
+
+def register_chain(chain_type, steps):
+    """
+    Register a chain type for get_chain() (and the server's /chain/<type>).
+
+    Args:
+        chain_type (str): The name to register
+        steps: A list of Steps (built into a DagChain) or a builder function taking the llm
+            (and any options passed to get_chain)
+
+    Returns:
+        The builder function
+    """
+    if callable(steps):
+        builder = steps
+    else:
+        topological_order(steps)  # fail now, not on first use, if the steps do not form a DAG
+        builder = lambda llm, cache=None: DagChain(steps, llm, name=chain_type, cache=cache)  # noqa: E731
+    CHAINS[chain_type] = builder
+    return builder
 
 
-def get_chain(chain_type, llm):
+def _accepts(builder, option) -> bool:
+    """Whether a chain builder takes a keyword option."""
+    parameters = inspect.signature(builder).parameters
+    return option in parameters or any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+
+
+def get_chain(chain_type, llm, profile=None, **options):
     """
     Chain selector function - returns appropriate chain based on type.
 
     Args:
-        chain_type (str): Either "simple" or "research"
+        chain_type (str): A registered chain type, e.g. "simple", "research" or "deep_research"
         llm: The language model to use
+        profile: Profile every call (True), never (False) or when sampled (None; see src/profiling.py)
+        **options: Passed to the chain's builder, e.g. cache=StepCache() for DAG chains
 
     Returns:
         Runnable: The appropriate chain
 
     Raises:
-        ValueError: If chain_type is not recognized
+        ValueError: If chain_type is not recognized, or its builder does not take an option
     """
-    chains = {
-        "simple": build_simple_sequential_chain,
-        "research": build_research_chain
-    }
-
-    if chain_type not in chains:
-        raise ValueError(f"Unknown chain type: {chain_type}. Available: {list(chains.keys())}")
-
-    return chains[chain_type](llm)
+    if chain_type not in CHAINS:
+        raise ValueError(f"Unknown chain type: {chain_type}. Available: {list(CHAINS.keys())}")
+    for option in options:
+        if not _accepts(CHAINS[chain_type], option):
+            takers = [name for name, builder in CHAINS.items() if _accepts(builder, option)]
+            raise ValueError(f"Chain type {chain_type} does not take option '{option}'. "
+                             f"Chain types that do: {takers}")
+
+    return profile_runnable(CHAINS[chain_type](llm, **options), f"chain.{chain_type}", profile)
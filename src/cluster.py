@@ -0,0 +1,553 @@
+"""
+Cluster module for LangChain application.
+Runs memory-chatbot sessions across worker processes, one session per worker.
+
+Prompt rendering, pydantic validation and tool execution hold the GIL, so
+one process uses one core. A ClusterSupervisor starts N worker processes,
+each with its own memory chatbot and session store, and routes every
+session_id to a fixed worker with a consistent-hash ring, so a
+conversation's history always lives in the process that answers it.
+
+Adding or removing a worker changes the owner of only ~1/N of the
+sessions. While the ring changes, new turns wait, in-flight turns finish,
+and the moved sessions' histories are copied from their old worker to the
+new one. The old copies are dropped only after every import has succeeded
+and the ring has switched, so a failed move loses no history.
+
+    with ClusterSupervisor(workers=8) as cluster:
+        cluster.chat("session-1", "My name is Ada")
+        cluster.add_worker()          # rebalances
+        cluster.chat("session-1", "What is my name?")
+
+Workers talk to the supervisor over pipes; each runs an asyncio loop, so
+one worker serves many sessions concurrently. The server routes /chat
+through a cluster with LabServer(..., cluster=...) (`serve --workers N`).
+A worker that dies loses its sessions; its pending turns fail with
+WorkerError. With warm_up=True each worker preconnects its Bedrock
+clients (and optionally primes its chatbot) before it takes turns.
+"""
+
+import asyncio
+import bisect
+import concurrent.futures
+import functools
+import hashlib
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+
+DEFAULT_REPLICAS = 128
+CALL_TIMEOUT = 300.0
+
+
+class WorkerError(RuntimeError):
+    """A request failed inside a worker process (or the worker exited)."""
+
+    def __init__(self, error_type: str, message: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    A consistent-hash ring with virtual nodes.
+
+    Args:
+        nodes: Initial node names
+        replicas: Virtual nodes per node (more spreads keys more evenly)
+    """
+
+    def __init__(self, nodes=(), replicas: int = DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self.nodes = set()
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def _rebuild(self, points) -> None:
+        points.sort()
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def add(self, node: str) -> None:
+        """Add a node (taking over ~1/N of the keys)."""
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        points = list(zip(self._points, self._owners))
+        points += [(_hash(f"{node}#{i}"), node) for i in range(self.replicas)]
+        self._rebuild(points)
+
+    def remove(self, node: str) -> None:
+        """Remove a node (its keys move to the next nodes on the ring)."""
+        self.nodes.discard(node)
+        self._rebuild([(p, n) for p, n in zip(self._points, self._owners) if n != node])
+
+    def node_for(self, key: str) -> str:
+        """The node owning key."""
+        if not self._points:
+            raise LookupError("the ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def copy(self) -> "HashRing":
+        ring = HashRing(replicas=self.replicas)
+        ring.nodes = set(self.nodes)
+        ring._points, ring._owners = list(self._points), list(self._owners)
+        return ring
+
+
+# ---- worker process ----------------------------------------------------------
+
+
+def default_chatbot():
+    """The worker chatbot: build_memory_chatbot on get_llm()."""
+    from src.llm import get_llm
+    from src.memory import build_memory_chatbot
+    return build_memory_chatbot(get_llm())
+
+
+def fake_chatbot(**options):
+    """A worker chatbot on the fake model (options as for FakeStreamingChatModel; echo by default)."""
+    from src.fake_llm import FakeStreamingChatModel
+    from src.memory import build_memory_chatbot
+    return build_memory_chatbot(FakeStreamingChatModel(**{"echo": True, **options}))
+
+
+def _chunk_text(chunk) -> str:
+    return chunk if isinstance(chunk, str) else getattr(chunk, "text", str(chunk))
+
+
+def _export_sessions(session_ids) -> dict:
+    from langchain_core.messages import messages_to_dict
+    from src.memory import get_session_history, list_sessions
+
+    present = set(list_sessions())
+    return {session_id: messages_to_dict(get_session_history(session_id).messages)
+            for session_id in session_ids if session_id in present}
+
+
+def _drop_sessions(session_ids) -> int:
+    from src.memory import clear_session
+
+    return sum(clear_session(session_id) for session_id in session_ids)
+
+
+def _import_sessions(histories: dict) -> int:
+    from langchain_core.messages import messages_from_dict
+    from src.memory import clear_session, get_session_history
+
+    for session_id, messages in histories.items():
+        clear_session(session_id)
+        get_session_history(session_id).add_messages(messages_from_dict(messages))
+    return len(histories)
+
+
+async def _handle(conn, chatbot, request) -> None:
+    kind, request_id, *args = request
+    try:
+        if kind == "chat":
+            session_id, message, stream, configurable = args
+            config = {"configurable": {**configurable, "session_id": session_id}}
+            if stream:
+                async for chunk in chatbot.astream({"input": message}, config=config):
+                    text = _chunk_text(chunk)
+                    if text:
+                        conn.send(("chunk", request_id, text))
+                result = None
+            else:
+                result = _chunk_text(await chatbot.ainvoke({"input": message}, config=config))
+        elif kind == "sessions":
+            from src.memory import list_sessions
+            result = list_sessions()
+        elif kind == "export":
+            result = _export_sessions(*args)
+        elif kind == "drop":
+            result = _drop_sessions(*args)
+        elif kind == "import":
+            result = _import_sessions(*args)
+        else:
+            raise ValueError(f"Unknown request: {kind}")
+        conn.send(("done", request_id, result))
+    except Exception as e:
+        conn.send(("error", request_id, (type(e).__name__, str(e))))
+
+
+async def _serve(conn, chatbot) -> None:
+    loop = asyncio.get_running_loop()
+    requests = asyncio.Queue()
+
+    def readable():
+        try:
+            requests.put_nowait(conn.recv())
+        except EOFError:
+            loop.remove_reader(conn.fileno())
+            requests.put_nowait(None)
+
+    loop.add_reader(conn.fileno(), readable)
+    tasks = set()
+    while True:
+        request = await requests.get()
+        if request is None or request[0] == "stop":
+            break
+        task = asyncio.ensure_future(_handle(conn, chatbot, request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _worker_main(conn, chatbot_factory, warm_up) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor decides when workers stop
+    try:
+        chatbot = chatbot_factory()
+    except Exception as e:
+        conn.send(("ready", None, ((type(e).__name__, str(e)), None)))
+        return
+    report = None
+    if warm_up is not None:  # {"prime": ...}: warm up before taking turns
+        from src.warmup import warm_up_worker
+        report = warm_up_worker(chatbot, **warm_up)
+    conn.send(("ready", None, (None, report)))
+    asyncio.run(_serve(conn, chatbot))
+
+
+# ---- supervisor --------------------------------------------------------------
+
+
+class _Worker:
+    """The supervisor's handle on one worker process: a pipe and its pending requests."""
+
+    def __init__(self, name: str, context, chatbot_factory, warm_up=None):
+        self.name = name
+        self.requests = 0
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, chatbot_factory, warm_up), name=name,
+                                       daemon=True)
+        self.process.start()
+        child.close()
+        _, _, (error, self.warmup) = self._conn.recv()
+        if error is not None:
+            self.process.join()
+            raise WorkerError(*error)
+        self._send_lock = threading.Lock()
+        self._pending = {}  # request id -> callback(kind, payload)
+        self._ids = itertools.count()
+        self._receiver = threading.Thread(target=self._receive, name=f"{name}-receiver", daemon=True)
+        self._receiver.start()
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                kind, request_id, payload = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            callback = self._pending.get(request_id)
+            if kind != "chunk":
+                self._pending.pop(request_id, None)
+            if callback is not None:
+                callback(kind, payload)
+        for callback in list(self._pending.values()):
+            callback("error", ("WorkerExited", f"{self.name} exited"))
+        self._pending.clear()
+
+    def send(self, kind: str, callback, *args) -> None:
+        request_id = next(self._ids)
+        self._pending[request_id] = callback
+        try:
+            with self._send_lock:
+                self._conn.send((kind, request_id, *args))
+        except (OSError, ValueError):
+            self._pending.pop(request_id, None)
+            raise WorkerError("WorkerExited", f"{self.name} exited")
+
+    def call(self, kind: str, *args, timeout: float = CALL_TIMEOUT):
+        """Send a request and wait for its result."""
+        future = concurrent.futures.Future()
+
+        def resolve(result_kind, payload):
+            if result_kind == "done":
+                future.set_result(payload)
+            elif result_kind == "error":
+                future.set_exception(WorkerError(*payload))
+
+        self.send(kind, resolve, *args)
+        return future.result(timeout)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        try:
+            with self._send_lock:
+                self._conn.send(("stop", None))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._conn.close()
+
+
+class ClusterSupervisor:
+    """
+    Runs worker processes and routes each session to one of them by consistent hashing.
+
+    Args:
+        workers: Worker processes to start (default: one per CPU)
+        chatbot_factory: Picklable callable building each worker's chatbot
+            (default_chatbot; e.g. functools.partial(fake_chatbot, cpu_work=10_000))
+        replicas: Virtual nodes per worker on the hash ring
+        start_method: multiprocessing start method ("spawn" by default, safe with threads)
+        warm_up: Warm up each worker before it takes turns (src/warmup.py warm_up_worker)
+        prime: Also send one tiny priming turn through each worker's chatbot
+    """
+
+    def __init__(self, workers: int = None, chatbot_factory=default_chatbot, replicas: int = DEFAULT_REPLICAS,
+                 start_method: str = "spawn", warm_up: bool = False, prime: bool = False):
+        self.chatbot_factory = chatbot_factory
+        self.warm_up = {"prime": prime} if warm_up else None
+        self._context = multiprocessing.get_context(start_method)
+        self._names = (f"worker-{n}" for n in itertools.count())
+        self._workers = {}
+        self.ring = HashRing(replicas=replicas)
+        self.migrated = 0
+        self.rebalances = 0
+
+        self._changing = threading.Lock()  # one add/remove at a time
+        self._routing = threading.Condition()
+        self._paused = False
+        self._in_flight = 0
+        try:
+            for _ in range(workers or os.cpu_count() or 1):
+                name = next(self._names)
+                self._workers[name] = _Worker(name, self._context, chatbot_factory, self.warm_up)
+                self.ring.add(name)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ---- routing ---------------------------------------------------------
+
+    def worker_for(self, session_id: str) -> str:
+        """The worker that owns a session."""
+        return self.ring.node_for(str(session_id))
+
+    def _try_begin(self, session_id: str):
+        with self._routing:
+            if self._paused:
+                return None
+            self._in_flight += 1
+            worker = self._workers[self.ring.node_for(session_id)]
+            worker.requests += 1
+            return worker
+
+    def _begin(self, session_id: str) -> _Worker:
+        with self._routing:
+            while self._paused:
+                self._routing.wait()
+            return self._try_begin(session_id)
+
+    def _end(self) -> None:
+        with self._routing:
+            self._in_flight -= 1
+            self._routing.notify_all()
+
+    async def _abegin(self, session_id: str) -> _Worker:
+        worker = self._try_begin(session_id)
+        if worker is None:  # rebalancing: wait off the event loop
+            worker = await asyncio.to_thread(self._begin, session_id)
+        return worker
+
+    def chat(self, session_id: str, message: str, **configurable) -> str:
+        """
+        Send one turn to the session's worker and wait for the reply.
+
+        Args:
+            session_id: The session identifier
+            message: The user's message
+            **configurable: Other configurable values for the turn (e.g. tenant_id)
+
+        Returns:
+            str: The chatbot's response
+
+        Raises:
+            WorkerError: If the turn failed in the worker
+        """
+        session_id = str(session_id)
+        worker = self._begin(session_id)
+        try:
+            return worker.call("chat", session_id, message, False, configurable)
+        finally:
+            self._end()
+
+    async def achat(self, session_id: str, message: str, **configurable) -> str:
+        """Async chat()."""
+        return "".join([text async for text in self.astream_chat(session_id, message, **configurable)])
+
+    async def astream_chat(self, session_id: str, message: str, **configurable):
+        """
+        Send one turn to the session's worker, yielding the reply as it streams.
+
+        Yields:
+            str: Response text chunks
+        """
+        session_id = str(session_id)
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def deliver(kind, payload):
+            loop.call_soon_threadsafe(chunks.put_nowait, (kind, payload))
+
+        worker = await self._abegin(session_id)
+        try:
+            worker.send("chat", deliver, session_id, message, True, configurable)
+            while True:
+                kind, payload = await chunks.get()
+                if kind == "chunk":
+                    yield payload
+                elif kind == "error":
+                    raise WorkerError(*payload)
+                else:
+                    return
+        finally:
+            self._end()
+
+    # ---- membership ------------------------------------------------------
+
+    def _pause(self) -> None:
+        with self._routing:
+            self._paused = True
+            while self._in_flight:
+                self._routing.wait()
+
+    def _resume(self) -> None:
+        with self._routing:
+            self._paused = False
+            self._routing.notify_all()
+
+    def _rebalance(self, ring: HashRing) -> int:
+        """Move every session whose owner differs under ring, then switch to it (routing paused)."""
+        moves = {}
+        for name, worker in self._workers.items():
+            for session_id in worker.call("sessions"):
+                owner = ring.node_for(session_id)
+                if owner != name:
+                    moves.setdefault((name, owner), []).append(session_id)
+        # Copy every moved session first; the sources keep theirs until the ring
+        # has switched, so a failed export or import loses nothing
+        copied = []
+        try:
+            for (source, target), session_ids in moves.items():
+                histories = self._workers[source].call("export", session_ids)
+                self._workers[target].call("import", histories)
+                copied.append((source, target, list(histories)))
+        except BaseException:
+            for _, target, session_ids in copied:  # the old owners still serve these
+                self._try_call(target, "drop", session_ids)
+            raise
+        self.ring = ring
+        for source, _, session_ids in copied:
+            self._try_call(source, "drop", session_ids)
+        moved = sum(len(session_ids) for _, _, session_ids in copied)
+        self.migrated += moved
+        self.rebalances += 1
+        return moved
+
+    def _try_call(self, name: str, kind: str, *args) -> None:
+        """Best-effort request to a worker (stale copies it keeps are never routed to)."""
+        try:
+            self._workers[name].call(kind, *args)
+        except (WorkerError, concurrent.futures.TimeoutError):
+            pass
+
+    def add_worker(self) -> str:
+        """
+        Start a worker and move the sessions it now owns to it.
+
+        Returns:
+            str: The new worker's name
+        """
+        with self._changing:
+            name = next(self._names)
+            worker = _Worker(name, self._context, self.chatbot_factory, self.warm_up)
+            ring = self.ring.copy()
+            ring.add(name)
+            self._pause()
+            try:
+                self._workers[name] = worker
+                self._rebalance(ring)
+            except BaseException:
+                del self._workers[name]
+                worker.stop()
+                raise
+            finally:
+                self._resume()
+            return name
+
+    def remove_worker(self, name: str = None) -> str:
+        """
+        Move a worker's sessions to the remaining workers, then stop it.
+
+        Args:
+            name: The worker to remove (default: the newest)
+
+        Returns:
+            str: The removed worker's name
+        """
+        with self._changing:
+            if len(self._workers) <= 1:
+                raise ValueError("Cannot remove the last worker")
+            name = name or list(self._workers)[-1]
+            if name not in self._workers:
+                raise ValueError(f"Unknown worker: {name}. Available: {list(self._workers)}")
+            ring = self.ring.copy()
+            ring.remove(name)
+            self._pause()
+            try:
+                self._rebalance(ring)
+                worker = self._workers.pop(name)
+            finally:
+                self._resume()
+            worker.stop()
+            return name
+
+    def sessions(self) -> dict:
+        """Session ids held by each worker."""
+        return {name: worker.call("sessions") for name, worker in list(self._workers.items())}
+
+    def stats(self) -> dict:
+        """Workers (pid, requests routed, warm-up report), sessions migrated and rebalances."""
+        workers = {}
+        for name, w in list(self._workers.items()):
+            workers[name] = {"pid": w.process.pid, "requests": w.requests, "alive": w.process.is_alive()}
+            if w.warmup is not None:
+                workers[name]["warmup"] = w.warmup
+        return {
+            "workers": workers,
+            "in_flight": self._in_flight,
+            "migrated": self.migrated,
+            "rebalances": self.rebalances,
+        }
+
+    def close(self) -> None:
+        """Stop every worker."""
+        for worker in list(self._workers.values()):
+            worker.stop()
+        self._workers.clear()
+
+
+def fake_cluster(workers: int = None, **options) -> ClusterSupervisor:
+    """A cluster of fake-model chatbots (options as for fake_chatbot)."""
+    return ClusterSupervisor(workers, chatbot_factory=functools.partial(fake_chatbot, **options))
@@ -0,0 +1,370 @@
+"""
+DAG module for LangChain application.
+Declarative multi-step chains whose independent steps run concurrently.
+
+A chain is a list of named Steps. Each step declares its inputs (by
+default, its prompt's variables); an input is either a chain input or the
+output of another step. Steps start as soon as their inputs are ready, so
+researching several angles of a topic takes as long as the slowest angle,
+not their sum.
+
+    chain = DagChain([
+        Step("facts", "List 3 facts about {topic}."),
+        Step("history", "Summarize the history of {topic}."),
+        Step("outline", "Outline an article on {topic} from:\\n{facts}\\n{history}"),
+    ], llm)
+    chain.invoke({"topic": "solar power"})  # topic, facts, history, outline
+
+Streaming yields the chain inputs first, then each step's output as it
+finishes, as {name: output} deltas (like RunnablePassthrough.assign()).
+
+With a StepCache, each step's output is stored under a hash of the step's
+prompt template, the model's parameters and the step's resolved inputs.
+Re-running a chain after editing one prompt re-runs only that step and the
+steps downstream of it; everything else is served from the cache.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from langchain_core.load import dumpd
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import get_executor_for_config, patch_config
+from langchain_core.runnables.utils import AddableDict
+
+from src.singleflight import model_params
+from src.tokens import with_token_budget
+
+_MISS = object()
+
+
+class Step:
+    """
+    One named step of a DagChain.
+
+    Args:
+        name: The step's output key
+        prompt: Template string or ChatPromptTemplate, run as prompt | llm | StrOutputParser()
+        runnable: Instead of a prompt, any runnable taking a dict of the step's inputs
+        inputs: Names the step reads (default: the prompt's variables)
+        version: Bump to invalidate cached outputs; runnable steps are only
+            cached when they have a version
+    """
+
+    def __init__(self, name: str, prompt=None, runnable=None, inputs=None, version: str = None):
+        if (prompt is None) == (runnable is None):
+            raise ValueError(f"Step {name!r} needs exactly one of prompt or runnable")
+        if isinstance(prompt, str):
+            prompt = ChatPromptTemplate.from_template(prompt)
+        if inputs is None:
+            if prompt is None:
+                raise ValueError(f"Step {name!r} runs a runnable, so it must declare its inputs")
+            inputs = prompt.input_variables
+        self.name = name
+        self.prompt = prompt
+        self.runnable = runnable
+        self.inputs = list(inputs)
+        self.version = version
+
+    def build(self, llm) -> Runnable:
+        """The runnable that computes this step's output from its inputs."""
+        if self.runnable is not None:
+            return self.runnable
+        # Oversize prompts are rejected before any call is made
+        return self.prompt | with_token_budget(llm, on_overflow="reject") | StrOutputParser()
+
+    def fingerprint(self, llm) -> str:
+        """What, besides its inputs, determines this step's output; None if it cannot be cached."""
+        if self.runnable is not None:
+            return None if self.version is None else json.dumps([self.name, self.version])
+        template = json.dumps(dumpd(self.prompt), sort_keys=True, default=str)
+        return json.dumps([self.name, self.version, template, model_params(llm)])
+
+    def __repr__(self) -> str:
+        return f"Step({self.name!r}, inputs={self.inputs})"
+
+
+class StepCache:
+    """
+    Content-addressed store of step outputs, in memory and optionally on disk.
+
+    Args:
+        directory: Keep outputs as JSON files here, so they survive restarts (default: memory only)
+        max_entries: Outputs kept in memory (least recently used are evicted)
+    """
+
+    def __init__(self, directory: str = None, max_entries: int = 10_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(fingerprint: str, step_input: dict) -> str:
+        """The cache key of one step run: its fingerprint and resolved inputs."""
+        payload = json.dumps([fingerprint, step_input], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """The cached output for key, or the module's _MISS sentinel."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = _MISS
+        if self.directory:
+            try:
+                with open(self._path(key), encoding="utf-8") as f:
+                    value = json.load(f)["output"]
+            except (OSError, ValueError, KeyError):
+                pass
+        with self._lock:
+            if value is _MISS:
+                self.misses += 1
+                return _MISS
+            self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value, step: str = None) -> None:
+        """Store a step output (on disk too when it is JSON-serializable)."""
+        self._remember(key, value)
+        if not self.directory:
+            return
+        try:
+            payload = json.dumps({"step": step, "output": value})
+        except TypeError:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(temp, path)  # atomic, so a crash never leaves a half-written entry
+
+    def _remember(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget the in-memory entries (files on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit and miss counts and the in-memory entry count."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+def topological_order(steps) -> list:
+    """
+    Order steps so each comes after the steps it reads from.
+
+    Raises:
+        ValueError: On duplicate step names or a dependency cycle
+    """
+    names = [step.name for step in steps]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate step names: {duplicates}")
+
+    by_name = {step.name: step for step in steps}
+    remaining = {step.name: {i for i in step.inputs if i in by_name} for step in steps}
+    order = []
+    while remaining:
+        ready = [name for name in names if name in remaining and not remaining[name]]
+        if not ready:
+            raise ValueError(f"Steps form a cycle: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+            order.append(by_name[name])
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+class DagChain(Runnable):
+    """
+    A chain of named steps run in dependency order, independent steps concurrently.
+
+    Args:
+        steps: The Steps (any order; dependencies are resolved by name)
+        llm: The model that prompt steps call
+        max_concurrency: Most steps running at once (default: no limit beyond the
+            config's max_concurrency)
+        name: Run name shown in traces
+        cache: A StepCache; steps whose template, model and inputs are unchanged are not re-run
+    """
+
+    def __init__(self, steps, llm=None, max_concurrency: int = None, name: str = "DagChain",
+                 cache: StepCache = None):
+        self.steps = topological_order(steps)
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.runnables = {step.name: step.build(llm) for step in self.steps}
+        self.fingerprints = {step.name: step.fingerprint(llm) for step in self.steps} if cache else {}
+        step_names = set(self.runnables)
+        self.step_inputs = {step.name: step.inputs for step in self.steps}
+        self.dependencies = {step.name: {i for i in step.inputs if i in step_names} for step in self.steps}
+        self.input_keys = sorted({i for step in self.steps for i in step.inputs if i not in step_names})
+
+    def __repr__(self) -> str:
+        return f"DagChain({self.steps})"
+
+    # ---- scheduling ------------------------------------------------------
+
+    def _start(self, input) -> tuple:
+        """Validate the chain inputs; returns (values, pending dependencies per step)."""
+        if not isinstance(input, dict):
+            raise ValueError(f"{self.name} takes a dict with keys {self.input_keys}")
+        missing = [key for key in self.input_keys if key not in input]
+        if missing:
+            raise ValueError(f"Missing chain input(s): {missing}")
+        return dict(input), {name: set(deps) for name, deps in self.dependencies.items()}
+
+    @staticmethod
+    def _ready(pending: dict) -> list:
+        ready = [name for name, deps in pending.items() if not deps]
+        for name in ready:
+            del pending[name]
+        return ready
+
+    def _step_input(self, name: str, values: dict) -> dict:
+        return {key: values[key] for key in self.step_inputs[name]}
+
+    def _cached(self, name: str, step_input: dict):
+        """Return (cache key or None, cached output or _MISS) for a step about to run."""
+        fingerprint = self.fingerprints.get(name)
+        if fingerprint is None:
+            return None, _MISS
+        key = self.cache.key(fingerprint, step_input)
+        return key, self.cache.get(key)
+
+    def _finish(self, name: str, value, key, values: dict, pending: dict, store: bool) -> AddableDict:
+        """Record a finished step; returns its output delta."""
+        if key is not None and store:
+            self.cache.set(key, value, name)
+        values[name] = value
+        for deps in pending.values():
+            deps.discard(name)
+        return AddableDict({name: value})
+
+    def _step_config(self, name: str, run_manager, config):
+        return patch_config(config, callbacks=run_manager.get_child(f"step:{name}"), run_name=name)
+
+    def _config(self, config):
+        if self.max_concurrency and not (config or {}).get("max_concurrency"):
+            return patch_config(config, max_concurrency=self.max_concurrency)
+        return config
+
+    def _run(self, inputs, run_manager, config):
+        for input in inputs:
+            values, pending = self._start(input)
+            yield AddableDict(values)
+            running = {}
+            with get_executor_for_config(config) as executor:
+                try:
+                    while pending or running:
+                        for name in self._ready(pending):
+                            step_input = self._step_input(name, values)
+                            key, cached = self._cached(name, step_input)
+                            if cached is not _MISS:
+                                yield self._finish(name, cached, key, values, pending, store=False)
+                                continue
+                            future = executor.submit(self.runnables[name].invoke, step_input,
+                                                     self._step_config(name, run_manager, config))
+                            running[future] = (name, key)
+                        if not running:
+                            continue  # cache hits may have made more steps ready
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            name, key = running.pop(future)
+                            yield self._finish(name, future.result(), key, values, pending, store=True)
+                finally:
+                    for future in running:
+                        future.cancel()
+
+    async def _arun(self, inputs, run_manager, config):
+        limit = (config or {}).get("max_concurrency")
+        slots = asyncio.Semaphore(limit) if limit else None
+
+        async def run_step(name, step_input, step_config):
+            if slots is None:
+                return await self.runnables[name].ainvoke(step_input, step_config)
+            async with slots:
+                return await self.runnables[name].ainvoke(step_input, step_config)
+
+        async for input in inputs:
+            values, pending = self._start(input)
+            yield AddableDict(values)
+            running = {}
+            try:
+                while pending or running:
+                    for name in self._ready(pending):
+                        step_input = self._step_input(name, values)
+                        key, cached = self._cached(name, step_input)
+                        if cached is not _MISS:
+                            yield self._finish(name, cached, key, values, pending, store=False)
+                            continue
+                        step = run_step(name, step_input, self._step_config(name, run_manager, config))
+                        running[asyncio.ensure_future(step)] = (name, key)
+                    if not running:
+                        continue  # cache hits may have made more steps ready
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        name, key = running.pop(task)
+                        yield self._finish(name, task.result(), key, values, pending, store=True)
+            finally:
+                for task in running:
+                    task.cancel()
+
+    # ---- Runnable interface ----------------------------------------------
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self._transform_stream_with_config(iter([input]), self._run, self._config(config), **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async def inputs():
+            yield input
+
+        async for delta in self._atransform_stream_with_config(inputs(), self._arun, self._config(config),
+                                                               **kwargs):
+            yield delta
+
+    def invoke(self, input, config=None, **kwargs) -> dict:
+        result = AddableDict()
+        for delta in self.stream(input, config, **kwargs):
+            result.update(delta)
+        return result
+
+    async def ainvoke(self, input, config=None, **kwargs) -> dict:
+        result = AddableDict()
+        async for delta in self.astream(input, config, **kwargs):
+            result.update(delta)
+        return result
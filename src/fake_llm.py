@@ -0,0 +1,114 @@
+"""
+Fake LLM module for LangChain application.
+A deterministic chat model for tests, benchmarks and load tests.
+
+It needs no network or credentials, streams its reply word by word with
+configurable latency (sync and async), and reports usage metadata like
+a real Bedrock model.
+"""
+
+import asyncio
+import random
+import re
+import time
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Chat model that answers with a fixed reply (or echoes the prompt).
+
+    Latency is first_token_delay before the first token plus token_delay
+    per token, in both invoke and stream modes; a tail_rate fraction of
+    calls (at random) waits an extra tail_delay before the first token, to
+    simulate a slow backend. cpu_work burns that many loop iterations per
+    call to simulate Python-side (GIL-bound) work.
+    """
+
+    reply: str = "This is a fake response from the test model."
+    echo: bool = False
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+    tail_rate: float = 0.0
+    tail_delay: float = 0.0
+    cpu_work: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"reply": self.reply, "echo": self.echo}
+
+    def _reply_text(self, messages) -> str:
+        if self.echo and messages:
+            return f"Echo: {messages[-1].text}"
+        return self.reply
+
+    def _tokens(self, messages) -> list:
+        return _TOKEN.findall(self._reply_text(messages))
+
+    def _usage(self, messages, output_tokens: int) -> dict:
+        input_tokens = sum(len(m.text) for m in messages) // 4 + 1
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens
+        }
+
+    def _first_delay(self) -> float:
+        if self.tail_rate and random.random() < self.tail_rate:
+            return self.first_token_delay + self.tail_delay
+        return self.first_token_delay
+
+    def _burn_cpu(self) -> None:
+        total = 0
+        for i in range(self.cpu_work):
+            total += i * i
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        self._burn_cpu()
+        time.sleep(self._first_delay() + self.token_delay * len(tokens))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        self._burn_cpu()
+        await asyncio.sleep(self._first_delay() + self.token_delay * len(tokens))
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        tokens = self._tokens(messages)
+        self._burn_cpu()
+        time.sleep(self._first_delay())
+        for token in tokens:
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens))))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        tokens = self._tokens(messages)
+        self._burn_cpu()
+        await asyncio.sleep(self._first_delay())
+        for token in tokens:
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, len(tokens))))
@@ -0,0 +1,406 @@
+"""
+Hedging module for LangChain application.
+Hedged requests: cut tail latency by racing a duplicate call.
+
+If a call has not answered (invoke) or produced its first token (stream)
+within a percentile of recent latency, a second identical call is fired;
+whichever answers first is used and the other is cancelled. A budget caps
+hedges to a small fraction of traffic so a slow backend is not hit with
+double load. Serial chains such as build_research_chain benefit most,
+because each step's tail compounds into the chain's.
+
+Asyncio calls are cancelled outright. Sync calls run on helper threads;
+a losing invoke is abandoned (its result discarded) and a losing stream
+stops at its next chunk.
+"""
+
+import asyncio
+import collections
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from pydantic import Field
+
+from src.wrappers import DelegatingChatModel
+
+_END = object()
+
+
+class LatencyTracker:
+    """
+    A sliding window of recent latencies.
+
+    Args:
+        window: Number of recent samples kept
+        min_samples: Samples needed before percentile() answers
+        max_age: Seconds a sample counts for (None keeps the last `window` samples whatever their age)
+        clock: Time source (monotonic seconds)
+    """
+
+    def __init__(self, window: int = 500, min_samples: int = 20, max_age: float = None, clock=time.monotonic):
+        self.samples = collections.deque(maxlen=window)  # (recorded at, seconds)
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self.samples.append((self.clock(), seconds))
+
+    def percentile(self, p: float):
+        """The p-th percentile (0-100) of recent samples, or None while warming up."""
+        with self._lock:
+            if self.max_age is not None:
+                cutoff = self.clock() - self.max_age
+                while self.samples and self.samples[0][0] < cutoff:
+                    self.samples.popleft()
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(seconds for _, seconds in self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    Caps hedges to `ratio` of requests: each request earns `ratio` of a hedge,
+    up to `burst` saved hedges, and each hedge spends one.
+    """
+
+    def __init__(self, ratio: float = 0.05, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.credit = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self.credit = min(self.burst, self.credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.credit >= 1.0:
+                self.credit -= 1.0
+                return True
+            return False
+
+
+def _start(target, *args) -> None:
+    """
+    Run target(*args) on a daemon thread, in a copy of the caller's context.
+
+    The copy carries context variables (the scheduler's priority and tenant,
+    LangChain's run config) over to the attempt.
+    """
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(target, *args), daemon=True).start()
+
+
+def _spawn(fn) -> Future:
+    """Run fn() on a daemon thread; returns a Future for its result."""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    _start(run)
+    return future
+
+
+def _pump(fn, tag, out, stop):
+    """Feed fn()'s chunks into `out` as (tag, chunk, error) until done or stopped."""
+    error = None
+    try:
+        iterator = iter(fn())
+        try:
+            for chunk in iterator:
+                if stop.is_set():
+                    break
+                out.put((tag, chunk, None))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+    except Exception as e:
+        error = e
+    out.put((tag, _END, error))
+
+
+class Hedger:
+    """
+    Decides when to hedge and races the duplicate calls.
+
+    Args:
+        percentile: Hedge once a call is slower than this percentile of recent latency
+        budget_ratio: Largest fraction of requests that may be hedged
+        min_samples: Latency samples needed before hedging starts
+        window: Latency samples kept
+        min_delay: Never hedge sooner than this many seconds
+    """
+
+    def __init__(self, percentile: float = 95.0, budget_ratio: float = 0.05, min_samples: int = 20,
+                 window: int = 500, min_delay: float = 0.0):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = HedgeBudget(budget_ratio)
+        self.latency = LatencyTracker(window, min_samples)      # invoke: time to the full answer
+        self.first_token = LatencyTracker(window, min_samples)  # stream: time to the first chunk
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _begin(self, tracker: LatencyTracker):
+        """Count a request and return its hedge delay (None = do not hedge)."""
+        self._count("requests")
+        self.budget.earn()
+        delay = tracker.percentile(self.percentile)
+        return None if delay is None else max(self.min_delay, delay)
+
+    # ---- invoke ----------------------------------------------------------
+
+    def call(self, fn):
+        """
+        Run fn(), racing a duplicate if it is slower than the hedge delay.
+
+        Args:
+            fn: Zero-argument callable making one model call
+
+        Returns:
+            The first successful result (or the last error if both fail)
+        """
+        started = time.perf_counter()
+        delay = self._begin(self.latency)
+        if delay is None:
+            result = fn()
+            self.latency.record(time.perf_counter() - started)
+            return result
+
+        primary = _spawn(fn)
+        if not wait([primary], timeout=delay).done and self.budget.try_spend():
+            self._count("hedged")
+            backup = _spawn(fn)
+            winner = self._first_success([primary, backup])
+            if winner is backup:
+                self._count("hedge_wins")
+        else:
+            winner = primary
+        result = winner.result()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    @staticmethod
+    def _first_success(futures):
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    for loser in pending:
+                        loser.cancel()
+                    return future
+
+    async def acall(self, fn):
+        """Async version of call(); fn is a zero-argument coroutine function."""
+        started = time.perf_counter()
+        delay = self._begin(self.latency)
+        if delay is None:
+            result = await fn()
+            self.latency.record(time.perf_counter() - started)
+            return result
+
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.budget.try_spend():
+                self._count("hedged")
+                tasks.append(asyncio.ensure_future(fn()))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if t.exception() is None), None)
+                if winner is None and not pending:
+                    winner = done.pop()
+                if winner is not None:
+                    break
+            if len(tasks) == 2 and winner is tasks[1]:
+                self._count("hedge_wins")
+            result = winner.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    # ---- stream ----------------------------------------------------------
+
+    def stream(self, fn):
+        """
+        Stream fn()'s chunks, racing a duplicate stream if the first chunk is late.
+
+        Args:
+            fn: Zero-argument callable returning an iterator of chunks
+
+        Yields:
+            The chunks of whichever stream produced a chunk first
+        """
+        started = time.perf_counter()
+        delay = self._begin(self.first_token)
+        if delay is None:
+            first = True
+            for chunk in fn():
+                if first:
+                    self.first_token.record(time.perf_counter() - started)
+                    first = False
+                yield chunk
+            return
+
+        out = queue.Queue()
+        stops = {"primary": threading.Event()}
+        _start(_pump, fn, "primary", out, stops["primary"])
+        try:
+            item = out.get(timeout=delay)
+        except queue.Empty:
+            item = None
+            if self.budget.try_spend():
+                self._count("hedged")
+                stops["backup"] = threading.Event()
+                _start(_pump, fn, "backup", out, stops["backup"])
+
+        # The first stream to produce a chunk (or finish cleanly) wins
+        running = set(stops)
+        while True:
+            if item is None:
+                item = out.get()
+            tag, chunk, error = item
+            if error is None or len(running) == 1:
+                break
+            running.discard(tag)
+            item = None
+        winner = tag
+        for tag in stops:
+            if tag != winner:
+                stops[tag].set()
+        if winner == "backup":
+            self._count("hedge_wins")
+        self.first_token.record(time.perf_counter() - started)
+
+        try:
+            while chunk is not _END:
+                yield chunk
+                tag, chunk, error = out.get()
+                while tag != winner:
+                    tag, chunk, error = out.get()
+            if error is not None:
+                raise error
+        finally:
+            stops[winner].set()
+
+    async def astream(self, fn):
+        """Async version of stream(); fn is a zero-argument callable returning an async iterator."""
+        started = time.perf_counter()
+        delay = self._begin(self.first_token)
+        if delay is None:
+            first = True
+            async for chunk in fn():
+                if first:
+                    self.first_token.record(time.perf_counter() - started)
+                    first = False
+                yield chunk
+            return
+
+        streams = [fn().__aiter__()]
+        firsts = [asyncio.ensure_future(streams[0].__anext__())]
+        try:
+            done, _ = await asyncio.wait(firsts, timeout=delay)
+            if not done and self.budget.try_spend():
+                self._count("hedged")
+                streams.append(fn().__aiter__())
+                firsts.append(asyncio.ensure_future(streams[1].__anext__()))
+
+            # The first stream to produce a chunk (or finish cleanly) wins
+            pending = set(firsts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                ready = [t for t in done if not t.exception() or isinstance(t.exception(), StopAsyncIteration)]
+                if ready or not pending:
+                    winner = firsts.index(ready[0] if ready else done.pop())
+                    break
+        except BaseException:
+            for task in firsts:
+                task.cancel()
+            raise
+
+        for index, task in enumerate(firsts):
+            if index != winner:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await streams[index].aclose()
+        if winner == 1:
+            self._count("hedge_wins")
+        self.first_token.record(time.perf_counter() - started)
+
+        try:
+            yield firsts[winner].result()
+            async for chunk in streams[winner]:
+                yield chunk
+        except StopAsyncIteration:
+            return
+        finally:
+            await streams[winner].aclose()
+
+    def stats(self) -> dict:
+        """Hedge counts and the current hedge delays."""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "invoke_delay": self.latency.percentile(self.percentile),
+            "first_token_delay": self.first_token.percentile(self.percentile),
+        }
+
+
+class HedgedChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that hedges slow calls to `llm`.
+
+    Usage:
+        llm = HedgedChatModel(llm=get_llm())
+        chain = get_chain("research", llm)
+
+    Pass a configured Hedger to change the percentile or budget, e.g.
+    HedgedChatModel(llm=..., hedger=Hedger(percentile=90, budget_ratio=0.02)).
+    """
+
+    hedger: Hedger = Field(default_factory=Hedger)
+
+    def _call(self, messages, **kwargs):
+        return self.hedger.call(lambda: self._invoke_inner(messages, **kwargs))
+
+    async def _acall(self, messages, **kwargs):
+        return await self.hedger.acall(lambda: self._ainvoke_inner(messages, **kwargs))
+
+    def _call_stream(self, messages, **kwargs):
+        yield from self.hedger.stream(lambda: self._stream_inner(messages, **kwargs))
+
+    async def _acall_stream(self, messages, **kwargs):
+        async for chunk in self.hedger.astream(lambda: self._astream_inner(messages, **kwargs)):
+            yield chunk
+
+    def stats(self) -> dict:
+        """Hedging metrics, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "hedging": self.hedger.stats()}
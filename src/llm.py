@@ -0,0 +1,268 @@
+"""
+LLM module for LangChain application.
+Lazily creates and caches the Bedrock client and chat models.
+
+Nothing AWS-related (boto3, botocore, langchain_aws) is imported or
+resolved until the first call, so importing prompts and tools stays fast.
+
+One client is shared per region/profile by every chat model instance
+(and so by every chain). botocore clients are thread-safe, and the shared
+client's connection pool, timeouts, keep-alive and retry mode are set with
+configure_bedrock_client().
+
+Models from get_llm() are wrapped in the process-wide rate limiter
+(src/ratelimit.py), which owns throttling and retries; botocore's own
+retries are off by default so the two layers do not multiply.
+"""
+
+import os
+import threading
+
+
+# Choose a Foundation Model to use from AWS Bedrock
+DEFAULT_MODEL_ID = "us.amazon.nova-lite-v1:0"
+DEFAULT_REGION = "us-east-1"
+DEFAULT_MAX_TOKENS = 2000
+
+# Connection settings for the shared Bedrock clients
+CLIENT_DEFAULTS = {
+    "max_pool_connections": 50,   # botocore default is 10
+    "connect_timeout": 5,
+    "read_timeout": 120,
+    "tcp_keepalive": True,
+    "retry_mode": "standard",
+    "max_attempts": 0,            # botocore retries; the rate limiter retries instead
+    "endpoint_url": None,         # override to point at a local stub
+}
+_client_settings = dict(CLIENT_DEFAULTS)
+
+# Cached objects, keyed on their construction parameters
+_clients = {}
+_models = {}
+_override = None
+_lock = threading.Lock()
+
+
+def configure_bedrock_client(**settings) -> dict:
+    """
+    Update the connection settings used for new Bedrock clients.
+
+    Cached clients and models are dropped so the next call picks up the
+    new settings.
+
+    Args:
+        **settings: Any of the CLIENT_DEFAULTS keys
+
+    Returns:
+        dict: The settings now in effect
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    unknown = set(settings) - set(CLIENT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown client setting(s): {sorted(unknown)}. Available: {list(CLIENT_DEFAULTS)}")
+
+    with _lock:
+        _client_settings.update(settings)
+        _clients.clear()
+        _models.clear()
+        return dict(_client_settings)
+
+
+def _build_client(service_name: str, region_name: str, profile_name):
+    """Create a Bedrock client with the configured pool, timeouts and retries."""
+    import boto3
+    from botocore.config import Config
+
+    settings = _client_settings
+    config = Config(
+        max_pool_connections=settings["max_pool_connections"],
+        connect_timeout=settings["connect_timeout"],
+        read_timeout=settings["read_timeout"],
+        tcp_keepalive=settings["tcp_keepalive"],
+        retries={"mode": settings["retry_mode"], "max_attempts": settings["max_attempts"]}
+    )
+    # Sessions are not thread-safe, so each client gets its own (under _lock)
+    session = boto3.session.Session(profile_name=profile_name, region_name=region_name)
+    return session.client(
+        service_name=service_name,
+        region_name=region_name,
+        endpoint_url=settings["endpoint_url"],
+        config=config
+    )
+
+
+def get_bedrock_client(region_name: str = DEFAULT_REGION, profile_name: str = None,
+                       service_name: str = "bedrock-runtime"):
+    """
+    Get the shared Bedrock client for a region/profile, creating it on first use.
+
+    Args:
+        region_name: AWS region of the Bedrock endpoint
+        profile_name: AWS CLI profile (defaults to AWS_PROFILE, if set)
+        service_name: "bedrock-runtime" (inference) or "bedrock" (control plane)
+
+    Returns:
+        botocore client: The Bedrock client
+    """
+    # An empty AWS_PROFILE means "no profile", not a profile named ""
+    profile_name = profile_name or os.environ.get("AWS_PROFILE") or None
+    key = (service_name, region_name, profile_name)
+
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                if not os.environ.get("AWS_PROFILE"):
+                    os.environ.pop("AWS_PROFILE", None)
+                client = _build_client(service_name, region_name, profile_name)
+                _clients[key] = client
+    return client
+
+
+def shared_clients() -> list:
+    """The shared Bedrock clients created so far in this process."""
+    with _lock:
+        return list(_clients.values())
+
+
+def create_bedrock_llm(model_id: str = DEFAULT_MODEL_ID, temperature: float = 0.7,
+                       max_tokens: int = DEFAULT_MAX_TOKENS, region_name: str = DEFAULT_REGION):
+    """
+    Build a new Bedrock chat model on the shared clients.
+
+    Nova models are served through the Converse API. ChatBedrock delegates
+    those calls to a ChatBedrockConverse it rebuilds on every call (creating
+    a fresh control-plane client each time), so the Converse model is built
+    directly, once, on the shared runtime and control-plane clients.
+
+    Args:
+        model_id: Bedrock model identifier
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        region_name: AWS region of the Bedrock endpoint
+
+    Returns:
+        ChatBedrockConverse: The chat model
+    """
+    from langchain_aws import ChatBedrockConverse
+
+    return ChatBedrockConverse(
+        model=model_id,
+        client=get_bedrock_client(region_name),
+        bedrock_client=get_bedrock_client(region_name, service_name="bedrock"),
+        region_name=region_name,
+        max_tokens=max_tokens,
+        temperature=temperature
+    )
+
+
+def get_llm(model_id: str = DEFAULT_MODEL_ID, temperature: float = 0.7,
+            max_tokens: int = DEFAULT_MAX_TOKENS, region_name: str = DEFAULT_REGION):
+    """
+    Get a cached chat model, creating it on first use.
+
+    Bedrock models are wrapped in a RateLimitedChatModel sharing the
+    process-wide limiter. If a model was injected with set_llm(), it is
+    returned (unwrapped) for every call. With LLM_CASSETTE set, models
+    record to / replay from that cassette (src/cassette.py); in replay
+    mode no Bedrock client is created at all. With accounting enabled
+    (LLM_USAGE_FILE or configure_accounting()), every call is checked
+    against its session and tenant budgets and its usage recorded
+    (src/accounting.py). With breakers enabled (LLM_BREAKER or
+    configure_breaker()), calls to a failing model fail fast or go to the
+    fallback model (src/breaker.py). With the scheduler enabled
+    (LLM_SCHEDULER or configure_scheduler()), calls are admitted by
+    priority class and tenant share (src/scheduler.py).
+
+    Args:
+        model_id: Bedrock model identifier
+        temperature: Sampling temperature
+        max_tokens: Maximum tokens to generate
+        region_name: AWS region of the Bedrock endpoint
+
+    Returns:
+        The chat model
+    """
+    if _override is not None:
+        return _override
+
+    key = (model_id, temperature, max_tokens, region_name)
+    llm = _models.get(key)
+    if llm is None:
+        from src.accounting import AccountingChatModel, accounting_settings, get_ledger
+        from src.scheduler import ScheduledChatModel, get_scheduler
+
+        llm = _build_llm(model_id, temperature, max_tokens, region_name)
+        ledger = get_ledger()
+        if ledger is not None:
+            settings = accounting_settings()
+            downgrade_id = settings["downgrade_model"]
+            downgrade = None
+            if downgrade_id and downgrade_id != model_id:
+                downgrade = _build_llm(downgrade_id, temperature, min(max_tokens, settings["downgrade_max_tokens"]),
+                                       region_name)
+            llm = AccountingChatModel(llm=llm, ledger=ledger, model_id=model_id, downgrade=downgrade,
+                                      downgrade_id=downgrade_id if downgrade is not None else None)
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            llm = ScheduledChatModel(llm=llm, scheduler=scheduler)  # outermost: it reads the call's config
+        with _lock:
+            llm = _models.setdefault(key, llm)
+    return llm
+
+
+def _build_llm(model_id, temperature, max_tokens, region_name):
+    """A rate-limited Bedrock model (behind a circuit breaker when enabled), with LLM_CASSETTE when set."""
+    from src.breaker import AnswerCache, CircuitBreakerChatModel, breaker_settings, get_breaker
+    from src.cassette import CassetteChatModel, cassette_from_env
+    from src.ratelimit import RateLimitedChatModel, get_rate_limiter
+
+    llm = None
+    cassette = cassette_from_env()
+    if cassette is None or cassette["mode"] != "replay":
+        llm = create_bedrock_llm(model_id, temperature, max_tokens, region_name)
+        breaker = get_breaker(model_id)
+        if breaker is not None:
+            settings = breaker_settings()
+            fallback_id, fallback_region = settings["fallback_model"], settings["fallback_region"] or region_name
+            fallback = None
+            if fallback_id and (fallback_id, fallback_region) != (model_id, region_name):
+                fallback = create_bedrock_llm(fallback_id, temperature, max_tokens, fallback_region)
+            answers = AnswerCache(settings["cache_size"]) if settings["cache_size"] else None
+            llm = CircuitBreakerChatModel(llm=llm, breaker=breaker, fallback=fallback, answers=answers)
+        llm = RateLimitedChatModel(llm=llm, limiter=get_rate_limiter())
+    if cassette is not None:
+        llm = CassetteChatModel(llm=llm, scope=f"{model_id}|{temperature}|{max_tokens}", **cassette)
+    return llm
+
+
+def set_llm(llm) -> None:
+    """
+    Inject a model returned by every get_llm() call (e.g. a fake model in tests).
+
+    Args:
+        llm: The language model to use, or None to restore Bedrock models
+    """
+    global _override
+    _override = llm
+
+
+def reset_llm() -> None:
+    """Drop the injected model, cached clients and models, and client, rate limit, breaker and scheduler settings."""
+    from src.breaker import reset_breaker
+    from src.ratelimit import reset_rate_limit
+    from src.scheduler import reset_scheduler
+
+    global _override
+    reset_rate_limit()
+    reset_breaker()
+    reset_scheduler()
+    with _lock:
+        _override = None
+        _client_settings.clear()
+        _client_settings.update(CLIENT_DEFAULTS)
+        _models.clear()
+        _clients.clear()
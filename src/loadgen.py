@@ -0,0 +1,264 @@
+"""
+Load generator module for LangChain application.
+Replays multi-turn conversations across many concurrent chat sessions.
+
+Each session sends its turns one after another (optionally pausing to
+"think" between them) through a memory chatbot, while up to `concurrency`
+sessions run at once and new sessions arrive at `arrival_rate` per second
+(Poisson arrivals; all at once when no rate is given). Arrivals are open
+loop: a session arrives on schedule even when every slot is busy, and waits
+in a queue for one. The report gives the achieved arrival rate next to the
+requested one, and each session's queue wait. A sampler records process
+RSS and the session store's size over time.
+
+Conversations are synthetic (synthetic_conversations) or recorded
+(load_conversations: JSONL, one {"session_id", "turns": [...]} per line).
+Pair it with the fake model to measure the app itself:
+
+    chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+    report = asyncio.run(run_load(chatbot, synthetic_conversations(10_000)))
+    print(format_report(report))
+"""
+
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+WORDS = ("the model session memory latency token prompt history user reply chain summary "
+         "python bedrock request stream cache budget store answer question context").split()
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process, in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def synthetic_conversations(sessions: int, turns=(2, 8), words=(5, 30), seed: int = 0):
+    """
+    Generate random conversations.
+
+    Args:
+        sessions: Number of conversations
+        turns: (min, max) user turns per conversation
+        words: (min, max) words per user message
+        seed: Random seed, so runs are repeatable
+
+    Yields:
+        dict: {"session_id", "turns": [message, ...]}
+    """
+    rng = random.Random(seed)
+    for i in range(sessions):
+        yield {
+            "session_id": f"load-{i}",
+            "turns": [" ".join(rng.choices(WORDS, k=rng.randint(*words))) for _ in range(rng.randint(*turns))],
+        }
+
+
+def load_conversations(path: str):
+    """
+    Stream recorded conversations from a JSONL file.
+
+    Each line is {"session_id", "turns": [message, ...]}; lines without a
+    session_id are numbered.
+
+    Yields:
+        dict: {"session_id", "turns"}
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {"session_id": str(record.get("session_id", f"recorded-{line_number}")),
+                   "turns": list(record["turns"])}
+
+
+def store_size(store) -> dict:
+    """
+    What a session store holds.
+
+    A shared store (src/shm_store.py) reports its sessions and bytes used,
+    from its header; memory_store is walked for sessions, messages and
+    message characters.
+    """
+    if hasattr(store, "stats"):
+        stats = store.stats()
+        return {"sessions": stats["sessions"], "bytes": stats["used_bytes"]}
+    sessions = messages = characters = 0
+    for history in list(store.values()):
+        sessions += 1
+        for message in history.messages:
+            messages += 1
+            content = message.content
+            characters += len(content) if isinstance(content, str) else len(str(content))
+    return {"sessions": sessions, "messages": messages, "characters": characters}
+
+
+def _percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    if len(latencies) == 1:
+        return {"p50": latencies[0], "p95": latencies[0], "p99": latencies[0], "max": latencies[0]}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(latencies)}
+
+
+async def run_load(chatbot, conversations, concurrency: int = 100, arrival_rate: float = None,
+                   think_time: float = 0.0, store=None, sample_interval: float = 1.0, seed: int = 0) -> dict:
+    """
+    Replay conversations through a memory chatbot and measure it.
+
+    Args:
+        chatbot: A chatbot from build_memory_chatbot()
+        conversations: Iterable of {"session_id", "turns"} (see synthetic_conversations)
+        concurrency: Most sessions in progress at once
+        arrival_rate: New sessions per second (Poisson), arriving whether or not a slot
+            is free; None starts them as fast as slots free up
+        think_time: Mean pause between a session's turns, in seconds (exponential)
+        store: The session store to measure (default: the shared session store if one
+            is configured, else src.memory.memory_store)
+        sample_interval: Seconds between RSS / store-size samples
+        seed: Random seed for arrivals and think times
+
+    Returns:
+        dict: The report (see format_report)
+    """
+    if store is None:
+        from src.memory import get_session_store, memory_store
+        store = get_session_store()
+        if store is None:
+            store = memory_store
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    queue_waits = []
+    errors = {}
+    counts = {"sessions": 0, "active": 0}
+    timeline = []
+    rss_start = rss_bytes()
+    started = time.perf_counter()
+
+    def sample():
+        size = store_size(store)
+        timeline.append({"t": time.perf_counter() - started, "rss_bytes": rss_bytes(),
+                         "active_sessions": counts["active"], "turns": len(latencies), **size})
+        return size
+
+    async def sampler():
+        while True:
+            await asyncio.sleep(sample_interval)
+            sample()
+
+    async def session(conversation, arrived=None):
+        if arrived is not None:
+            await slots.acquire()
+            queue_waits.append(time.perf_counter() - arrived)
+        counts["active"] += 1
+        config = {"configurable": {"session_id": conversation["session_id"]}}
+        try:
+            for index, message in enumerate(conversation["turns"]):
+                if index and think_time:
+                    await asyncio.sleep(rng.expovariate(1 / think_time))
+                turn_started = time.perf_counter()
+                try:
+                    await chatbot.ainvoke({"input": message}, config=config)
+                except Exception as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    return
+                latencies.append(time.perf_counter() - turn_started)
+        finally:
+            counts["active"] -= 1
+            slots.release()
+
+    sample()
+    sampling = asyncio.ensure_future(sampler())
+    tasks = set()
+    next_arrival = started
+    last_arrival = None
+    try:
+        for conversation in conversations:
+            if arrival_rate:
+                # Sleep to the scheduled arrival time, so the rate does not
+                # drift with how long the loop itself takes
+                next_arrival += rng.expovariate(arrival_rate)
+                await asyncio.sleep(max(next_arrival - time.perf_counter(), 0))
+                last_arrival = time.perf_counter()
+                task = asyncio.ensure_future(session(conversation, arrived=last_arrival))
+            else:
+                await slots.acquire()
+                task = asyncio.ensure_future(session(conversation))
+            counts["sessions"] += 1
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        sampling.cancel()
+    duration = time.perf_counter() - started
+    arrival_span = (last_arrival - started) if last_arrival is not None else 0.0
+    store_end = sample()
+
+    rss_end = timeline[-1]["rss_bytes"]
+    sessions = counts["sessions"]
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_turns_per_s": len(latencies) / duration if duration else 0.0,
+        "latency_s": _percentiles(latencies),
+        "arrivals": {
+            "requested_rate": arrival_rate,
+            "achieved_rate": counts["sessions"] / arrival_span if arrival_span else None,
+            "queue_wait_s": _percentiles(queue_waits),
+        },
+        "rss_start_bytes": rss_start,
+        "rss_end_bytes": rss_end,
+        "rss_per_session_bytes": (rss_end - rss_start) / sessions if sessions else 0.0,
+        "store": store_end,
+        "timeline": timeline,
+        "settings": {"concurrency": concurrency, "arrival_rate": arrival_rate, "think_time": think_time},
+    }
+
+
+def format_report(report: dict) -> str:
+    """A short text summary of a run_load() report."""
+    latency = report["latency_s"]
+
+    def ms(value):
+        return "   n/a" if value is None else f"{value * 1000:6.1f}"
+
+    store = report["store"]
+    lines = [
+        f"Sessions {report['sessions']}, turns {report['turns']} in {report['duration_s']:.1f}s "
+        f"({report['throughput_turns_per_s']:.0f} turns/s)",
+        f"Turn latency ms: p50 {ms(latency['p50'])}  p95 {ms(latency['p95'])}  "
+        f"p99 {ms(latency['p99'])}  max {ms(latency['max'])}",
+    ]
+    arrivals = report["arrivals"]
+    if arrivals["requested_rate"]:
+        achieved = arrivals["achieved_rate"]
+        achieved_text = "n/a" if achieved is None else f"{achieved:.1f}"
+        wait = arrivals["queue_wait_s"]
+        lines.append(f"Arrivals/s: requested {arrivals['requested_rate']:.1f}, achieved {achieved_text}; "
+                     f"queue wait ms: p50 {ms(wait['p50'])}  p99 {ms(wait['p99'])}  max {ms(wait['max'])}")
+    lines.append(f"RSS {report['rss_start_bytes'] / 2**20:.1f} MB -> {report['rss_end_bytes'] / 2**20:.1f} MB "
+                 f"({report['rss_per_session_bytes'] / 1024:.1f} KB per session)")
+    if "bytes" in store:
+        lines.append(f"Session store (shared): {store['sessions']} sessions, {store['bytes'] / 2**20:.1f} MB used")
+    else:
+        lines.append(f"Session store: {store['sessions']} sessions, {store['messages']} messages, "
+                     f"{store['characters'] / 1e6:.1f} M characters")
+    if report["errors"]:
+        lines.append(f"Errors: {report['errors']}")
+    return "\n".join(lines)
@@ -1,16 +1,79 @@
 """
 Memory module for LangChain application.
 Handles conversation history and session management.
+
+Histories live in memory_store (this process only) unless a shared
+session store is configured with configure_session_store(path) or the
+LLM_SESSION_STORE environment variable; then every process on the host
+that opens the same file shares them (see src/shm_store.py).
 """
 
+import os
+import threading
+
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+from src.profiling import profile_runnable, profiled
+from src.retrieval import HistoryRetriever, forget_session
+from src.tokens import with_token_budget
+
 
 # Global memory store (in production, use a database)
 memory_store = {}
 
+# Guards session creation so concurrent first messages share one history
+_store_lock = threading.Lock()
+
+# Shared session store (src/shm_store.py), if configured
+_session_store = None
+_session_store_checked = False
+
+
+def configure_session_store(path: str, **options):
+    """
+    Keep session histories in a shared memory-mapped file instead of memory_store.
+
+    The store it replaces is not closed here, since histories already
+    handed out may still be using it; it closes once they are gone.
+
+    Args:
+        path: The store file, e.g. /dev/shm/sessions.db (shared by every process that opens it)
+        **options: capacity/size for a new file (see SharedSessionStore)
+
+    Returns:
+        SharedSessionStore: The store now in use
+    """
+    global _session_store, _session_store_checked
+    from src.shm_store import SharedSessionStore
+
+    store = SharedSessionStore(path, **options)
+    with _store_lock:
+        _session_store, _session_store_checked = store, True
+    return store
+
+
+def get_session_store():
+    """The shared session store in use, or None (opens LLM_SESSION_STORE on first use)."""
+    global _session_store, _session_store_checked
+    if not _session_store_checked:
+        with _store_lock:  # one thread opens the store; the others use it
+            if not _session_store_checked:
+                path = os.environ.get("LLM_SESSION_STORE")
+                if path:
+                    from src.shm_store import SharedSessionStore
+                    _session_store = SharedSessionStore(path)
+                _session_store_checked = True
+    return _session_store
+
+
+def reset_session_store() -> None:
+    """Go back to the in-process memory_store (the shared file is kept, and closed once unused)."""
+    global _session_store, _session_store_checked
+    with _store_lock:
+        _session_store, _session_store_checked = None, False
+
 
 def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
     """
@@ -20,11 +83,19 @@ def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
         session_id: Unique identifier for the conversation session
 
     Returns:
-        InMemoryChatMessageHistory: The chat history for this session
+        BaseChatMessageHistory: The chat history for this session
     """
-    if session_id not in memory_store:
-        memory_store[session_id] = InMemoryChatMessageHistory()
-    return memory_store[session_id]
+    store = get_session_store()
+    if store is not None:
+        return store.history(session_id)
+    history = memory_store.get(session_id)
+    if history is None:
+        with _store_lock:
+            history = memory_store.get(session_id)
+            if history is None:
+                history = InMemoryChatMessageHistory()
+                memory_store[session_id] = history
+    return history
 
 
 def clear_session(session_id: str) -> bool:
@@ -37,6 +108,10 @@ def clear_session(session_id: str) -> bool:
     Returns:
         bool: True if session was cleared, False if it didn't exist
     """
+    forget_session(session_id)
+    store = get_session_store()
+    if store is not None:
+        return store.clear(session_id)
     if session_id in memory_store:
         del memory_store[session_id]
         return True
@@ -50,15 +125,26 @@ def list_sessions() -> list:
     Returns:
         list: List of session IDs
     """
+    store = get_session_store()
+    if store is not None:
+        return store.sessions()
     return list(memory_store.keys())
 
 
-def build_memory_chatbot(llm):
+def build_memory_chatbot(llm, max_input_tokens: int = None, profile: bool = None, retrieval=None):
     """
     Build a chatbot that remembers conversations.
 
+    When the prompt outgrows the token budget, the oldest history is left
+    out of it (the stored history is kept). With retrieval, long sessions
+    send only the past turns relevant to the new message plus the latest
+    turns (see src/retrieval.py).
+
     Args:
         llm: The language model to use
+        max_input_tokens: Prompt token budget (default: the model's context window minus max_tokens)
+        profile: Profile every call (True), never (False) or when sampled (None; see src/profiling.py)
+        retrieval: A HistoryRetriever, or True for one with default settings (default: send the whole history)
 
     Returns:
         RunnableWithMessageHistory: A memory-enabled chatbot
@@ -70,8 +156,12 @@ def build_memory_chatbot(llm):
         ("human", "{input}")
     ])
 
-    # Create the base chain
-    chain = prompt | llm
+    # Create the base chain, trimming the prompt to the budget before each call
+    chain = prompt | with_token_budget(llm, max_input_tokens)
+    if retrieval:
+        if retrieval is True:
+            retrieval = HistoryRetriever()
+        chain = retrieval.as_runnable() | chain
 
     # Wrap with memory
     chatbot = RunnableWithMessageHistory(
@@ -81,10 +171,10 @@ def build_memory_chatbot(llm):
         history_messages_key="history"
     )
 
-    return chatbot
+    return profile_runnable(chatbot, "memory_chatbot", profile)
 
 
-def chat(chatbot, message: str, session_id: str = "default") -> str:
+def chat(chatbot, message: str, session_id: str = "default", profile: bool = None) -> str:
     """
     Send a message to the chatbot and get a response.
 
@@ -92,12 +182,14 @@ def chat(chatbot, message: str, session_id: str = "default") -> str:
         chatbot: The memory-enabled chatbot
         message: The user's message
         session_id: The session identifier
+        profile: Profile this call (True), never (False) or when sampled (None)
 
     Returns:
         str: The chatbot's response
     """
     config = {"configurable": {"session_id": session_id}}
-    response = chatbot.invoke({"input": message}, config=config)
+    with profiled("chat", profile):
+        response = chatbot.invoke({"input": message}, config=config)
 
     # Handle both string and AIMessage responses
     if hasattr(response, 'content'):
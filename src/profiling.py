@@ -0,0 +1,388 @@
+"""
+Profiling module for LangChain application.
+Opt-in cProfile and tracemalloc profiles of individual requests.
+
+With profiling enabled, 1 in every N requests (memory chat, chains, tool
+calls, summaries) runs under cProfile and tracemalloc. Each sampled request
+writes two files to the profile directory:
+
+    <seq>-<name>.prof   cProfile stats (load with pstats or snakeviz)
+    <seq>-<name>.txt    wall/CPU time, where the time went (network,
+                        waiting, pydantic, langchain, app, other python),
+                        top functions and top allocations
+
+and top_functions.txt is rewritten with the same breakdown aggregated over
+every sampled request so far.
+
+Enable it for the process with LLM_PROFILE=N (profile 1 in N requests;
+LLM_PROFILE_DIR sets the directory, default "profiles") or
+configure_profiling(), or for one call with profile=True, e.g.
+chat(chatbot, "hi", profile=True) or get_chain("research", llm, profile=True).
+When profiling is disabled, entry points pay one global lookup and chains
+are returned unwrapped.
+
+Notes: tracemalloc is process-wide, so one request is profiled at a time
+(a sampled request that overlaps another is counted as skipped). cProfile
+sees the calling thread only: time a chain spends in its worker threads
+shows up as waiting, and an async request profiled on a busy event loop
+also records the other coroutines that ran meanwhile.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+DEFAULT_DIRECTORY = "profiles"
+DEFAULT_TOP = 30
+REPORT_FILE = "top_functions.txt"
+
+# Where the time went: first match on "<filename>:<function>" wins
+CATEGORIES = [
+    ("network", ("socket", "ssl", "select", "selectors.py", "http/client.py", "urllib3", "botocore/httpsession")),
+    ("waiting", ("_thread.lock", "time.sleep", "threading.py", "concurrent/futures")),
+    ("pydantic", ("pydantic",)),
+    ("langchain", ("langchain",)),
+    ("app", (os.path.dirname(os.path.abspath(__file__)),)),
+]
+
+_SAFE_NAME = re.compile(r"[^\w.-]")
+_active = contextvars.ContextVar("profiling_active", default=False)
+_UNSET = object()
+_DISABLED = contextlib.nullcontext()
+
+
+def _category(filename: str, function: str) -> str:
+    where = f"{filename}:{function}"
+    for category, needles in CATEGORIES:
+        if any(needle in where for needle in needles):
+            return category
+    return "other python"
+
+
+def time_by_category(stats: pstats.Stats) -> dict:
+    """Own (not cumulative) seconds per category, largest first."""
+    totals = {}
+    for (filename, _, function), (_, _, own_time, _, _) in stats.stats.items():
+        category = _category(filename, function)
+        totals[category] = totals.get(category, 0.0) + own_time
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def _top_functions(stats: pstats.Stats, sort: str, top: int) -> str:
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(top)
+    return out.getvalue()
+
+
+def _breakdown(stats: pstats.Stats) -> str:
+    totals = time_by_category(stats)
+    overall = sum(totals.values()) or 1.0
+    return "\n".join(f"  {category:<14} {seconds:8.3f}s  {seconds / overall:6.1%}"
+                     for category, seconds in totals.items())
+
+
+class RequestProfiler:
+    """
+    Profiles 1 in every sample_rate requests and writes the results to a directory.
+
+    Args:
+        directory: Where profiles and the aggregated report are written (created if missing)
+        sample_rate: Profile every Nth request; 0 profiles only forced requests
+        top: Functions and allocations listed per report
+        frames: Traceback frames kept per allocation by tracemalloc
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, sample_rate: int = 1, top: int = DEFAULT_TOP,
+                 frames: int = 1):
+        if sample_rate < 0:
+            raise ValueError("sample_rate must be >= 0")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.top = top
+        self.frames = frames
+        self._lock = threading.Lock()  # one profiled request at a time
+        self._stats_lock = threading.Lock()
+        self._aggregate = None
+        self._by_name = {}
+        self.requests = 0
+        self.profiled = 0
+        self.skipped = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def profile(self, name: str, force: bool = False):
+        """
+        Profile the enclosed request if it is sampled (or forced).
+
+        Requests nested in a profiled one (a tool call inside a chat turn,
+        a chain step) are part of that profile, not counted separately.
+
+        Args:
+            name: Request name, used in the file names and the aggregate report
+            force: Profile this request whatever the sample rate
+        """
+        if _active.get():
+            yield
+            return
+        token = _active.set(True)
+        try:
+            if self._sampled(force):
+                try:
+                    with self._profiling(name):
+                        yield
+                finally:
+                    self._lock.release()
+            else:
+                yield
+        finally:
+            try:
+                _active.reset(token)
+            except ValueError:  # a stream closed from another context
+                _active.set(False)
+
+    def _sampled(self, force: bool) -> bool:
+        """Count a request; True (holding the profiling lock) if it is to be profiled."""
+        with self._stats_lock:
+            self.requests += 1
+            if not force and not (self.sample_rate and self.requests % self.sample_rate == 0):
+                return False
+            if not self._lock.acquire(blocking=False):
+                self.skipped += 1
+                return False
+            return True
+
+    @contextlib.contextmanager
+    def _profiling(self, name: str):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        profiler = cProfile.Profile()
+        error = None
+        wall, cpu = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            profiler.disable()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write(name, profiler, wall, cpu, peak, after.compare_to(before, "lineno"), error)
+
+    def _write(self, name, profiler, wall, cpu, peak, allocations, error) -> None:
+        with self._stats_lock:
+            self.profiled += 1
+            seq = self.profiled
+            count, total = self._by_name.get(name, (0, 0.0))
+            self._by_name[name] = (count + 1, total + wall)
+            if self._aggregate is None:
+                self._aggregate = pstats.Stats(profiler)
+            else:
+                self._aggregate.add(profiler)
+
+        base = os.path.join(self.directory, f"{seq:06d}-{_SAFE_NAME.sub('_', name)}")
+        profiler.dump_stats(base + ".prof")
+        stats = pstats.Stats(profiler)
+        status = "ok" if error is None else f"{type(error).__name__}: {error}"
+        lines = [
+            f"Request {name} ({status})",
+            f"Wall {wall * 1000:.1f} ms, CPU {cpu * 1000:.1f} ms, peak traced memory {peak / 1024:.1f} KB",
+            "",
+            "Time by category (own time):",
+            _breakdown(stats),
+            "",
+            "Top allocations (net, by line):",
+            *[f"  {stat}" for stat in allocations[:self.top]],
+            "",
+            _top_functions(stats, "cumulative", self.top),
+        ]
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        with open(os.path.join(self.directory, REPORT_FILE), "w", encoding="utf-8") as f:
+            f.write(self.report())
+
+    def report(self) -> str:
+        """The aggregated report over every profiled request so far."""
+        with self._stats_lock:
+            if self._aggregate is None:
+                return "No requests profiled yet.\n"
+            lines = [
+                f"{self.profiled} requests profiled of {self.requests} ({self.skipped} skipped while busy)",
+                "",
+                "Requests:",
+                *[f"  {name:<30} {count:5d}  mean {total / count * 1000:8.1f} ms"
+                  for name, (count, total) in sorted(self._by_name.items())],
+                "",
+                "Time by category (own time):",
+                _breakdown(self._aggregate),
+                "",
+                _top_functions(self._aggregate, "tottime", self.top),
+            ]
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        """Request counters."""
+        return {"requests": self.requests, "profiled": self.profiled, "skipped": self.skipped}
+
+
+_profiler = _UNSET
+_on_demand = None
+_config_lock = threading.Lock()
+
+
+def configure_profiling(directory: str = DEFAULT_DIRECTORY, sample_rate: int = 1, **options) -> RequestProfiler:
+    """
+    Enable profiling for the process.
+
+    Args:
+        directory: Where profiles are written
+        sample_rate: Profile every Nth request
+        **options: Other RequestProfiler options (top, frames)
+
+    Returns:
+        RequestProfiler: The process-wide profiler
+    """
+    global _profiler
+    _profiler = RequestProfiler(directory, sample_rate, **options)
+    return _profiler
+
+
+def get_profiler() -> Optional[RequestProfiler]:
+    """
+    The process-wide profiler, or None if profiling is disabled.
+
+    Read from LLM_PROFILE (sample 1 in N requests; unset or 0 disables) and
+    LLM_PROFILE_DIR on first use, unless configure_profiling() was called.
+    """
+    global _profiler
+    if _profiler is _UNSET:
+        with _config_lock:
+            if _profiler is _UNSET:
+                sample_rate = int(os.environ.get("LLM_PROFILE") or 0)
+                _profiler = (RequestProfiler(os.environ.get("LLM_PROFILE_DIR", DEFAULT_DIRECTORY), sample_rate)
+                             if sample_rate else None)
+    return _profiler
+
+
+def reset_profiling() -> None:
+    """Disable profiling (the environment is read again on next use)."""
+    global _profiler, _on_demand
+    _profiler = _UNSET
+    _on_demand = None
+
+
+def _forced_profiler() -> RequestProfiler:
+    """The process-wide profiler, or one that profiles only profile=True requests."""
+    global _on_demand
+    profiler = get_profiler()
+    if profiler is not None:
+        return profiler
+    with _config_lock:
+        if _on_demand is None:
+            _on_demand = RequestProfiler(os.environ.get("LLM_PROFILE_DIR", DEFAULT_DIRECTORY), sample_rate=0)
+        return _on_demand
+
+
+def profiled(name: str, profile: Optional[bool] = None):
+    """
+    Context manager that profiles one request when sampled.
+
+    Args:
+        name: Request name, e.g. "chat" or "tool.calculator"
+        profile: True to always profile this request, False to never,
+            None to follow the process-wide sample rate
+
+    Returns:
+        A context manager (a shared no-op one when profiling is off)
+    """
+    if profile:
+        return _forced_profiler().profile(name, force=True)
+    profiler = _profiler if _profiler is not _UNSET else get_profiler()
+    if profiler is None or profile is False:
+        return _DISABLED
+    return profiler.profile(name)
+
+
+class ProfiledRunnable(Runnable):
+    """
+    A runnable whose invoke/stream calls are profiled as requests.
+
+    Built by profile_runnable(); batches profile each input separately.
+    """
+
+    def __init__(self, bound: Runnable, name: str, profile: Optional[bool] = None):
+        self.bound = bound
+        self.name = name
+        self.profile = profile
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def get_input_schema(self, config: Optional[RunnableConfig] = None):
+        return self.bound.get_input_schema(config)
+
+    def get_output_schema(self, config: Optional[RunnableConfig] = None):
+        return self.bound.get_output_schema(config)
+
+    def __getattr__(self, name: str) -> Any:
+        # e.g. DagChain.steps or RunnableWithMessageHistory.get_session_history
+        if name == "bound":
+            raise AttributeError(name)
+        return getattr(self.bound, name)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with profiled(self.name, self.profile):
+            return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with profiled(self.name, self.profile):
+            return await self.bound.ainvoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator:
+        with profiled(self.name, self.profile):
+            yield from self.bound.stream(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator:
+        with profiled(self.name, self.profile):
+            async for chunk in self.bound.astream(input, config, **kwargs):
+                yield chunk
+
+
+def profile_runnable(runnable: Runnable, name: str, profile: Optional[bool] = None) -> Runnable:
+    """
+    Profile a runnable's requests when profiling is enabled.
+
+    Args:
+        runnable: The chain or chatbot
+        name: Request name for its profiles
+        profile: As for profiled(); True profiles every call
+
+    Returns:
+        Runnable: runnable itself when profiling is off (no overhead), else a ProfiledRunnable
+    """
+    if profile is False or not profile and get_profiler() is None:
+        return runnable
+    return ProfiledRunnable(runnable, name, profile)
@@ -0,0 +1,493 @@
+"""
+Rate limiting module for LangChain application.
+A process-wide limiter in front of the Bedrock chat models.
+
+Every model returned by get_llm() shares one RateLimiter, which combines:
+
+- token buckets on requests per minute and estimated tokens per minute
+  (input estimate + max_tokens is reserved up front, the unused part is
+  refunded from the response's usage metadata),
+- AIMD adaptive concurrency: the number of calls in flight grows by one
+  per window of successes and halves on a throttle (other failures
+  leave it unchanged),
+- jittered exponential backoff for throttled and transient failures.
+
+Retries happen here, in one place, instead of in every caller (and in
+botocore underneath), so a throttling storm is not amplified.
+"""
+
+import asyncio
+import collections
+import random
+import threading
+import time
+from typing import Any
+
+from src.tokens import get_estimator
+from src.wrappers import DelegatingChatModel
+
+# Error codes meaning "slow down": these shrink the concurrency window
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "Throttling", "RequestLimitExceeded"}
+# Error codes worth retrying after a backoff without shrinking the window
+TRANSIENT_CODES = {"ServiceUnavailableException", "InternalServerException", "ModelNotReadyException"}
+TRANSIENT_ERRORS = {"EndpointConnectionError", "ConnectTimeoutError", "ReadTimeoutError", "ConnectionClosedError"}
+# How a call ended, as reported to AdaptiveConcurrency.release()
+OUTCOMES = ("ok", "throttled", "error")
+
+RATE_LIMIT_DEFAULTS = {
+    "requests_per_minute": None,  # None = no request quota
+    "tokens_per_minute": None,    # None = no token quota
+    "initial_concurrency": 16,
+    "min_concurrency": 1,
+    "max_concurrency": 64,
+    "max_retries": 6,
+    "backoff_base": 0.25,         # seconds; doubles per attempt
+    "backoff_cap": 20.0,
+}
+
+
+def _error_code(error) -> str:
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code", "")
+    return ""
+
+
+def is_throttle(error) -> bool:
+    """Whether an exception from the model is a throttling response."""
+    return _error_code(error) in THROTTLE_CODES
+
+
+def is_transient(error) -> bool:
+    """Whether an exception from the model is worth retrying (throttles included)."""
+    if is_throttle(error) or _error_code(error) in TRANSIENT_CODES:
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+def outcome_of(error) -> str:
+    """The AdaptiveConcurrency outcome of a failed call: "throttled" or "error"."""
+    return "throttled" if is_throttle(error) else "error"
+
+
+def backoff_delay(attempt: int, base: float = 0.25, cap: float = 20.0, rng=random) -> float:
+    """
+    Full-jitter exponential backoff: a random delay in [0, min(cap, base * 2**attempt)].
+
+    Args:
+        attempt: Zero-based retry number
+        base: Delay ceiling for the first retry, in seconds
+        cap: Largest delay ceiling, in seconds
+        rng: Random source (seedable in tests)
+
+    Returns:
+        float: Seconds to wait
+    """
+    return rng.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled continuously at rate_per_minute.
+
+    reserve() always succeeds and returns how long the caller must wait;
+    the balance can go negative, so concurrent callers queue up behind
+    each other instead of racing.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.clock = clock
+        self.level = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take amount from the bucket; returns the seconds to wait before using it."""
+        with self._lock:
+            self._refill()
+            self.level -= amount
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float) -> None:
+        """Return unused tokens to the bucket."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    An AIMD concurrency limit shared by threads and asyncio tasks.
+
+    acquire() returns a ticket to pass back to release(). A throttle halves
+    the limit once per "epoch": calls that started before the last cut do
+    not cut it again, so one burst of 429s counts as one congestion signal.
+    """
+
+    def __init__(self, initial: int = 16, minimum: int = 1, maximum: int = 64, decrease: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.epoch = 0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    def _grant(self):
+        """Wake queued waiters while there is room (called with the lock held)."""
+        while self._waiters and self.in_flight < int(self.limit):
+            wake = self._waiters.popleft()
+            self.in_flight += 1
+            wake()
+
+    def acquire(self) -> int:
+        """Block until a slot is free; returns the ticket for release()."""
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return self.epoch
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+        return self.epoch
+
+    async def aacquire(self) -> int:
+        """Async version of acquire()."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return self.epoch
+            self._waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if wake in self._waiters:
+                    self._waiters.remove(wake)
+                    raise
+            self.release(self.epoch, "error")  # the slot was granted as we were cancelled
+            raise
+        return self.epoch
+
+    def release(self, ticket: int, outcome: str = "ok") -> None:
+        """
+        Free a slot; grow the limit on success, cut it on a throttle.
+
+        Args:
+            ticket: The ticket acquire() returned
+            outcome: "ok", "throttled", or "error" (any other failure, which leaves the limit as is)
+        """
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome '{outcome}'. Available: {list(OUTCOMES)}")
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == "throttled":
+                if ticket == self.epoch:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self.epoch += 1
+            elif outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._grant()
+
+
+class RateLimiter:
+    """
+    Admission control for model calls: quotas, adaptive concurrency and retries.
+
+    Args:
+        requests_per_minute: Request quota, or None for no limit
+        tokens_per_minute: Token quota (input + max output), or None for no limit
+        initial_concurrency: Starting number of calls allowed in flight
+        min_concurrency: Floor for the adaptive limit
+        max_concurrency: Ceiling for the adaptive limit
+        max_retries: Retries for throttled or transient failures
+        backoff_base: First retry's backoff ceiling, in seconds
+        backoff_cap: Largest backoff ceiling, in seconds
+        rng: Random source for jitter
+    """
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 initial_concurrency: int = 16, min_concurrency: int = 1, max_concurrency: int = 64,
+                 max_retries: int = 6, backoff_base: float = 0.25, backoff_cap: float = 20.0, rng=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    # ---- quotas ----------------------------------------------------------
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and `tokens` tokens from the buckets; returns the wait."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def refund(self, tokens: int) -> None:
+        """Give back reserved tokens that the call did not use."""
+        if self.tokens is not None and tokens > 0:
+            self.tokens.refund(tokens)
+
+    def _backoff(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, self.rng)
+
+    def _on_error(self, error, attempt: int, tokens: int) -> bool:
+        """Record a failed attempt; returns whether to retry it."""
+        self.refund(tokens)
+        if is_throttle(error):
+            self._count("throttled")
+        if is_transient(error) and attempt < self.max_retries:
+            self._count("retries")
+            return True
+        self._count("failed")
+        return False
+
+    # ---- calls -----------------------------------------------------------
+
+    def call(self, fn, tokens: int = 0):
+        """
+        Run fn() under the limiter, retrying throttled and transient failures.
+
+        Args:
+            fn: Zero-argument callable making one model call
+            tokens: Estimated tokens the call may consume
+
+        Returns:
+            fn()'s return value
+
+        Raises:
+            The last error, once it is not retryable or retries are exhausted
+        """
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._reserve(tokens))
+            ticket = self.concurrency.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                self.concurrency.release(ticket, outcome_of(e))
+                if not self._on_error(e, attempt, tokens):
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            self.concurrency.release(ticket)
+            self._count("succeeded")
+            return result
+
+    async def acall(self, fn, tokens: int = 0):
+        """Async version of call(); fn is a zero-argument coroutine function."""
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._reserve(tokens))
+            ticket = await self.concurrency.aacquire()
+            try:
+                result = await fn()
+            except Exception as e:
+                self.concurrency.release(ticket, outcome_of(e))
+                if not self._on_error(e, attempt, tokens):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self.concurrency.release(ticket)
+            self._count("succeeded")
+            return result
+
+    def stream(self, fn, tokens: int = 0):
+        """
+        Stream fn()'s chunks under the limiter, holding a slot for the whole stream.
+
+        Failures are retried only before the first chunk has been yielded.
+        """
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self._reserve(tokens))
+            ticket = self.concurrency.acquire()
+            started = False
+            try:
+                for chunk in fn():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.concurrency.release(ticket, outcome_of(e))
+                if started or not self._on_error(e, attempt, tokens):
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                self.concurrency.release(ticket, "error")
+                raise
+            self.concurrency.release(ticket)
+            self._count("succeeded")
+            return
+
+    async def astream(self, fn, tokens: int = 0):
+        """Async version of stream(); fn is a zero-argument callable returning an async iterator."""
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self._reserve(tokens))
+            ticket = await self.concurrency.aacquire()
+            started = False
+            try:
+                async for chunk in fn():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self.concurrency.release(ticket, outcome_of(e))
+                if started or not self._on_error(e, attempt, tokens):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                self.concurrency.release(ticket, "error")
+                raise
+            self.concurrency.release(ticket)
+            self._count("succeeded")
+            return
+
+    def stats(self) -> dict:
+        """Call outcomes and the current concurrency limit."""
+        return {
+            "calls": self.calls,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+_limiter = None
+_settings = dict(RATE_LIMIT_DEFAULTS)
+_lock = threading.Lock()
+
+
+def configure_rate_limit(**settings) -> dict:
+    """
+    Update the process-wide limiter's settings (quotas, concurrency bounds, retries).
+
+    The shared limiter is rebuilt on its next use. Models already created
+    keep the limiter they were built with, so call this before get_llm().
+
+    Args:
+        **settings: Any of the RATE_LIMIT_DEFAULTS keys
+
+    Returns:
+        dict: The settings now in effect
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    global _limiter
+    unknown = set(settings) - set(RATE_LIMIT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown rate limit setting(s): {sorted(unknown)}. Available: {list(RATE_LIMIT_DEFAULTS)}")
+    with _lock:
+        _settings.update(settings)
+        _limiter = None
+        return dict(_settings)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide limiter, creating it on first use."""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = RateLimiter(**_settings)
+        return _limiter
+
+
+def reset_rate_limit() -> None:
+    """Restore the default settings and drop the shared limiter."""
+    global _limiter
+    with _lock:
+        _settings.clear()
+        _settings.update(RATE_LIMIT_DEFAULTS)
+        _limiter = None
+
+
+def _max_tokens(llm) -> int:
+    bound = getattr(llm, "bound", llm)  # see through bind_tools()
+    return getattr(bound, "max_tokens", None) or 0
+
+
+class RateLimitedChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that sends every call through a RateLimiter.
+
+    Each call reserves its estimated input tokens plus the model's
+    max_tokens; whatever the response's usage metadata shows was not used
+    is refunded, and the reported input tokens calibrate the estimator.
+    """
+
+    limiter: Any
+
+    def _estimate(self, messages):
+        """Return (estimated prompt tokens, tokens to reserve)."""
+        prompt = get_estimator(self.llm).count_messages(messages)
+        return prompt, prompt + _max_tokens(self.llm)
+
+    def _refund(self, estimate, message) -> None:
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            prompt, reserved = estimate
+            self.limiter.refund(reserved - usage.get("total_tokens", reserved))
+            get_estimator(self.llm).observe(prompt, usage.get("input_tokens", 0))
+
+    def _call(self, messages, **kwargs):
+        estimate = self._estimate(messages)
+        message = self.limiter.call(lambda: self._invoke_inner(messages, **kwargs), estimate[1])
+        self._refund(estimate, message)
+        return message
+
+    async def _acall(self, messages, **kwargs):
+        estimate = self._estimate(messages)
+        message = await self.limiter.acall(lambda: self._ainvoke_inner(messages, **kwargs), estimate[1])
+        self._refund(estimate, message)
+        return message
+
+    def _call_stream(self, messages, **kwargs):
+        estimate = self._estimate(messages)
+        for chunk in self.limiter.stream(lambda: self._stream_inner(messages, **kwargs), estimate[1]):
+            self._refund(estimate, chunk)
+            yield chunk
+
+    async def _acall_stream(self, messages, **kwargs):
+        estimate = self._estimate(messages)
+        async for chunk in self.limiter.astream(lambda: self._astream_inner(messages, **kwargs), estimate[1]):
+            self._refund(estimate, chunk)
+            yield chunk
+
+    def stats(self) -> dict:
+        """Limiter metrics, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "ratelimit": self.limiter.stats()}
@@ -0,0 +1,257 @@
+"""
+Retrieval module for LangChain application.
+Sends only the relevant past turns of a long chat, instead of the whole transcript.
+
+In a long session most of the history is unrelated to the current
+question, yet every turn pays for all of it. A HistoryRetriever keeps an
+inverted index of each session's turns (a turn is a user message and
+the replies that follow it) and builds the prompt history from:
+
+- the top_k past turns that best match the new message under BM25, in
+  their original order, then
+- the last recent_turns turns, verbatim.
+
+The index is updated incrementally: each turn's terms are added once,
+when the turn first appears in the history, so an update costs O(new
+turn) and a lookup only touches the postings of the message's terms.
+Each session's index has its own lock, so turns of different sessions
+never wait for each other. At most max_sessions indexes are kept (least
+recently used are evicted), and clear_session (src/memory.py) drops the
+session's index from every retriever.
+
+    chatbot = build_memory_chatbot(llm, retrieval=HistoryRetriever(top_k=4, recent_turns=2))
+"""
+
+import collections
+import heapq
+import math
+import re
+import threading
+import weakref
+from collections import Counter
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+DEFAULT_TOP_K = 4
+DEFAULT_RECENT_TURNS = 2
+DEFAULT_MAX_SESSIONS = 10_000
+K1 = 1.2
+B = 0.75
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does did for from had has have he her his how i if in is it its me my "
+    "no not of on or our she so that the their them then there they this to was we were what when where "
+    "which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list:
+    """Lowercase word terms of text, without stopwords."""
+    return [term for term in _WORD.findall(text.lower()) if term not in STOPWORDS]
+
+
+def _text(message) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+class TurnIndex:
+    """
+    An incremental BM25 index over one session's turns.
+
+    Turns are numbered in order; starts[i] is the position of turn i's
+    first message in the history.
+    """
+
+    def __init__(self):
+        self.postings = {}  # term -> {turn: term frequency}
+        self.lengths = []  # terms per turn
+        self.starts = []
+        self.indexed = 0  # history messages seen so far
+        self.first = None  # text of the first message, to notice a cleared session
+        self._total = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def _add_terms(self, turn: int, terms) -> None:
+        for term, count in Counter(terms).items():
+            postings = self.postings.setdefault(term, {})
+            postings[turn] = postings.get(turn, 0) + count
+        self.lengths[turn] += len(terms)
+        self._total += len(terms)
+
+    def update(self, messages) -> None:
+        """Index the messages added since the last update."""
+        for position in range(self.indexed, len(messages)):
+            message = messages[position]
+            if position == 0:
+                self.first = _text(message)
+            if isinstance(message, HumanMessage) or not self.lengths:
+                self.starts.append(position)
+                self.lengths.append(0)
+            self._add_terms(len(self.lengths) - 1, tokenize(_text(message)))
+        self.indexed = len(messages)
+
+    def search(self, query: str, top_k: int, before: int = None) -> list:
+        """
+        Best-matching turns for query by BM25.
+
+        Args:
+            query: The text to match
+            top_k: Turns to return
+            before: Only consider turns numbered below this (default: all)
+
+        Returns:
+            list: Turn numbers, best first (turns sharing no term with the query are left out)
+        """
+        count = len(self.lengths) if before is None else before
+        if count <= 0 or top_k <= 0:
+            return []
+        average = self._total / len(self.lengths) or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self.lengths) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for turn, frequency in postings.items():
+                if turn < count:
+                    norm = K1 * (1 - B + B * self.lengths[turn] / average)
+                    scores[turn] = scores.get(turn, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return heapq.nlargest(top_k, scores, key=scores.get)
+
+
+# Every HistoryRetriever, so clear_session can drop a session's indexes
+_retrievers = weakref.WeakSet()
+
+
+def forget_session(session_id: str) -> None:
+    """Drop a session's index from every HistoryRetriever (called by clear_session)."""
+    for retriever in list(_retrievers):
+        retriever.forget(session_id)
+
+
+class _SessionIndex:
+    """A session's TurnIndex and the lock its concurrent turns share."""
+
+    __slots__ = ("lock", "index")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = TurnIndex()
+
+
+class HistoryRetriever:
+    """
+    Picks the prompt history for a turn: relevant past turns plus the latest ones.
+
+    Args:
+        top_k: Past turns to retrieve by relevance
+        recent_turns: Latest turns always sent verbatim
+        min_turns: Sessions with at most this many turns are sent whole
+        max_sessions: Session indexes kept (least recently used are evicted and
+            rebuilt from the history if the session comes back)
+    """
+
+    def __init__(self, top_k: int = DEFAULT_TOP_K, recent_turns: int = DEFAULT_RECENT_TURNS, min_turns: int = None,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.top_k = top_k
+        self.recent_turns = recent_turns
+        self.min_turns = top_k + recent_turns if min_turns is None else min_turns
+        self.max_sessions = max_sessions
+        self._indexes = collections.OrderedDict()
+        # Guards _indexes and the counters; each session's index has its own lock
+        self._lock = threading.Lock()
+        self.retrievals = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        _retrievers.add(self)
+
+    def _session(self, session_id: str) -> _SessionIndex:
+        with self._lock:
+            session = self._indexes.get(session_id)
+            if session is None:
+                session = self._indexes[session_id] = _SessionIndex()
+                while len(self._indexes) > self.max_sessions:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(session_id)
+            return session
+
+    @staticmethod
+    def _index_for(session: _SessionIndex, messages) -> TurnIndex:
+        # Called with the session's lock held
+        index = session.index
+        if len(messages) < index.indexed or (
+                messages and index.first is not None and _text(messages[0]) != index.first):
+            index = session.index = TurnIndex()  # cleared session
+        index.update(messages)
+        return index
+
+    def index_for(self, session_id: str, messages) -> TurnIndex:
+        """The session's index, brought up to date with messages."""
+        session = self._session(session_id)
+        with session.lock:
+            return self._index_for(session, messages)
+
+    def select(self, session_id: str, messages, query: str) -> list:
+        """
+        The history to send with query.
+
+        Args:
+            session_id: The session (one index per session)
+            messages: The session's full stored history
+            query: The new user message
+
+        Returns:
+            list: Retrieved turns' messages followed by the recent turns', in conversation order
+        """
+        messages = list(messages)
+        session = self._session(session_id)
+        # Concurrent turns of a session share its index, so it is searched under the lock too
+        with session.lock:
+            index = self._index_for(session, messages)
+            turns = len(index)
+            if turns <= self.min_turns:
+                selected = messages
+            else:
+                recent = turns - self.recent_turns
+                retrieved = sorted(index.search(query, self.top_k, before=recent))
+                selected = []
+                for turn in retrieved + list(range(recent, turns)):
+                    end = index.starts[turn + 1] if turn + 1 < turns else len(messages)
+                    selected.extend(messages[index.starts[turn]:end])
+        with self._lock:
+            self.retrievals += 1
+            self.messages_in += len(messages)
+            self.messages_out += len(selected)
+        return selected
+
+    def forget(self, session_id: str) -> None:
+        """Drop a session's index."""
+        with self._lock:
+            self._indexes.pop(session_id, None)
+
+    def stats(self) -> dict:
+        """Sessions indexed and the share of history messages sent."""
+        with self._lock:
+            return {
+                "sessions": len(self._indexes),
+                "retrievals": self.retrievals,
+                "messages_in": self.messages_in,
+                "messages_out": self.messages_out,
+            }
+
+    def as_runnable(self, history_key: str = "history", input_key: str = "input"):
+        """A runnable that replaces inputs[history_key] with the selected history (session from config)."""
+        def pick(inputs: dict, config) -> dict:
+            session_id = str(config.get("configurable", {}).get("session_id", "default"))
+            history = self.select(session_id, inputs.get(history_key, []), str(inputs[input_key]))
+            return {**inputs, history_key: history}
+
+        return RunnableLambda(pick, name="HistoryRetriever")
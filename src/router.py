@@ -0,0 +1,292 @@
+"""
+Router module for LangChain application.
+Chooses a model and max-token budget per request.
+
+A brief summary or a word-count question does not need the same model
+and 2000-token budget as a detailed research outline. The router picks,
+per call:
+
+- the cheapest model listed for the request's mode that can take the
+  input length and is meeting the mode's latency target (p95 over the
+  last few minutes, so a model that had a slow spell is tried again),
+- a max_tokens budget for the mode, scaled to the input for summaries.
+
+Every decision is logged (logger "src.router") and its cost is compared
+with the default model, so savings can be measured from stats().
+"""
+
+import logging
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.hedging import LatencyTracker
+from src.llm import DEFAULT_MAX_TOKENS, DEFAULT_MODEL_ID, get_llm
+from src.tokens import count_message_tokens
+from src.wrappers import ainvoke_model, astream_model, invoke_model, stream_model
+
+logger = logging.getLogger(__name__)
+
+NOVA_MICRO = "us.amazon.nova-micro-v1:0"
+NOVA_LITE = "us.amazon.nova-lite-v1:0"
+NOVA_PRO = "us.amazon.nova-pro-v1:0"
+
+# On-demand prices in USD per 1,000 tokens: (input, output)
+MODEL_PRICES = {
+    NOVA_MICRO: (0.000035, 0.00014),
+    NOVA_LITE: (0.00006, 0.00024),
+    NOVA_PRO: (0.0008, 0.0032),
+}
+
+# Largest input (estimated tokens) the router sends to each model
+MODEL_INPUT_LIMITS = {
+    NOVA_MICRO: 8_000,
+    NOVA_LITE: 200_000,
+    NOVA_PRO: 200_000,
+}
+
+# Per-mode policy: candidate models (cheapest first), output budget and latency target.
+# With output_ratio set, max_tokens is input_tokens * output_ratio, clamped to [min_tokens, max_tokens].
+ROUTES = {
+    "chatbot": {"models": [NOVA_MICRO, NOVA_LITE], "max_tokens": 512, "latency_slo": 3.0},
+    "tools": {"models": [NOVA_MICRO, NOVA_LITE], "max_tokens": 256, "latency_slo": 3.0},
+    "summarize_brief": {"models": [NOVA_MICRO, NOVA_LITE], "max_tokens": 300, "min_tokens": 64,
+                        "output_ratio": 0.25, "latency_slo": 5.0},
+    "summarize_detailed": {"models": [NOVA_LITE, NOVA_PRO], "max_tokens": 1500, "min_tokens": 256,
+                           "output_ratio": 0.5, "latency_slo": 15.0},
+    "assistant": {"models": [NOVA_LITE, NOVA_PRO], "max_tokens": 1000, "latency_slo": 10.0},
+    "research": {"models": [NOVA_LITE, NOVA_PRO], "max_tokens": DEFAULT_MAX_TOKENS, "latency_slo": 20.0},
+}
+
+
+# Seconds a latency sample counts for. A model over its latency target gets no
+# traffic, so it only comes back once its slow samples have expired.
+DEFAULT_LATENCY_MAX_AGE = 300.0
+
+
+# Chain type (src/chains.py) -> the route its steps use; other chain types use "research"
+CHAIN_ROUTES = {"simple": "assistant"}
+
+
+def chain_route(chain_type: str) -> str:
+    """The route a get_chain chain type's model calls go through."""
+    return CHAIN_ROUTES.get(chain_type, "research")
+
+
+def _bedrock_model(model_id: str, max_tokens: int):
+    return get_llm(model_id=model_id, max_tokens=max_tokens)
+
+
+class ModelRouter:
+    """
+    Picks a model and max_tokens per request and tracks latency and cost per model.
+
+    Args:
+        routes: Per-mode policy (see ROUTES); unknown modes use the default model
+        get_model: Factory (model_id, max_tokens) -> chat model; defaults to get_llm()
+        prices: USD per 1,000 tokens per model, (input, output)
+        input_limits: Largest estimated input each model is given
+        default_model: The model every request used before routing (the cost baseline)
+        default_max_tokens: Budget for modes without a route
+        percentile: Latency percentile compared with a route's latency_slo
+        min_samples: Calls needed before a model's latency is trusted
+        latency_max_age: Seconds a latency sample counts for; a model taken out of
+            rotation for being slow is tried again once its samples expire
+        clock: Time source for latency samples (monotonic seconds)
+    """
+
+    def __init__(self, routes: dict = None, get_model=None, prices: dict = None, input_limits: dict = None,
+                 default_model: str = DEFAULT_MODEL_ID, default_max_tokens: int = DEFAULT_MAX_TOKENS,
+                 percentile: float = 95.0, min_samples: int = 10, latency_max_age: float = DEFAULT_LATENCY_MAX_AGE,
+                 clock=time.monotonic):
+        self.routes = routes if routes is not None else ROUTES
+        self.get_model = get_model or _bedrock_model
+        self.prices = prices if prices is not None else MODEL_PRICES
+        self.input_limits = input_limits if input_limits is not None else MODEL_INPUT_LIMITS
+        self.default_model = default_model
+        self.default_max_tokens = default_max_tokens
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latency_max_age = latency_max_age
+        self.clock = clock
+
+        self._latency = {}
+        self._lock = threading.Lock()
+        self.decisions = {}  # (mode, model_id) -> count
+        self.cost = 0.0
+        self.baseline_cost = 0.0
+
+    def _tracker(self, model_id: str) -> LatencyTracker:
+        with self._lock:
+            tracker = self._latency.get(model_id)
+            if tracker is None:
+                tracker = LatencyTracker(min_samples=self.min_samples, max_age=self.latency_max_age, clock=self.clock)
+                self._latency[model_id] = tracker
+            return tracker
+
+    def latency(self, model_id: str):
+        """Rolling latency percentile for a model, or None until enough calls were seen."""
+        return self._tracker(model_id).percentile(self.percentile)
+
+    def choose(self, mode: str, input_tokens: int) -> dict:
+        """
+        Pick the model and budget for one request.
+
+        Args:
+            mode: Workload name, e.g. "chatbot" or "summarize_brief"
+            input_tokens: Estimated prompt size
+
+        Returns:
+            dict: mode, model_id, max_tokens, input_tokens and reason
+        """
+        route = self.routes.get(mode)
+        if route is None:
+            return self._decide(mode, self.default_model, self.default_max_tokens, input_tokens, "no route")
+
+        models = route["models"]
+        fits = [m for m in models if input_tokens <= self.input_limits.get(m, float("inf"))] or models[-1:]
+        reason = "cheapest" if fits[0] == models[0] else "input length"
+
+        slo = route.get("latency_slo")
+        latencies = {m: self.latency(m) for m in fits}
+        within = [m for m in fits if slo is None or latencies[m] is None or latencies[m] <= slo]
+        if within:
+            model_id = within[0]
+        else:
+            model_id = min(fits, key=lambda m: latencies[m])
+        if model_id != fits[0]:
+            reason = "latency"
+
+        max_tokens = route["max_tokens"]
+        if route.get("output_ratio"):
+            scaled = int(input_tokens * route["output_ratio"])
+            max_tokens = max(route.get("min_tokens", 1), min(max_tokens, scaled))
+        return self._decide(mode, model_id, max_tokens, input_tokens, reason)
+
+    def _decide(self, mode, model_id, max_tokens, input_tokens, reason) -> dict:
+        decision = {"mode": mode, "model_id": model_id, "max_tokens": max_tokens,
+                    "input_tokens": input_tokens, "reason": reason}
+        with self._lock:
+            self.decisions[(mode, model_id)] = self.decisions.get((mode, model_id), 0) + 1
+        logger.info("route mode=%s model=%s max_tokens=%d input_tokens=%d reason=%s",
+                    mode, model_id, max_tokens, input_tokens, reason)
+        return decision
+
+    def _price(self, model_id: str, usage: dict) -> float:
+        input_price, output_price = self.prices.get(model_id, (0.0, 0.0))
+        return (usage.get("input_tokens", 0) * input_price + usage.get("output_tokens", 0) * output_price) / 1000
+
+    def record(self, decision: dict, seconds: float, usage: dict = None) -> None:
+        """Record a finished call's latency and, from its usage metadata, its cost."""
+        self._tracker(decision["model_id"]).record(seconds)
+        if not usage:
+            return
+        cost = self._price(decision["model_id"], usage)
+        baseline = self._price(self.default_model, usage)
+        with self._lock:
+            self.cost += cost
+            self.baseline_cost += baseline
+        logger.debug("routed call mode=%s model=%s latency=%.3fs cost=$%.6f baseline=$%.6f",
+                     decision["mode"], decision["model_id"], seconds, cost, baseline)
+
+    def model(self, mode: str) -> "RoutedChatModel":
+        """A chat model that routes every call for `mode`, for use in chains."""
+        return RoutedChatModel(router=self, mode=mode)
+
+    def stats(self) -> dict:
+        """Decision counts per mode and model, estimated cost and savings, and p95 latency per model."""
+        with self._lock:
+            decisions = {f"{mode}:{model_id}": n for (mode, model_id), n in self.decisions.items()}
+            cost, baseline = self.cost, self.baseline_cost
+            models = list(self._latency)
+        return {
+            "decisions": decisions,
+            "cost_usd": cost,
+            "baseline_cost_usd": baseline,
+            "savings_usd": baseline - cost,
+            "latency_p95": {m: self.latency(m) for m in models},
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """
+    A chat model that asks a ModelRouter which model to use on every call.
+
+    Usage:
+        chain = prompt | router.model("summarize_brief") | StrOutputParser()
+
+    The decision is attached to each response as response_metadata["route"].
+    """
+
+    router: Any
+    mode: str
+    tools: Any = None  # (tools, kwargs) from bind_tools(), applied to the chosen model
+
+    @property
+    def _llm_type(self) -> str:
+        return f"routed-{self.mode}"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"mode": self.mode}
+
+    def _route(self, messages):
+        decision = self.router.choose(self.mode, count_message_tokens(messages))
+        llm = self.router.get_model(decision["model_id"], decision["max_tokens"])
+        if self.tools is not None:
+            tools, tool_kwargs = self.tools
+            llm = llm.bind_tools(tools, **tool_kwargs)
+        return decision, llm
+
+    @staticmethod
+    def _call_kwargs(stop, kwargs) -> dict:
+        return dict(kwargs, stop=stop) if stop is not None else dict(kwargs)
+
+    def _finish(self, decision, started, message) -> None:
+        self.router.record(decision, time.perf_counter() - started, getattr(message, "usage_metadata", None))
+        message.response_metadata["route"] = decision
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        decision, llm = self._route(messages)
+        started = time.perf_counter()
+        message = invoke_model(llm, messages, **self._call_kwargs(stop, kwargs))
+        self._finish(decision, started, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        decision, llm = self._route(messages)
+        started = time.perf_counter()
+        message = await ainvoke_model(llm, messages, **self._call_kwargs(stop, kwargs))
+        self._finish(decision, started, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        decision, llm = self._route(messages)
+        started = time.perf_counter()
+        usage = None
+        for chunk in stream_model(llm, messages, **self._call_kwargs(stop, kwargs)):
+            usage = chunk.usage_metadata or usage
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+        self.router.record(decision, time.perf_counter() - started, usage)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        decision, llm = self._route(messages)
+        started = time.perf_counter()
+        usage = None
+        async for chunk in astream_model(llm, messages, **self._call_kwargs(stop, kwargs)):
+            usage = chunk.usage_metadata or usage
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+        self.router.record(decision, time.perf_counter() - started, usage)
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools to whichever model each call is routed to."""
+        return self.model_copy(update={"tools": (tools, kwargs)})
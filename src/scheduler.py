@@ -0,0 +1,422 @@
+"""
+Scheduler module for LangChain application.
+Admits model calls by priority class, sharing capacity fairly across tenants.
+
+Interactive chat and batch jobs (bulk summarization, research chains)
+draw on the same Bedrock quota. A PriorityScheduler lets at most
+`capacity` model calls run at once and queues the rest:
+
+- priority classes: "interactive" waiters are always admitted before
+  "batch" waiters,
+- reserved capacity: batch calls never hold more than capacity -
+  reserved_interactive slots, so an interactive call finds a free slot
+  even while a batch job is saturating its share,
+- weighted fair queuing: within a class, tenants are served in order of
+  their virtual finish tags (self-clocked fair queuing), so a tenant with
+  weight 2 gets twice the calls of a tenant with weight 1 when both are
+  backlogged, and a tenant with many queued calls cannot starve the rest.
+
+A slot is held for one model call, not for a whole job, so batch work is
+preempted at step boundaries: every chain step, map-reduce chunk or
+document queues again, behind any interactive call that arrived meanwhile.
+
+A call's class and tenant come from its config (configurable or metadata
+"priority" and "tenant_id"), else from an enclosing priority() block,
+else it is interactive:
+
+    chain.invoke(inputs, config={"configurable": {"priority": "batch", "tenant_id": "acme"}})
+    with priority("batch"):
+        my_summarizer("brief", text)
+
+Models from get_llm() go through the process-wide scheduler once
+configure_scheduler() is called or LLM_SCHEDULER is set. Queue depth,
+slots in use and wait times per class are in stats() (GET /health shows
+them under llm).
+"""
+
+import asyncio
+import collections
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any
+
+from langchain_core.runnables.config import ensure_config
+
+from src.wrappers import DelegatingChatModel
+
+INTERACTIVE, BATCH = "interactive", "batch"
+PRIORITIES = (INTERACTIVE, BATCH)  # highest first
+
+SCHEDULER_DEFAULTS = {
+    "capacity": 16,               # model calls in flight at once (keep at or below the rate limiter's concurrency)
+    "reserved_interactive": 4,    # slots batch calls may never take
+    "tenant_weights": None,       # {tenant_id: weight}; other tenants get default_weight
+    "default_weight": 1.0,
+    "wait_samples": 1000,         # recent waits per class kept for percentiles
+}
+
+_current = contextvars.ContextVar("llm_priority", default=(None, None))
+
+
+def check_priority(name: str) -> str:
+    """
+    Validate a priority class name.
+
+    Raises:
+        ValueError: If name is not one of PRIORITIES
+    """
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{name}'. Available: {list(PRIORITIES)}")
+    return name
+
+
+@contextmanager
+def priority(name: str, tenant_id: str = None):
+    """
+    Run the model calls made in this block (and in contexts copied from it) at a priority class.
+
+    Args:
+        name: One of PRIORITIES
+        tenant_id: Tenant to charge the calls' share to, unless their config names one
+    """
+    token = _current.set((check_priority(name), tenant_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def request_class(config=None) -> tuple:
+    """A call's (priority, tenant_id), from its config, else the enclosing priority() block."""
+    config = ensure_config(config)  # merged with the enclosing run's config, as LangChain does
+    configurable, metadata = config.get("configurable", {}), config.get("metadata", {})
+    name, tenant_id = _current.get()
+    name = configurable.get("priority", metadata.get("priority")) or name or INTERACTIVE
+    tenant_id = configurable.get("tenant_id", metadata.get("tenant_id", tenant_id))
+    return check_priority(name), tenant_id
+
+
+class _Waiter:
+    __slots__ = ("name", "tenant_id", "finish", "queued_at", "wake", "admitted", "cancelled")
+
+    def __init__(self, name, tenant_id, finish, wake):
+        self.name = name
+        self.tenant_id = tenant_id
+        self.finish = finish
+        self.queued_at = time.perf_counter()
+        self.wake = wake
+        self.admitted = False
+        self.cancelled = False
+
+
+class PriorityScheduler:
+    """
+    Admission control for model calls with priority classes, reserved capacity and per-tenant fairness.
+
+    acquire() blocks until the call may run and release() frees its slot;
+    slot() and aslot() wrap the pair. Shared by threads and asyncio tasks.
+
+    Args:
+        capacity: Model calls in flight at once
+        reserved_interactive: Slots only interactive calls may use
+        tenant_weights: {tenant_id: weight} shares within a class
+        default_weight: Weight of tenants not in tenant_weights
+        wait_samples: Recent waits per class kept for percentiles
+    """
+
+    def __init__(self, capacity: int = 16, reserved_interactive: int = 4, tenant_weights: dict = None,
+                 default_weight: float = 1.0, wait_samples: int = 1000):
+        if capacity < 1 or not 0 <= reserved_interactive < capacity:
+            raise ValueError("capacity must be at least 1 and reserved_interactive in [0, capacity)")
+        self.capacity = capacity
+        self.reserved_interactive = reserved_interactive
+        self.tenant_weights = dict(tenant_weights or {})
+        self.default_weight = default_weight
+        self.in_flight = {name: 0 for name in PRIORITIES}
+        self._queues = {name: [] for name in PRIORITIES}  # heaps of (finish tag, sequence, waiter)
+        self._queued = {name: 0 for name in PRIORITIES}
+        self._virtual = {name: 0.0 for name in PRIORITIES}  # finish tag of the last call admitted
+        self._finish = {name: {} for name in PRIORITIES}  # tenant -> finish tag of its last call
+        self._sequence = itertools.count()
+        self._waits = {name: collections.deque(maxlen=wait_samples) for name in PRIORITIES}
+        self._granted = {name: 0 for name in PRIORITIES}
+        self._waited = {name: 0 for name in PRIORITIES}  # calls that had to queue
+        self._wait_total = {name: 0.0 for name in PRIORITIES}
+        self._wait_max = {name: 0.0 for name in PRIORITIES}
+        self._lock = threading.Lock()
+
+    def _limit(self, name: str) -> int:
+        return self.capacity if name == INTERACTIVE else self.capacity - self.reserved_interactive
+
+    def _has_room(self, name: str) -> bool:
+        return sum(self.in_flight.values()) < self.capacity and self.in_flight[name] < self._limit(name)
+
+    def _tag(self, name: str, tenant_id) -> float:
+        """Stamp a call's virtual finish tag (called with the lock held)."""
+        weight = self.tenant_weights.get(tenant_id, self.default_weight)
+        finishes = self._finish[name]
+        finish = max(self._virtual[name], finishes.get(tenant_id, 0.0)) + 1.0 / weight
+        finishes[tenant_id] = finish
+        return finish
+
+    def _admit(self, name: str, finish: float, waited: float = None) -> None:
+        """Count a call as running; waited is None if it did not queue (called with the lock held)."""
+        self.in_flight[name] += 1
+        self._virtual[name] = max(self._virtual[name], finish)
+        self._granted[name] += 1
+        if waited is not None:
+            self._waited[name] += 1
+            self._wait_total[name] += waited
+            self._wait_max[name] = max(self._wait_max[name], waited)
+        self._waits[name].append(waited or 0.0)
+        if not self._queued[name]:
+            self._finish[name].clear()  # the class is idle: old tags no longer matter
+
+    def _grant(self) -> None:
+        """Wake queued waiters, highest class first, while there is room (called with the lock held)."""
+        for name in PRIORITIES:
+            queue = self._queues[name]
+            while queue and self._has_room(name):
+                waiter = heapq.heappop(queue)[2]
+                if waiter.cancelled:
+                    continue
+                self._queued[name] -= 1
+                self._admit(name, waiter.finish, time.perf_counter() - waiter.queued_at)
+                waiter.admitted = True
+                waiter.wake()
+            if self._queued[name]:
+                return  # strict priority: lower classes wait while a higher one is queued
+
+    def _enqueue(self, name: str, tenant_id, wake):
+        """Admit the call now (returns None) or queue it (returns its waiter); called with the lock held."""
+        finish = self._tag(name, tenant_id)
+        ahead = any(self._queued[other] for other in PRIORITIES[:PRIORITIES.index(name) + 1])
+        if not ahead and self._has_room(name):
+            self._admit(name, finish)
+            return None
+        waiter = _Waiter(name, tenant_id, finish, wake)
+        heapq.heappush(self._queues[name], (finish, next(self._sequence), waiter))
+        self._queued[name] += 1
+        return waiter
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it had already been admitted."""
+        with self._lock:
+            if waiter.admitted:
+                return False
+            waiter.cancelled = True
+            self._queued[waiter.name] -= 1
+            self._grant()  # a lower class may have been held back by this waiter
+            return True
+
+    def acquire(self, name: str = INTERACTIVE, tenant_id: str = None) -> str:
+        """
+        Block until a call of this class and tenant may run.
+
+        Args:
+            name: Priority class (one of PRIORITIES)
+            tenant_id: Tenant whose share the call uses
+
+        Returns:
+            str: The class, to pass to release()
+        """
+        check_priority(name)
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(name, tenant_id, event.set)
+        if waiter is not None:
+            event.wait()
+        return name
+
+    async def aacquire(self, name: str = INTERACTIVE, tenant_id: str = None) -> str:
+        """Async version of acquire()."""
+        check_priority(name)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            waiter = self._enqueue(name, tenant_id, wake)
+        if waiter is None:
+            return name
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not self._cancel(waiter):
+                self.release(name)  # the slot was granted as we were cancelled
+            raise
+        return name
+
+    def release(self, name: str) -> None:
+        """Free a slot taken by acquire() and admit the next waiters."""
+        with self._lock:
+            self.in_flight[name] -= 1
+            self._grant()
+
+    @contextmanager
+    def slot(self, name: str = INTERACTIVE, tenant_id: str = None):
+        """Hold a slot for the block."""
+        self.acquire(name, tenant_id)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    @asynccontextmanager
+    async def aslot(self, name: str = INTERACTIVE, tenant_id: str = None):
+        """Async version of slot()."""
+        await self.aacquire(name, tenant_id)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def stats(self) -> dict:
+        """Per class: queue depth, calls in flight, calls admitted, and wait times in seconds."""
+        with self._lock:
+            classes = {}
+            for name in PRIORITIES:
+                waits = sorted(self._waits[name])
+                granted = self._granted[name]
+                classes[name] = {
+                    "queued": self._queued[name],
+                    "in_flight": self.in_flight[name],
+                    "limit": self._limit(name),
+                    "granted": granted,
+                    "waited": self._waited[name],
+                    "wait_avg": self._wait_total[name] / granted if granted else 0.0,
+                    "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "wait_max": self._wait_max[name],
+                }
+            return {"capacity": self.capacity, "reserved_interactive": self.reserved_interactive,
+                    "classes": classes}
+
+
+class ScheduledChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that holds a scheduler slot for each call.
+
+    It must be the outermost wrapper: its public invoke/stream read the
+    call's priority and tenant from the config and pass the config on to
+    the inner model, so wrappers that read it too (accounting) still see it.
+    Calls made directly on the inner hooks by another wrapper use the
+    enclosing priority() block.
+    """
+
+    scheduler: Any
+
+    def _call(self, messages, **kwargs):
+        with self.scheduler.slot(*request_class()):
+            return self._invoke_inner(messages, **kwargs)
+
+    async def _acall(self, messages, **kwargs):
+        async with self.scheduler.aslot(*request_class()):
+            return await self._ainvoke_inner(messages, **kwargs)
+
+    def _call_stream(self, messages, **kwargs):
+        with self.scheduler.slot(*request_class()):
+            yield from self._stream_inner(messages, **kwargs)
+
+    async def _acall_stream(self, messages, **kwargs):
+        async with self.scheduler.aslot(*request_class()):
+            async for chunk in self._astream_inner(messages, **kwargs):
+                yield chunk
+
+    def invoke(self, input, config=None, **kwargs: Any):
+        with self.scheduler.slot(*request_class(config)):
+            return self.llm.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs: Any):
+        async with self.scheduler.aslot(*request_class(config)):
+            return await self.llm.ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs: Any):
+        # The class is read now, in the caller's context; the slot is taken on the first chunk
+        return self._scheduled_stream(request_class(config), input, config, kwargs)
+
+    def astream(self, input, config=None, **kwargs: Any):
+        return self._scheduled_astream(request_class(config), input, config, kwargs)
+
+    def _scheduled_stream(self, request, input, config, kwargs):
+        with self.scheduler.slot(*request):
+            yield from self.llm.stream(input, config, **kwargs)
+
+    async def _scheduled_astream(self, request, input, config, kwargs):
+        async with self.scheduler.aslot(*request):
+            async for chunk in self.llm.astream(input, config, **kwargs):
+                yield chunk
+
+    def stats(self) -> dict:
+        """Scheduler metrics, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "scheduler": self.scheduler.stats()}
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools on the inner model, keeping this wrapper around it."""
+        return self.model_copy(update={"llm": self.llm.bind_tools(tools, **kwargs)})
+
+
+_settings = dict(SCHEDULER_DEFAULTS)
+_configured = False
+_scheduler = None
+_lock = threading.Lock()
+
+
+def configure_scheduler(**settings) -> dict:
+    """
+    Enable the scheduler for every get_llm() model and update its settings.
+
+    The scheduler is rebuilt on its next use. Models already created keep
+    the scheduler they were built with, so call this before get_llm().
+
+    Args:
+        **settings: Any of the SCHEDULER_DEFAULTS keys
+
+    Returns:
+        dict: The settings now in effect
+
+    Raises:
+        ValueError: If a setting is not recognized
+    """
+    global _configured, _scheduler
+    unknown = set(settings) - set(SCHEDULER_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown scheduler setting(s): {sorted(unknown)}. Available: {list(SCHEDULER_DEFAULTS)}")
+    with _lock:
+        _settings.update(settings)
+        _scheduler = None
+        _configured = True
+        return dict(_settings)
+
+
+def scheduler_enabled() -> bool:
+    """Whether get_llm() models are scheduled (configure_scheduler() was called or LLM_SCHEDULER is set)."""
+    return _configured or os.environ.get("LLM_SCHEDULER", "").lower() in ("1", "true", "yes", "on")
+
+
+def get_scheduler():
+    """Get the process-wide scheduler, creating it on first use, or None if scheduling is off."""
+    global _scheduler
+    if not scheduler_enabled():
+        return None
+    with _lock:
+        if _scheduler is None:
+            _scheduler = PriorityScheduler(**_settings)
+        return _scheduler
+
+
+def reset_scheduler() -> None:
+    """Disable scheduling, restore the default settings and drop the shared scheduler."""
+    global _configured, _scheduler
+    with _lock:
+        _settings.clear()
+        _settings.update(SCHEDULER_DEFAULTS)
+        _scheduler = None
+        _configured = False
@@ -0,0 +1,483 @@
+"""
+Server module for LangChain application.
+A small asyncio HTTP server for the chatbot, summarizer, memory chat and chains.
+
+Endpoints (POST with a JSON body, except /health):
+    /chatbot        {"language", "text"}
+    /summarize      {"length", "text"}
+    /chat           {"message", "session_id", optional "tenant_id" and "priority"}
+    /chain/<type>   chain inputs, e.g. {"topic"} (any get_chain type), optional "priority"
+    GET /health     counters for load balancers and dashboards
+
+Add "stream": true (or send Accept: text/event-stream) to get Server-Sent
+Events: one `data: {"token": ...}` event per chunk (`{"delta": ...}` for
+chains with named outputs), then `event: done` with timing.
+
+Admission control: at most max_concurrency requests run at once and up to
+max_queue more wait for a slot; beyond that requests get 429. On shutdown
+the listener closes, new requests get 503, and in-flight requests drain
+for up to drain_timeout seconds.
+
+Prompts are checked against the model's token budget before any call is
+made: chatbot and summarizer prompts are truncated, and chain prompts
+that do not fit get 413. A call that would exceed a session or tenant
+budget (src/accounting.py) gets 429, and a call refused by an open
+circuit breaker (src/breaker.py) gets 503 with Retry-After.
+
+Model calls are interactive unless the body sets "priority": "batch"
+(see src/scheduler.py).
+
+With a cluster, /chat turns run in worker processes (src/cluster.py);
+the other endpoints stay in the server process.
+"""
+
+import asyncio
+import json
+import signal
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+
+from src.accounting import BudgetExceededError
+from src.breaker import CircuitOpenError
+from src.chains import get_chain
+from src.cluster import WorkerError
+from src.memory import build_memory_chatbot
+from src.router import chain_route
+from src.scheduler import check_priority
+from src.summarize import LONG_DOCUMENT_TOKENS, estimate_tokens, map_reduce_summarize
+from src.tokens import PromptTooLongError, with_token_budget
+
+DEFAULT_MAX_CONCURRENCY = 256
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_DRAIN_TIMEOUT = 30.0
+MAX_BODY_BYTES = 1_000_000
+REQUEST_READ_TIMEOUT = 30.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """An error response with an HTTP status code."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _chunk_text(chunk):
+    """Convert a streamed chunk to text (or a dict of texts for multi-output chains)."""
+    if isinstance(chunk, str):
+        return chunk
+    if isinstance(chunk, dict):
+        return {key: _chunk_text(value) for key, value in chunk.items()}
+    return getattr(chunk, "text", str(chunk))
+
+
+def _merge(result, chunk):
+    """Accumulate streamed chunks into a full response."""
+    if isinstance(chunk, str):
+        return (result or "") + chunk
+    result = dict(result or {})
+    for key, value in chunk.items():
+        result[key] = result[key] + value if isinstance(value, str) and key in result else value
+    return result
+
+
+class LabServer:
+    """
+    HTTP front end for the lab's LLM features.
+
+    Args:
+        llm: The language model to serve
+        get_prompt: Prompt selector ("assistant"/"summarizer"), e.g. langchain_chatbot_lab.get_prompt
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+        max_concurrency: Requests processed at once
+        max_queue: Requests allowed to wait for a slot before 429s
+        drain_timeout: Seconds to let in-flight requests finish on shutdown
+        cluster: Optional ClusterSupervisor (src/cluster.py) that runs /chat turns
+            in worker processes, each session on its own worker
+        warm_up: Warm up before accepting connections (src/warmup.py)
+        prime: Also send one tiny priming request while warming up
+        models: Optional factory mode -> chat model (e.g. ModelRouter.model) for the
+            chains and /summarize; each chain type runs on its route's model (src/router.py
+            chain_route), and summaries on summarize_<length>. By default both use llm.
+    """
+
+    def __init__(self, llm, get_prompt, host: str = "127.0.0.1", port: int = 8000,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_queue: int = DEFAULT_MAX_QUEUE,
+                 drain_timeout: float = DEFAULT_DRAIN_TIMEOUT, cluster=None, warm_up: bool = False,
+                 prime: bool = False, models=None):
+        self.llm = llm
+        self.models = models
+        self.get_prompt = get_prompt
+        self.host = host
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+        self.cluster = cluster
+        self.warm_up_on_start = warm_up
+        self.prime = prime
+        self.warmup = None
+
+        # Built once and shared by every request
+        self.chatbot = build_memory_chatbot(llm)
+        self.budgeted_llm = with_token_budget(llm)
+        self._prompts = {}
+        self._chains = {}
+
+        self.active = 0
+        self.waiting = 0
+        self.peak_active = 0
+        self.served = 0
+        self.rejected = 0
+
+        self._slots = None
+        self._server = None
+        self._closing = False
+        self._stopped = None
+        self._connections = set()
+        self._in_flight = set()
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def warm_up(self, prime: bool = False) -> dict:
+        """Build the prompts and chains, open model connections and optionally prime the model (src/warmup.py)."""
+        from src.warmup import warm_up
+
+        self.warmup = warm_up(self.llm, server=self, prime=prime)
+        return self.warmup
+
+    async def start(self):
+        """Warm up if enabled, then start listening; returns once the socket is bound."""
+        if self.warm_up_on_start:
+            await asyncio.to_thread(self.warm_up, self.prime)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def shutdown(self):
+        """Stop accepting, drain in-flight requests, then close idle connections."""
+        if self._closing:
+            return
+        self._closing = True
+        self._server.close()
+
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight), timeout=self.drain_timeout)
+        for task in set(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.wait(set(self._connections))
+        self._stopped.set()
+
+    async def serve_forever(self):
+        """Serve until SIGINT/SIGTERM, then shut down gracefully."""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown()))
+            except NotImplementedError:  # pragma: no cover (Windows)
+                pass
+        if self.warmup is not None:
+            errors = "".join(f", {step} failed: {error}" for step, error in self.warmup["errors"].items())
+            print(f"🔥 Warmed up in {self.warmup['seconds']:.2f}s{errors}")
+        print(f"🌐 Serving on http://{self.host}:{self.port} "
+              f"(max_concurrency={self.max_concurrency}, max_queue={self.max_queue})")
+        await self._stopped.wait()
+        print("👋 Server stopped")
+
+    def stats(self) -> dict:
+        """Current load counters, plus the model wrappers' metrics (e.g. coalescing) if any."""
+        stats = {
+            "status": "draining" if self._closing else "ok",
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_active": self.peak_active,
+            "served": self.served,
+            "rejected": self.rejected,
+        }
+        llm_stats = getattr(self.llm, "stats", None)
+        if callable(llm_stats):
+            stats["llm"] = llm_stats()
+        if self.cluster is not None:
+            stats["cluster"] = self.cluster.stats()
+        if self.warmup is not None:
+            stats["warmup"] = self.warmup
+        return stats
+
+    # ---- HTTP plumbing ---------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), REQUEST_READ_TIMEOUT)
+            self._in_flight.add(task)
+            await self._dispatch(*request, writer)
+        except HTTPError as e:
+            headers = {"Retry-After": "1"} if e.status in (429, 503) else {}
+            await self._send_json(writer, e.status, {"error": e.message}, headers)
+        except PromptTooLongError as e:
+            await self._send_json(writer, 413, {"error": str(e)})
+        except BudgetExceededError as e:
+            await self._send_json(writer, 429, {"error": str(e)})
+        except CircuitOpenError as e:
+            await self._send_json(writer, 503, {"error": str(e)}, {"Retry-After": str(max(1, round(e.retry_after)))})
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            await self._send_json(writer, 500, {"error": str(e)})
+        finally:
+            self._in_flight.discard(task)
+            self._connections.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            raise ConnectionError("client closed connection")
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        # Digits only: int() would also take signs, spaces and underscores
+        length = headers.get("content-length", "0")
+        if not (length.isascii() and length.isdigit()):
+            raise HTTPError(400, "Malformed Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _send(self, writer, status: int, content_type: str, body: bytes = b"", headers: dict = None,
+                    streaming: bool = False):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                 "Connection: close"]
+        if streaming:
+            lines.append("Cache-Control: no-cache")
+        else:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload: dict, headers: dict = None):
+        try:
+            await self._send(writer, status, "application/json", json.dumps(payload).encode(), headers)
+        except ConnectionError:
+            pass
+
+    # ---- routing and admission control -----------------------------------
+
+    def _route(self, method: str, path: str):
+        routes = {
+            "/chatbot": self._chatbot,
+            "/summarize": self._summarize,
+            "/chat": self._chat,
+        }
+        if path in routes:
+            handler = routes[path]
+        elif path.startswith("/chain/"):
+            chain_type = path[len("/chain/"):]
+            handler = lambda payload: self._chain(chain_type, payload)  # noqa: E731
+        else:
+            raise HTTPError(404, f"Unknown endpoint: {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} only accepts POST")
+        return handler
+
+    async def _dispatch(self, method, path, headers, body, writer):
+        if self._closing:
+            raise HTTPError(503, "Server is shutting down")
+        if path == "/health" and method == "GET":
+            await self._send_json(writer, 200, self.stats())
+            return
+
+        handler = self._route(method, path)
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        stream = bool(payload.pop("stream", False)) or "text/event-stream" in headers.get("accept", "")
+
+        # Backpressure: bounded running + waiting, everything else is shed
+        if self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise HTTPError(429, "Server overloaded, retry later")
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            chunks = handler(payload)
+            if stream:
+                await self._send_events(writer, chunks)
+            else:
+                result = None
+                async for chunk in chunks:
+                    result = _merge(result, chunk)
+                await self._send_json(writer, 200, {"response": result})
+            self.served += 1
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _send_events(self, writer, chunks):
+        started = time.perf_counter()
+        chunks = chunks.__aiter__()
+        # Wait for the first chunk before committing to 200, so validation errors keep their status
+        try:
+            pending = [await chunks.__anext__()]
+        except StopAsyncIteration:
+            pending = []
+        first_token = time.perf_counter() - started if pending else None
+
+        await self._send(writer, 200, "text/event-stream", streaming=True)
+        try:
+            while True:
+                for chunk in pending:
+                    key = "token" if isinstance(chunk, str) else "delta"
+                    writer.write(f"data: {json.dumps({key: chunk})}\n\n".encode())
+                    await writer.drain()
+                if not pending:
+                    break
+                try:
+                    pending = [await chunks.__anext__()]
+                except StopAsyncIteration:
+                    pending = []
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            message = e.message if isinstance(e, HTTPError) else str(e)
+            writer.write(f"event: error\ndata: {json.dumps({'error': message})}\n\n".encode())
+        done = {"time_to_first_token": first_token, "total_time": time.perf_counter() - started}
+        writer.write(f"event: done\ndata: {json.dumps(done)}\n\n".encode())
+        await writer.drain()
+
+    # ---- handlers (async generators of text chunks) ----------------------
+
+    def _prompt(self, task_name: str):
+        if task_name not in self._prompts:
+            self._prompts[task_name] = self.get_prompt(task_name)
+        return self._prompts[task_name]
+
+    @staticmethod
+    def _require(payload: dict, *fields):
+        missing = [f for f in fields if not isinstance(payload.get(f), str)]
+        if missing:
+            raise HTTPError(400, f"Missing string field(s): {missing}")
+
+    @staticmethod
+    def _priority(payload) -> dict:
+        """The request's scheduler priority as configurable entries (none if not given)."""
+        name = payload.pop("priority", None)
+        if name is None:
+            return {}
+        try:
+            return {"priority": check_priority(name)}
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    async def _chatbot(self, payload):
+        self._require(payload, "language", "text")
+        chain = self._prompt("assistant") | self.budgeted_llm
+        async for chunk in chain.astream({"language": payload["language"], "freeform_text": payload["text"]}):
+            if chunk.text:
+                yield chunk.text
+
+    async def _summarize(self, payload):
+        self._require(payload, "text")
+        length = payload.get("length", "brief")
+        text = payload["text"]
+        chain = self._prompt("summarizer") | self.summarizer_llm(f"summarize_{length}")
+        if estimate_tokens(text) > LONG_DOCUMENT_TOKENS:
+            # Intermediate summaries are detailed whatever the final length
+            reducer = self._prompt("summarizer") | self.summarizer_llm("summarize_detailed") | StrOutputParser()
+            yield await asyncio.to_thread(map_reduce_summarize, reducer, length, text,
+                                          final_chain=chain | StrOutputParser())
+            return
+        async for chunk in chain.astream({"length": length, "text": text}):
+            if chunk.text:
+                yield chunk.text
+
+    async def _chat(self, payload):
+        self._require(payload, "message")
+        config = {"configurable": {"session_id": str(payload.get("session_id", "default"))}}
+        if payload.get("tenant_id") is not None:
+            config["configurable"]["tenant_id"] = str(payload["tenant_id"])
+        config["configurable"].update(self._priority(payload))
+        if self.cluster is not None:
+            async for text in self._cluster_chat(payload["message"], **config["configurable"]):
+                yield text
+            return
+        async for chunk in self.chatbot.astream({"input": payload["message"]}, config=config):
+            if _chunk_text(chunk):
+                yield _chunk_text(chunk)
+
+    async def _cluster_chat(self, message: str, session_id: str, **configurable):
+        try:
+            async for text in self.cluster.astream_chat(session_id, message, **configurable):
+                yield text
+        except WorkerError as e:
+            if e.error_type == "BudgetExceededError":
+                raise HTTPError(429, str(e))
+            raise
+
+    def summarizer_llm(self, mode: str):
+        """The token-budgeted model for a summarizer mode: its routed model, or llm without a models factory."""
+        if self.models is None:
+            return self.budgeted_llm
+        return with_token_budget(self.models(mode))
+
+    def chain_llm(self, chain_type: str):
+        """The model a chain type runs on: its route's model, or llm without a models factory."""
+        if self.models is None:
+            return self.llm
+        return self.models(chain_route(chain_type))
+
+    async def _chain(self, chain_type: str, payload):
+        if chain_type not in self._chains:
+            try:
+                self._chains[chain_type] = get_chain(chain_type, self.chain_llm(chain_type))
+            except ValueError as e:
+                raise HTTPError(404, str(e))
+        chain = self._chains[chain_type]
+        config = {"configurable": self._priority(payload)}
+        # The simple chain takes its topic as a bare string
+        inputs = payload.get("topic", "") if chain_type == "simple" else payload
+        async for chunk in chain.astream(inputs, config=config):
+            chunk = _chunk_text(chunk)
+            if chunk:
+                yield chunk
@@ -0,0 +1,342 @@
+"""
+Shared-memory store module for LangChain application.
+Keeps chat histories in a memory-mapped file that every process on the host can use.
+
+The file has three parts:
+
+    header   magic, index capacity, end of the arena, session count, deleted slots
+    index    open-addressing hash table: session_id hash -> (name, last message, count)
+    arena    append-only records: session names and messages
+
+Each message record points back to the session's previous message, so
+appending a message costs one record plus one index update, and reading
+the last n messages walks back n records. Records are read in place
+through memoryviews of the mapping; a message is only decoded into a
+LangChain message when it is materialized.
+
+Writers hold an exclusive flock on the file (plus a thread lock inside
+the process); readers hold a shared flock. Any process that opens the
+same path sees every session, so a session's turns can be answered by
+any worker:
+
+    store = SharedSessionStore("/dev/shm/sessions.db")
+    history = store.history("session-1")      # a BaseChatMessageHistory
+
+A cleared session's index slot becomes a tombstone, which a later new
+session can reuse. When live slots plus tombstones reach the load limit,
+the index is rebuilt in place without tombstones, so probes stay short
+however many sessions come and go. Cleared sessions leave their records in
+the arena (it is append-only); start a new file to reclaim the space.
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+DEFAULT_CAPACITY = 1 << 16  # index slots (sessions)
+DEFAULT_SIZE = 16 << 20  # initial file size in bytes; the file doubles as needed
+
+MAGIC = b"LCSHM001"
+_HEADER = struct.Struct("<8sQQQQ")  # magic, capacity, arena end, sessions, deleted slots
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<QQQQ")  # key hash, name offset, last message offset, message count
+_RECORD = struct.Struct("<QI")  # previous record offset, payload length
+_EMPTY, _DELETED = 0, 1
+_MAX_LOAD = 0.75
+
+
+def _key(session_id: str) -> int:
+    digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+    return max(int.from_bytes(digest, "little"), 2)  # 0 and 1 mark empty and deleted slots
+
+
+class SharedSessionStore:
+    """
+    Chat histories in a memory-mapped file shared by every process that opens it.
+
+    Args:
+        path: The store file (created if missing); /dev/shm keeps it in memory
+        capacity: Index slots for a new file (the most sessions it can hold)
+        size: Initial size of a new file in bytes
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY, size: int = DEFAULT_SIZE):
+        self.path = path
+        self._lock = threading.RLock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size == 0:
+                arena = _HEADER_SIZE + capacity * _SLOT.size
+                os.ftruncate(self._fd, max(size, arena + 4096))
+                self._map = mmap.mmap(self._fd, 0)
+                _HEADER.pack_into(self._map, 0, MAGIC, capacity, arena, 0, 0)
+            else:
+                self._map = mmap.mmap(self._fd, 0)
+            magic, self.capacity, _, _, _ = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a session store")
+
+    # ---- file plumbing ---------------------------------------------------
+
+    @contextmanager
+    def _locked(self, operation):
+        with self._lock:
+            if self._fd is None:
+                raise ValueError(f"Session store {self.path} is closed")
+            fcntl.flock(self._fd, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def _end(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[2]
+
+    @property
+    def _count(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[3]
+
+    @property
+    def _deleted(self) -> int:
+        return _HEADER.unpack_from(self._map, 0)[4]
+
+    def _set_header(self, end: int, sessions: int, deleted: int = None) -> None:
+        deleted = self._deleted if deleted is None else deleted
+        _HEADER.pack_into(self._map, 0, MAGIC, self.capacity, end, sessions, deleted)
+
+    def _refresh(self) -> None:
+        """Map again if another process grew the file."""
+        if self._end > len(self._map):
+            # Views handed out keep the old mapping alive until they are released
+            self._map = mmap.mmap(self._fd, 0)
+
+    def _reserve(self, size: int) -> int:
+        """Make room for size more bytes; returns the offset they start at."""
+        end = self._end
+        if end + size > len(self._map):
+            new_size = os.fstat(self._fd).st_size
+            while end + size > new_size:
+                new_size *= 2
+            os.ftruncate(self._fd, new_size)
+            self._map = mmap.mmap(self._fd, 0)
+        self._set_header(end + size, self._count)
+        return end
+
+    def _payload(self, offset: int) -> memoryview:
+        _, length = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        return memoryview(self._map)[start:start + length]
+
+    def _append_record(self, previous: int, payload: bytes) -> int:
+        offset = self._reserve(_RECORD.size + len(payload))
+        _RECORD.pack_into(self._map, offset, previous, len(payload))
+        self._map[offset + _RECORD.size:offset + _RECORD.size + len(payload)] = payload
+        return offset
+
+    # ---- index -----------------------------------------------------------
+
+    def _slot_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * _SLOT.size
+
+    def _find(self, session_id: str, create: bool = False):
+        """The slot offset for a session (None if absent and not create)."""
+        key = _key(session_id)
+        name = session_id.encode()
+        index = key % self.capacity
+        free = None
+        for _ in range(self.capacity):
+            offset = self._slot_offset(index)
+            slot_key, name_offset, _, _ = _SLOT.unpack_from(self._map, offset)
+            if slot_key == _EMPTY:
+                break
+            if slot_key == _DELETED:
+                free = offset if free is None else free
+            elif slot_key == key and self._payload(name_offset) == name:
+                return offset
+            index = (index + 1) % self.capacity
+        else:
+            offset = None
+        if not create:
+            return None
+        if self._count + 1 > self.capacity * _MAX_LOAD:
+            raise RuntimeError(f"Session store {self.path} is full ({self.capacity} slots)")
+        deleted = self._deleted
+        if free is not None:
+            deleted = max(deleted - 1, 0)  # reusing a tombstone (files from before the count start at 0)
+        elif self._count + deleted + 1 > self.capacity * _MAX_LOAD:
+            # Taking an empty slot would leave too few to end probes early
+            self._rehash()
+            return self._find(session_id, create=True)
+        else:
+            free = offset
+        _SLOT.pack_into(self._map, free, key, self._append_record(0, name), 0, 0)
+        self._set_header(self._end, self._count + 1, deleted)
+        return free
+
+    def _rehash(self) -> None:
+        """Rebuild the index without tombstones (called with the exclusive lock held)."""
+        live = list(self._slots())
+        self._map[_HEADER_SIZE:_HEADER_SIZE + self.capacity * _SLOT.size] = bytes(self.capacity * _SLOT.size)
+        for slot in live:
+            index = slot[0] % self.capacity
+            while _SLOT.unpack_from(self._map, self._slot_offset(index))[0] != _EMPTY:
+                index = (index + 1) % self.capacity
+            _SLOT.pack_into(self._map, self._slot_offset(index), *slot)
+        self._set_header(self._end, len(live), 0)
+
+    def _slots(self):
+        region = memoryview(self._map)[_HEADER_SIZE:_HEADER_SIZE + self.capacity * _SLOT.size]
+        try:
+            for slot in _SLOT.iter_unpack(region):
+                if slot[0] > _DELETED:
+                    yield slot
+        finally:
+            region.release()
+
+    # ---- public API ------------------------------------------------------
+
+    def history(self, session_id: str) -> "SharedChatMessageHistory":
+        """A chat history view of one session (created on its first message)."""
+        return SharedChatMessageHistory(self, session_id)
+
+    def append(self, session_id: str, messages) -> None:
+        """Append messages to a session."""
+        payloads = [json.dumps(message_to_dict(m), separators=(",", ":")).encode() for m in messages]
+        with self._locked(fcntl.LOCK_EX):
+            self._refresh()
+            slot = self._find(session_id, create=True)
+            key, name_offset, last, count = _SLOT.unpack_from(self._map, slot)
+            for payload in payloads:
+                last = self._append_record(last, payload)
+            _SLOT.pack_into(self._map, slot, key, name_offset, last, count + len(payloads))
+
+    def views(self, session_id: str, last: int = None) -> list:
+        """
+        The session's messages as undecoded JSON memoryviews, oldest first.
+
+        Args:
+            session_id: The session
+            last: Only the newest this many messages (default: all)
+
+        Returns:
+            list: memoryviews into the shared mapping
+        """
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            slot = self._find(session_id)
+            if slot is None:
+                return []
+            _, _, offset, count = _SLOT.unpack_from(self._map, slot)
+            count = count if last is None else min(count, last)
+            views = []
+            for _ in range(count):
+                views.append(self._payload(offset))
+                offset = _RECORD.unpack_from(self._map, offset)[0]
+        views.reverse()
+        return views
+
+    def messages(self, session_id: str, last: int = None) -> list:
+        """The session's messages (or the newest `last`), decoded."""
+        return messages_from_dict([json.loads(view.tobytes()) for view in self.views(session_id, last)])
+
+    def count(self, session_id: str) -> int:
+        """Number of messages in a session, without reading them."""
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            slot = self._find(session_id)
+            return 0 if slot is None else _SLOT.unpack_from(self._map, slot)[3]
+
+    def clear(self, session_id: str) -> bool:
+        """
+        Delete a session.
+
+        Returns:
+            bool: True if the session existed
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._refresh()
+            slot = self._find(session_id)
+            if slot is None:
+                return False
+            _SLOT.pack_into(self._map, slot, _DELETED, 0, 0, 0)
+            self._set_header(self._end, self._count - 1, self._deleted + 1)
+            return True
+
+    def sessions(self) -> list:
+        """Every session id in the store."""
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            return [bytes(self._payload(name_offset)).decode() for _, name_offset, _, _ in self._slots()]
+
+    def __len__(self) -> int:
+        with self._locked(fcntl.LOCK_SH):
+            return self._count
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            return self._find(session_id) is not None
+
+    def stats(self) -> dict:
+        """Sessions, bytes used and file size."""
+        with self._locked(fcntl.LOCK_SH):
+            self._refresh()
+            return {"sessions": self._count, "capacity": self.capacity, "deleted_slots": self._deleted,
+                    "used_bytes": self._end, "file_bytes": len(self._map)}
+
+    def close(self) -> None:
+        """Unmap and close the file (the store's contents stay in it); later use raises ValueError."""
+        with self._lock:
+            if self._fd is not None:
+                try:
+                    self._map.close()
+                except BufferError:  # views still in use; the mapping goes when they do
+                    pass
+                os.close(self._fd)
+                self._fd = None
+
+    def __del__(self):
+        # Stores replaced in src.memory are not closed there, since histories
+        # handed out may still use them; they close once nothing refers to them
+        if getattr(self, "_fd", None) is not None:
+            self.close()
+
+
+class SharedChatMessageHistory(BaseChatMessageHistory):
+    """
+    One session of a SharedSessionStore, as a LangChain chat history.
+
+    Args:
+        store: The SharedSessionStore
+        session_id: The session
+    """
+
+    def __init__(self, store: SharedSessionStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> list:
+        return self.store.messages(self.session_id)
+
+    def last(self, n: int) -> list:
+        """The newest n messages (only those are read and decoded)."""
+        return self.store.messages(self.session_id, last=n) if n > 0 else []
+
+    def add_messages(self, messages) -> None:
+        self.store.append(self.session_id, list(messages))
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
+
+    def __len__(self) -> int:
+        return self.store.count(self.session_id)
@@ -0,0 +1,297 @@
+"""
+Single-flight module for LangChain application.
+Coalesces identical LLM calls that are in flight at the same moment.
+
+When dozens of identical requests arrive together (a trending topic, a
+retried batch), only the first one calls the model; the rest wait for it
+and share its result. In streaming mode every waiter receives every token,
+including the ones produced before it joined. Nothing is kept once the
+call finishes - this is deduplication, not caching.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+
+from langchain_core.messages import messages_to_dict
+from pydantic import Field
+
+from src.wrappers import DelegatingChatModel
+
+_DONE = object()
+
+
+class _Flight:
+    """One in-flight call: its result (or error) and any streamed chunks so far."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.result = None
+        self.error = None
+
+
+class _AsyncFlight:
+    """The asyncio counterpart of _Flight."""
+
+    def __init__(self):
+        self.cond = asyncio.Condition()
+        self.future = asyncio.get_running_loop().create_future()
+        self.task = None
+        self.chunks = []
+        self.finished = False
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and shares it with concurrent callers.
+
+    Thread-based callers (do/stream) and asyncio callers (ado/astream) are
+    tracked separately, so a flight never crosses event loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        self.requests = 0
+        self.executions = 0
+
+    def _join(self, table, key, factory):
+        """Return (flight, is_leader), creating the flight if none is running."""
+        with self._lock:
+            self.requests += 1
+            flight = table.get(key)
+            if flight is not None:
+                return flight, False
+            flight = table[key] = factory()
+            self.executions += 1
+            return flight, True
+
+    def _leave(self, table, key, flight):
+        with self._lock:
+            if table.get(key) is flight:
+                del table[key]
+
+    # ---- threads ---------------------------------------------------------
+
+    def do(self, key, fn):
+        """
+        Call fn() unless an identical call is already running; share its result.
+
+        Args:
+            key: Hashable identity of the call
+            fn: Zero-argument callable doing the real work
+
+        Returns:
+            fn()'s return value; its exception is raised in every waiter
+        """
+        flight, leader = self._join(self._flights, key, _Flight)
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            self._leave(self._flights, key, flight)
+            flight.done.set()
+
+    def stream(self, key, fn):
+        """
+        Iterate fn() once per key and replay every chunk to all concurrent callers.
+
+        The leader's iteration runs on a background thread so a caller that
+        stops reading early cannot stall the others.
+
+        Args:
+            key: Hashable identity of the call
+            fn: Zero-argument callable returning an iterator of chunks
+
+        Yields:
+            Every chunk fn() produces, from the first one
+        """
+        flight, leader = self._join(self._flights, key, _Flight)
+        if leader:
+            # A copy of the leader's context keeps its priority, tenant and run config
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, flight, fn), daemon=True).start()
+        position = 0
+        while True:
+            with flight.cond:
+                while position >= len(flight.chunks):
+                    flight.cond.wait()
+                chunk = flight.chunks[position]
+            position += 1
+            if chunk is _DONE:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            yield chunk
+
+    def _produce(self, key, flight, fn):
+        try:
+            for chunk in fn():
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            self._leave(self._flights, key, flight)
+            with flight.cond:
+                flight.chunks.append(_DONE)
+                flight.cond.notify_all()
+
+    # ---- asyncio ---------------------------------------------------------
+
+    async def ado(self, key, fn):
+        """
+        Async version of do(); fn is a zero-argument coroutine function.
+
+        The call runs as its own task, so cancelling one waiter (even the
+        first) does not cancel it for the others.
+        """
+        key = (id(asyncio.get_running_loop()), key)
+        flight, leader = self._join(self._async_flights, key, _AsyncFlight)
+        if leader:
+            flight.task = asyncio.ensure_future(self._aproduce_result(key, flight, fn))
+        return await asyncio.shield(flight.future)
+
+    async def _aproduce_result(self, key, flight, fn):
+        try:
+            flight.future.set_result(await fn())
+        except asyncio.CancelledError:
+            flight.future.cancel()
+        except BaseException as e:
+            flight.future.set_exception(e)
+        finally:
+            self._leave(self._async_flights, key, flight)
+
+    async def astream(self, key, fn):
+        """
+        Async version of stream(); fn is a zero-argument callable returning an async iterator.
+        """
+        key = (id(asyncio.get_running_loop()), key)
+        flight, leader = self._join(self._async_flights, key, _AsyncFlight)
+        if leader:
+            flight.task = asyncio.ensure_future(self._aproduce_stream(key, flight, fn))
+        position = 0
+        while True:
+            async with flight.cond:
+                await flight.cond.wait_for(lambda: position < len(flight.chunks) or flight.finished)
+                if position >= len(flight.chunks):
+                    break
+                chunk = flight.chunks[position]
+            position += 1
+            yield chunk
+        if flight.error is not None:
+            raise flight.error
+
+    async def _aproduce_stream(self, key, flight, fn):
+        try:
+            async for chunk in fn():
+                async with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            self._leave(self._async_flights, key, flight)
+            async with flight.cond:
+                flight.finished = True
+                flight.cond.notify_all()
+
+    # ---- metrics ---------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Request, execution and coalescing counters."""
+        with self._lock:
+            requests, executions = self.requests, self.executions
+            in_flight = len(self._flights) + len(self._async_flights)
+        coalesced = requests - executions
+        return {
+            "requests": requests,
+            "executions": executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": coalesced / requests if requests else 0.0,
+            "in_flight": in_flight,
+        }
+
+
+def model_params(llm, kwargs: dict = None) -> str:
+    """Identify the model and call options, the way LangChain's own LLM cache does."""
+    kwargs = kwargs or {}
+    bound = getattr(llm, "bound", None)
+    if hasattr(bound, "_get_llm_string"):  # a RunnableBinding, e.g. from bind_tools()
+        return bound._get_llm_string(**{**llm.kwargs, **kwargs})
+    if hasattr(llm, "_get_llm_string"):
+        return llm._get_llm_string(**kwargs)
+    return repr((llm, sorted(kwargs.items())))
+
+
+def request_key(llm, messages, **kwargs) -> str:
+    """
+    Build the single-flight key for a call: rendered prompt + model params + call options.
+
+    Args:
+        llm: The model that will answer
+        messages: The rendered prompt messages
+        **kwargs: Per-call options (stop sequences, bound tools, ...)
+
+    Returns:
+        A hex digest identifying the call
+    """
+    payload = json.dumps(
+        [messages_to_dict(messages), model_params(llm, kwargs)],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlightChatModel(DelegatingChatModel):
+    """
+    Chat model wrapper that coalesces identical concurrent calls to `llm`.
+
+    Use it anywhere a model is accepted:
+        llm = SingleFlightChatModel(llm=get_llm())
+        chain = get_chain("research", llm)
+
+    Invoke and stream calls are keyed separately, since one returns a
+    message and the other chunks. Metrics are available via stats().
+    """
+
+    flight: SingleFlight = Field(default_factory=SingleFlight)
+
+    def _key(self, messages, kwargs, mode):
+        return mode, request_key(self.llm, messages, **kwargs)
+
+    def _call(self, messages, **kwargs):
+        return self.flight.do(self._key(messages, kwargs, "invoke"),
+                              lambda: self._invoke_inner(messages, **kwargs))
+
+    async def _acall(self, messages, **kwargs):
+        return await self.flight.ado(self._key(messages, kwargs, "invoke"),
+                                     lambda: self._ainvoke_inner(messages, **kwargs))
+
+    def _call_stream(self, messages, **kwargs):
+        yield from self.flight.stream(self._key(messages, kwargs, "stream"),
+                                      lambda: self._stream_inner(messages, **kwargs))
+
+    async def _acall_stream(self, messages, **kwargs):
+        async for chunk in self.flight.astream(self._key(messages, kwargs, "stream"),
+                                               lambda: self._astream_inner(messages, **kwargs)):
+            yield chunk
+
+    def stats(self) -> dict:
+        """Coalescing metrics, merged with those of any wrapped wrappers."""
+        return {**super().stats(), "singleflight": self.flight.stats()}
@@ -0,0 +1,101 @@
+"""
+Streaming module for LangChain application.
+Streams text from a chain token-by-token and measures its timing.
+"""
+
+import time
+
+
+class StreamStats:
+    """
+    Timing for one streamed response.
+
+    Filled in by stream_text() as chunks arrive; read it once the
+    generator is exhausted.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.chunks = 0
+        self.output_tokens = None  # from usage metadata, when the model reports it
+
+    @property
+    def time_to_first_token(self) -> float:
+        """Seconds from the request until the first text arrived."""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    @property
+    def total_time(self) -> float:
+        """Seconds from the request until the stream ended."""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def tokens(self) -> int:
+        """Output tokens (reported usage, or the number of text chunks)."""
+        return self.output_tokens if self.output_tokens is not None else self.chunks
+
+    @property
+    def tokens_per_second(self) -> float:
+        """Output tokens per second of total time."""
+        total = self.total_time
+        return self.tokens / total if total > 0 else 0.0
+
+    def footer(self) -> str:
+        """
+        One-line timing summary for the end of a response.
+
+        Returns:
+            str: e.g. "⏱️ first token 0.42s · total 3.10s · 35.2 tok/s"
+        """
+        ttft = self.time_to_first_token
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+        return (f"⏱️ first token {ttft_text} · total {self.total_time:.2f}s · "
+                f"{self.tokens_per_second:.1f} tok/s")
+
+
+def _chunk_text(chunk) -> str:
+    """Extract the text from a streamed string or message chunk."""
+    if isinstance(chunk, str):
+        return chunk
+    return chunk.text
+
+
+def stream_text(chain, inputs, stats: StreamStats = None, config=None):
+    """
+    Stream a chain's output as text, recording timing as it goes.
+
+    The chain should end at the model (prompt | llm) so usage metadata is
+    visible; chains ending in StrOutputParser also work, with tokens
+    estimated from the number of chunks.
+
+    Args:
+        chain: The runnable to stream
+        inputs: Input for the chain
+        stats: Optional StreamStats to fill in
+        config: Optional runnable config
+
+    Yields:
+        str: Text chunks as they arrive
+    """
+    stats = stats if stats is not None else StreamStats()
+    stats.started = time.perf_counter()
+    try:
+        for chunk in chain.stream(inputs, config=config):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage and usage.get("output_tokens"):
+                stats.output_tokens = (stats.output_tokens or 0) + usage["output_tokens"]
+
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if stats.first_token_at is None:
+                stats.first_token_at = time.perf_counter()
+            stats.chunks += 1
+            yield text
+    finally:
+        stats.finished_at = time.perf_counter()
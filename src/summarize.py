@@ -0,0 +1,192 @@
+"""
+Summarization module for LangChain application.
+Map-reduce summarization for documents too long for a single prompt.
+
+The text is split on paragraph/sentence boundaries into token-budgeted
+chunks, the chunks are summarized concurrently, and the partial summaries
+are merged level by level until one remains. Each level is one concurrent
+batch, so wall-clock time grows with the depth of the reduce tree rather
+than with the length of the document.
+"""
+
+import re
+
+from src.profiling import profiled
+from src.tokens import count_tokens
+
+# Documents above this many (estimated) tokens are summarized with map-reduce
+LONG_DOCUMENT_TOKENS = 6000
+DEFAULT_CHUNK_TOKENS = 2000
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Length used for chunk and intermediate summaries (keeps detail for the final pass)
+INTERMEDIATE_LENGTH = "detailed"
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheaply estimate the number of tokens in a text (see src.tokens).
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return count_tokens(text)
+
+
+def _split_words(text: str, max_tokens: int) -> list:
+    """Split text without sentence breaks into word runs under the budget."""
+    pieces = []
+    current = []
+    size = 0
+    for word in text.split():
+        word_tokens = estimate_tokens(word)
+        if current and size + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _pack(pieces: list, max_tokens: int) -> list:
+    """
+    Greedily pack (separator, text) pieces into groups under the budget.
+
+    Returns:
+        list: Groups, each a list of (separator, text) pieces
+    """
+    groups = []
+    current = []
+    size = 0
+    for sep, piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        if current and size + piece_tokens > max_tokens:
+            groups.append(current)
+            current, size = [], 0
+        current.append((sep, piece))
+        size += piece_tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _join(group: list) -> str:
+    """Join a packed group back into text, keeping paragraph/sentence separators."""
+    return "".join(sep + piece if i else piece for i, (sep, piece) in enumerate(group))
+
+
+def split_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> list:
+    """
+    Split text into chunks of at most max_tokens (estimated).
+
+    Splits on paragraph boundaries first, then sentences, then words, and
+    packs adjacent pieces together so chunks are as full as the budget allows.
+
+    Args:
+        text: The text to split
+        max_tokens: Token budget per chunk
+
+    Returns:
+        list: The text chunks, in order
+    """
+    pieces = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(("\n\n", paragraph))
+            continue
+
+        sep = "\n\n"
+        for sentence in _SENTENCE_END.split(paragraph):
+            parts = [sentence] if estimate_tokens(sentence) <= max_tokens else _split_words(sentence, max_tokens)
+            for part in parts:
+                pieces.append((sep, part))
+                sep = " "
+
+    return [_join(group) for group in _pack(pieces, max_tokens)]
+
+
+def _reduce_groups(summaries: list, max_tokens: int) -> list:
+    """Group partial summaries for the next reduce level (at least two per group)."""
+    groups = [[piece for _, piece in group] for group in _pack([("\n\n", s) for s in summaries], max_tokens)]
+
+    # Guarantee progress: a lone (oversize) summary is merged with a neighbour
+    merged = []
+    for group in groups:
+        if merged and len(merged[-1]) == 1:
+            merged[-1].extend(group)
+        else:
+            merged.append(group)
+    if len(merged) > 1 and len(merged[-1]) == 1:
+        merged[-2].extend(merged.pop())
+    return ["\n\n".join(group) for group in merged]
+
+
+def map_reduce_summarize(chain, length: str, text: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                         max_concurrency: int = DEFAULT_MAX_CONCURRENCY, profile: bool = None,
+                         final_chain=None) -> str:
+    """
+    Summarize a long text with concurrent map and hierarchical reduce steps.
+
+    Args:
+        chain: Summarizer runnable taking {"length", "text"} and returning a string
+        length: Final summary length ("brief" or "detailed")
+        text: The text to summarize
+        chunk_tokens: Token budget per chunk and per reduce group
+        max_concurrency: Maximum concurrent model calls per level
+        profile: Profile this call (True), never (False) or when sampled (None; see src/profiling.py)
+        final_chain: Summarizer for the final step only, e.g. one routed by length
+            (default: chain, which then runs every step)
+
+    Returns:
+        str: The final summary
+    """
+    with profiled("summarize.map_reduce", profile):
+        return _map_reduce(chain, length, text, chunk_tokens, max_concurrency, final_chain or chain)
+
+
+def _map_reduce(chain, length: str, text: str, chunk_tokens: int, max_concurrency: int, final_chain) -> str:
+    return final_chain.invoke({"length": length, "text": reduce_text(chain, text, chunk_tokens, max_concurrency)})
+
+
+def reduce_text(chain, text: str, chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> str:
+    """
+    Run the map and intermediate reduce steps, leaving the text for the final summary.
+
+    Callers that stream the final summary run this first, then send the
+    result through the summarizer prompt themselves.
+
+    Args:
+        chain: Summarizer runnable taking {"length", "text"} and returning a string
+        text: The text to summarize
+        chunk_tokens: Token budget per chunk and per reduce group
+        max_concurrency: Maximum concurrent model calls per level
+
+    Returns:
+        str: text itself if it fits one chunk, else the merged partial summaries (fitting one prompt)
+    """
+    config = {"max_concurrency": max_concurrency}
+    chunks = split_text(text, chunk_tokens)
+    if len(chunks) <= 1:
+        return text
+
+    # Map: summarize every chunk concurrently
+    summaries = chain.batch([{"length": INTERMEDIATE_LENGTH, "text": c} for c in chunks], config=config)
+
+    # Reduce: merge summaries level by level until they fit one prompt
+    while True:
+        groups = _reduce_groups(summaries, chunk_tokens)
+        if len(groups) == 1:
+            return groups[0]
+        summaries = chain.batch([{"length": INTERMEDIATE_LENGTH, "text": g} for g in groups], config=config)
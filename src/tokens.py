@@ -0,0 +1,340 @@
+"""
+Tokens module for LangChain application.
+Fast local token estimates and prompt-budget enforcement.
+
+Bedrock only reports token counts after a call, so this module estimates
+them locally, fast enough to run on every request (hundreds of MB/s on
+long text):
+
+- per model family, prose is costed at that family's characters per
+  token, with punctuation, digits and non-ASCII text weighted separately,
+- estimates are cached per message text, so a growing chat history is
+  only measured once per message,
+- each family's estimator calibrates itself against the input token
+  counts Bedrock reports (observe()).
+
+with_token_budget() puts a pre-flight check in front of a model that
+truncates (oldest history first) or rejects a prompt that would not fit,
+before any network I/O.
+"""
+
+import functools
+import string
+import threading
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, convert_to_messages
+from langchain_core.runnables import RunnableLambda
+
+# Per-family estimate parameters: characters of prose per token, and tokens per
+# punctuation mark, per digit and per extra UTF-8 byte of non-ASCII text
+MODEL_FAMILIES = {
+    "nova": {"chars_per_token": 4.0, "punctuation": 0.5, "digit": 0.35, "non_ascii": 0.5},
+    "claude": {"chars_per_token": 3.5, "punctuation": 0.6, "digit": 0.4, "non_ascii": 0.6},
+    "llama": {"chars_per_token": 3.8, "punctuation": 0.5, "digit": 0.34, "non_ascii": 0.5},
+    "titan": {"chars_per_token": 4.2, "punctuation": 0.5, "digit": 0.35, "non_ascii": 0.5},
+    "mistral": {"chars_per_token": 3.6, "punctuation": 0.5, "digit": 0.5, "non_ascii": 0.6},
+    "default": {"chars_per_token": 4.0, "punctuation": 0.5, "digit": 0.35, "non_ascii": 0.5},
+}
+
+# Context windows in tokens, matched by substring of the model id
+CONTEXT_WINDOWS = {
+    "nova-micro": 128_000,
+    "nova-lite": 300_000,
+    "nova-pro": 300_000,
+    "claude": 200_000,
+    "llama": 128_000,
+    "titan": 8_000,
+    "mistral": 32_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+DEFAULT_OUTPUT_RESERVE = 2000
+
+# Framing tokens added per message (role markers) and once per prompt
+MESSAGE_OVERHEAD = 4
+PROMPT_OVERHEAD = 3
+
+# Texts at least this long are cached (shorter ones are cheaper to recount)
+CACHE_MIN_CHARS = 256
+TRUNCATION_MARKER = " [truncated]"
+
+_PUNCTUATION_BYTES = string.punctuation.encode()
+_DIGIT_BYTES = string.digits.encode()
+
+
+class PromptTooLongError(ValueError):
+    """Raised by the pre-flight check when a prompt exceeds its token budget."""
+
+    def __init__(self, tokens: int, budget: int):
+        super().__init__(f"Prompt is about {tokens} tokens, over the budget of {budget}")
+        self.tokens = tokens
+        self.budget = budget
+
+
+def model_family(model_id: str) -> str:
+    """Map a Bedrock model id (e.g. "us.amazon.nova-lite-v1:0") to a MODEL_FAMILIES key."""
+    model_id = (model_id or "").lower()
+    if "claude" in model_id or "anthropic" in model_id:
+        return "claude"
+    for family in ("nova", "llama", "titan", "mistral"):
+        if family in model_id:
+            return family
+    return "default"
+
+
+def context_window(model_id: str) -> int:
+    """The context window of a model, in tokens."""
+    model_id = (model_id or "").lower()
+    for name, window in CONTEXT_WINDOWS.items():
+        if name in model_id:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def model_id_of(llm) -> str:
+    """Find the Bedrock model id of a (possibly wrapped or tool-bound) model, or None."""
+    for _ in range(10):
+        for attr in ("model_id", "model"):
+            value = getattr(llm, attr, None)
+            if isinstance(value, str):
+                return value
+        inner = getattr(llm, "llm", None) or getattr(llm, "bound", None)
+        if inner is None:
+            return None
+        llm = inner
+    return None
+
+
+def _count_characters(text: str):
+    """Return (punctuation, digits, extra UTF-8 bytes) in text."""
+    # bytes.translate() deletes at memory speed, unlike str.translate() or a regex
+    data = text.encode("utf-8", "surrogatepass")
+    without_punctuation = data.translate(None, _PUNCTUATION_BYTES)
+    punctuation = len(data) - len(without_punctuation)
+    digits = len(without_punctuation) - len(without_punctuation.translate(None, _DIGIT_BYTES))
+    return punctuation, digits, len(data) - len(text)
+
+
+class TokenEstimator:
+    """
+    Estimates tokens for one model family.
+
+    Args:
+        family: A MODEL_FAMILIES key
+        cache_size: Distinct long texts whose counts are cached
+    """
+
+    def __init__(self, family: str = "default", cache_size: int = 4096):
+        self.family = family
+        profile = MODEL_FAMILIES.get(family, MODEL_FAMILIES["default"])
+        self.chars_per_token = profile["chars_per_token"]
+        self.punctuation = profile["punctuation"]
+        self.digit = profile["digit"]
+        self.non_ascii = profile["non_ascii"]
+        self.scale = 1.0  # correction learned from reported usage
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._cached = functools.lru_cache(maxsize=cache_size)(self._raw_count)
+
+    def _raw_count(self, text: str) -> float:
+        punctuation, digits, extra_bytes = _count_characters(text)
+        prose = len(text) - punctuation - digits
+        symbols = punctuation * self.punctuation + digits * self.digit + extra_bytes * self.non_ascii
+        return prose / self.chars_per_token + symbols
+
+    def count(self, text: str) -> int:
+        """Estimated tokens in a string."""
+        if not text:
+            return 0
+        raw = self._cached(text) if len(text) >= CACHE_MIN_CHARS else self._raw_count(text)
+        return max(1, round(raw * self.scale))
+
+    def count_messages(self, messages) -> int:
+        """Estimated prompt tokens for a list of messages, framing included."""
+        return PROMPT_OVERHEAD + sum(self.count_message(m) for m in messages)
+
+    def count_message(self, message) -> int:
+        """Estimated tokens for one message, framing included."""
+        content = message.content
+        return MESSAGE_OVERHEAD + self.count(content if isinstance(content, str) else message.text)
+
+    def observe(self, estimated: int, actual: int, weight: float = 0.1) -> None:
+        """
+        Calibrate against a count reported by the model (e.g. usage_metadata input_tokens).
+
+        Args:
+            estimated: What count_messages() predicted for the prompt
+            actual: The input tokens the model reported
+            weight: How far one observation moves the correction (moving average)
+        """
+        if estimated <= 0 or actual <= 0:
+            return
+        ratio = actual / (estimated / self.scale)
+        with self._lock:
+            self.scale += weight * (min(2.0, max(0.5, ratio)) - self.scale)
+            self.samples += 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text (keeping its start) to about max_tokens, marking the cut."""
+        if self.count(text) <= max_tokens:
+            return text
+        budget = max(0, max_tokens - self.count(TRUNCATION_MARKER))
+        end = len(text)
+        for _ in range(4):  # refine the cut point from the measured ratio
+            tokens = self.count(text[:end])
+            if tokens <= budget:
+                break
+            end = int(end * budget / tokens * 0.98)
+        return text[:end] + TRUNCATION_MARKER
+
+
+_estimators = {}
+_estimators_lock = threading.Lock()
+
+
+def get_estimator(model=None) -> TokenEstimator:
+    """
+    Get the shared estimator for a model family.
+
+    Args:
+        model: A model id, a chat model (possibly wrapped), a family name, or None
+
+    Returns:
+        TokenEstimator: One instance per family, so calibration is shared
+    """
+    if model is None or isinstance(model, str) and model in MODEL_FAMILIES:
+        family = model or "default"
+    else:
+        family = model_family(model if isinstance(model, str) else model_id_of(model))
+    estimator = _estimators.get(family)
+    if estimator is None:
+        with _estimators_lock:
+            estimator = _estimators.setdefault(family, TokenEstimator(family))
+    return estimator
+
+
+def count_tokens(text: str, model=None) -> int:
+    """
+    Estimate the tokens in a string.
+
+    Args:
+        text: The text to measure
+        model: Model id, chat model or family to estimate for (default: generic)
+
+    Returns:
+        int: Estimated token count
+    """
+    return get_estimator(model).count(text)
+
+
+def count_message_tokens(messages, model=None) -> int:
+    """
+    Estimate the prompt tokens of a message list.
+
+    Args:
+        messages: LangChain messages
+        model: Model id, chat model or family to estimate for (default: generic)
+
+    Returns:
+        int: Estimated token count, including per-message framing
+    """
+    return get_estimator(model).count_messages(messages)
+
+
+def input_budget(llm, output_reserve: int = None) -> int:
+    """Tokens available for the prompt: the model's context window minus its output budget."""
+    bound = getattr(llm, "bound", llm)
+    reserve = output_reserve or getattr(bound, "max_tokens", None) or DEFAULT_OUTPUT_RESERVE
+    return context_window(model_id_of(llm)) - reserve
+
+
+def fit_messages(messages, max_tokens: int, estimator: TokenEstimator = None, on_overflow: str = "truncate") -> list:
+    """
+    Make a prompt fit its token budget.
+
+    Truncation keeps system messages and the latest message, drops the
+    oldest history first (never leaving a tool result without its call,
+    and always starting the conversation with a user turn), and finally
+    cuts the latest message's text.
+
+    Args:
+        messages: The prompt messages
+        max_tokens: The prompt's token budget
+        estimator: Estimator to count with (default: generic)
+        on_overflow: "truncate" or "reject"
+
+    Returns:
+        list: Messages that fit (the input list if it already fits)
+
+    Raises:
+        PromptTooLongError: If on_overflow is "reject" and the prompt is over budget
+    """
+    estimator = estimator or get_estimator()
+    sizes = [estimator.count_message(m) for m in messages]
+    total = PROMPT_OVERHEAD + sum(sizes)
+    if total <= max_tokens:
+        return messages
+    if on_overflow == "reject":
+        raise PromptTooLongError(total, max_tokens)
+
+    system = [i for i, m in enumerate(messages) if isinstance(m, SystemMessage)]
+    history = [i for i in range(len(messages) - 1) if i not in system]
+    dropped = set()
+    for index in history:
+        if total <= max_tokens:
+            break
+        dropped.add(index)
+        total -= sizes[index]
+    if dropped:
+        # What remains must start with a user turn, so no tool result loses its call
+        for index in history:
+            if index in dropped:
+                continue
+            if isinstance(messages[index], HumanMessage):
+                break
+            dropped.add(index)
+            total -= sizes[index]
+
+    kept = [m for i, m in enumerate(messages) if i not in dropped]
+    if total > max_tokens:
+        last = kept[-1]
+        room = max_tokens - (total - sizes[len(messages) - 1]) - MESSAGE_OVERHEAD
+        if room <= 0:
+            raise PromptTooLongError(total, max_tokens)
+        kept[-1] = last.model_copy(update={"content": estimator.truncate(last.text, room)})
+    return kept
+
+
+def _to_messages(prompt) -> list:
+    if hasattr(prompt, "to_messages"):
+        return prompt.to_messages()
+    if isinstance(prompt, str):
+        return [HumanMessage(content=prompt)]
+    if isinstance(prompt, BaseMessage):
+        return [prompt]
+    return convert_to_messages(prompt)
+
+
+def with_token_budget(llm, max_input_tokens: int = None, on_overflow: str = "truncate"):
+    """
+    Put a pre-flight token check in front of a model.
+
+    Usage:
+        chain = prompt | with_token_budget(llm) | StrOutputParser()
+
+    Args:
+        llm: The chat model
+        max_input_tokens: Prompt budget (default: context window minus max_tokens)
+        on_overflow: "truncate" (drop oldest history, then cut the last message) or "reject"
+
+    Returns:
+        Runnable: prompt -> fitted messages -> llm
+    """
+    if on_overflow not in ("truncate", "reject"):
+        raise ValueError(f"Unknown on_overflow: {on_overflow}. Available: ['truncate', 'reject']")
+    estimator = get_estimator(llm)
+    budget = max_input_tokens or input_budget(llm)
+
+    def preflight(prompt):
+        return fit_messages(_to_messages(prompt), budget, estimator, on_overflow)
+
+    return RunnableLambda(preflight, name="token_budget") | llm
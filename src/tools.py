@@ -3,9 +3,11 @@ Tools module for LangChain application.
 Contains custom tools for calculator, time, and word counting.
 """
 
-from langchain.tools import tool
+from langchain_core.tools import tool
 from datetime import datetime
 
+from src.profiling import profiled
+
 
 @tool
 def calculator(expression: str) -> str:
@@ -84,13 +86,51 @@ def get_tool_by_name(name: str):
     return tools.get(name)
 
 
-def invoke_tool(tool_name: str, tool_input: str) -> str:
+def get_tool_arg_name(tool_obj) -> str:
+    """
+    Get the name of a tool's first argument.
+
+    Args:
+        tool_obj: The tool object
+
+    Returns:
+        str: The first argument name
+    """
+    # tool.args is cached by the tool, unlike model_json_schema()
+    return next(iter(tool_obj.args))
+
+
+def parse_tool_call(text: str) -> tuple:
+    """
+    Parse a free-text TOOL:/INPUT: tool request from a model response.
+
+    Args:
+        text: The model's response text
+
+    Returns:
+        tuple: (tool_name, tool_input), or (None, None) if no tool was requested
+    """
+    if "TOOL:" not in text or "INPUT:" not in text:
+        return None, None
+
+    tool_name = None
+    tool_input = None
+    for line in text.strip().split("\n"):
+        if line.startswith("TOOL:"):
+            tool_name = line.replace("TOOL:", "").strip()
+        if line.startswith("INPUT:"):
+            tool_input = line.replace("INPUT:", "").strip()
+    return tool_name, tool_input
+
+
+def invoke_tool(tool_name: str, tool_input: str, profile: bool = None) -> str:
     """
     Invoke a tool by name with the given input.
 
     Args:
         tool_name: Name of the tool to invoke
         tool_input: Input string for the tool
+        profile: Profile this call (True), never (False) or when sampled (None; see src/profiling.py)
 
     Returns:
         str: Tool result or error message
@@ -101,8 +141,9 @@ def invoke_tool(tool_name: str, tool_input: str) -> str:
 
     try:
         # Get the first argument name dynamically
-        arg_name = list(tool_obj.args_schema.model_json_schema()['properties'].keys())[0]
-        result = tool_obj.invoke({arg_name: tool_input})
+        arg_name = get_tool_arg_name(tool_obj)
+        with profiled(f"tool.{tool_name}", profile):
+            result = tool_obj.invoke({arg_name: tool_input})
         return result if isinstance(result, str) else str(result)
     except Exception as e:
         return f"Error invoking tool: {str(e)}"
@@ -0,0 +1,215 @@
+"""
+Warm-up module for LangChain application.
+Does the first request's one-off work at startup, before traffic arrives.
+
+The first request after a deploy otherwise pays for botocore loading its
+service model and resolving credentials, the TCP and TLS handshakes, LCEL
+chain construction and pydantic schema generation for every tool. warm_up()
+does all of that up front:
+
+- connect: resolve credentials and open pooled connections on every
+  Bedrock client under the model (wrappers, fallbacks and downgrades),
+- prompts: build the named prompts with get_prompt,
+- chains: build every registered get_chain chain and its input schema,
+- tools: generate each tool's argument and tool-calling schemas,
+- prime (optional): send one tiny request through the model (or through
+  the server's memory chatbot, in a session that is then deleted).
+
+Cluster workers (src/cluster.py) answer /chat with their own chatbot, so
+each one runs warm_up_worker() at startup: it preconnects the process's
+shared Bedrock clients and primes the worker's chatbot.
+
+Each step is timed and a failing step is reported, not raised, so a
+missing credential does not stop the server from starting:
+
+    report = warm_up(get_llm(), get_prompt, prime=True)
+    report["steps"]     # {"connect": 0.21, "prompts": 0.001, ...} in seconds
+"""
+
+import time
+
+DEFAULT_CONNECTIONS = 4
+PROMPTS = ("assistant", "summarizer")
+PRIME_MESSAGE = "Reply with OK."
+PRIME_SESSION = "__warmup__"
+
+_WRAPPED = ("llm", "fallback", "downgrade", "bound")
+
+
+def bedrock_clients(llm) -> list:
+    """The botocore clients used by a model, looking through wrappers, fallbacks and bindings."""
+    clients, seen, pending = [], set(), [llm]
+    while pending:
+        model = pending.pop()
+        if model is None or id(model) in seen:
+            continue
+        seen.add(id(model))
+        for name in ("client", "bedrock_client"):
+            client = getattr(model, name, None)
+            if client is not None and hasattr(client, "meta") and client not in clients:
+                clients.append(client)
+        pending.extend(getattr(model, name, None) for name in _WRAPPED)
+    return clients
+
+
+def preconnect(client, connections: int = DEFAULT_CONNECTIONS) -> int:
+    """
+    Resolve a botocore client's credentials and open pooled connections to its endpoint.
+
+    Args:
+        client: A botocore client
+        connections: Connections to open (and return to the pool)
+
+    Returns:
+        int: Connections opened
+    """
+    credentials = getattr(client._request_signer, "_credentials", None)
+    if credentials is not None:
+        credentials.get_frozen_credentials()  # refreshable credentials resolve here, not on first call
+
+    endpoint = client._endpoint
+    pool = endpoint.http_session._manager.connection_from_url(endpoint.host)
+    opened = [pool._get_conn() for _ in range(connections)]
+    try:
+        for connection in opened:
+            connection.connect()
+    finally:
+        for connection in opened:
+            pool._put_conn(connection)
+    return len(opened)
+
+
+def _connect(llm, connections: int) -> dict:
+    clients = bedrock_clients(llm)
+    return {"clients": len(clients), "connections": sum(preconnect(c, connections) for c in clients)}
+
+
+def _prompts(get_prompt, names, server) -> dict:
+    for name in names:
+        if server is not None:
+            server._prompt(name)
+        else:
+            get_prompt(name)
+    return {"prompts": len(names)}
+
+
+def _chains(llm, server) -> dict:
+    from src.chains import CHAINS, get_chain
+
+    for chain_type in list(CHAINS):
+        chain = get_chain(chain_type, server.chain_llm(chain_type) if server is not None else llm)
+        chain.get_input_schema().model_json_schema()
+        if server is not None:
+            server._chains.setdefault(chain_type, chain)
+    return {"chains": len(CHAINS)}
+
+
+def _tools() -> dict:
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    from src.tools import get_all_tools
+
+    tools = get_all_tools()
+    for tool in tools:
+        _ = tool.args  # cached by the tool
+        tool.tool_call_schema.model_json_schema()
+        convert_to_openai_tool(tool)
+    return {"tools": len(tools)}
+
+
+def _prime_chatbot(chatbot) -> dict:
+    from src.memory import clear_session
+
+    config = {"configurable": {"session_id": PRIME_SESSION}}
+    try:
+        for _ in chatbot.stream({"input": PRIME_MESSAGE}, config=config):  # the server streams
+            pass
+    finally:
+        clear_session(PRIME_SESSION)
+    return {"via": "memory_chatbot"}
+
+
+def _prime(llm, server) -> dict:
+    if server is not None and server.cluster is None:
+        return _prime_chatbot(server.chatbot)
+    llm.invoke(PRIME_MESSAGE)  # with a cluster, this model still serves the other routes
+    return {"via": "llm"}
+
+
+def _run(steps) -> dict:
+    """Run (name, step) pairs, timing each and reporting a failing step instead of raising."""
+    report = {"steps": {}, "details": {}, "errors": {}}
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            report["details"][name] = step()
+        except Exception as e:
+            report["errors"][name] = f"{type(e).__name__}: {e}"
+        report["steps"][name] = time.perf_counter() - step_started
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def warm_up(llm, get_prompt=None, server=None, prompts=PROMPTS, chains: bool = True, tools: bool = True,
+            connect: bool = True, prime: bool = False, connections: int = DEFAULT_CONNECTIONS) -> dict:
+    """
+    Do the one-off work of a first request before serving.
+
+    Args:
+        llm: The model to warm up
+        get_prompt: Prompt selector (e.g. langchain_chatbot_lab.get_prompt), for the prompts step
+        server: A LabServer whose prompt and chain caches to fill (its llm and get_prompt are used)
+        prompts: Prompt names to build
+        chains: Build every registered chain
+        tools: Generate the tool schemas
+        connect: Resolve credentials and open pooled Bedrock connections
+        prime: Send one tiny request through the model (or the server's memory chatbot)
+        connections: Connections to open per Bedrock client
+
+    Returns:
+        dict: {"steps": seconds per step, "details": per step, "errors": per failed step, "seconds": total}
+    """
+    if server is not None:
+        llm, get_prompt = server.llm, server.get_prompt
+    steps = []
+    if connect:
+        steps.append(("connect", lambda: _connect(llm, connections)))
+    if prompts and get_prompt is not None:
+        steps.append(("prompts", lambda: _prompts(get_prompt, prompts, server)))
+    if chains:
+        steps.append(("chains", lambda: _chains(llm, server)))
+    if tools:
+        steps.append(("tools", _tools))
+    if prime:
+        steps.append(("prime", lambda: _prime(llm, server)))
+
+    return _run(steps)
+
+
+def warm_up_worker(chatbot, prime: bool = False, connect: bool = True,
+                   connections: int = DEFAULT_CONNECTIONS) -> dict:
+    """
+    Warm up a cluster worker process before it takes turns.
+
+    Args:
+        chatbot: The worker's memory chatbot
+        prime: Send one tiny turn through the chatbot (in a session that is then deleted)
+        connect: Resolve credentials and open pooled connections on the process's shared Bedrock clients
+        connections: Connections to open per Bedrock client
+
+    Returns:
+        dict: As for warm_up()
+    """
+    from src.llm import shared_clients
+
+    def connect_shared():
+        clients = shared_clients()
+        return {"clients": len(clients), "connections": sum(preconnect(c, connections) for c in clients)}
+
+    steps = []
+    if connect:
+        steps.append(("connect", connect_shared))
+    if prime:
+        steps.append(("prime", lambda: _prime_chatbot(chatbot)))
+    return _run(steps)
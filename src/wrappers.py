@@ -0,0 +1,167 @@
+"""
+Wrappers module for LangChain application.
+Base class for chat models that wrap another model.
+
+A DelegatingChatModel is a regular LangChain chat model, so it drops into
+`prompt | llm` chains, memory chatbots and the server unchanged. Subclasses
+override the _call/_acall/_call_stream/_acall_stream hooks to add
+behaviour (coalescing, rate limiting, ...) around the wrapped model.
+
+invoke_model()/stream_model() (and their async versions) call a model on
+already-rendered messages, for code that picks the model per call.
+"""
+
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _direct(llm):
+    """
+    The chat model to call directly and its bound kwargs, or (None, None).
+
+    Calling a chat model's _generate/_stream directly skips a second round
+    of callback and config handling per wrapper layer; other runnables go
+    through their public invoke/stream.
+    """
+    if isinstance(llm, BaseChatModel):
+        return llm, {}
+    bound = getattr(llm, "bound", None)
+    if isinstance(bound, BaseChatModel):  # a RunnableBinding, e.g. from bind_tools()
+        return bound, llm.kwargs
+    return None, None
+
+
+def invoke_model(llm, messages, **kwargs):
+    """Invoke a model on already-rendered messages; returns an AIMessage."""
+    model, bound = _direct(llm)
+    if model is None:
+        return llm.invoke(messages, **kwargs)
+    return model._generate(messages, **{**bound, **kwargs}).generations[0].message
+
+
+async def ainvoke_model(llm, messages, **kwargs):
+    """Async version of invoke_model()."""
+    model, bound = _direct(llm)
+    if model is None:
+        return await llm.ainvoke(messages, **kwargs)
+    return (await model._agenerate(messages, **{**bound, **kwargs})).generations[0].message
+
+
+def stream_model(llm, messages, **kwargs):
+    """Stream AIMessageChunks from a model on already-rendered messages."""
+    model, bound = _direct(llm)
+    if model is None:
+        yield from llm.stream(messages, **kwargs)
+        return
+    for generation in model._stream(messages, **{**bound, **kwargs}):
+        yield generation.message
+
+
+async def astream_model(llm, messages, **kwargs):
+    """Async version of stream_model()."""
+    model, bound = _direct(llm)
+    if model is None:
+        async for chunk in llm.astream(messages, **kwargs):
+            yield chunk
+        return
+    async for generation in model._astream(messages, **{**bound, **kwargs}):
+        yield generation.message
+
+
+class DelegatingChatModel(BaseChatModel):
+    """
+    A chat model that forwards every call to an inner model (`llm`).
+
+    Wrappers compose: DelegatingChatModel(llm=OtherWrapper(llm=bedrock)).
+    """
+
+    llm: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{type(self).__name__}({getattr(self.llm, '_llm_type', type(self.llm).__name__)})"
+
+    @property
+    def _identifying_params(self) -> dict:
+        # Lets LangChain's cache (and single-flight keys) tell wrapped models apart
+        llm, bound = self.llm, {}
+        if hasattr(llm, "bound"):  # a RunnableBinding, e.g. from bind_tools()
+            llm, bound = llm.bound, llm.kwargs
+        params = getattr(llm, "_identifying_params", None)
+        return {
+            "llm_type": getattr(llm, "_llm_type", type(llm).__name__),
+            "llm": params if params is not None else repr(llm),
+            "bound": bound,
+        }
+
+    # ---- calling the inner model -----------------------------------------
+
+    def _invoke_inner(self, messages, **kwargs):
+        return invoke_model(self.llm, messages, **kwargs)
+
+    async def _ainvoke_inner(self, messages, **kwargs):
+        return await ainvoke_model(self.llm, messages, **kwargs)
+
+    def _stream_inner(self, messages, **kwargs):
+        return stream_model(self.llm, messages, **kwargs)
+
+    def _astream_inner(self, messages, **kwargs):
+        return astream_model(self.llm, messages, **kwargs)
+
+    # ---- hooks for subclasses --------------------------------------------
+
+    def _call(self, messages, **kwargs):
+        """Handle an invoke; returns an AIMessage."""
+        return self._invoke_inner(messages, **kwargs)
+
+    async def _acall(self, messages, **kwargs):
+        """Handle an async invoke; returns an AIMessage."""
+        return await self._ainvoke_inner(messages, **kwargs)
+
+    def _call_stream(self, messages, **kwargs):
+        """Handle a stream; yields AIMessageChunks."""
+        yield from self._stream_inner(messages, **kwargs)
+
+    async def _acall_stream(self, messages, **kwargs):
+        """Handle an async stream; yields AIMessageChunks."""
+        async for chunk in self._astream_inner(messages, **kwargs):
+            yield chunk
+
+    def stats(self) -> dict:
+        """Metrics from this wrapper and every wrapper beneath it, keyed by wrapper."""
+        inner = getattr(self.llm, "stats", None)
+        return dict(inner()) if callable(inner) else {}
+
+    # ---- BaseChatModel plumbing ------------------------------------------
+
+    @staticmethod
+    def _call_kwargs(stop, kwargs) -> dict:
+        return dict(kwargs, stop=stop) if stop is not None else dict(kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self._call(messages, **self._call_kwargs(stop, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = await self._acall(messages, **self._call_kwargs(stop, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        for chunk in self._call_stream(messages, **self._call_kwargs(stop, kwargs)):
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        async for chunk in self._acall_stream(messages, **self._call_kwargs(stop, kwargs)):
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=generation)
+            yield generation
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind tools on the inner model, keeping this wrapper around it."""
+        return self.model_copy(update={"llm": self.llm.bind_tools(tools, **kwargs)})
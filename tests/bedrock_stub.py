@@ -0,0 +1,168 @@
+"""
+Local HTTP stand-in for the bedrock-runtime endpoint, used by tests.
+
+Answers InvokeModel, Converse and ConverseStream requests with a canned
+Nova-style reply (streamed as one event per word),
+records which client connections were used, and can inject faults
+(HTTP errors such as ThrottlingException) or latency. With `capacity`
+set it behaves like a quota: requests beyond that many in flight get a
+ThrottlingException.
+"""
+
+import json
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ERROR_TYPES = {
+    429: "ThrottlingException",
+    500: "InternalServerException",
+    503: "ServiceUnavailableException",
+}
+
+
+def _event(event_type: str, payload: dict) -> bytes:
+    """Encode one AWS event-stream message (as used by ConverseStream)."""
+    headers = b""
+    for name, value in ((":event-type", event_type), (":content-type", "application/json"),
+                        (":message-type", "event")):
+        headers += bytes([len(name)]) + name.encode() + b"\x07" + struct.pack(">H", len(value)) + value.encode()
+    body = json.dumps(payload).encode()
+    prelude = struct.pack(">II", 16 + len(headers) + len(body), len(headers))
+    prelude += struct.pack(">I", zlib.crc32(prelude))
+    message = prelude + headers + body
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def _stream_events(reply: str, delay: float) -> bytes:
+    words = reply.split(" ")
+    events = [_event("messageStart", {"role": "assistant"})]
+    for n, word in enumerate(words):
+        text = word if n == 0 else " " + word
+        events.append(_event("contentBlockDelta", {"contentBlockIndex": 0, "delta": {"text": text}}))
+    events += [
+        _event("contentBlockStop", {"contentBlockIndex": 0}),
+        _event("messageStop", {"stopReason": "end_turn"}),
+        _event("metadata", {"usage": {"inputTokens": 10, "outputTokens": 5, "totalTokens": 15},
+                            "metrics": {"latencyMs": int(delay * 1000)}}),
+    ]
+    return b"".join(events)
+
+
+class BedrockStub:
+    """
+    A threaded local Bedrock endpoint.
+
+    Usage:
+        with BedrockStub(reply="hi") as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+    """
+
+    def __init__(self, reply: str = "stub reply", delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.faults = []          # status codes returned (FIFO) before succeeding
+        self.fault_rate = 0.0     # or: fail this fraction of requests (evenly spread) with fault_status
+        self.fault_status = 503
+        self._fault_credit = 0.0
+        self.capacity = None      # or: throttle requests beyond this many in flight
+        self.active = 0
+        self.peak_active = 0
+        self.throttled = 0
+        self.requests = 0
+        self.connections = set()  # client (host, port) pairs seen
+        self.paths = []           # request paths, e.g. /model/<model id>/converse
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _next_status(self) -> int:
+        with self._lock:
+            self.requests += 1
+            if self.faults:
+                return self.faults.pop(0)
+            self._fault_credit += self.fault_rate
+            if self._fault_credit >= 1.0:
+                self._fault_credit -= 1.0
+                return self.fault_status
+        return 200
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with stub._lock:
+                    stub.connections.add(self.client_address)
+                    stub.paths.append(self.path)
+                    stub.active += 1
+                    stub.peak_active = max(stub.peak_active, stub.active)
+                    over_capacity = stub.capacity is not None and stub.active > stub.capacity
+                    if over_capacity:
+                        stub.requests += 1
+                        stub.throttled += 1
+                try:
+                    if over_capacity:
+                        status = 429
+                    else:
+                        if stub.delay:
+                            time.sleep(stub.delay)
+                        status = stub._next_status()
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+                if status == 200:
+                    payload = {
+                        "output": {"message": {"role": "assistant", "content": [{"text": stub.reply}]}},
+                        "stopReason": "end_turn",
+                        "usage": {"inputTokens": 10, "outputTokens": 5, "totalTokens": 15},
+                        "metrics": {"latencyMs": int(stub.delay * 1000)},
+                    }
+                else:
+                    payload = {"message": f"Injected fault {status}"}
+
+                body = json.dumps(payload).encode()
+                content_type = "application/json"
+                if status == 200 and self.path.endswith("/converse-stream"):
+                    body = _stream_events(stub.reply, stub.delay)
+                    content_type = "application/vnd.amazon.eventstream"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if status != 200:
+                    self.send_header("x-amzn-ErrorType", ERROR_TYPES.get(status, "ValidationException"))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
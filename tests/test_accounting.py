@@ -0,0 +1,211 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.accounting import (AccountingChatModel, BudgetExceededError, UsageLedger, configure_accounting,
+                            get_ledger, reset_accounting)
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import configure_bedrock_client, get_llm, reset_llm
+from src.memory import build_memory_chatbot, chat, memory_store
+from src.router import NOVA_LITE, NOVA_MICRO
+from src.singleflight import SingleFlightChatModel
+from tests.bedrock_stub import BedrockStub
+from tests.test_server import request, run_with_server
+
+PRICES = {"cheap": (1.0, 2.0), "dear": (10.0, 20.0)}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def usage(input_tokens, output_tokens):
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
+
+
+class TestLedger:
+    """Tests for usage totals and budgets"""
+
+    def test_totals_per_session_tenant_and_model(self):
+        """Verify calls are charged to their session, tenant and model"""
+        ledger = UsageLedger(prices=PRICES)
+        ledger.record("s1", "acme", "dear", usage(1000, 500))
+        ledger.record("s1", "acme", "cheap", usage(1000, 0))
+        ledger.record("s2", None, "cheap", usage(0, 1000))
+        ledger.record(None, None, "cheap", None)  # no usage metadata
+        assert ledger.usage("sessions", "s1") == {"input_tokens": 2000, "output_tokens": 500,
+                                                  "cost_usd": 21.0, "calls": 2}
+        assert ledger.usage("tenants", "acme")["cost_usd"] == 21.0
+        assert ledger.usage("models", "cheap")["calls"] == 2
+        assert ledger.stats()["total"]["calls"] == 3
+
+    def test_concurrent_recording(self):
+        """Verify no usage is lost when many threads record at once"""
+        ledger = UsageLedger(prices=PRICES)
+
+        def worker(n):
+            for _ in range(2000):
+                ledger.record(f"s{n % 4}", "acme", "cheap", usage(3, 1))
+            ledger.usage("tenants", "acme")  # readers fold while others record
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert ledger.usage("tenants", "acme")["calls"] == 16000
+        assert ledger.usage("sessions", "s0")["input_tokens"] == 2 * 2000 * 3
+
+    def test_budgets(self):
+        """Verify calls are allowed, downgraded past downgrade_at, and rejected past the limit"""
+        ledger = UsageLedger(prices=PRICES, session_tokens=1000, downgrade_at=0.8)
+        assert ledger.check("s1", None, 100) == "ok"
+        ledger.record("s1", None, "cheap", usage(600, 100))
+        assert ledger.check("s1", None, 100) == "downgrade"
+        with pytest.raises(BudgetExceededError) as error:
+            ledger.check("s1", None, 400)
+        assert (error.value.scope, error.value.measure, error.value.used) == ("session", "tokens", 700)
+        assert ledger.check("s2", None, 400) == "ok"
+        assert ledger.check(None, None, 10**9) == "ok"
+        assert (ledger.rejected, ledger.downgraded) == (1, 1)
+
+    def test_tenant_cost_budgets(self):
+        """Verify tenant cost limits, with per-tenant overrides"""
+        ledger = UsageLedger(prices=PRICES, tenant_cost_usd=1.0, tenant_budgets={"big": {"cost_usd": 100.0}})
+        ledger.record("a", "small", "cheap", usage(500, 0))
+        ledger.record("b", "big", "cheap", usage(500, 0))
+        with pytest.raises(BudgetExceededError, match="tenant 'small'"):
+            ledger.check("c", "small", 600, "cheap")
+        assert ledger.check("c", "big", 600, "cheap") == "ok"
+
+    def test_persists_periodically(self, tmp_path):
+        """Verify usage is saved every flush_interval and survives a restart"""
+        path = str(tmp_path / "usage.json")
+        clock = Clock()
+        ledger = UsageLedger(path, flush_interval=10, prices=PRICES, clock=clock)
+        ledger.record("s1", "acme", "cheap", usage(100, 10))
+        assert not os.path.exists(path)
+        clock.now = 11
+        ledger.record("s1", "acme", "cheap", usage(100, 10))
+        assert json.loads(open(path).read())["sessions"]["s1"]["calls"] == 2
+
+        restarted = UsageLedger(path, session_tokens=300, prices=PRICES)
+        assert restarted.usage("tenants", "acme")["input_tokens"] == 200
+        with pytest.raises(BudgetExceededError):
+            restarted.check("s1", None, 100)
+
+
+class TestAccountingChatModel:
+    """Tests for budgets and accounting on model calls"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def make(self, **budgets):
+        ledger = UsageLedger(prices=PRICES, **budgets)
+        llm = AccountingChatModel(llm=FakeStreamingChatModel(echo=True), ledger=ledger, model_id="dear",
+                                  downgrade=FakeStreamingChatModel(reply="short answer"), downgrade_id="cheap")
+        return ledger, build_memory_chatbot(llm)
+
+    def test_memory_chatbot_charges_sessions(self):
+        """Verify each turn is charged to the session and tenant in its config"""
+        ledger, chatbot = self.make()
+        chat(chatbot, "hello", session_id="s1")
+        config = {"configurable": {"session_id": "s2", "tenant_id": "acme"}}
+        chatbot.invoke({"input": "hi"}, config=config)
+        list(chatbot.stream({"input": "again"}, config=config))
+
+        async def astream():
+            return [c async for c in chatbot.astream({"input": "async"}, config=config)]
+
+        asyncio.run(astream())
+        assert ledger.usage("sessions", "s1")["calls"] == 1
+        assert ledger.usage("sessions", "s2")["calls"] == 3
+        assert ledger.usage("tenants", "acme")["calls"] == 3
+        # the stored history makes every turn's prompt larger
+        assert ledger.usage("sessions", "s2")["input_tokens"] > 3 * ledger.usage("sessions", "s1")["input_tokens"]
+
+    def test_downgrade_then_reject(self):
+        """Verify a long session is moved to the cheaper model, then stopped"""
+        ledger, chatbot = self.make(session_tokens=400, downgrade_at=0.5)
+        replies = []
+        with pytest.raises(BudgetExceededError):
+            for n in range(50):
+                replies.append(chat(chatbot, f"tell me more about topic {n}", session_id="long"))
+        assert replies[0].startswith("Echo:")
+        assert replies[-1] == "short answer"
+        assert ledger.usage("models", "cheap")["calls"] >= 1
+        assert ledger.stats()["rejected"] == 1
+
+    def test_budgets_apply_under_an_outer_wrapper(self):
+        """Verify a session is still charged and stopped when another wrapper calls the accounting model"""
+        ledger = UsageLedger(prices=PRICES, session_tokens=300)
+        accounting = AccountingChatModel(llm=FakeStreamingChatModel(echo=True), ledger=ledger, model_id="dear")
+        chatbot = build_memory_chatbot(SingleFlightChatModel(llm=accounting))
+        with pytest.raises(BudgetExceededError):
+            for n in range(50):
+                chat(chatbot, f"tell me more about topic {n}", session_id="wrapped")
+        assert ledger.usage("sessions", "wrapped")["calls"] >= 1
+        chatbot.invoke({"input": "hi"}, config={"configurable": {"session_id": "s2", "tenant_id": "acme"}})
+        assert ledger.usage("tenants", "acme")["calls"] == 1
+
+
+class TestGetLlmAccounting:
+    """Tests for accounting in get_llm()"""
+
+    def setup_method(self):
+        reset_llm()
+        reset_accounting()
+
+    def teardown_method(self):
+        reset_llm()
+        reset_accounting()
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+        monkeypatch.delenv("LLM_USAGE_FILE", raising=False)
+
+    def test_off_by_default(self):
+        """Verify get_llm() models are not wrapped unless accounting is enabled"""
+        assert get_ledger() is None
+        assert not isinstance(get_llm(), AccountingChatModel)
+
+    def test_bedrock_usage_is_recorded_and_saved(self, tmp_path, monkeypatch):
+        """Verify Bedrock usage metadata is charged and saved to LLM_USAGE_FILE"""
+        path = tmp_path / "usage.json"
+        monkeypatch.setenv("LLM_USAGE_FILE", str(path))
+        with BedrockStub() as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+            llm = get_llm(model_id=NOVA_LITE)
+            assert isinstance(llm, AccountingChatModel)
+            assert llm.downgrade_id == llm.downgrade.llm.model_id == NOVA_MICRO
+            llm.invoke("hello", config={"configurable": {"session_id": "s1", "tenant_id": "acme"}})
+        reset_accounting()
+        saved = json.loads(path.read_text())
+        assert saved["sessions"]["s1"]["input_tokens"] == 10
+        assert saved["tenants"]["acme"]["output_tokens"] == 5
+        assert saved["models"][NOVA_LITE]["cost_usd"] > 0
+
+    def test_server_returns_429(self):
+        """Verify /chat answers 429 once a session is over budget"""
+        configure_accounting(session_tokens=1)
+        llm = AccountingChatModel(llm=FakeStreamingChatModel(echo=True), ledger=get_ledger())
+        status, body = run_with_server(
+            lambda s: request(s.port, "POST", "/chat", {"message": "hi", "session_id": "s", "tenant_id": "t"}),
+            llm=llm)
+        assert status == 429
+        assert "budget" in json.loads(body)["error"]
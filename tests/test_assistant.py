@@ -0,0 +1,150 @@
+import pytest
+import sys
+import os
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel, GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from src.assistant import CompleteAssistant, ToolChain
+from src.memory import memory_store
+
+
+class TestToolChain:
+    """Tests for the long-lived tool chain"""
+
+    def test_answers_directly(self):
+        """Verify ToolChain returns plain answers unchanged"""
+        chain = ToolChain(FakeListChatModel(responses=["Paris"]))
+        assert chain.ask("What is the capital of France?") == "Paris"
+
+    def test_uses_tool(self):
+        """Verify ToolChain runs the requested tool"""
+        chain = ToolChain(FakeListChatModel(responses=["TOOL: calculator\nINPUT: 2 + 3"]))
+        result = chain.ask("What is 2 + 3?")
+        assert "calculator" in result
+        assert "5" in result
+
+    def test_prompt_built_once(self):
+        """Verify the compiled prompt is reused across questions"""
+        chain = ToolChain(FakeListChatModel(responses=["a", "b"]))
+        prompt = chain.prompt
+        chain.ask("one")
+        chain.ask("two")
+        assert chain.prompt is prompt
+
+
+class TestCompleteAssistant:
+    """Tests for the long-lived complete assistant"""
+
+    def setup_method(self):
+        """Clear memory store before each test"""
+        memory_store.clear()
+
+    def test_remembers_per_session(self):
+        """Verify one assistant keeps separate histories per session"""
+        assistant = CompleteAssistant(FakeListChatModel(responses=["hi"]))
+        assistant.chat("I'm Alice", session_id="alice")
+        assistant.chat("I'm Bob", session_id="bob")
+        assistant.chat("Still Alice", session_id="alice")
+
+        assert len(memory_store["alice"].messages) == 4
+        assert len(memory_store["bob"].messages) == 2
+
+    def test_tool_followup(self):
+        """Verify a tool request is answered with a natural follow-up"""
+        llm = FakeListChatModel(responses=["TOOL: word_counter\nINPUT: a b c", "That has 3 words."])
+        assistant = CompleteAssistant(llm)
+        assert assistant.chat("Count: a b c", session_id="s") == "That has 3 words."
+
+    def test_unknown_tool_returns_text(self):
+        """Verify an unknown tool name falls back to the raw response"""
+        text = "TOOL: teleporter\nINPUT: mars"
+        assistant = CompleteAssistant(FakeListChatModel(responses=[text]))
+        assert assistant.chat("Go to mars", session_id="s") == text
+
+    def test_concurrent_sessions(self):
+        """Verify a shared assistant serves many threads without losing messages"""
+        assistant = CompleteAssistant(FakeListChatModel(responses=["ok"]))
+
+        def worker(n):
+            for _ in range(5):
+                assistant.chat("hello", session_id=f"user{n}")
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(memory_store) == 8
+        assert all(len(h.messages) == 10 for h in memory_store.values())
+
+
+class FakeToolCallingModel(GenericFakeChatModel):
+    """Fake chat model that accepts bind_tools and replays scripted messages"""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def tool_call_message(name, args, call_id="call_1"):
+    """Build an AIMessage requesting a single structured tool call"""
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+class TestNativeToolCalling:
+    """Tests for the structured tool-calling mode"""
+
+    def setup_method(self):
+        """Clear memory store before each test"""
+        memory_store.clear()
+
+    def test_invalid_mode_raises_error(self):
+        """Verify an unknown tool calling mode is rejected"""
+        with pytest.raises(ValueError) as exc_info:
+            CompleteAssistant(FakeListChatModel(responses=["x"]), tool_calling="magic")
+        assert "Unknown tool calling mode" in str(exc_info.value)
+
+    def test_stores_tool_messages(self):
+        """Verify history holds the tool call and a ToolMessage, not synthetic prose"""
+        llm = FakeToolCallingModel(messages=iter([
+            tool_call_message("calculator", {"expression": "500 * 0.3"}),
+            AIMessage(content="That is $150.")
+        ]))
+        assistant = CompleteAssistant(llm, tool_calling="native")
+
+        assert assistant.chat("What is 30% of $500?", session_id="s") == "That is $150."
+
+        messages = memory_store["s"].messages
+        assert [type(m) for m in messages] == [HumanMessage, AIMessage, ToolMessage, AIMessage]
+        assert messages[2].content == "Result: 150.0"
+        assert messages[2].tool_call_id == "call_1"
+        assert not any("returned:" in str(m.content) for m in messages)
+
+    def test_unknown_tool_reports_error(self):
+        """Verify an unknown tool produces an error ToolMessage"""
+        llm = FakeToolCallingModel(messages=iter([
+            tool_call_message("teleporter", {"to": "mars"}),
+            AIMessage(content="I can't do that.")
+        ]))
+        assistant = CompleteAssistant(llm, tool_calling="native")
+
+        assert assistant.chat("Go to mars", session_id="s") == "I can't do that."
+        assert "Unknown tool" in memory_store["s"].messages[2].content
+
+    def test_loop_is_bounded(self):
+        """Verify the agent loop stops after max_tool_rounds"""
+        calls = [tool_call_message("word_counter", {"text": "a"}, f"call_{i}") for i in range(10)]
+        llm = FakeToolCallingModel(messages=iter(calls))
+        assistant = CompleteAssistant(llm, tool_calling="native", max_tool_rounds=2)
+
+        result = assistant.chat("Loop forever", session_id="s")
+
+        assert "tool call limit" in result
+        messages = memory_store["s"].messages
+        # human + 3 model calls, each answered by a ToolMessage
+        assert len(messages) == 7
+        assert isinstance(messages[-1], ToolMessage)
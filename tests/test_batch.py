@@ -0,0 +1,196 @@
+import pytest
+import sys
+import os
+import io
+import json
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from src.batch import BatchProgress, count_documents, iter_documents, load_checkpoint, run_batch
+from src.llm import set_llm, reset_llm
+import langchain_chatbot_lab
+
+
+def write_jsonl(path, count):
+    """Write count documents to a JSONL file"""
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"doc{i}", "text": f"Document number {i}."}) + "\n")
+
+
+def read_results(path):
+    """Read a JSONL results file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def quiet_progress(total=None):
+    """Progress reporter that writes to a buffer instead of stderr"""
+    return BatchProgress(total=total, stream=io.StringIO())
+
+
+class TestDocumentSources:
+    """Tests for streaming documents from JSONL and directories"""
+
+    def test_jsonl_documents(self, tmp_path):
+        """Verify JSONL ids default to line numbers and keep length overrides"""
+        path = tmp_path / "docs.jsonl"
+        path.write_text('{"text": "a"}\n\n{"id": "x", "text": "b", "length": "detailed"}\n')
+
+        docs = list(iter_documents(str(path)))
+        assert docs == [{"id": "1", "text": "a"}, {"id": "x", "text": "b", "length": "detailed"}]
+        assert count_documents(str(path)) == 2
+
+    def test_directory_documents(self, tmp_path):
+        """Verify directories yield .txt/.md files by relative path"""
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "a.txt").write_text("alpha")
+        (tmp_path / "sub" / "b.md").write_text("beta")
+        (tmp_path / "skip.bin").write_text("nope")
+
+        docs = list(iter_documents(str(tmp_path)))
+        assert docs == [{"id": "a.txt", "text": "alpha"}, {"id": os.path.join("sub", "b.md"), "text": "beta"}]
+        assert count_documents(str(tmp_path)) == 2
+
+    def test_torn_checkpoint_line_ignored(self, tmp_path):
+        """Verify a partially written checkpoint line is not treated as finished"""
+        path = tmp_path / "ckpt"
+        path.write_text("doc1\ndoc2\ndoc")
+        assert load_checkpoint(str(path)) == {"doc1", "doc2"}
+
+
+class TestRunBatch:
+    """Tests for the bulk summarization runner"""
+
+    def test_summarizes_all_documents(self, tmp_path):
+        """Verify every document gets one result line"""
+        write_jsonl(tmp_path / "in.jsonl", 25)
+        out = tmp_path / "out.jsonl"
+
+        progress = run_batch(str(tmp_path / "in.jsonl"), str(out), lambda length, text: f"{length}: {text}",
+                             progress=quiet_progress(25))
+
+        results = read_results(out)
+        assert len(results) == 25
+        assert {r["id"] for r in results} == {f"doc{i}" for i in range(25)}
+        assert results[0]["summary"].startswith("brief: ")
+        assert progress.done == 25
+
+    def test_resume_skips_finished(self, tmp_path):
+        """Verify a resumed job does not redo checkpointed documents"""
+        write_jsonl(tmp_path / "in.jsonl", 10)
+        out = str(tmp_path / "out.jsonl")
+        (tmp_path / "out.jsonl.checkpoint").write_text("".join(f"doc{i}\n" for i in range(6)))
+        calls = []
+
+        progress = run_batch(str(tmp_path / "in.jsonl"), out, lambda length, text: calls.append(text) or "ok",
+                             progress=quiet_progress(10))
+
+        assert len(calls) == 4
+        assert progress.skipped == 6
+        assert load_checkpoint(out + ".checkpoint") == {f"doc{i}" for i in range(10)}
+
+    def test_failures_recorded_and_retried(self, tmp_path):
+        """Verify failed documents are reported but left out of the checkpoint"""
+        write_jsonl(tmp_path / "in.jsonl", 3)
+        out = str(tmp_path / "out.jsonl")
+
+        def flaky(length, text):
+            if "1" in text:
+                raise RuntimeError("throttled")
+            return "ok"
+
+        progress = run_batch(str(tmp_path / "in.jsonl"), out, flaky, progress=quiet_progress(3))
+
+        assert progress.failed == 1
+        assert {"id": "doc1", "error": "throttled"} in read_results(out)
+        assert "doc1" not in load_checkpoint(out + ".checkpoint")
+
+    def test_concurrency_is_bounded(self, tmp_path):
+        """Verify no more than max_concurrency documents run at once"""
+        write_jsonl(tmp_path / "in.jsonl", 30)
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow(length, text):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.01)
+            with lock:
+                state["active"] -= 1
+            return "ok"
+
+        run_batch(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), slow,
+                  max_concurrency=4, progress=quiet_progress(30))
+        assert 1 < state["peak"] <= 4
+
+    def test_slow_document_does_not_hold_back_finished_ones(self, tmp_path):
+        """Verify results are written and checkpointed as they complete, not in input order"""
+        write_jsonl(tmp_path / "in.jsonl", 5)
+        out = str(tmp_path / "out.jsonl")
+        seen = {}
+
+        def summarize(length, text):
+            if text == "Document number 0.":
+                # Wait for the other documents to be checkpointed before finishing
+                deadline = time.monotonic() + 2
+                while time.monotonic() < deadline and len(load_checkpoint(out + ".checkpoint")) < 4:
+                    time.sleep(0.01)
+                seen["checkpointed"] = load_checkpoint(out + ".checkpoint")
+            return "ok"
+
+        run_batch(str(tmp_path / "in.jsonl"), out, summarize, max_concurrency=4, progress=quiet_progress(5))
+
+        assert seen["checkpointed"] == {f"doc{i}" for i in range(1, 5)}
+        assert read_results(out)[-1]["id"] == "doc0"
+
+    def test_repeated_ids_summarized_once(self, tmp_path):
+        """Verify a document id repeated in the input is only summarized once per run"""
+        with open(tmp_path / "in.jsonl", "w") as f:
+            for doc_id in ["a", "b", "a", "c", "b"]:
+                f.write(json.dumps({"id": doc_id, "text": doc_id}) + "\n")
+        out = str(tmp_path / "out.jsonl")
+        calls = []
+
+        run_batch(str(tmp_path / "in.jsonl"), out, lambda length, text: calls.append(text) or "ok",
+                  progress=quiet_progress(5))
+
+        assert sorted(calls) == ["a", "b", "c"]
+        assert [r["id"] for r in read_results(out)].count("a") == 1
+
+
+class TestBatchProgress:
+    """Tests for progress reporting"""
+
+    def test_line_reports_rate_and_eta(self):
+        """Verify the progress line shows counts, docs/s and ETA"""
+        progress = quiet_progress(total=100)
+        progress.started -= 10
+        progress.done = 20
+        assert progress.line() == "📦 20/100 docs · 2.0 docs/s · ETA 0m40s"
+
+
+class TestBatchCommand:
+    """Tests for the lab's batch command"""
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_batch_cli(self, tmp_path, capsys):
+        """Verify `batch` summarizes a directory with my_summarizer"""
+        (tmp_path / "docs").mkdir()
+        for i in range(3):
+            (tmp_path / "docs" / f"{i}.txt").write_text(f"Text {i}")
+        set_llm(FakeListChatModel(responses=["summary"]))
+
+        out = tmp_path / "out.jsonl"
+        code = langchain_chatbot_lab.main(["batch", str(tmp_path / "docs"), str(out), "--concurrency", "2"])
+
+        assert code == 0
+        assert [r["summary"] for r in read_results(out)] == ["summary"] * 3
+        assert "3/3 docs" in capsys.readouterr().err
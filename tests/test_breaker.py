@@ -0,0 +1,265 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+
+from src.breaker import (CLOSED, HALF_OPEN, OPEN, AnswerCache, CircuitBreaker, CircuitBreakerChatModel,
+                         CircuitOpenError, configure_breaker, get_breaker)
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import configure_bedrock_client, get_llm, reset_llm
+from src.ratelimit import configure_rate_limit
+from src.router import NOVA_LITE, NOVA_MICRO
+from tests.bedrock_stub import BedrockStub
+from tests.test_server import request, run_with_server
+
+
+class Unavailable(Exception):
+    """Stand-in for a botocore ClientError carrying a ServiceUnavailableException"""
+
+    response = {"Error": {"Code": "ServiceUnavailableException"}}
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyModel(FakeStreamingChatModel):
+    """Echo model that fails with Unavailable while `down` is set"""
+
+    down: bool = False
+    calls: int = 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise Unavailable()
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        if self.down:
+            raise Unavailable()
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+
+class RejectingModel(FakeStreamingChatModel):
+    """Model that rejects every request as invalid"""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise ValueError("bad request")
+
+
+def trip(breaker, calls=4):
+    for _ in range(calls):
+        assert breaker.allow()
+        breaker.record(True, 0.01)
+
+
+class TestCircuitBreaker:
+    """Tests for the breaker's state machine"""
+
+    def test_opens_on_error_rate_after_min_calls(self):
+        """Verify the circuit stays closed until min_calls, then opens at error_rate"""
+        breaker = CircuitBreaker(min_calls=4, error_rate=0.5)
+        breaker.record(True, 0.01)
+        breaker.record(True, 0.01)
+        assert breaker.state == CLOSED
+        breaker.record(False, 0.01)
+        breaker.record(False, 0.01)
+        assert breaker.state == OPEN and not breaker.allow()
+        assert breaker.stats()["rejected"] == 1
+
+    def test_opens_on_slow_calls(self):
+        """Verify a share of slow calls opens the circuit even without errors"""
+        breaker = CircuitBreaker(min_calls=3, slow_call_seconds=1.0, slow_call_rate=0.6)
+        for seconds in (2.0, 0.1, 3.0):
+            breaker.record(False, seconds)
+        assert breaker.state == OPEN
+
+    def test_old_outcomes_expire(self):
+        """Verify failures older than the window no longer count"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, clock=clock)
+        for _ in range(3):
+            breaker.record(True, 0.01)
+        clock.now = 20
+        breaker.record(True, 0.01)
+        assert breaker.state == CLOSED and breaker.stats()["window_calls"] == 1
+
+    def test_half_open_trials(self):
+        """Verify trial calls after open_seconds close the circuit, or reopen it on failure"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=4, open_seconds=5, half_open_calls=2, clock=clock)
+        trip(breaker)
+        clock.now = 5
+        assert breaker.allow() and breaker.state == HALF_OPEN
+        breaker.record(True, 0.01)
+        assert breaker.state == OPEN and breaker.retry_after() == 5
+
+        clock.now = 10
+        assert breaker.allow() and breaker.allow() and not breaker.allow()  # two trial slots
+        breaker.record(False, 0.01)
+        breaker.record(False, 0.01)
+        assert breaker.state == CLOSED
+        assert breaker.stats()["transitions"] == {"closed->open": 1, "open->half_open": 2, "half_open->open": 1,
+                                                  "half_open->closed": 1}
+
+
+    def test_calls_from_an_earlier_state_are_not_trials(self):
+        """Verify a call allowed while closed that finishes while half-open neither closes nor reopens the circuit"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=4, open_seconds=5, half_open_calls=2, clock=clock)
+        slow_success, slow_failure = breaker.allow(), breaker.allow()
+        trip(breaker)
+        clock.now = 5
+        trial = breaker.allow()
+        assert breaker.state == HALF_OPEN
+
+        breaker.record(False, 0.01, slow_success)
+        breaker.record(True, 0.01, slow_failure)
+        breaker.record(False, 0.01, trial)
+        assert breaker.state == HALF_OPEN
+        assert breaker.stats()["calls"] == 7
+
+        breaker.record(False, 0.01, breaker.allow())
+        assert breaker.state == CLOSED
+
+
+class TestCircuitBreakerChatModel:
+    """Tests for fast-fail, fallback and cached answers"""
+
+    def make(self, **options):
+        primary = FlakyModel(echo=True)
+        breaker = CircuitBreaker("primary", min_calls=2, error_rate=0.5, open_seconds=60)
+        return primary, CircuitBreakerChatModel(llm=primary, breaker=breaker, **options)
+
+    def fail_twice(self, primary, llm):
+        primary.down = True
+        for _ in range(2):
+            with pytest.raises(Unavailable):
+                llm.invoke("hi")
+        assert llm.breaker.state == OPEN
+
+    def test_fails_fast_when_open(self):
+        """Verify an open circuit refuses calls without reaching the model"""
+        primary, llm = self.make()
+        self.fail_twice(primary, llm)
+        with pytest.raises(CircuitOpenError) as error:
+            llm.invoke("hi")
+        assert primary.calls == 2 and error.value.retry_after > 50
+
+    def test_client_errors_do_not_count(self):
+        """Verify errors that are not transient leave the circuit closed"""
+        breaker = CircuitBreaker(min_calls=1)
+        llm = CircuitBreakerChatModel(llm=RejectingModel(), breaker=breaker)
+        with pytest.raises(ValueError):
+            llm.invoke("hi")
+        assert breaker.state == CLOSED
+
+    def test_fallback_model(self):
+        """Verify calls go to the fallback model while open, streamed or not"""
+        primary, llm = self.make(fallback=FakeStreamingChatModel(reply="from fallback"))
+        self.fail_twice(primary, llm)
+        assert llm.invoke("hi").content == "from fallback"
+        assert "".join(c.content for c in llm.stream("hi")) == "from fallback"
+        assert asyncio.run(llm.ainvoke("hi")).content == "from fallback"
+        assert primary.calls == 2 and llm.stats()["breaker"]["fallbacks"] == 3
+
+    def test_cached_answer(self):
+        """Verify the last good answer to the same prompt is served while open"""
+        primary, llm = self.make(answers=AnswerCache(10))
+        assert llm.invoke("what is 2+2?").content == "Echo: what is 2+2?"
+        assert "".join(c.content for c in llm.stream("streamed")) == "Echo: streamed"
+        self.fail_twice(primary, llm)
+        assert llm.invoke("what is 2+2?").content == "Echo: what is 2+2?"
+        assert "".join(c.content for c in llm.stream("streamed")) == "Echo: streamed"
+        with pytest.raises(CircuitOpenError):
+            llm.invoke("never asked")
+        assert llm.stats()["breaker"]["cache_hits"] == 2
+
+    def test_abandoned_stream_releases_trial(self):
+        """Verify a trial stream that is not read to the end still records its outcome"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(min_calls=2, open_seconds=1, half_open_calls=1, clock=clock)
+        llm = CircuitBreakerChatModel(llm=FakeStreamingChatModel(echo=True), breaker=breaker)
+        trip(breaker, 2)
+        clock.now = 1
+        stream = llm.stream("one two three")
+        next(stream)
+        stream.close()
+        assert breaker.state == CLOSED
+
+    def test_cache_evicts_oldest(self):
+        """Verify the answer cache keeps at most size prompts"""
+        cache = AnswerCache(2)
+        for text in ("a", "b", "c"):
+            cache.put([AIMessage(text)], AIMessage(text))
+        assert len(cache) == 2 and cache.get([AIMessage("a")]) is None
+
+
+class TestBedrockOutage:
+    """Tests for breakers on get_llm() models against the fault-injecting stub"""
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+        monkeypatch.delenv("LLM_BREAKER", raising=False)
+        monkeypatch.delenv("LLM_BREAKER_FALLBACK", raising=False)
+        reset_llm()
+        yield
+        reset_llm()
+
+    def test_off_by_default(self):
+        """Verify get_llm() models have no breaker unless enabled"""
+        assert get_breaker(NOVA_LITE) is None
+        assert "breaker" not in get_llm().stats()
+
+    def test_outage_opens_then_recovers(self):
+        """Verify failures open the circuit, calls then use the fallback, and a trial closes it"""
+        with BedrockStub(reply="ok", delay=0.05) as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+            configure_rate_limit(max_retries=3, backoff_base=0.001)
+            configure_breaker(min_calls=3, error_rate=0.5, open_seconds=0.3, half_open_calls=1,
+                              fallback_model=NOVA_MICRO)
+            llm = get_llm(model_id=NOVA_LITE)
+            stub.faults = [503] * 3
+
+            # the limiter's retries reach the open circuit and are served by the fallback
+            assert llm.invoke("hi").content == "ok"
+            assert [("nova-micro" in path) for path in stub.paths] == [False, False, False, True]
+            started = time.perf_counter()
+            assert llm.invoke("again").content == "ok"
+            assert time.perf_counter() - started < 1.0
+            assert "nova-micro" in stub.paths[-1]
+
+            time.sleep(0.35)
+            assert llm.invoke("trial").content == "ok"
+            assert "nova-lite" in stub.paths[-1]
+            stats = llm.stats()["breaker"]
+        assert stats["state"] == CLOSED and stats["fallbacks"] == 2
+        assert stats["transitions"] == {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1}
+
+    def test_server_returns_503(self):
+        """Verify a refused call gets 503 with Retry-After"""
+        breaker = CircuitBreaker("stub", min_calls=1, open_seconds=30)
+        trip(breaker, 1)
+        llm = CircuitBreakerChatModel(llm=FakeStreamingChatModel(), breaker=breaker)
+        status, body = run_with_server(
+            lambda s: request(s.port, "POST", "/chat", {"message": "hi", "session_id": "s"}), llm=llm)
+        assert status == 503
+        assert "open" in json.loads(body)["error"]
@@ -0,0 +1,190 @@
+import pytest
+import sys
+import os
+import asyncio
+import hashlib
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+
+from src.cassette import Cassette, CassetteChatModel, CassetteMissError
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import configure_bedrock_client, get_llm, reset_llm
+from tests.bedrock_stub import BedrockStub
+
+
+@tool
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+def key(n):
+    return hashlib.sha256(str(n).encode()).hexdigest()
+
+
+class TestCassetteStore:
+    """Tests for the indexed cassette file"""
+
+    def test_put_get_and_reopen(self, tmp_path):
+        """Verify records survive reopening and the latest record for a key wins"""
+        path = str(tmp_path / "calls.cassette")
+        cassette = Cassette(path)
+        cassette.put(key(1), {"n": 1})
+        cassette.put(key(2), {"n": 2})
+        cassette.put(key(1), {"n": 3})
+        assert cassette.get(key(1)) == {"n": 3}
+        assert cassette.get(key(9)) is None
+        cassette.close()
+
+        reopened = Cassette(path)
+        assert len(reopened) == 2
+        assert reopened.get(key(1)) == {"n": 3}
+        assert reopened.get(key(2)) == {"n": 2}
+
+    def test_index_grows(self, tmp_path):
+        """Verify the hash index resizes past its initial capacity"""
+        cassette = Cassette(str(tmp_path / "calls.cassette"))
+        for n in range(3000):
+            cassette.put(key(n * 7919), {"n": n})
+        assert len(cassette) == 3000
+        assert all(cassette.get(key(n * 7919)) == {"n": n} for n in range(0, 3000, 97))
+
+    def test_rebuilds_missing_or_stale_index(self, tmp_path):
+        """Verify the index is rebuilt from the data file, and a torn last write is dropped"""
+        path = str(tmp_path / "calls.cassette")
+        cassette = Cassette(path)
+        for n in range(10):
+            cassette.put(key(n), {"n": n})
+        cassette.close()
+        os.remove(path + ".idx")
+        with open(path, "ab") as f:
+            f.write(key(99).encode() + b'\t{"n":')  # crash mid-write
+
+        reopened = Cassette(path)
+        assert len(reopened) == 10
+        assert reopened.get(key(99)) is None
+        reopened.put(key(99), {"n": 99})
+        reopened.close()
+        assert Cassette(path).get(key(99)) == {"n": 99}
+
+    def test_lookup_does_not_scan(self, tmp_path):
+        """Verify lookups in a large cassette stay fast (no scan of the data file)"""
+        cassette = Cassette(str(tmp_path / "calls.cassette"))
+        padding = "x" * 2000
+        for n in range(5000):
+            cassette.put(key(n), {"n": n, "padding": padding})
+        started = time.perf_counter()
+        for n in range(0, 5000, 5):
+            assert cassette.get(key(n))["n"] == n
+        assert (time.perf_counter() - started) / 1000 < 0.001
+
+
+class TestCassetteChatModel:
+    """Tests for recording and replaying model calls"""
+
+    def make(self, tmp_path, **options):
+        return Cassette(str(tmp_path / "calls.cassette")), FakeStreamingChatModel(echo=True, **options)
+
+    def test_record_then_replay_offline(self, tmp_path):
+        """Verify recorded invokes and streams replay with no model"""
+        cassette, fake = self.make(tmp_path)
+        recorder = CassetteChatModel(llm=fake, cassette=cassette)
+        answer = recorder.invoke("hello")
+        streamed = [c.content for c in recorder.stream("stream this")]
+
+        player = CassetteChatModel(cassette=cassette, mode="replay")
+        assert player.invoke("hello").content == answer.content
+        assert player.invoke("hello").usage_metadata == answer.usage_metadata
+        assert [c.content for c in player.stream("stream this")] == streamed
+        assert player.invoke("stream this").content == "".join(streamed)
+        assert [c.content for c in player.stream("hello") if c.content] == [answer.content]
+        assert cassette.stats()["recorded"] == 2
+
+    def test_replay_miss_raises(self, tmp_path):
+        """Verify replay mode never calls a model for an unrecorded prompt"""
+        cassette, _ = self.make(tmp_path)
+        with pytest.raises(CassetteMissError):
+            CassetteChatModel(cassette=cassette, mode="replay").invoke("never recorded")
+        with pytest.raises(ValueError):
+            CassetteChatModel(cassette=cassette, mode="auto")
+
+    def test_auto_mode_records_only_misses(self, tmp_path):
+        """Verify auto mode calls the model once per distinct prompt"""
+        cassette, fake = self.make(tmp_path)
+        llm = CassetteChatModel(llm=fake, cassette=cassette)
+        for _ in range(3):
+            llm.invoke([HumanMessage(content="same prompt")])
+        llm.invoke("other prompt", stop=["."])
+        llm.invoke("other prompt")
+        assert cassette.stats() == {"hits": 2, "misses": 3, "recorded": 3, "entries": 3}
+
+    def test_realtime_replay_reproduces_timing(self, tmp_path):
+        """Verify realtime replay keeps the recorded per-token timing"""
+        cassette, fake = self.make(tmp_path, first_token_delay=0.05, token_delay=0.02)
+        list(CassetteChatModel(llm=fake, cassette=cassette).stream("one two three"))
+
+        fast = CassetteChatModel(cassette=cassette, mode="replay")
+        started = time.perf_counter()
+        list(fast.stream("one two three"))
+        assert time.perf_counter() - started < 0.03
+
+        realtime = CassetteChatModel(cassette=cassette, mode="replay", realtime=True)
+
+        async def first_token_and_total():
+            started = time.perf_counter()
+            first = None
+            async for _ in realtime.astream("one two three"):
+                first = first or time.perf_counter() - started
+            return first, time.perf_counter() - started
+
+        first, total = asyncio.run(first_token_and_total())
+        assert 0.04 < first < 0.1
+        assert total > 0.1
+
+    def test_bound_tools_are_part_of_the_key(self, tmp_path):
+        """Verify calls with tools bound replay only with the same tools"""
+        cassette, fake = self.make(tmp_path)
+        fake_with_tools = type(fake).model_copy(fake)
+        object.__setattr__(fake_with_tools, "bind_tools", lambda tools, **kwargs: fake)
+        CassetteChatModel(llm=fake_with_tools, cassette=cassette).bind_tools([add]).invoke("2+3?")
+        player = CassetteChatModel(cassette=cassette, mode="replay")
+        assert player.bind_tools([add]).invoke("2+3?").content == "Echo: 2+3?"
+        with pytest.raises(CassetteMissError):
+            player.invoke("2+3?")
+
+
+class TestGetLlmCassette:
+    """Tests for LLM_CASSETTE in get_llm()"""
+
+    def setup_method(self):
+        reset_llm()
+
+    def teardown_method(self):
+        reset_llm()
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+
+    def test_record_from_bedrock_then_replay_without_it(self, tmp_path, monkeypatch):
+        """Verify a Bedrock call recorded through get_llm replays with no endpoint"""
+        monkeypatch.setenv("LLM_CASSETTE", str(tmp_path / "bedrock.cassette"))
+        with BedrockStub(reply="recorded answer") as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+            assert get_llm().invoke("What is recorded?").content == "recorded answer"
+            assert stub.requests == 1
+
+        reset_llm()
+        monkeypatch.setenv("LLM_CASSETTE_MODE", "replay")
+        llm = get_llm()
+        assert llm.llm is None
+        assert llm.invoke("What is recorded?").content == "recorded answer"
+        with pytest.raises(CassetteMissError):
+            get_llm(temperature=0.1).invoke("What is recorded?")
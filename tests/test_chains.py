@@ -65,3 +65,13 @@ class TestGetChain:
 
         assert "Unknown chain type" in str(exc_info.value)
         assert "invalid_chain" in str(exc_info.value)
+
+    def test_unsupported_option_raises_error(self):
+        """Verify an option the chain's builder does not take is reported, naming the chain types that take it"""
+        mock_llm = MockLLM()
+        with pytest.raises(ValueError) as exc_info:
+            get_chain("simple", mock_llm, cache=object())
+
+        message = str(exc_info.value)
+        assert "simple" in message and "'cache'" in message
+        assert "research" in message and "deep_research" in message
@@ -0,0 +1,152 @@
+import pytest
+import sys
+import os
+import asyncio
+import functools
+import json
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cluster import ClusterSupervisor, HashRing, WorkerError, _Worker, fake_chatbot, fake_cluster
+from tests.test_server import request, run_with_server
+
+
+def failing_chatbot():
+    raise RuntimeError("no model")
+
+
+class TestHashRing:
+    """Tests for consistent hashing"""
+
+    def test_keys_spread_over_nodes(self):
+        """Verify every node owns a fair share of the keys"""
+        ring = HashRing(["a", "b", "c", "d"])
+        owners = [ring.node_for(f"session-{n}") for n in range(4000)]
+        for node in "abcd":
+            assert 600 < owners.count(node) < 1400
+
+    def test_adding_a_node_moves_only_its_share(self):
+        """Verify a new node takes keys only from others, about 1/N of them"""
+        ring = HashRing(["a", "b", "c"])
+        before = {f"s{n}": ring.node_for(f"s{n}") for n in range(3000)}
+        bigger = ring.copy()
+        bigger.add("d")
+        moved = [key for key, node in before.items() if bigger.node_for(key) != node]
+        assert all(bigger.node_for(key) == "d" for key in moved)
+        assert 450 < len(moved) < 1100
+        assert all(ring.node_for(key) == node for key, node in before.items())  # the copy is independent
+
+    def test_empty_ring(self):
+        """Verify an empty ring refuses lookups"""
+        with pytest.raises(LookupError):
+            HashRing().node_for("s")
+
+
+class TestClusterSupervisor:
+    """Tests for routing and rebalancing across worker processes"""
+
+    def test_sessions_stay_on_their_worker(self):
+        """Verify each session's turns go to one worker that keeps its history"""
+        with fake_cluster(2) as cluster:
+            for n in range(10):
+                assert cluster.chat(f"s{n}", f"hello {n}") == f"Echo: hello {n}"
+            for name, sessions in cluster.sessions().items():
+                assert all(cluster.worker_for(s) == name for s in sessions)
+            assert sum(len(s) for s in cluster.sessions().values()) == 10
+            assert sum(w["requests"] for w in cluster.stats()["workers"].values()) == 10
+
+    def test_async_streaming(self):
+        """Verify streamed turns arrive in chunks and run concurrently"""
+        with fake_cluster(2, token_delay=0.001) as cluster:
+            async def main():
+                chunks = [c async for c in cluster.astream_chat("s", "one two three")]
+                replies = await asyncio.gather(*(cluster.achat(f"s{n}", "hi") for n in range(20)))
+                return chunks, replies
+
+            chunks, replies = asyncio.run(main())
+            assert len(chunks) > 1 and "".join(chunks) == "Echo: one two three"
+            assert replies == ["Echo: hi"] * 20
+
+    def test_histories_survive_add_and_remove(self):
+        """Verify sessions move with their histories when workers join and leave"""
+        factory = functools.partial(fake_chatbot, echo=False, reply="ok")
+        with ClusterSupervisor(2, chatbot_factory=factory) as cluster:
+            for n in range(30):
+                cluster.chat(f"s{n}", f"turn one of s{n}")
+            owners = {f"s{n}": cluster.worker_for(f"s{n}") for n in range(30)}
+
+            new = cluster.add_worker()
+            held = cluster.sessions()
+            moved = [s for s, owner in owners.items() if cluster.worker_for(s) != owner]
+            assert moved and sorted(held[new]) == sorted(moved)
+            assert cluster.stats()["migrated"] == len(moved)
+
+            cluster.remove_worker("worker-0")
+            held = cluster.sessions()
+            assert "worker-0" not in held
+            assert sorted(s for sessions in held.values() for s in sessions) == sorted(owners)
+            for n in range(30):
+                cluster.chat(f"s{n}", "turn two")
+            counts = [len(sessions) for sessions in cluster.sessions().values()]
+            assert sum(counts) == 30
+            # each history has both turns (2 messages each) after the moves
+            for name, worker in cluster._workers.items():
+                histories = worker.call("export", held[name])
+                assert all(len(messages) == 4 for messages in histories.values())
+
+    def test_failed_import_loses_no_history(self, monkeypatch):
+        """Verify sessions stay with their old owners, histories intact, when a move's import fails"""
+        factory = functools.partial(fake_chatbot, echo=False, reply="ok")
+        with ClusterSupervisor(2, chatbot_factory=factory) as cluster:
+            for n in range(20):
+                cluster.chat(f"s{n}", f"turn one of s{n}")
+            before = cluster.sessions()
+            call = _Worker.call
+
+            def failing_call(worker, kind, *args, **kwargs):
+                if kind == "import":
+                    raise WorkerError("WorkerExited", f"{worker.name} exited")
+                return call(worker, kind, *args, **kwargs)
+
+            monkeypatch.setattr(_Worker, "call", failing_call)
+            with pytest.raises(WorkerError):
+                cluster.add_worker()
+            monkeypatch.setattr(_Worker, "call", call)
+
+            assert cluster.sessions() == before
+            for name, worker in cluster._workers.items():
+                histories = worker.call("export", before[name])
+                assert all(len(messages) == 2 for messages in histories.values())
+            assert cluster.stats()["migrated"] == 0
+
+    def test_remove_last_worker(self):
+        """Verify the last worker cannot be removed"""
+        with fake_cluster(1) as cluster:
+            with pytest.raises(ValueError):
+                cluster.remove_worker()
+
+    def test_worker_errors(self):
+        """Verify a worker that fails to start raises WorkerError"""
+        with pytest.raises(WorkerError, match="no model") as error:
+            ClusterSupervisor(1, chatbot_factory=failing_chatbot)
+        assert error.value.error_type == "RuntimeError"
+
+
+class TestServerCluster:
+    """Tests for /chat served by a cluster"""
+
+    def test_chat_route(self):
+        """Verify /chat runs in the cluster and /health reports its workers"""
+        with fake_cluster(2) as cluster:
+            async def scenario(server):
+                first = await request(server.port, "POST", "/chat", {"message": "hi", "session_id": "a"})
+                streamed = await request(server.port, "POST", "/chat",
+                                         {"message": "there", "session_id": "a", "stream": True})
+                health = await request(server.port, "GET", "/health")
+                return first, streamed, health
+
+            first, streamed, health = run_with_server(scenario, cluster=cluster)
+            assert first[0] == 200 and "Echo: hi" in first[1]
+            assert streamed[0] == 200 and "event: done" in streamed[1]
+            assert json.loads(health[1])["cluster"]["workers"][cluster.worker_for("a")]["requests"] == 2
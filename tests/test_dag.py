@@ -0,0 +1,231 @@
+import pytest
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from src.chains import CHAINS, RESEARCH_STEPS, get_chain, register_chain
+from src.dag import DagChain, Step, StepCache, topological_order
+from src.fake_llm import FakeStreamingChatModel
+
+
+class Tracker:
+    """Records how many steps run at once"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def step(self, name, delay=0.05):
+        def run(inputs):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(delay)
+            with self._lock:
+                self.active -= 1
+            return f"{name}({','.join(str(inputs[k]) for k in sorted(inputs))})"
+        return RunnableLambda(run)
+
+    def astep(self, name, delay=0.05):
+        async def run(inputs):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(delay)
+            self.active -= 1
+            return f"{name}({','.join(str(inputs[k]) for k in sorted(inputs))})"
+        return RunnableLambda(run)
+
+
+def diamond(tracker, make=None):
+    make = make or tracker.step
+    return DagChain([
+        Step("final", runnable=make("final"), inputs=["left", "right"]),
+        Step("left", runnable=make("left"), inputs=["topic"]),
+        Step("right", runnable=make("right"), inputs=["topic"]),
+    ])
+
+
+class TestDefinition:
+    """Tests for step definitions and validation"""
+
+    def test_prompt_variables_are_inputs(self):
+        """Verify a prompt step reads its template variables"""
+        assert Step("s", "About {topic} using {facts}").inputs == ["facts", "topic"]
+
+    def test_orders_by_dependency(self):
+        """Verify steps are ordered after the steps they read"""
+        chain = diamond(Tracker())
+        assert [s.name for s in chain.steps] == ["left", "right", "final"]
+        assert chain.input_keys == ["topic"]
+
+    def test_rejects_cycles_and_duplicates(self):
+        """Verify cycles, duplicate names and ambiguous steps are errors"""
+        with pytest.raises(ValueError, match="cycle"):
+            topological_order([Step("a", "{b}"), Step("b", "{a}")])
+        with pytest.raises(ValueError, match="Duplicate"):
+            topological_order([Step("a", "{x}"), Step("a", "{y}")])
+        with pytest.raises(ValueError):
+            Step("a", runnable=RunnableLambda(lambda x: x))
+
+    def test_missing_input(self):
+        """Verify a missing chain input is reported before any step runs"""
+        with pytest.raises(ValueError, match="topic"):
+            diamond(Tracker()).invoke({})
+
+
+class TestExecution:
+    """Tests for concurrent execution"""
+
+    def test_independent_steps_run_concurrently(self):
+        """Verify independent steps overlap and dependents see their outputs"""
+        tracker = Tracker()
+        started = time.perf_counter()
+        result = diamond(tracker).invoke({"topic": "t"})
+        assert time.perf_counter() - started < 0.14
+        assert tracker.peak == 2
+        assert result == {"topic": "t", "left": "left(t)", "right": "right(t)", "final": "final(left(t),right(t))"}
+
+    def test_async_independent_steps_run_concurrently(self):
+        """Verify the async path overlaps independent steps too"""
+        tracker = Tracker()
+        result = asyncio.run(diamond(tracker, tracker.astep).ainvoke({"topic": "t"}))
+        assert tracker.peak == 2
+        assert result["final"] == "final(left(t),right(t))"
+
+    def test_max_concurrency(self):
+        """Verify max_concurrency caps steps running at once"""
+        tracker = Tracker()
+        chain = DagChain([Step(n, runnable=tracker.step(n), inputs=["topic"]) for n in "abcd"], max_concurrency=1)
+        chain.invoke({"topic": "t"})
+        assert tracker.peak == 1
+
+    def test_stream_yields_inputs_then_steps(self):
+        """Verify streaming yields the inputs, then each step output as it finishes"""
+        deltas = list(diamond(Tracker()).stream({"topic": "t"}))
+        assert deltas[0] == {"topic": "t"}
+        assert set(deltas[1]) | set(deltas[2]) == {"left", "right"}
+        assert list(deltas[3]) == ["final"]
+
+    def test_step_error_propagates(self):
+        """Verify a failing step fails the chain"""
+        def fail(inputs):
+            raise RuntimeError("boom")
+        chain = DagChain([Step("a", runnable=RunnableLambda(fail), inputs=["topic"]),
+                          Step("b", runnable=RunnableLambda(lambda x: "ok"), inputs=["a"])])
+        with pytest.raises(RuntimeError, match="boom"):
+            chain.invoke({"topic": "t"})
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(chain.ainvoke({"topic": "t"}))
+
+
+class TestChainTypes:
+    """Tests for the DAG chain types in get_chain"""
+
+    def test_research_chain_outputs(self):
+        """Verify the research chain keeps its named outputs"""
+        result = get_chain("research", FakeStreamingChatModel(echo=True)).invoke({"topic": "solar"})
+        assert set(result) == {"topic", "research_data", "outline", "summary"}
+        assert "solar" in result["research_data"]
+
+    def test_deep_research_runs_angles_concurrently(self):
+        """Verify deep_research takes about three model calls of time, not five"""
+        llm = FakeStreamingChatModel(first_token_delay=0.05)
+        chain = get_chain("deep_research", llm)
+        started = time.perf_counter()
+        result = asyncio.run(chain.ainvoke({"topic": "solar"}))
+        assert time.perf_counter() - started < 0.22
+        assert set(result) == {"topic", "facts", "history", "challenges", "outline", "summary"}
+
+    def test_register_chain(self):
+        """Verify new chain types can be registered from steps"""
+        try:
+            register_chain("pros_cons", [Step("pros", "Pros of {topic}"), Step("cons", "Cons of {topic}")])
+            result = get_chain("pros_cons", FakeStreamingChatModel(echo=True)).invoke({"topic": "tea"})
+            assert "Pros of tea" in result["pros"] and "Cons of tea" in result["cons"]
+        finally:
+            CHAINS.pop("pros_cons", None)
+
+
+class CountingModel:
+    """A model stand-in that records the last prompt message of every call"""
+
+    def __init__(self):
+        self.prompts = []
+        self.runnable = RunnableLambda(self._answer, name="counting")
+
+    def _answer(self, messages):
+        text = messages.to_messages()[-1].text if hasattr(messages, "to_messages") else messages[-1].text
+        self.prompts.append(text)
+        return AIMessage(content=f"answer to: {text[:20]}")
+
+
+class TestStepCache:
+    """Tests for step memoization"""
+
+    def test_rerun_is_served_from_cache(self):
+        """Verify re-running with unchanged inputs makes no model calls"""
+        model, cache = CountingModel(), StepCache()
+        first = get_chain("research", model.runnable, cache=cache).invoke({"topic": "solar"})
+        second = get_chain("research", model.runnable, cache=cache).invoke({"topic": "solar"})
+        assert len(model.prompts) == 3
+        assert first == second
+        assert cache.stats()["hits"] == 3
+
+    def test_only_changed_step_reruns(self):
+        """Verify editing the summary prompt re-runs only the summary step"""
+        model, cache = CountingModel(), StepCache()
+        DagChain(RESEARCH_STEPS, model.runnable, cache=cache).invoke({"topic": "solar"})
+        edited = RESEARCH_STEPS[:2] + [Step("summary", "Write one sentence about {topic} from:\n{outline}")]
+        DagChain(edited, model.runnable, cache=cache).invoke({"topic": "solar"})
+        assert len(model.prompts) == 4
+        assert model.prompts[-1].startswith("Write one sentence")
+
+    def test_changed_input_reruns_downstream(self):
+        """Verify a new chain input re-runs every step that depends on it"""
+        model, cache = CountingModel(), StepCache()
+        chain = get_chain("research", model.runnable, cache=cache)
+        chain.invoke({"topic": "solar"})
+        chain.invoke({"topic": "wind"})
+        assert len(model.prompts) == 6
+
+    def test_model_params_are_part_of_the_key(self):
+        """Verify a different model configuration does not reuse cached outputs"""
+        cache = StepCache()
+        a = get_chain("research", FakeStreamingChatModel(reply="from a"), cache=cache).invoke({"topic": "x"})
+        b = get_chain("research", FakeStreamingChatModel(reply="from b"), cache=cache).invoke({"topic": "x"})
+        assert a["summary"] == "from a" and b["summary"] == "from b"
+
+    def test_async_and_streaming_use_cache(self):
+        """Verify ainvoke and stream read and fill the same cache"""
+        model, cache = CountingModel(), StepCache()
+        chain = get_chain("deep_research", model.runnable, cache=cache)
+        asyncio.run(chain.ainvoke({"topic": "solar"}))
+        deltas = list(chain.stream({"topic": "solar"}))
+        assert len(model.prompts) == 5
+        assert len(deltas) == 6
+
+    def test_disk_cache_survives_restart(self, tmp_path):
+        """Verify outputs stored on disk are reused by a new cache"""
+        model = CountingModel()
+        get_chain("research", model.runnable, cache=StepCache(str(tmp_path))).invoke({"topic": "solar"})
+        get_chain("research", model.runnable, cache=StepCache(str(tmp_path))).invoke({"topic": "solar"})
+        assert len(model.prompts) == 3
+        assert len(list(tmp_path.rglob("*.json"))) == 3
+
+    def test_runnable_steps_need_a_version(self):
+        """Verify runnable steps are cached only when versioned"""
+        calls = []
+        run = RunnableLambda(lambda x: calls.append(x) or "done")
+        cache = StepCache()
+        for version in (None, None, "1", "1"):
+            DagChain([Step("a", runnable=run, inputs=["topic"], version=version)], cache=cache).invoke({"topic": "t"})
+        assert len(calls) == 3
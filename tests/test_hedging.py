@@ -0,0 +1,164 @@
+import pytest
+import sys
+import os
+import asyncio
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+from src.chains import get_chain
+from src.fake_llm import FakeStreamingChatModel
+from src.hedging import HedgeBudget, HedgedChatModel, Hedger, LatencyTracker
+from src.scheduler import priority, request_class
+
+
+class ScheduledModel(FakeStreamingChatModel):
+    """Fake model whose n-th call waits delays[n] before its first token"""
+
+    delays: list = []
+    calls: int = 0
+
+    def _first_delay(self) -> float:
+        index = self.calls
+        self.calls += 1
+        return self.delays[index] if index < len(self.delays) else self.first_token_delay
+
+
+class ClassRecordingModel(ScheduledModel):
+    """ScheduledModel that records the priority class each call runs under"""
+
+    seen: list = []
+
+    def _first_delay(self) -> float:
+        self.seen.append(request_class())
+        return super()._first_delay()
+
+
+def warmed_hedger(**options):
+    """A Hedger whose latency history says calls normally take about 10 ms"""
+    hedger = Hedger(min_samples=5, **options)
+    for _ in range(5):
+        hedger.latency.record(0.01)
+        hedger.first_token.record(0.01)
+    hedger.budget.credit = hedger.budget.burst
+    return hedger
+
+
+class TestPolicy:
+    """Tests for the latency window and the hedge budget"""
+
+    def test_percentile_needs_samples(self):
+        """Verify no hedge delay is reported until enough samples exist"""
+        tracker = LatencyTracker(min_samples=3)
+        tracker.record(0.1)
+        assert tracker.percentile(95) is None
+        tracker.record(0.2)
+        tracker.record(0.3)
+        assert tracker.percentile(50) == 0.2
+
+    def test_budget_caps_hedge_rate(self):
+        """Verify the budget allows about ratio hedges per request"""
+        budget = HedgeBudget(ratio=0.1, burst=1)
+        hedges = 0
+        for _ in range(100):
+            budget.earn()
+            hedges += budget.try_spend()
+        assert 9 <= hedges <= 10
+
+
+class TestHedgedChatModel:
+    """Tests for racing duplicate calls"""
+
+    def test_no_hedging_while_warming_up(self):
+        """Verify calls pass straight through until latency history exists"""
+        inner = ScheduledModel(delays=[0.05])
+        llm = HedgedChatModel(llm=inner, hedger=Hedger(min_samples=5))
+        assert llm.invoke("hi").content == inner.reply
+        assert inner.calls == 1
+        assert llm.stats()["hedging"]["hedged"] == 0
+
+    def test_slow_sync_call_is_hedged(self):
+        """Verify a call slower than the percentile is raced and the fast duplicate wins"""
+        inner = ScheduledModel(delays=[1.0, 0.0])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger())
+
+        started = time.perf_counter()
+        assert llm.invoke("hi").content == inner.reply
+        assert time.perf_counter() - started < 0.5
+        stats = llm.stats()["hedging"]
+        assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+
+    def test_fast_call_is_not_hedged(self):
+        """Verify calls within the percentile are not duplicated"""
+        inner = ScheduledModel(delays=[0.0])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger(min_delay=0.2))
+        llm.invoke("hi")
+        assert inner.calls == 1
+
+    def test_budget_exhausted_means_no_hedge(self):
+        """Verify slow calls are not hedged once the budget is spent"""
+        inner = ScheduledModel(delays=[0.1])
+        hedger = warmed_hedger()
+        hedger.budget.credit = 0
+        llm = HedgedChatModel(llm=inner, hedger=hedger)
+        llm.invoke("hi")
+        assert inner.calls == 1
+        assert hedger.stats()["hedged"] == 0
+
+    def test_async_loser_is_cancelled(self):
+        """Verify the slow async call is cancelled once the duplicate answers"""
+        inner = ScheduledModel(delays=[1.0, 0.0])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger())
+
+        async def main():
+            started = time.perf_counter()
+            message = await llm.ainvoke("hi")
+            elapsed = time.perf_counter() - started
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            return message, elapsed, pending
+
+        message, elapsed, pending = asyncio.run(main())
+        assert message.content == inner.reply
+        assert elapsed < 0.5
+        assert pending == []
+
+    def test_async_stream_hedges_on_first_token(self):
+        """Verify a stream with a late first token is replaced by a faster duplicate"""
+        inner = ScheduledModel(reply="one two three", delays=[1.0, 0.0])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger())
+
+        async def main():
+            return "".join([chunk.content async for chunk in llm.astream("hi")])
+
+        started = time.perf_counter()
+        assert asyncio.run(main()) == "one two three"
+        assert time.perf_counter() - started < 0.5
+        assert llm.stats()["hedging"]["hedge_wins"] == 1
+
+    def test_sync_stream_hedges_on_first_token(self):
+        """Verify sync streaming also races a late first token"""
+        inner = ScheduledModel(reply="one two three", delays=[1.0, 0.0])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger())
+
+        started = time.perf_counter()
+        assert "".join(chunk.content for chunk in llm.stream("hi")) == "one two three"
+        assert time.perf_counter() - started < 0.5
+        assert llm.stats()["hedging"]["hedge_wins"] == 1
+
+    def test_attempts_keep_the_callers_context(self):
+        """Verify both sync attempts, invoke and stream, run at the caller's priority and tenant"""
+        inner = ClassRecordingModel(delays=[1.0, 0.0, 1.0, 0.0], seen=[])
+        llm = HedgedChatModel(llm=inner, hedger=warmed_hedger())
+        with priority("batch", tenant_id="acme"):
+            llm.invoke("hi")
+            list(llm.stream("hi"))
+        assert inner.seen == [("batch", "acme")] * 4
+
+    def test_research_chain_runs_hedged(self):
+        """Verify the serial research chain works on a hedged model"""
+        llm = HedgedChatModel(llm=FakeStreamingChatModel(reply="text"))
+        result = get_chain("research", llm).invoke({"topic": "solar"})
+        assert result["summary"] == "text"
+        assert llm.stats()["hedging"]["requests"] == 3
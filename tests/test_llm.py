@@ -0,0 +1,143 @@
+import pytest
+import sys
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import src.llm as llm_module
+from src.llm import configure_bedrock_client, get_bedrock_client, get_llm, set_llm, reset_llm
+from tests.bedrock_stub import BedrockStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestModelFactory:
+    """Tests for the lazy, cached model factory"""
+
+    def setup_method(self):
+        """Start each test with no cached or injected models"""
+        reset_llm()
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_injected_model_is_returned(self):
+        """Verify set_llm injects a model for every get_llm call"""
+        fake = FakeListChatModel(responses=["hi"])
+        set_llm(fake)
+        assert get_llm() is fake
+        assert get_llm(temperature=0.1) is fake
+
+    def test_models_created_once(self, monkeypatch):
+        """Verify get_llm builds each configuration only on first use"""
+        created = []
+        monkeypatch.setattr(llm_module, "create_bedrock_llm", lambda *args: created.append(args) or object())
+
+        first = get_llm(temperature=0.9)
+        assert get_llm(temperature=0.9) is first
+        assert get_llm(temperature=0.7) is not first
+        assert len(created) == 2
+
+    def test_client_cached_per_region(self, monkeypatch):
+        """Verify the Bedrock client is created lazily and reused (empty AWS_PROFILE is ignored)"""
+        monkeypatch.setenv("AWS_PROFILE", "")
+        client = get_bedrock_client("us-east-1")
+        assert get_bedrock_client("us-east-1") is client
+        assert get_bedrock_client("us-west-2") is not client
+
+
+class TestLazyImports:
+    """Regression checks that importing the labs does not load AWS libraries"""
+
+    @pytest.mark.parametrize("module", ["langchain_chatbot_lab", "day2_lab"])
+    def test_import_does_not_load_boto(self, module):
+        """Verify importing a lab module skips boto3/botocore/langchain_aws and needs no AWS_PROFILE"""
+        env = dict(os.environ)
+        env.pop("AWS_PROFILE", None)
+        code = (
+            f"import sys, {module}; "
+            "leaked = [m for m in ('boto3', 'botocore', 'langchain_aws') if m in sys.modules]; "
+            "sys.exit(', '.join(leaked) or None)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+    def test_lab_uses_injected_model(self):
+        """Verify lab functions run against an injected fake model"""
+        import langchain_chatbot_lab
+
+        set_llm(FakeListChatModel(responses=["Bonjour!"]))
+        try:
+            assert langchain_chatbot_lab.my_chatbot("French", "Hello") == "Bonjour!"
+            assert langchain_chatbot_lab.llm is llm_module.get_llm()
+        finally:
+            reset_llm()
+
+
+class TestPooledClient:
+    """Tests for the shared, pooled Bedrock client against a local stub endpoint"""
+
+    def setup_method(self):
+        reset_llm()
+
+    def teardown_method(self):
+        reset_llm()
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+
+    def test_client_uses_configured_settings(self):
+        """Verify pool size, timeouts, keep-alive and retry mode reach botocore"""
+        configure_bedrock_client(max_pool_connections=7, read_timeout=30, retry_mode="adaptive", max_attempts=2)
+        config = get_bedrock_client().meta.config
+
+        assert config.max_pool_connections == 7
+        assert config.read_timeout == 30
+        assert config.tcp_keepalive is True
+        assert config.retries["mode"] == "adaptive"
+        assert config.retries["total_max_attempts"] == 3
+
+    def test_unknown_setting_raises_error(self):
+        """Verify configure_bedrock_client rejects unknown settings"""
+        with pytest.raises(ValueError) as exc_info:
+            configure_bedrock_client(pool=5)
+        assert "Unknown client setting" in str(exc_info.value)
+
+    def test_models_share_one_client(self):
+        """Verify chat models with different parameters share the client and rate limiter"""
+        first = get_llm(temperature=0.9)
+        second = get_llm(temperature=0.2)
+        assert first.llm.client is second.llm.client
+        assert first.limiter is second.limiter
+
+    def test_connections_reused_across_threads(self):
+        """Verify concurrent calls reuse pooled keep-alive connections instead of reconnecting"""
+        with BedrockStub(reply="pooled", delay=0.01) as stub:
+            configure_bedrock_client(endpoint_url=stub.url, max_pool_connections=8)
+            llm = get_llm()
+
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                replies = list(pool.map(lambda _: llm.invoke("hi").content, range(40)))
+
+        assert replies == ["pooled"] * 40
+        assert stub.requests == 40
+        # One connection per concurrent caller at most, never one per request
+        assert len(stub.connections) <= 8
+
+    def test_throttle_is_retried(self):
+        """Verify a ThrottlingException is retried once, by the rate limiter rather than botocore"""
+        with BedrockStub(reply="eventually") as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+            stub.faults = [429]
+            llm = get_llm()
+            assert llm.invoke("hi").content == "eventually"
+
+        assert stub.requests == 2
+        assert llm.limiter.stats()["throttled"] == 1
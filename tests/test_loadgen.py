@@ -0,0 +1,144 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fake_llm import FakeStreamingChatModel
+from src.loadgen import format_report, load_conversations, rss_bytes, run_load, synthetic_conversations
+from src.memory import build_memory_chatbot, configure_session_store, memory_store, reset_session_store
+import langchain_chatbot_lab
+
+
+class StubChatbot:
+    """Chatbot stand-in that records concurrency and can fail on a marker message"""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if inputs["input"] == "fail":
+                raise RuntimeError("boom")
+            return inputs["input"]
+        finally:
+            self.active -= 1
+
+
+class TestConversations:
+    """Tests for conversation sources"""
+
+    def test_synthetic_is_repeatable(self):
+        """Verify synthetic conversations respect the turn range and the seed"""
+        first = list(synthetic_conversations(20, turns=(2, 4), seed=1))
+        assert first == list(synthetic_conversations(20, turns=(2, 4), seed=1))
+        assert all(2 <= len(c["turns"]) <= 4 for c in first)
+        assert len({c["session_id"] for c in first}) == 20
+
+    def test_load_recorded(self, tmp_path):
+        """Verify recorded conversations are read from JSONL"""
+        path = tmp_path / "conversations.jsonl"
+        path.write_text('{"session_id": "a", "turns": ["hi", "bye"]}\n\n{"turns": ["solo"]}\n')
+        assert list(load_conversations(str(path))) == [
+            {"session_id": "a", "turns": ["hi", "bye"]},
+            {"session_id": "recorded-3", "turns": ["solo"]},
+        ]
+
+
+class TestRunLoad:
+    """Tests for the load run and its report"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_memory_chatbot_report(self):
+        """Verify every turn runs through the memory chatbot and the report adds up"""
+        conversations = list(synthetic_conversations(30, turns=(1, 3)))
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+        report = asyncio.run(run_load(chatbot, conversations, concurrency=10, sample_interval=0.01))
+        turns = sum(len(c["turns"]) for c in conversations)
+        assert report["sessions"] == 30
+        assert report["turns"] == turns
+        assert report["store"]["sessions"] == 30
+        assert report["store"]["messages"] == 2 * turns
+        assert report["latency_s"]["p50"] <= report["latency_s"]["p99"] <= report["latency_s"]["max"]
+        assert report["timeline"][0]["turns"] == 0
+        assert report["timeline"][-1]["turns"] == turns
+        json.dumps(report)
+
+    def test_shared_session_store_report(self, tmp_path):
+        """Verify a configured shared session store is the one measured"""
+        configure_session_store(str(tmp_path / "sessions.db"))
+        try:
+            chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+            report = asyncio.run(run_load(chatbot, synthetic_conversations(12, turns=(1, 2)), concurrency=4))
+        finally:
+            reset_session_store()
+        assert report["store"]["sessions"] == 12
+        assert report["store"]["bytes"] > 0
+        assert memory_store == {}
+        assert "12 sessions" in format_report(report)
+
+    def test_concurrency_cap(self):
+        """Verify no more than `concurrency` sessions run at once"""
+        chatbot = StubChatbot()
+        asyncio.run(run_load(chatbot, synthetic_conversations(40, turns=(1, 2)), concurrency=5, store={}))
+        assert chatbot.peak == 5
+
+    def test_arrival_rate_spreads_sessions(self):
+        """Verify an arrival rate paces session starts"""
+        chatbot = StubChatbot(delay=0)
+        report = asyncio.run(run_load(chatbot, synthetic_conversations(20, turns=(1, 1)), arrival_rate=200, store={}))
+        assert report["duration_s"] > 0.04
+        assert chatbot.peak <= 5
+
+    def test_arrivals_do_not_wait_for_slots(self):
+        """Verify sessions keep arriving on schedule while every slot is busy, and their wait is reported"""
+        chatbot = StubChatbot(delay=0.05)
+        conversations = synthetic_conversations(20, turns=(1, 1))
+        report = asyncio.run(run_load(chatbot, conversations, concurrency=2, arrival_rate=200, store={}))
+
+        arrivals = report["arrivals"]
+        assert chatbot.peak == 2
+        # Blocking on a slot would cap arrivals at concurrency / delay = 40 per second
+        assert arrivals["requested_rate"] == 200
+        assert arrivals["achieved_rate"] > 100
+        assert arrivals["queue_wait_s"]["max"] > 0.2
+        assert "queue wait" in format_report(report)
+
+    def test_errors_end_the_session(self):
+        """Verify a failed turn is counted and stops that session only"""
+        conversations = [{"session_id": "a", "turns": ["fail", "never sent"]}, {"session_id": "b", "turns": ["ok"]}]
+        report = asyncio.run(run_load(StubChatbot(), conversations, store={}))
+        assert report["errors"] == {"RuntimeError": 1}
+        assert report["turns"] == 1
+
+    def test_format_report(self):
+        """Verify the text summary shows throughput, percentiles and memory"""
+        report = asyncio.run(run_load(StubChatbot(), synthetic_conversations(5), store={}))
+        text = format_report(report)
+        assert "turns/s" in text and "p99" in text and "per session" in text
+        assert rss_bytes() > 0
+
+
+class TestCommand:
+    """Tests for the loadtest command"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_loadtest_writes_json(self, tmp_path, capsys):
+        """Verify `loadtest` prints a summary and writes the JSON report"""
+        path = tmp_path / "report.json"
+        code = langchain_chatbot_lab.main(["loadtest", "--sessions", "5", "--latency", "0", "--json", str(path)])
+        assert code == 0
+        assert "Sessions 5" in capsys.readouterr().out
+        assert json.loads(path.read_text())["sessions"] == 5
@@ -0,0 +1,158 @@
+import pytest
+import sys
+import os
+import asyncio
+import threading
+import tracemalloc
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from src.chains import get_chain
+from src.dag import DagChain
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import reset_llm, set_llm
+from src.memory import build_memory_chatbot, chat, memory_store
+from src.profiling import (REPORT_FILE, ProfiledRunnable, configure_profiling, get_profiler, profiled,
+                           reset_profiling)
+from src.tools import invoke_tool
+import langchain_chatbot_lab
+
+
+@pytest.fixture(autouse=True)
+def no_profiling(monkeypatch):
+    monkeypatch.delenv("LLM_PROFILE", raising=False)
+    monkeypatch.delenv("LLM_PROFILE_DIR", raising=False)
+    reset_profiling()
+    memory_store.clear()
+    yield
+    reset_profiling()
+
+
+def profiles(directory):
+    return sorted(p.name for p in directory.glob("*.prof"))
+
+
+class TestDisabled:
+    """Tests for profiling when it is off"""
+
+    def test_entry_points_are_unwrapped(self):
+        """Verify chains and chatbots are returned as-is and requests are not profiled"""
+        assert get_profiler() is None
+        assert type(get_chain("research", FakeStreamingChatModel())) is DagChain
+        assert isinstance(build_memory_chatbot(FakeStreamingChatModel()), RunnableWithMessageHistory)
+        assert profiled("a") is profiled("b")
+
+    def test_environment(self, tmp_path, monkeypatch):
+        """Verify LLM_PROFILE and LLM_PROFILE_DIR enable profiling"""
+        monkeypatch.setenv("LLM_PROFILE", "5")
+        monkeypatch.setenv("LLM_PROFILE_DIR", str(tmp_path))
+        reset_profiling()
+        assert get_profiler().sample_rate == 5
+        assert get_profiler().directory == str(tmp_path)
+
+
+class TestSampling:
+    """Tests for sampled request profiles"""
+
+    def test_one_in_n(self, tmp_path):
+        """Verify every Nth chat turn is profiled and the aggregate report is written"""
+        profiler = configure_profiling(str(tmp_path), sample_rate=3)
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+        for n in range(6):
+            chat(chatbot, f"message {n}", session_id="s")
+        assert profiler.stats() == {"requests": 6, "profiled": 2, "skipped": 0}
+        assert profiles(tmp_path) == ["000001-chat.prof", "000002-chat.prof"]
+        report = (tmp_path / REPORT_FILE).read_text()
+        assert "2 requests profiled of 6" in report and "Time by category" in report
+        assert not tracemalloc.is_tracing()
+
+    def test_per_call_flag(self, tmp_path, monkeypatch):
+        """Verify profile=True profiles one call with profiling otherwise off"""
+        monkeypatch.setenv("LLM_PROFILE_DIR", str(tmp_path))
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+        assert chat(chatbot, "hello", profile=True) == "Echo: hello"
+        chat(chatbot, "again")
+        assert profiles(tmp_path) == ["000001-chat.prof"]
+        text = (tmp_path / "000001-chat.txt").read_text()
+        assert text.startswith("Request chat (ok)")
+        assert "pydantic" in text and "Top allocations" in text
+
+    def test_nested_requests_are_one_profile(self, tmp_path):
+        """Verify a tool call inside a profiled request is part of its profile"""
+        profiler = configure_profiling(str(tmp_path))
+        with profiled("outer"):
+            assert invoke_tool("calculator", "6 * 7") == "Result: 42"
+        assert invoke_tool("calculator", "1 + 1", profile=False) == "Result: 2"
+        assert profiler.stats()["requests"] == 1
+        assert profiles(tmp_path) == ["000001-outer.prof"]
+
+    def test_failed_request_is_recorded(self, tmp_path):
+        """Verify a request that raises still writes its profile"""
+        configure_profiling(str(tmp_path))
+        with pytest.raises(RuntimeError):
+            with profiled("broken"):
+                raise RuntimeError("boom")
+        assert "(RuntimeError: boom)" in (tmp_path / "000001-broken.txt").read_text()
+
+    def test_overlapping_request_is_skipped(self, tmp_path):
+        """Verify only one request is profiled at a time"""
+        profiler = configure_profiling(str(tmp_path))
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            with profiled("slow"):
+                started.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=slow)
+        thread.start()
+        started.wait(5)
+        with profiled("overlapping"):
+            pass
+        release.set()
+        thread.join()
+        assert profiler.stats() == {"requests": 2, "profiled": 1, "skipped": 1}
+
+
+class TestCoverage:
+    """Tests for the profiled entry points"""
+
+    def test_chain(self, tmp_path):
+        """Verify get_chain(profile=True) profiles invoke, stream and ainvoke"""
+        configure_profiling(str(tmp_path), sample_rate=0)
+        chain = get_chain("research", FakeStreamingChatModel(echo=True), profile=True)
+        assert isinstance(chain, ProfiledRunnable)
+        assert chain.input_keys == ["topic"]
+        assert "solar" in chain.invoke({"topic": "solar"})["summary"]
+        assert len(list(chain.stream({"topic": "solar"}))) == 4
+        asyncio.run(chain.ainvoke({"topic": "solar"}))
+        assert profiles(tmp_path) == ["000001-chain.research.prof", "000002-chain.research.prof",
+                                      "000003-chain.research.prof"]
+
+    def test_memory_chatbot_stream(self, tmp_path):
+        """Verify a sampled memory chatbot profiles streamed turns"""
+        configure_profiling(str(tmp_path))
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+
+        async def turn():
+            config = {"configurable": {"session_id": "s"}}
+            return [chunk.content async for chunk in chatbot.astream({"input": "hi there"}, config=config)]
+
+        assert "".join(asyncio.run(turn())) == "Echo: hi there"
+        assert profiles(tmp_path) == ["000001-memory_chatbot.prof"]
+
+    def test_summarizer(self, tmp_path):
+        """Verify my_summarizer and map-reduce summaries are profiled once per call"""
+        langchain_chatbot_lab.get_router.cache_clear()
+        set_llm(FakeStreamingChatModel(reply="summary"))
+        try:
+            profiler = configure_profiling(str(tmp_path))
+            assert langchain_chatbot_lab.my_summarizer("brief", "word " * 50, long_document=True) == "summary"
+            assert profiler.stats()["requests"] == 1
+            assert profiles(tmp_path) == ["000001-summarize.prof"]
+        finally:
+            reset_llm()
+            langchain_chatbot_lab.get_router.cache_clear()
@@ -0,0 +1,231 @@
+import pytest
+import sys
+import os
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import configure_bedrock_client, get_llm, reset_llm
+from src.ratelimit import (
+    AdaptiveConcurrency, RateLimitedChatModel, RateLimiter, TokenBucket,
+    backoff_delay, configure_rate_limit, get_rate_limiter, is_throttle
+)
+from tests.bedrock_stub import BedrockStub
+
+
+class Throttled(Exception):
+    """Stand-in for a botocore ClientError carrying a ThrottlingException"""
+
+    response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket:
+    """Tests for the per-minute token bucket"""
+
+    def test_waits_when_empty_and_refills(self):
+        """Verify reservations beyond the balance return a wait, and time refills the bucket"""
+        clock = FakeClock()
+        bucket = TokenBucket(60, clock=clock)  # one per second
+        assert bucket.reserve(60) == 0.0
+        assert bucket.reserve(2) == pytest.approx(2.0)
+        clock.now = 10
+        assert bucket.reserve(1) == 0.0
+
+    def test_refund_returns_unused_tokens(self):
+        """Verify refunded tokens are available again"""
+        bucket = TokenBucket(60, clock=FakeClock())
+        bucket.reserve(60)
+        bucket.refund(30)
+        assert bucket.reserve(30) == 0.0
+
+
+class TestAdaptiveConcurrency:
+    """Tests for the AIMD concurrency limit"""
+
+    def test_additive_increase(self):
+        """Verify the limit grows by about one per window of successes"""
+        limit = AdaptiveConcurrency(initial=4, maximum=10)
+        for _ in range(4):
+            limit.release(limit.acquire())
+        assert 4.9 < limit.limit < 5.1
+
+    def test_errors_do_not_grow_the_limit(self):
+        """Verify only successes grow the limit; other failures leave it unchanged"""
+        limit = AdaptiveConcurrency(initial=4, maximum=10)
+        for _ in range(4):
+            limit.release(limit.acquire(), "error")
+        assert (limit.limit, limit.in_flight) == (4, 0)
+        with pytest.raises(ValueError):
+            limit.release(limit.acquire(), "maybe")
+
+    def test_one_cut_per_burst_of_throttles(self):
+        """Verify throttles from calls started before a cut do not cut again"""
+        limit = AdaptiveConcurrency(initial=8)
+        tickets = [limit.acquire() for _ in range(4)]
+        for ticket in tickets:
+            limit.release(ticket, "throttled")
+        assert limit.limit == 4
+
+        limit.release(limit.acquire(), "throttled")
+        assert limit.limit == 2
+
+    def test_limit_blocks_extra_callers(self):
+        """Verify a caller beyond the limit waits for a release"""
+        limit = AdaptiveConcurrency(initial=1)
+        ticket = limit.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limit.acquire(), acquired.set()))
+        thread.start()
+        assert not acquired.wait(0.05)
+        limit.release(ticket)
+        assert acquired.wait(1)
+        thread.join()
+
+    def test_cancelled_async_waiter_leaves_queue(self):
+        """Verify a cancelled async waiter does not leak a slot"""
+        limit = AdaptiveConcurrency(initial=1, maximum=1)
+
+        async def main():
+            ticket = await limit.aacquire()
+            waiter = asyncio.ensure_future(limit.aacquire())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            limit.release(ticket)
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+
+        asyncio.run(main())
+        assert limit.in_flight == 0
+
+
+class TestRateLimiter:
+    """Tests for retries and backoff"""
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Verify backoff stays within the exponential ceiling and the cap"""
+        rng = random.Random(1)
+        delays = [backoff_delay(attempt, base=1, cap=4, rng=rng) for attempt in range(10)]
+        assert all(0 <= delay <= min(4, 2 ** attempt) for attempt, delay in enumerate(delays))
+        assert len(set(delays)) == len(delays)
+
+    def test_throttles_are_retried(self):
+        """Verify throttled calls are retried until they succeed"""
+        limiter = RateLimiter(backoff_base=0.001)
+        outcomes = [Throttled(), Throttled(), "ok"]
+
+        def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        assert limiter.call(call) == "ok"
+        assert limiter.stats()["throttled"] == 2
+        assert limiter.concurrency.limit < 16
+
+    def test_other_errors_are_not_retried(self):
+        """Verify non-transient errors are raised immediately"""
+        limiter = RateLimiter()
+        calls = []
+
+        def call():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            limiter.call(call)
+        assert len(calls) == 1
+        assert not is_throttle(ValueError())
+        assert limiter.concurrency.limit == 16
+
+    def test_retries_exhausted(self):
+        """Verify the throttle is raised once max_retries is used up"""
+        limiter = RateLimiter(max_retries=2, backoff_base=0.001)
+
+        def call():
+            raise Throttled()
+
+        with pytest.raises(Throttled):
+            limiter.call(call)
+        assert limiter.stats()["retries"] == 2
+        assert limiter.stats()["failed"] == 1
+
+
+class TestRateLimitedChatModel:
+    """Tests for the model wrapper and the shared limiter"""
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_token_reservation_is_refunded(self):
+        """Verify unused reserved tokens go back to the bucket after the call"""
+        limiter = RateLimiter(tokens_per_minute=10_000)
+        llm = RateLimitedChatModel(llm=FakeStreamingChatModel(), limiter=limiter)
+        llm.invoke("hello")
+        assert limiter.tokens.level > 9_900
+
+    def test_streaming_goes_through_limiter(self):
+        """Verify async streams hold a slot and count as calls"""
+        limiter = RateLimiter()
+        llm = RateLimitedChatModel(llm=FakeStreamingChatModel(reply="a b c"), limiter=limiter)
+
+        async def main():
+            return "".join([chunk.content async for chunk in llm.astream("hi")])
+
+        assert asyncio.run(main()) == "a b c"
+        assert limiter.stats()["succeeded"] == 1
+        assert limiter.stats()["in_flight"] == 0
+
+    def test_configure_rebuilds_shared_limiter(self):
+        """Verify configure_rate_limit applies to the next shared limiter"""
+        configure_rate_limit(initial_concurrency=3)
+        assert get_rate_limiter().concurrency.limit == 3
+        assert get_rate_limiter() is get_rate_limiter()
+        with pytest.raises(ValueError):
+            configure_rate_limit(burst=5)
+
+
+class TestThrottlingSimulation:
+    """Load simulation against a stub that throttles beyond its capacity"""
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_goodput_is_stable_under_throttling(self):
+        """Verify 32 concurrent callers all succeed while the limiter converges on the stub's capacity"""
+        with BedrockStub(reply="ok", delay=0.02) as stub:
+            stub.capacity = 4
+            configure_bedrock_client(endpoint_url=stub.url, max_pool_connections=32)
+            configure_rate_limit(initial_concurrency=16, backoff_base=0.02, max_retries=10)
+            llm = get_llm()
+
+            with ThreadPoolExecutor(max_workers=32) as pool:
+                replies = list(pool.map(lambda _: llm.invoke("hi").content, range(160)))
+
+        stats = llm.stats()["ratelimit"]
+        assert replies == ["ok"] * 160
+        assert stats["failed"] == 0
+        # Throttles are a small fraction of the traffic instead of a retry storm
+        assert stub.throttled < 160 * 0.25
+        assert stats["concurrency_limit"] <= 8
@@ -0,0 +1,168 @@
+import sys
+import os
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+from src.fake_llm import FakeStreamingChatModel
+from src.memory import build_memory_chatbot, chat, clear_session, get_session_history, memory_store
+from src.retrieval import HistoryRetriever, TurnIndex, tokenize
+
+TOPICS = ["my cat is called Felix", "I live in Lisbon", "my favourite colour is green",
+          "I work as a carpenter", "I play the violin", "my sister is a pilot"]
+
+
+def transcript(turns):
+    messages = []
+    for n in range(turns):
+        messages += [HumanMessage(TOPICS[n % len(TOPICS)] + f" (turn {n})"), AIMessage("Noted.")]
+    return messages
+
+
+class RecordingModel(FakeStreamingChatModel):
+    """Echo model that remembers the prompts it was sent"""
+
+    prompts: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+
+class TestTurnIndex:
+    """Tests for the incremental BM25 index"""
+
+    def test_tokenize(self):
+        """Verify terms are lowercased words without stopwords"""
+        assert tokenize("What is the Capital of France?") == ["capital", "france"]
+
+    def test_search_ranks_matching_turns(self):
+        """Verify the turn sharing rare terms with the query ranks first"""
+        index = TurnIndex()
+        index.update(transcript(12))
+        assert index.search("which city do I live in, Lisbon?", 2)[0] in (1, 7)
+        assert set(index.search("Lisbon", 5)) == {1, 7}
+        assert index.search("Lisbon", 5, before=5) == [1]
+        assert index.search("unrelated words", 3) == []
+
+    def test_update_is_incremental(self):
+        """Verify only new messages are indexed, and replies join their turn"""
+        index = TurnIndex()
+        messages = transcript(3)
+        index.update(messages)
+        assert (len(index), index.indexed) == (3, 6)
+        messages.append(AIMessage("Also, Felix likes fish."))
+        index.update(messages)
+        assert len(index) == 3 and set(index.search("fish", 3)) == {2}
+        assert index.starts == [0, 2, 4]
+
+
+class TestHistoryRetriever:
+    """Tests for selecting the prompt history"""
+
+    def test_short_sessions_are_sent_whole(self):
+        """Verify sessions up to min_turns keep their full history"""
+        retriever = HistoryRetriever(top_k=2, recent_turns=2)
+        messages = transcript(4)
+        assert retriever.select("s", messages, "Felix") == messages
+
+    def test_relevant_and_recent_turns(self):
+        """Verify the history is the matching turns then the latest turns, in order"""
+        retriever = HistoryRetriever(top_k=1, recent_turns=2)
+        messages = transcript(30)
+        selected = retriever.select("s", messages, "what does my sister do?")
+        assert [m.content for m in selected[2::2]] == ["I play the violin (turn 28)", "my sister is a pilot (turn 29)"]
+        assert selected[0].content.startswith("my sister is a pilot") and selected[1].content == "Noted."
+        assert retriever.stats()["messages_out"] == 6
+
+    def test_cleared_session_is_reindexed(self):
+        """Verify a session that starts over gets a fresh index"""
+        retriever = HistoryRetriever(top_k=1, recent_turns=1)
+        retriever.select("s", transcript(10), "Felix")
+        fresh = [HumanMessage("hello again"), AIMessage("hi")] * 3
+        assert len(retriever.index_for("s", fresh)) == 3
+
+
+    def test_concurrent_turns_in_one_session(self):
+        """Verify concurrent turns of one session can index and search it at once"""
+        retriever = HistoryRetriever(top_k=2, recent_turns=1)
+        errors = []
+
+        def turns(worker):
+            messages = transcript(8)
+            try:
+                for n in range(200):
+                    messages += [HumanMessage(f"new words w{worker}x{n} y{n} Lisbon"), AIMessage("Noted.")]
+                    retriever.select("s", messages, f"Lisbon y{n} w{worker}x{n}")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=turns, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert retriever.stats()["retrievals"] == 800
+
+    def test_sessions_do_not_wait_for_each_other(self):
+        """Verify a turn in one session is not blocked while another session's index is in use"""
+        retriever = HistoryRetriever(top_k=1, recent_turns=1)
+        done = threading.Event()
+
+        def other_turn():
+            retriever.select("other", transcript(10), "Felix")
+            done.set()
+
+        with retriever._session("busy").lock:
+            thread = threading.Thread(target=other_turn)
+            thread.start()
+            assert done.wait(2)
+        thread.join()
+
+    def test_least_recently_used_sessions_evicted(self):
+        """Verify at most max_sessions indexes are kept, dropping the least recently used"""
+        retriever = HistoryRetriever(top_k=1, recent_turns=1, max_sessions=2)
+        for session_id in ["a", "b", "a", "c"]:
+            retriever.select(session_id, transcript(10), "Felix")
+        assert retriever.stats()["sessions"] == 2
+        assert list(retriever._indexes) == ["a", "c"]
+
+
+class TestMemoryChatbotRetrieval:
+    """Tests for build_memory_chatbot(retrieval=...)"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_prompt_gets_selected_history(self):
+        """Verify the model sees the relevant and recent turns while the full history is stored"""
+        llm = RecordingModel(reply="Noted.", prompts=[])
+        chatbot = build_memory_chatbot(llm, retrieval=HistoryRetriever(top_k=1, recent_turns=1))
+        for n in range(12):
+            chat(chatbot, TOPICS[n % len(TOPICS)], session_id="long")
+        chat(chatbot, "Remind me where I live: Lisbon?", session_id="long")
+
+        prompt = [m.content for m in llm.prompts[-1]]
+        assert prompt[1:4:2] == ["I live in Lisbon", "my sister is a pilot"]
+        assert len(prompt) == 1 + 4 + 1  # system, two turns, new message
+        assert len(get_session_history("long").messages) == 26
+
+    def test_clear_session_drops_the_index(self):
+        """Verify clearing a session also drops its retrieval index"""
+        retriever = HistoryRetriever(top_k=1, recent_turns=1)
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(reply="Noted."), retrieval=retriever)
+        chat(chatbot, "I live in Lisbon", session_id="gone")
+        assert retriever.stats()["sessions"] == 1
+
+        assert clear_session("gone")
+        assert retriever.stats()["sessions"] == 0
+
+    def test_retrieval_true_uses_defaults(self):
+        """Verify retrieval=True works with a stock chat model"""
+        chatbot = build_memory_chatbot(GenericFakeChatModel(messages=iter(["a", "b"])), retrieval=True)
+        assert chat(chatbot, "hi", session_id="s") == "a"
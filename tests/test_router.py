@@ -0,0 +1,152 @@
+import pytest
+import sys
+import os
+import asyncio
+import logging
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import reset_llm, set_llm
+from src.router import NOVA_LITE, NOVA_MICRO, NOVA_PRO, ModelRouter
+
+
+class FakeModels:
+    """Model factory for the router: each model answers with its own id"""
+
+    def __init__(self):
+        self.created = []
+
+    def __call__(self, model_id, max_tokens):
+        self.created.append((model_id, max_tokens))
+        return FakeStreamingChatModel(reply=model_id)
+
+
+def make_router(**options):
+    models = FakeModels()
+    return ModelRouter(get_model=models, min_samples=2, **options), models
+
+
+class TestChoose:
+    """Tests for the routing policy"""
+
+    def test_cheapest_model_for_mode(self):
+        """Verify brief work goes to the small model and detailed work to a larger one"""
+        router, _ = make_router()
+        assert router.choose("summarize_brief", 400)["model_id"] == NOVA_MICRO
+        assert router.choose("tools", 50)["model_id"] == NOVA_MICRO
+        assert router.choose("summarize_detailed", 400)["model_id"] == NOVA_LITE
+
+    def test_unknown_mode_uses_default(self):
+        """Verify modes without a route get the default model and budget"""
+        router, _ = make_router()
+        decision = router.choose("something else", 10)
+        assert decision["model_id"] == NOVA_LITE
+        assert decision["max_tokens"] == 2000
+        assert decision["reason"] == "no route"
+
+    def test_long_input_skips_small_model(self):
+        """Verify inputs beyond a model's limit go to the next candidate"""
+        router, _ = make_router()
+        decision = router.choose("chatbot", 20_000)
+        assert decision["model_id"] == NOVA_LITE
+        assert decision["reason"] == "input length"
+
+    def test_budget_scales_with_input(self):
+        """Verify summary budgets follow input length within the route's bounds"""
+        router, _ = make_router()
+        assert router.choose("summarize_brief", 100)["max_tokens"] == 64
+        assert router.choose("summarize_brief", 800)["max_tokens"] == 200
+        assert router.choose("summarize_brief", 5000)["max_tokens"] == 300
+        assert router.choose("chatbot", 5000)["max_tokens"] == 512
+
+    def test_slow_model_is_avoided(self):
+        """Verify a model whose rolling p95 breaks the latency target is skipped"""
+        router, _ = make_router()
+        for _ in range(3):
+            router.record({"mode": "chatbot", "model_id": NOVA_MICRO}, 10.0)
+        decision = router.choose("chatbot", 50)
+        assert decision["model_id"] == NOVA_LITE
+        assert decision["reason"] == "latency"
+
+    def test_slow_model_recovers_after_its_samples_expire(self):
+        """Verify a model skipped after a slow burst gets traffic again once the burst ages out"""
+        now = [0.0]
+        router, _ = make_router(latency_max_age=60.0, clock=lambda: now[0])
+        for _ in range(3):
+            router.record({"mode": "chatbot", "model_id": NOVA_MICRO}, 10.0)
+        assert router.choose("chatbot", 50)["model_id"] == NOVA_LITE
+        now[0] = 61.0
+        assert router.latency(NOVA_MICRO) is None
+        assert router.choose("chatbot", 50)["model_id"] == NOVA_MICRO
+
+    def test_fastest_model_when_none_meet_target(self):
+        """Verify the fastest candidate is picked when all are over the target"""
+        router, _ = make_router()
+        for _ in range(3):
+            router.record({"mode": "research", "model_id": NOVA_LITE}, 40.0)
+            router.record({"mode": "research", "model_id": NOVA_PRO}, 25.0)
+        assert router.choose("research", 50)["model_id"] == NOVA_PRO
+
+    def test_decisions_are_logged(self, caplog):
+        """Verify each decision is logged for later analysis"""
+        router, _ = make_router()
+        with caplog.at_level(logging.INFO, logger="src.router"):
+            router.choose("summarize_brief", 400)
+        assert "mode=summarize_brief" in caplog.text
+        assert f"model={NOVA_MICRO}" in caplog.text
+
+
+class TestRoutedChatModel:
+    """Tests for routing inside chains"""
+
+    def test_chain_uses_routed_model(self):
+        """Verify the chosen model answers and the decision is recorded on the response"""
+        router, models = make_router()
+        llm = router.model("summarize_brief")
+        message = llm.invoke("Summarize this")
+        assert message.content == NOVA_MICRO
+        assert message.response_metadata["route"]["mode"] == "summarize_brief"
+        assert models.created == [(NOVA_MICRO, 64)]
+
+        chain = PromptTemplate.from_template("{text}") | router.model("summarize_detailed") | StrOutputParser()
+        assert chain.invoke({"text": "x"}) == NOVA_LITE
+
+    def test_savings_are_measured(self):
+        """Verify cost is tracked against the default model's price"""
+        router, _ = make_router()
+        router.model("chatbot").invoke("hello there")
+        stats = router.stats()
+        assert stats["decisions"] == {f"chatbot:{NOVA_MICRO}": 1}
+        assert 0 < stats["cost_usd"] < stats["baseline_cost_usd"]
+        assert stats["savings_usd"] > 0
+
+    def test_async_streaming_is_routed(self):
+        """Verify streamed calls are routed and their latency recorded"""
+        router, _ = make_router()
+        llm = router.model("tools")
+
+        async def main():
+            return "".join([chunk.content async for chunk in llm.astream("count words")])
+
+        assert asyncio.run(main()) == NOVA_MICRO
+        assert router._tracker(NOVA_MICRO).samples
+
+    def test_lab_summarizer_routes_by_length(self):
+        """Verify my_summarizer routes through the lab router with an injected model"""
+        import langchain_chatbot_lab
+
+        set_llm(FakeListChatModel(responses=["short"]))
+        try:
+            before = dict(langchain_chatbot_lab.get_router().decisions)
+            assert langchain_chatbot_lab.my_summarizer("brief", "Some text") == "short"
+            after = langchain_chatbot_lab.get_router().decisions
+            key = ("summarize_brief", NOVA_MICRO)
+            assert after[key] == before.get(key, 0) + 1
+        finally:
+            reset_llm()
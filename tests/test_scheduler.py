@@ -0,0 +1,257 @@
+import pytest
+import sys
+import os
+import asyncio
+import io
+import json
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from src.accounting import AccountingChatModel, UsageLedger
+from src.batch import BatchProgress, run_batch
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import get_llm, reset_llm
+from src.memory import build_memory_chatbot, memory_store
+from src.scheduler import (BATCH, INTERACTIVE, PriorityScheduler, ScheduledChatModel, configure_scheduler,
+                           get_scheduler, priority)
+from tests.test_server import request, run_with_server
+
+
+class RecordingScheduler(PriorityScheduler):
+    """Scheduler that records the (priority, tenant) of every acquire"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.requests = []
+
+    def acquire(self, name=INTERACTIVE, tenant_id=None):
+        self.requests.append((name, tenant_id))
+        return super().acquire(name, tenant_id)
+
+    async def aacquire(self, name=INTERACTIVE, tenant_id=None):
+        self.requests.append((name, tenant_id))
+        return await super().aacquire(name, tenant_id)
+
+
+def wait_until(condition, timeout=2.0):
+    """Poll condition until it holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def acquire_in_thread(scheduler, name, tenant_id=None, admitted=None):
+    """Start a thread that acquires a slot and appends (name, tenant_id) to admitted once it has it"""
+    def run():
+        scheduler.acquire(name, tenant_id)
+        if admitted is not None:
+            admitted.append((name, tenant_id))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+class TestPriorityScheduler:
+    """Tests for priority classes, reserved capacity and tenant fairness"""
+
+    def test_reserved_capacity(self):
+        """Verify batch calls leave the reserved slots free for interactive calls"""
+        scheduler = PriorityScheduler(capacity=3, reserved_interactive=1)
+        scheduler.acquire(BATCH)
+        scheduler.acquire(BATCH)
+        admitted = []
+        thread = acquire_in_thread(scheduler, BATCH, admitted=admitted)
+        wait_until(lambda: scheduler.stats()["classes"][BATCH]["queued"] == 1)
+        scheduler.acquire(INTERACTIVE)  # does not block
+        assert admitted == []
+
+        scheduler.release(BATCH)
+        thread.join(2)
+        assert admitted == [(BATCH, None)]
+        assert scheduler.in_flight == {INTERACTIVE: 1, BATCH: 2}
+
+    def test_interactive_goes_first(self):
+        """Verify a queued interactive call is admitted before batch calls queued earlier"""
+        scheduler = PriorityScheduler(capacity=1, reserved_interactive=0)
+        scheduler.acquire(BATCH)
+        admitted = []
+        acquire_in_thread(scheduler, BATCH, "b1", admitted)
+        wait_until(lambda: scheduler.stats()["classes"][BATCH]["queued"] == 1)
+        acquire_in_thread(scheduler, INTERACTIVE, "i1", admitted)
+        wait_until(lambda: scheduler.stats()["classes"][INTERACTIVE]["queued"] == 1)
+
+        scheduler.release(BATCH)
+        wait_until(lambda: len(admitted) == 1)
+        assert admitted == [(INTERACTIVE, "i1")]
+        scheduler.release(INTERACTIVE)
+        wait_until(lambda: len(admitted) == 2)
+        assert admitted[1] == (BATCH, "b1")
+
+    def test_weighted_fair_queuing(self):
+        """Verify backlogged tenants are served in proportion to their weights"""
+        scheduler = PriorityScheduler(capacity=1, reserved_interactive=0, tenant_weights={"big": 2.0})
+        order = []
+
+        async def call(tenant_id):
+            await scheduler.aacquire(BATCH, tenant_id)
+            order.append(tenant_id)
+            await asyncio.sleep(0)
+            scheduler.release(BATCH)
+
+        async def main():
+            scheduler.acquire(BATCH)
+            # the heavy tenant queues all its calls first
+            tasks = [asyncio.ensure_future(call("big")) for _ in range(6)]
+            tasks += [asyncio.ensure_future(call("small")) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()["classes"][BATCH]["queued"] == 9
+            scheduler.release(BATCH)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        assert "".join(tenant[0] for tenant in order) == "bbsbbsbbs"
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        """Verify a waiter that gives up is dropped and does not hold back lower classes"""
+        scheduler = PriorityScheduler(capacity=1, reserved_interactive=0)
+
+        async def main():
+            scheduler.acquire(BATCH)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(scheduler.aacquire(INTERACTIVE), 0.02)
+            assert scheduler.stats()["classes"][INTERACTIVE]["queued"] == 0
+            waiter = asyncio.ensure_future(scheduler.aacquire(BATCH))
+            await asyncio.sleep(0.01)
+            scheduler.release(BATCH)
+            await asyncio.wait_for(waiter, 1)
+
+        asyncio.run(main())
+        assert scheduler.in_flight == {INTERACTIVE: 0, BATCH: 1}
+
+    def test_stats_per_class(self):
+        """Verify queue depth, slots in use and wait times are reported per class"""
+        scheduler = PriorityScheduler(capacity=2, reserved_interactive=1)
+        with scheduler.slot(BATCH):
+            thread = acquire_in_thread(scheduler, BATCH)
+            wait_until(lambda: scheduler.stats()["classes"][BATCH]["queued"] == 1)
+            stats = scheduler.stats()["classes"]
+            assert stats[BATCH]["in_flight"] == 1 and stats[BATCH]["limit"] == 1
+            assert stats[INTERACTIVE]["limit"] == 2
+            time.sleep(0.02)
+        thread.join(2)
+        stats = scheduler.stats()["classes"][BATCH]
+        assert stats["granted"] == 2 and stats["waited"] == 1
+        assert stats["wait_max"] >= 0.02 and stats["wait_p95"] == stats["wait_max"]
+        assert 0 < stats["wait_avg"] < stats["wait_max"]
+        with pytest.raises(ValueError):
+            scheduler.acquire("urgent")
+
+
+class TestScheduledChatModel:
+    """Tests for scheduling model calls by config and context"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def make(self, inner=None):
+        scheduler = RecordingScheduler(capacity=4, reserved_interactive=1)
+        inner = inner or FakeStreamingChatModel(echo=True)
+        return scheduler, ScheduledChatModel(llm=inner, scheduler=scheduler)
+
+    def test_class_and_tenant_from_config_or_context(self):
+        """Verify calls take their class from config, then priority(), then default to interactive"""
+        scheduler, llm = self.make()
+        chain = ChatPromptTemplate.from_messages([("human", "{text}")]) | llm
+        chain.invoke({"text": "a"})
+        chain.invoke({"text": "b"}, config={"configurable": {"priority": BATCH, "tenant_id": "acme"}})
+        list(chain.stream({"text": "c"}, config={"metadata": {"priority": BATCH}}))
+        with priority(BATCH, tenant_id="nightly"):
+            llm.invoke("d")
+            asyncio.run(llm.ainvoke("e", config={"configurable": {"tenant_id": "acme"}}))
+        assert scheduler.requests == [(INTERACTIVE, None), (BATCH, "acme"), (BATCH, None), (BATCH, "nightly"),
+                                      (BATCH, "acme")]
+        assert scheduler.in_flight == {INTERACTIVE: 0, BATCH: 0}
+
+    def test_accounting_still_sees_the_config(self):
+        """Verify the memory chatbot's turns are scheduled and still charged to their session and tenant"""
+        ledger = UsageLedger()
+        scheduler, llm = self.make(AccountingChatModel(llm=FakeStreamingChatModel(echo=True), ledger=ledger))
+        chatbot = build_memory_chatbot(llm)
+        config = {"configurable": {"session_id": "s1", "tenant_id": "acme", "priority": BATCH}}
+        chatbot.invoke({"input": "hi"}, config=config)
+
+        async def astream():
+            return [c async for c in chatbot.astream({"input": "again"}, config=config)]
+
+        asyncio.run(astream())
+        assert scheduler.requests == [(BATCH, "acme"), (BATCH, "acme")]
+        assert ledger.usage("sessions", "s1")["calls"] == 2
+        assert ledger.usage("tenants", "acme")["calls"] == 2
+        assert llm.stats()["scheduler"]["classes"][BATCH]["granted"] == 2
+
+    def test_batch_jobs_run_at_batch_priority(self, tmp_path):
+        """Verify run_batch's model calls are scheduled as batch"""
+        scheduler, llm = self.make()
+        with open(tmp_path / "in.jsonl", "w") as f:
+            for i in range(3):
+                f.write(json.dumps({"id": f"doc{i}", "text": f"Document {i}."}) + "\n")
+        progress = run_batch(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"),
+                             lambda length, text: llm.invoke(text).content, max_concurrency=2,
+                             progress=BatchProgress(total=3, stream=io.StringIO()))
+        assert progress.done == 3
+        assert scheduler.requests == [(BATCH, None)] * 3
+
+
+class TestGetLlmScheduler:
+    """Tests for the scheduler in get_llm() and the server"""
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+        monkeypatch.delenv("LLM_SCHEDULER", raising=False)
+        reset_llm()
+        yield
+        reset_llm()
+
+    def test_off_by_default(self):
+        """Verify get_llm() models are not scheduled unless enabled"""
+        assert get_scheduler() is None
+        assert not isinstance(get_llm(), ScheduledChatModel)
+
+    def test_outermost_wrapper(self, monkeypatch):
+        """Verify every get_llm() model shares one scheduler, outside the other wrappers"""
+        monkeypatch.setenv("LLM_SCHEDULER", "1")
+        configure_scheduler(capacity=8, reserved_interactive=2)
+        llm = get_llm()
+        assert isinstance(llm, ScheduledChatModel)
+        assert llm.scheduler is get_scheduler() is get_llm(temperature=0.1).scheduler
+        assert llm.stats()["scheduler"]["capacity"] == 8
+        with pytest.raises(ValueError):
+            configure_scheduler(slots=4)
+
+    def test_server_priority(self):
+        """Verify /chat and /chain pass a priority on to the model and reject unknown ones"""
+        scheduler = RecordingScheduler(capacity=4, reserved_interactive=1)
+        llm = ScheduledChatModel(llm=FakeStreamingChatModel(echo=True), scheduler=scheduler)
+
+        async def scenario(server):
+            return [
+                await request(server.port, "POST", "/chat", {"message": "hi", "session_id": "s"}),
+                await request(server.port, "POST", "/chat", {"message": "hi", "tenant_id": "t", "priority": BATCH}),
+                await request(server.port, "POST", "/chain/simple", {"topic": "owls", "priority": BATCH}),
+                await request(server.port, "POST", "/chat", {"message": "hi", "priority": "urgent"}),
+            ]
+
+        responses = run_with_server(scenario, llm=llm)
+        assert [status for status, _ in responses] == [200, 200, 200, 400]
+        # the simple chain's two steps each take their own slot
+        assert scheduler.requests == [(INTERACTIVE, None), (BATCH, "t"), (BATCH, None), (BATCH, None)]
@@ -0,0 +1,210 @@
+import pytest
+import sys
+import os
+import asyncio
+import json
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.fake_llm import FakeStreamingChatModel
+from src.memory import memory_store
+from src.router import NOVA_LITE, ModelRouter
+from src.server import LabServer
+from src.singleflight import SingleFlightChatModel
+from langchain_chatbot_lab import get_prompt
+
+
+async def request(port, method, path, payload=None, accept=None):
+    """Send one HTTP request and return (status, body text)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\n"
+    if accept:
+        head += f"Accept: {accept}\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    status_line, _, rest = raw.decode().partition("\r\n")
+    return int(status_line.split()[1]), rest.partition("\r\n\r\n")[2]
+
+
+def run_with_server(scenario, llm=None, **options):
+    """Start a LabServer on a free port, run scenario(server), then shut down"""
+    async def main():
+        server = LabServer(llm or FakeStreamingChatModel(echo=True), get_prompt, port=0, **options)
+        await server.start()
+        try:
+            return await scenario(server)
+        finally:
+            await server.shutdown()
+    return asyncio.run(main())
+
+
+def sse_tokens(body):
+    """Extract the streamed text from an SSE body"""
+    tokens = []
+    for event in body.split("\n\n"):
+        if event.startswith("data: "):
+            tokens.append(json.loads(event[len("data: "):]).get("token", ""))
+    return "".join(tokens)
+
+
+class TestEndpoints:
+    """Tests for the JSON and SSE endpoints"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_health(self):
+        """Verify /health reports load counters"""
+        status, body = run_with_server(lambda s: request(s.port, "GET", "/health"))
+        assert status == 200
+        assert json.loads(body)["status"] == "ok"
+
+    def test_chatbot_json(self):
+        """Verify /chatbot returns the full response as JSON"""
+        status, body = run_with_server(
+            lambda s: request(s.port, "POST", "/chatbot", {"language": "French", "text": "Bonjour"}))
+        assert status == 200
+        response = json.loads(body)["response"]
+        assert response.startswith("Echo: ")
+        assert "French" in response and "Bonjour" in response
+
+    def test_summarize_streams_sse(self):
+        """Verify stream=true returns token events followed by a done event"""
+        status, body = run_with_server(
+            lambda s: request(s.port, "POST", "/summarize", {"length": "brief", "text": "Some text", "stream": True}))
+        assert status == 200
+        assert "Some text" in sse_tokens(body)
+        assert "event: done" in body
+        assert "time_to_first_token" in body
+
+    def test_chat_keeps_session_memory(self):
+        """Verify /chat stores history per session_id"""
+        async def scenario(server):
+            await request(server.port, "POST", "/chat", {"message": "I'm Alice", "session_id": "alice"})
+            return await request(server.port, "POST", "/chat", {"message": "Who am I?", "session_id": "alice"},
+                                 accept="text/event-stream")
+
+        status, body = run_with_server(scenario)
+        assert status == 200
+        assert sse_tokens(body) == "Echo: Who am I?"
+        assert len(memory_store["alice"].messages) == 4
+
+    def test_chain_endpoint(self):
+        """Verify /chain/<type> runs get_chain and merges named outputs"""
+        status, body = run_with_server(lambda s: request(s.port, "POST", "/chain/research", {"topic": "solar"}))
+        assert status == 200
+        assert set(json.loads(body)["response"]) == {"topic", "research_data", "outline", "summary"}
+
+    def test_chains_run_on_their_routes(self):
+        """Verify chains are built on the router's research and assistant routes when a models factory is given"""
+        router = ModelRouter(get_model=lambda model_id, max_tokens: FakeStreamingChatModel(echo=True))
+
+        async def scenario(server):
+            research = await request(server.port, "POST", "/chain/research", {"topic": "solar"})
+            simple = await request(server.port, "POST", "/chain/simple", {"topic": "apps"})
+            return research, simple
+
+        research, simple = run_with_server(scenario, models=router.model)
+        assert research[0] == simple[0] == 200
+        assert router.decisions == {("research", NOVA_LITE): 3, ("assistant", NOVA_LITE): 2}
+
+    def test_long_summary_final_pass_routed_by_length(self):
+        """Verify a long brief summary runs its intermediate passes on summarize_detailed and only the last on summarize_brief"""
+        router = ModelRouter(get_model=lambda model_id, max_tokens: FakeStreamingChatModel(echo=True))
+        document = "\n\n".join(f"Paragraph {p} talks about topic {p} at some length." * 20 for p in range(200))
+
+        status, _ = run_with_server(
+            lambda s: request(s.port, "POST", "/summarize", {"length": "brief", "text": document}),
+            models=router.model)
+
+        routed = {}
+        for (mode, _), n in router.decisions.items():
+            routed[mode] = routed.get(mode, 0) + n
+        assert status == 200
+        assert routed["summarize_brief"] == 1
+        assert routed["summarize_detailed"] > 1
+
+    def test_health_reports_coalescing(self):
+        """Verify /health includes the model wrapper's coalescing metrics"""
+        async def scenario(server):
+            payload = {"language": "English", "text": "trending"}
+            await asyncio.gather(*[request(server.port, "POST", "/chatbot", payload) for _ in range(4)])
+            return await request(server.port, "GET", "/health")
+
+        llm = SingleFlightChatModel(llm=FakeStreamingChatModel(first_token_delay=0.1))
+        status, body = run_with_server(scenario, llm=llm)
+        coalescing = json.loads(body)["llm"]["singleflight"]
+        assert coalescing["requests"] == 4
+        assert coalescing["executions"] == 1
+
+    def test_errors(self):
+        """Verify unknown routes, unknown chains and bad bodies get proper statuses"""
+        async def scenario(server):
+            return [
+                (await request(server.port, "POST", "/nope", {}))[0],
+                (await request(server.port, "POST", "/chain/nope", {}))[0],
+                (await request(server.port, "POST", "/chatbot", {"language": "English"}))[0],
+                (await request(server.port, "GET", "/chatbot"))[0],
+            ]
+
+        assert run_with_server(scenario) == [404, 404, 400, 405]
+
+    def test_bad_content_length(self):
+        """Verify malformed, negative and oversize Content-Length values are rejected before the body is read"""
+        async def send(port, length):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /chatbot HTTP/1.1\r\nHost: test\r\nContent-Length: {length}\r\n\r\n".encode())
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+            return int(raw.split()[1])
+
+        async def scenario(server):
+            return [await send(server.port, length) for length in ("abc", "-5", "1_0", "10000000")]
+
+        assert run_with_server(scenario) == [400, 400, 400, 413]
+
+    def test_oversize_chain_prompt_returns_413(self):
+        """Verify a chain prompt over the model's token budget is rejected before the model is called"""
+        llm = FakeStreamingChatModel(echo=True)
+        status, body = run_with_server(
+            lambda s: request(s.port, "POST", "/chain/research", {"topic": "solar " * 150_000}), llm=llm)
+        assert status == 413
+        assert "budget" in json.loads(body)["error"]
+
+
+class TestAdmissionControl:
+    """Tests for bounded concurrency, backpressure and graceful shutdown"""
+
+    def test_overload_returns_429(self):
+        """Verify requests beyond max_concurrency + max_queue are rejected"""
+        async def scenario(server):
+            payload = {"language": "English", "text": "hi"}
+            results = await asyncio.gather(*[request(server.port, "POST", "/chatbot", payload) for _ in range(6)])
+            return sorted(status for status, _ in results), server.stats()
+
+        statuses, stats = run_with_server(scenario, llm=FakeStreamingChatModel(first_token_delay=0.2),
+                                          max_concurrency=2, max_queue=1)
+        assert statuses == [200, 200, 200, 429, 429, 429]
+        assert stats["rejected"] == 3
+        assert stats["peak_active"] == 2
+
+    def test_shutdown_drains_in_flight(self):
+        """Verify shutdown lets running requests finish and refuses new ones"""
+        async def main():
+            server = LabServer(FakeStreamingChatModel(first_token_delay=0.2), get_prompt, port=0)
+            await server.start()
+            in_flight = asyncio.ensure_future(
+                request(server.port, "POST", "/chatbot", {"language": "English", "text": "hi", "stream": True}))
+            await asyncio.sleep(0.05)
+            await server.shutdown()
+            return await in_flight
+
+        status, body = asyncio.run(main())
+        assert status == 200
+        assert "event: done" in body
+        assert sse_tokens(body) == FakeStreamingChatModel().reply
@@ -0,0 +1,177 @@
+import pytest
+import sys
+import os
+import multiprocessing
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.fake_llm import FakeStreamingChatModel
+from src.memory import (build_memory_chatbot, chat, clear_session, configure_session_store, get_session_history,
+                        get_session_store, list_sessions, memory_store, reset_session_store)
+from src.shm_store import SharedChatMessageHistory, SharedSessionStore
+
+
+def append_from_process(path, session_id, count):
+    store = SharedSessionStore(path)
+    for n in range(count):
+        store.append(session_id, [HumanMessage(f"from child {n}")])
+    store.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SharedSessionStore(str(tmp_path / "sessions.db"), capacity=64, size=4096)
+    yield store
+    store.close()
+
+
+class TestSharedSessionStore:
+    """Tests for the memory-mapped session store"""
+
+    def test_append_and_read(self, store):
+        """Verify messages round-trip in order, per session"""
+        history = store.history("a")
+        history.add_messages([HumanMessage("hi"), AIMessage("hello")])
+        store.history("b").add_user_message("other")
+        assert [m.content for m in history.messages] == ["hi", "hello"]
+        assert isinstance(history.messages[1], AIMessage)
+        assert len(history) == 2 and [m.content for m in history.last(1)] == ["hello"]
+        assert sorted(store.sessions()) == ["a", "b"] and len(store) == 2
+
+    def test_views_are_undecoded(self, store):
+        """Verify views() returns memoryviews into the mapping"""
+        store.append("a", [HumanMessage("zero copy")])
+        (view,) = store.views("a")
+        assert isinstance(view, memoryview) and b"zero copy" in view.tobytes()
+
+    def test_clear(self, store):
+        """Verify a cleared session is gone and can start again"""
+        store.append("a", [HumanMessage("one")])
+        assert store.clear("a") and not store.clear("a")
+        assert "a" not in store and store.messages("a") == []
+        store.append("a", [HumanMessage("two")])
+        assert [m.content for m in store.messages("a")] == ["two"]
+        assert len(store) == 1
+
+    def test_grows_and_reopens(self, store):
+        """Verify the file grows past its initial size and keeps its contents when reopened"""
+        for n in range(200):
+            store.append(f"s{n % 10}", [HumanMessage("x" * 500)])
+        assert store.stats()["file_bytes"] > 100_000
+        reopened = SharedSessionStore(store.path)
+        assert len(reopened.history("s3")) == 20 and len(reopened) == 10
+        reopened.close()
+
+    def test_full(self, store):
+        """Verify a store with no free slots raises"""
+        with pytest.raises(RuntimeError, match="full"):
+            for n in range(64):
+                store.append(f"s{n}", [HumanMessage("x")])
+
+    def test_churn_reclaims_deleted_slots(self, store):
+        """Verify sessions created and cleared over and over never fill the index or use up its empty slots"""
+        for n in range(20):
+            store.append(f"keep{n}", [HumanMessage(f"kept {n}")])
+        for n in range(2000):
+            store.append(f"churn{n}", [HumanMessage("x")])
+            assert store.clear(f"churn{n}")
+
+        stats = store.stats()
+        assert stats["sessions"] == 20
+        assert stats["sessions"] + stats["deleted_slots"] <= 64 * 0.75
+        assert [m.content for m in store.messages("keep7")] == ["kept 7"]
+        assert sorted(store.sessions()) == sorted(f"keep{n}" for n in range(20))
+
+    def test_threads_and_processes_share_sessions(self, store):
+        """Verify concurrent writers in threads and another process lose no messages"""
+        context = multiprocessing.get_context("spawn")
+        child = context.Process(target=append_from_process, args=(store.path, "shared", 100))
+        child.start()
+        threads = [threading.Thread(target=lambda: [store.append("shared", [AIMessage("t")]) for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        child.join()
+        assert child.exitcode == 0
+        assert len(store.history("shared")) == 500
+        assert sum(m.content.startswith("from child") for m in store.messages("shared")) == 100
+
+
+class TestMemoryIntegration:
+    """Tests for the shared store behind src.memory"""
+
+    def setup_method(self):
+        reset_session_store()
+        memory_store.clear()
+
+    def teardown_method(self):
+        reset_session_store()
+
+    def test_off_by_default(self, monkeypatch):
+        """Verify memory_store is used unless a store is configured"""
+        monkeypatch.delenv("LLM_SESSION_STORE", raising=False)
+        assert get_session_store() is None
+        get_session_history("s")
+        assert list_sessions() == ["s"]
+
+    def test_memory_chatbot(self, tmp_path, monkeypatch):
+        """Verify the memory chatbot keeps its history in the file named by LLM_SESSION_STORE"""
+        path = str(tmp_path / "sessions.db")
+        monkeypatch.setenv("LLM_SESSION_STORE", path)
+        chatbot = build_memory_chatbot(FakeStreamingChatModel(echo=True))
+        chat(chatbot, "My name is Ada", session_id="s1")
+        chat(chatbot, "What is my name?", session_id="s1")
+        assert isinstance(get_session_history("s1"), SharedChatMessageHistory)
+        assert memory_store == {} and list_sessions() == ["s1"]
+
+        other = SharedSessionStore(path)  # e.g. another worker process
+        assert [m.content for m in other.messages("s1")][::2] == ["My name is Ada", "What is my name?"]
+        other.close()
+        assert clear_session("s1") and list_sessions() == []
+
+    def test_configure(self, tmp_path):
+        """Verify configure_session_store switches the store"""
+        store = configure_session_store(str(tmp_path / "a.db"), capacity=128)
+        assert get_session_store() is store and store.capacity == 128
+
+    def test_concurrent_first_use_opens_one_store(self, tmp_path, monkeypatch):
+        """Verify threads racing on the first request share one store opened from LLM_SESSION_STORE"""
+        monkeypatch.setenv("LLM_SESSION_STORE", str(tmp_path / "sessions.db"))
+        start = threading.Barrier(8)
+        stores = []
+
+        def first_request():
+            start.wait()
+            stores.append(get_session_store())
+
+        threads = [threading.Thread(target=first_request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(store) for store in stores}) == 1
+        get_session_history("s").add_messages([HumanMessage(content="hi")])
+        assert stores[0].count("s") == 1
+
+    def test_reconfigure_keeps_live_histories(self, tmp_path):
+        """Verify a history handed out before the store is replaced keeps working"""
+        configure_session_store(str(tmp_path / "a.db"))
+        history = get_session_history("s")
+        configure_session_store(str(tmp_path / "b.db"))
+        history.add_messages([HumanMessage(content="hi")])
+        assert [m.content for m in history.messages] == ["hi"]
+        assert list_sessions() == []
+
+    def test_closed_store_fails_clearly(self, tmp_path):
+        """Verify using a closed store raises a clear error"""
+        store = SharedSessionStore(str(tmp_path / "sessions.db"))
+        history = store.history("s")
+        store.close()
+        with pytest.raises(ValueError, match="is closed"):
+            history.add_messages([HumanMessage(content="hi")])
@@ -0,0 +1,189 @@
+import pytest
+import sys
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from src.fake_llm import FakeStreamingChatModel
+from src.scheduler import priority, request_class
+from src.singleflight import SingleFlight, SingleFlightChatModel, request_key
+
+
+class CountingModel(FakeStreamingChatModel):
+    """Fake model that counts how many calls reach it"""
+
+    calls: int = 0
+
+    def _generate(self, *args, **kwargs):
+        self.calls += 1
+        return super()._generate(*args, **kwargs)
+
+    async def _agenerate(self, *args, **kwargs):
+        self.calls += 1
+        return await super()._agenerate(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        self.calls += 1
+        yield from super()._stream(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        self.calls += 1
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+class TestSingleFlight:
+    """Tests for the SingleFlight primitive"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Verify identical concurrent do() calls run fn once and all get its result"""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            leader = pool.submit(flight.do, "key", work)
+            started.wait()
+            followers = [pool.submit(flight.do, "key", work) for _ in range(4)]
+            while flight.stats()["requests"] < 5:
+                pass
+            release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+
+        assert results == ["result"] * 5
+        assert len(calls) == 1
+        assert flight.stats()["coalescing_ratio"] == pytest.approx(0.8)
+
+    def test_sequential_calls_are_not_cached(self):
+        """Verify a finished call is not reused by later callers"""
+        flight = SingleFlight()
+        assert flight.do("key", lambda: 1) == 1
+        assert flight.do("key", lambda: 2) == 2
+        assert flight.stats()["coalesced"] == 0
+
+    def test_errors_reach_every_waiter(self):
+        """Verify the leader's exception is raised in all coalesced callers"""
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def main():
+            return await asyncio.gather(*[flight.ado("key", failing) for _ in range(3)], return_exceptions=True)
+
+        errors = asyncio.run(main())
+        assert all(isinstance(e, RuntimeError) for e in errors)
+        assert flight.stats()["executions"] == 1
+
+    def test_late_stream_joiner_gets_every_chunk(self):
+        """Verify a stream waiter joining mid-stream replays the earlier chunks"""
+        flight = SingleFlight()
+        first_chunk = threading.Event()
+        release = threading.Event()
+
+        def produce():
+            yield "a"
+            first_chunk.set()
+            release.wait()
+            yield "b"
+
+        leader = flight.stream("key", produce)
+        assert next(leader) == "a"
+        first_chunk.wait()
+        follower = flight.stream("key", produce)
+        assert next(follower) == "a"
+        release.set()
+        assert list(leader) == ["b"]
+        assert list(follower) == ["b"]
+        assert flight.stats()["executions"] == 1
+
+    def test_stream_producer_keeps_the_leaders_context(self):
+        """Verify the leader's stream is produced at its priority and tenant"""
+        flight = SingleFlight()
+
+        def produce():
+            yield request_class()
+
+        with priority("batch", tenant_id="acme"):
+            assert list(flight.stream("key", produce)) == [("batch", "acme")]
+
+
+class TestSingleFlightChatModel:
+    """Tests for the coalescing chat model wrapper"""
+
+    def test_identical_async_requests_share_one_call(self):
+        """Verify concurrent identical chain calls hit the model once"""
+        inner = CountingModel(first_token_delay=0.05)
+        llm = SingleFlightChatModel(llm=inner)
+        chain = PromptTemplate.from_template("Research {topic}") | llm | StrOutputParser()
+
+        async def main():
+            return await asyncio.gather(*[chain.ainvoke({"topic": "solar"}) for _ in range(10)])
+
+        results = asyncio.run(main())
+        assert results == [inner.reply] * 10
+        assert inner.calls == 1
+        assert llm.stats()["singleflight"]["coalesced"] == 9
+
+    def test_different_prompts_are_not_coalesced(self):
+        """Verify requests with different rendered prompts each call the model"""
+        inner = CountingModel(echo=True, first_token_delay=0.05)
+        llm = SingleFlightChatModel(llm=inner)
+
+        async def main():
+            return await asyncio.gather(llm.ainvoke("one"), llm.ainvoke("two"))
+
+        first, second = asyncio.run(main())
+        assert (first.content, second.content) == ("Echo: one", "Echo: two")
+        assert inner.calls == 2
+
+    def test_streaming_fans_out_tokens(self):
+        """Verify every concurrent streaming waiter receives the full token stream"""
+        inner = CountingModel(reply="one two three", first_token_delay=0.05, token_delay=0.01)
+        llm = SingleFlightChatModel(llm=inner)
+
+        async def consume():
+            return [chunk.content async for chunk in llm.astream("same prompt")]
+
+        async def main():
+            return await asyncio.gather(*[consume() for _ in range(5)])
+
+        streams = asyncio.run(main())
+        assert all("".join(tokens) == "one two three" for tokens in streams)
+        assert all(len(tokens) > 1 for tokens in streams)
+        assert inner.calls == 1
+
+    def test_threaded_invoke_coalesces(self):
+        """Verify sync invoke from many threads shares one call"""
+        inner = CountingModel(first_token_delay=0.1)
+        llm = SingleFlightChatModel(llm=inner)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: llm.invoke("hi").content, range(8)))
+        assert results == [inner.reply] * 8
+        assert inner.calls == 1
+
+    def test_key_includes_model_params(self):
+        """Verify the key changes with model parameters, not just the prompt"""
+        messages = [HumanMessage(content="hi")]
+        assert request_key(FakeStreamingChatModel(reply="a"), messages) == \
+            request_key(FakeStreamingChatModel(reply="a"), messages)
+        assert request_key(FakeStreamingChatModel(reply="a"), messages) != \
+            request_key(FakeStreamingChatModel(reply="b"), messages)
+        assert request_key(FakeStreamingChatModel(), messages) != \
+            request_key(FakeStreamingChatModel(), messages, stop=["\n"])
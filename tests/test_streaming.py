@@ -0,0 +1,137 @@
+import pytest
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableGenerator
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import set_llm, reset_llm
+from src.streaming import StreamStats, stream_text
+import langchain_chatbot_lab
+
+
+def fake_model(*replies):
+    """Fake chat model that streams each reply word by word"""
+    return GenericFakeChatModel(messages=iter([AIMessage(content=r) for r in replies]))
+
+
+class RecordingModel(FakeStreamingChatModel):
+    """Fake model that remembers the prompts it was sent, invoked or streamed"""
+
+    prompts: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages)
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+
+class TestStreamText:
+    """Tests for the streaming generator"""
+
+    def test_yields_chunks_in_order(self):
+        """Verify stream_text yields the full response incrementally"""
+        chain = ChatPromptTemplate.from_template("{q}") | fake_model("one two three")
+        chunks = list(stream_text(chain, {"q": "count"}))
+        assert len(chunks) > 1
+        assert "".join(chunks) == "one two three"
+
+    def test_records_timing(self):
+        """Verify stats capture first token, total time and token count"""
+        chain = ChatPromptTemplate.from_template("{q}") | fake_model("a b c")
+        stats = StreamStats()
+        for _ in stream_text(chain, {"q": "x"}, stats):
+            time.sleep(0.01)
+
+        assert 0 <= stats.time_to_first_token <= stats.total_time
+        assert stats.tokens == stats.chunks == 5  # words and the spaces between them
+        assert stats.tokens_per_second > 0
+
+    def test_prefers_reported_usage(self):
+        """Verify output tokens from usage metadata override chunk counting"""
+        def model(inputs):
+            for _ in inputs:
+                pass
+            yield AIMessageChunk(content="hello")
+            yield AIMessageChunk(content=" world")
+            yield AIMessageChunk(content="", usage_metadata={
+                "input_tokens": 3, "output_tokens": 2, "total_tokens": 5
+            })
+
+        stats = StreamStats()
+        assert "".join(stream_text(RunnableGenerator(model), {"q": "x"}, stats)) == "hello world"
+        assert stats.tokens == 2
+
+    def test_footer_format(self):
+        """Verify the footer reports first token, total time and tokens per second"""
+        stats = StreamStats()
+        stats.started, stats.first_token_at, stats.finished_at = 0.0, 0.5, 2.0
+        stats.chunks = 40
+        assert stats.footer() == "⏱️ first token 0.50s · total 2.00s · 20.0 tok/s"
+
+
+class TestLabStreaming:
+    """Tests for the lab's streaming chatbot and summarizer"""
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_stream_chatbot(self):
+        """Verify stream_chatbot yields the model's reply"""
+        set_llm(fake_model("Hola amigo"))
+        assert "".join(langchain_chatbot_lab.stream_chatbot("Spanish", "Hi")) == "Hola amigo"
+
+    def test_stream_summarizer(self):
+        """Verify stream_summarizer yields the model's summary"""
+        set_llm(fake_model("Short summary."))
+        stats = StreamStats()
+        text = "".join(langchain_chatbot_lab.stream_summarizer("brief", "Long text", stats))
+        assert text == "Short summary."
+        assert stats.time_to_first_token is not None
+
+    def test_stream_summarizer_long_document(self):
+        """Verify a long document is map-reduced first and only the final summary is streamed"""
+        model = RecordingModel(reply="partial summary", prompts=[])
+        set_llm(model)
+        document = "\n\n".join(f"Paragraph {p} talks about topic {p} at some length." * 20 for p in range(200))
+        stats = StreamStats()
+        text = "".join(langchain_chatbot_lab.stream_summarizer("brief", document, stats))
+        assert text == "partial summary"
+        assert len(model.prompts) > 2
+        assert "partial summary" in model.prompts[-1][-1].content
+        assert max(len(prompt[-1].content) for prompt in model.prompts) < len(document) / 10
+        assert stats.time_to_first_token is not None
+
+    def test_stream_summarizer_long_document_final_route(self):
+        """Verify the streamed final summary of a long document runs on the requested length's route"""
+        set_llm(RecordingModel(reply="partial summary", prompts=[]))
+        router = langchain_chatbot_lab.get_router()
+        document = "\n\n".join(f"Paragraph {p} talks about topic {p} at some length." * 20 for p in range(200))
+        before = sum(n for (mode, _), n in router.decisions.items() if mode == "summarize_brief")
+
+        "".join(langchain_chatbot_lab.stream_summarizer("brief", document))
+
+        after = sum(n for (mode, _), n in router.decisions.items() if mode == "summarize_brief")
+        assert after == before + 1
+
+    def test_interactive_mode_streams(self, monkeypatch, capsys):
+        """Verify interactive_mode prints the streamed reply and a timing footer"""
+        set_llm(fake_model("Bonjour tout le monde"))
+        answers = iter(["assistant", "French", "Hello", "quit"])
+        monkeypatch.setattr("builtins.input", lambda _: next(answers))
+
+        langchain_chatbot_lab.interactive_mode()
+
+        out = capsys.readouterr().out
+        assert "🤖 Bot: Bonjour tout le monde" in out
+        assert "first token" in out
+        assert "tok/s" in out
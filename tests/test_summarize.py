@@ -0,0 +1,166 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+from src.llm import set_llm, reset_llm
+from src.summarize import estimate_tokens, split_text, map_reduce_summarize
+import langchain_chatbot_lab
+
+
+def make_document(paragraphs=40, sentences=10):
+    """Build a long multi-paragraph document"""
+    return "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {s} talks about topic {p}." for s in range(sentences))
+        for p in range(paragraphs)
+    )
+
+
+class RecordingSummarizer:
+    """Fake summarizer chain that records calls and peak concurrency"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self.chain = RunnableLambda(self._summarize)
+
+    def _summarize(self, inputs):
+        with self._lock:
+            self.calls.append(inputs)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return f"[{inputs['length']} summary of {len(inputs['text'])} chars]"
+
+
+class TestSplitText:
+    """Tests for token-budgeted chunking"""
+
+    def test_short_text_is_one_chunk(self):
+        """Verify text under the budget is returned whole"""
+        assert split_text("Just one short paragraph.", max_tokens=100) == ["Just one short paragraph."]
+
+    def test_chunks_respect_budget(self):
+        """Verify every chunk fits the token budget"""
+        chunks = split_text(make_document(), max_tokens=200)
+        assert len(chunks) > 1
+        assert all(estimate_tokens(c) <= 200 for c in chunks)
+
+    def test_splits_on_paragraph_boundaries(self):
+        """Verify paragraphs that fit are never cut mid-paragraph"""
+        doc = make_document(paragraphs=6, sentences=3)
+        paragraphs = doc.split("\n\n")
+        for chunk in split_text(doc, max_tokens=60):
+            assert all(p in paragraphs for p in chunk.split("\n\n"))
+
+    def test_long_paragraph_split_on_sentences(self):
+        """Verify an oversize paragraph is split between sentences"""
+        paragraph = " ".join(f"Sentence number {i} is here." for i in range(50))
+        chunks = split_text(paragraph, max_tokens=40)
+        assert len(chunks) > 1
+        assert all(c.endswith(".") for c in chunks)
+
+    def test_no_text_lost(self):
+        """Verify chunking keeps every word in order"""
+        doc = make_document(paragraphs=10)
+        chunks = split_text(doc, max_tokens=50)
+        assert " ".join(chunks).split() == doc.split()
+
+
+class TestMapReduceSummarize:
+    """Tests for the map-reduce summarization engine"""
+
+    def test_short_text_single_call(self):
+        """Verify short text is summarized with one call at the requested length"""
+        fake = RecordingSummarizer()
+        map_reduce_summarize(fake.chain, "brief", "A short text.", chunk_tokens=100)
+        assert fake.calls == [{"length": "brief", "text": "A short text."}]
+
+    def test_final_pass_uses_requested_length(self):
+        """Verify intermediate passes are detailed and the final pass uses the requested length"""
+        fake = RecordingSummarizer()
+        result = map_reduce_summarize(fake.chain, "brief", make_document(), chunk_tokens=200)
+
+        assert result.startswith("[brief summary")
+        assert [c["length"] for c in fake.calls[:-1]] == ["detailed"] * (len(fake.calls) - 1)
+        assert fake.calls[-1]["length"] == "brief"
+
+    def test_final_chain_runs_only_the_final_pass(self):
+        """Verify a separate final chain gets the last call and the chain every intermediate one"""
+        fake, final = RecordingSummarizer(), RecordingSummarizer()
+        result = map_reduce_summarize(fake.chain, "brief", make_document(), chunk_tokens=200,
+                                      final_chain=final.chain)
+
+        assert result.startswith("[brief summary")
+        assert [c["length"] for c in final.calls] == ["brief"]
+        assert {c["length"] for c in fake.calls} == {"detailed"}
+
+    def test_reduces_hierarchically(self):
+        """Verify oversize summaries are reduced over several levels until one remains"""
+        fake = RecordingSummarizer()
+        chunks = split_text(make_document(), max_tokens=200)
+        # ~23 chunk summaries overflow one 200-token group, forcing an extra level
+        map_reduce_summarize(fake.chain, "detailed", make_document(), chunk_tokens=200)
+        assert len(fake.calls) > len(chunks) + 1
+
+    def test_map_runs_concurrently(self):
+        """Verify wall-clock time tracks tree depth, not chunk count"""
+        fake = RecordingSummarizer(delay=0.05)
+        doc = make_document(paragraphs=64)
+        chunks = split_text(doc, max_tokens=100)
+
+        start = time.perf_counter()
+        map_reduce_summarize(fake.chain, "brief", doc, chunk_tokens=100, max_concurrency=64)
+        elapsed = time.perf_counter() - start
+
+        assert len(chunks) >= 32
+        assert fake.peak > 8
+        assert elapsed < len(chunks) * 0.05 / 4
+
+
+class TestLabLongDocuments:
+    """Tests for my_summarizer's long-document mode"""
+
+    def teardown_method(self):
+        reset_llm()
+
+    def test_long_text_uses_map_reduce(self, monkeypatch):
+        """Verify my_summarizer switches to map-reduce for long input"""
+        used = []
+        original = langchain_chatbot_lab.map_reduce_summarize
+        monkeypatch.setattr(langchain_chatbot_lab, "map_reduce_summarize",
+                            lambda *args, **kwargs: used.append(args) or original(*args, **kwargs))
+        set_llm(FakeListChatModel(responses=["partial"]))
+
+        assert langchain_chatbot_lab.my_summarizer("brief", make_document(paragraphs=200)) == "partial"
+        assert len(used) == 1
+
+    def test_long_text_final_pass_routed_by_length(self):
+        """Verify a brief long-document summary ends on the summarize_brief route, not summarize_detailed"""
+        set_llm(FakeListChatModel(responses=["partial"]))
+        router = langchain_chatbot_lab.get_router()
+
+        def routed(mode):
+            return sum(n for (m, _), n in router.decisions.items() if m == mode)
+
+        before = {mode: routed(mode) for mode in ("summarize_brief", "summarize_detailed")}
+        langchain_chatbot_lab.my_summarizer("brief", make_document(paragraphs=200))
+
+        assert routed("summarize_brief") == before["summarize_brief"] + 1
+        assert routed("summarize_detailed") > before["summarize_detailed"] + 1
+
+    def test_short_text_single_prompt(self):
+        """Verify short input keeps the single-prompt path"""
+        set_llm(FakeListChatModel(responses=["one shot"]))
+        assert langchain_chatbot_lab.my_summarizer("brief", "Short text.", long_document=False) == "one shot"
@@ -0,0 +1,193 @@
+import pytest
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from src.chains import get_chain
+from src.fake_llm import FakeStreamingChatModel
+from src.memory import build_memory_chatbot, chat, memory_store
+from src.ratelimit import RateLimitedChatModel, RateLimiter
+from src.tokens import (
+    PromptTooLongError, TokenEstimator, context_window, count_message_tokens, count_tokens, fit_messages,
+    get_estimator, input_budget, model_family, with_token_budget,
+)
+
+
+class RecordingModel:
+    """A model stand-in that records the messages it is called with"""
+
+    def __init__(self):
+        self.calls = []
+        self.runnable = RunnableLambda(self._answer)
+
+    def _answer(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content="ok")
+
+
+class TestEstimates:
+    """Tests for token estimates"""
+
+    def test_prose_is_about_four_characters_per_token(self):
+        """Verify plain English prose lands near the usual 4 characters per token"""
+        text = "The quick brown fox jumps over the lazy dog while the farmer sleeps " * 50
+        assert len(text) / 5 < count_tokens(text) < len(text) / 3
+
+    def test_punctuation_digits_and_non_ascii_cost_more(self):
+        """Verify code-like, numeric and non-ASCII text is estimated denser than prose"""
+        assert count_tokens("{[(<>)]};:,.!?" * 20) > count_tokens("abcdefghijklmn" * 20)
+        assert count_tokens("3141592653" * 30) > count_tokens("tenletters" * 30)
+        assert count_tokens("日本語のテキスト" * 20) > count_tokens("englishs" * 20)
+
+    def test_cached_and_uncached_counts_agree(self):
+        """Verify long (cached) texts are counted like the sum of their parts"""
+        estimator = TokenEstimator()
+        word = "Hello, world 42! "
+        short = sum(estimator._raw_count(word) for _ in range(40))
+        assert estimator._raw_count(word * 40) == pytest.approx(short)
+        assert estimator.count(word * 40) == estimator.count(word * 40) == round(short)
+
+    def test_families_and_windows(self):
+        """Verify model ids map to families and context windows"""
+        assert model_family("us.amazon.nova-lite-v1:0") == "nova"
+        assert model_family("anthropic.claude-3-haiku") == "claude"
+        assert model_family("something-else") == "default"
+        assert context_window("us.amazon.nova-micro-v1:0") == 128_000
+        assert context_window("us.amazon.nova-pro-v1:0") == 300_000
+        assert TokenEstimator("claude").count("x" * 350) > TokenEstimator("nova").count("x" * 350)
+
+    def test_messages_include_framing(self):
+        """Verify message lists count each message plus framing"""
+        messages = [SystemMessage(content="Be brief."), HumanMessage(content="Hello there")]
+        assert count_message_tokens(messages) > count_tokens("Be brief.") + count_tokens("Hello there")
+
+    def test_estimator_is_shared_per_family(self):
+        """Verify every model of a family shares one (calibrated) estimator"""
+        assert get_estimator("us.amazon.nova-lite-v1:0") is get_estimator("us.amazon.nova-pro-v1:0")
+        assert get_estimator("nova") is get_estimator("us.amazon.nova-micro-v1:0")
+
+    def test_observe_calibrates(self):
+        """Verify reported token counts pull the estimates toward them, within bounds"""
+        estimator = TokenEstimator()
+        text = "calibrate me " * 100
+        before = estimator.count(text)
+        for _ in range(50):
+            estimator.observe(estimator.count(text), int(before * 1.3))
+        assert estimator.count(text) == pytest.approx(before * 1.3, rel=0.03)
+        for _ in range(100):
+            estimator.observe(estimator.count(text), before * 10)
+        assert estimator.scale <= 2.0
+
+    def test_rate_limited_model_calibrates_from_usage(self):
+        """Verify reported input tokens calibrate the model's estimator"""
+        llm = RateLimitedChatModel(llm=FakeStreamingChatModel(), limiter=RateLimiter())
+        estimator = get_estimator(llm)
+        samples = estimator.samples
+        llm.invoke("How many tokens is this prompt?")
+        assert estimator.samples == samples + 1
+
+
+class TestFitMessages:
+    """Tests for prompt-budget enforcement"""
+
+    def conversation(self, turns=20):
+        messages = [SystemMessage(content="You are a helpful assistant.")]
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"Question {i}: " + "tell me more " * 20))
+            messages.append(AIMessage(content=f"Answer {i}: " + "here is more " * 20))
+        messages.append(HumanMessage(content="Latest question"))
+        return messages
+
+    def test_fitting_prompt_is_unchanged(self):
+        """Verify a prompt under budget is passed through as is"""
+        messages = self.conversation(2)
+        assert fit_messages(messages, 10_000) is messages
+
+    def test_drops_oldest_history_first(self):
+        """Verify truncation keeps the system prompt and latest turn and drops the oldest turns"""
+        messages = self.conversation()
+        fitted = fit_messages(messages, 500)
+        assert count_message_tokens(fitted) <= 500
+        assert fitted[0] == messages[0]
+        assert fitted[-1] == messages[-1]
+        assert isinstance(fitted[1], HumanMessage)
+        assert fitted[1:] == messages[len(messages) - len(fitted) + 1:]
+
+    def test_never_starts_with_orphaned_tool_result(self):
+        """Verify history never starts with an AI turn or a tool result"""
+        messages = [
+            HumanMessage(content="old " * 200),
+            AIMessage(content="", tool_calls=[{"name": "add", "args": {}, "id": "1"}]),
+            ToolMessage(content="3", tool_call_id="1"),
+            AIMessage(content="The answer is 3"),
+            HumanMessage(content="And now?"),
+        ]
+        fitted = fit_messages(messages, 100)
+        assert fitted == [messages[-1]]
+
+    def test_truncates_an_oversize_last_message(self):
+        """Verify a single oversize message is cut to fit, with a marker"""
+        fitted = fit_messages([HumanMessage(content="word " * 10_000)], 1000)
+        assert count_message_tokens(fitted) <= 1000
+        assert fitted[0].content.endswith("[truncated]")
+        assert len(fitted[0].content) > 2000
+
+    def test_reject(self):
+        """Verify reject mode raises instead of truncating"""
+        with pytest.raises(PromptTooLongError) as e:
+            fit_messages(self.conversation(), 100, on_overflow="reject")
+        assert e.value.budget == 100
+        assert isinstance(e.value, ValueError)
+
+    def test_default_budget_leaves_room_for_output(self):
+        """Verify the default budget is the context window minus max_tokens"""
+        class Model:
+            model_id = "us.amazon.nova-micro-v1:0"
+            max_tokens = 1000
+        assert input_budget(Model()) == 127_000
+
+
+class TestWiring:
+    """Tests for the pre-flight checks in chains and the memory chatbot"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_budget_runs_before_the_model(self):
+        """Verify with_token_budget trims the prompt the model sees"""
+        model = RecordingModel()
+        prompt = ChatPromptTemplate.from_messages([("system", "Be brief."), ("human", "{text}")])
+        chain = prompt | with_token_budget(model.runnable, max_input_tokens=200)
+        chain.invoke({"text": "long " * 5000})
+        assert count_message_tokens(model.calls[0]) <= 200
+
+    def test_memory_chatbot_trims_old_history(self):
+        """Verify a long session is trimmed in the prompt but kept in the store"""
+        model = RecordingModel()
+        chatbot = build_memory_chatbot(model.runnable, max_input_tokens=300)
+        for i in range(20):
+            chat(chatbot, f"Message {i}: " + "filler " * 30, session_id="long")
+        assert count_message_tokens(model.calls[-1]) <= 300
+        assert model.calls[-1][-1].content.startswith("Message 19")
+        assert len(memory_store["long"].messages) == 40
+
+    def test_chain_rejects_oversize_prompt_without_calling_model(self):
+        """Verify chains reject oversize prompts before any model call"""
+        llm = FakeStreamingChatModel()
+        model = RecordingModel()
+        chain = get_chain("research", model.runnable)
+        with pytest.raises(PromptTooLongError):
+            chain.invoke({"topic": "solar " * 150_000})
+        assert model.calls == []
+        assert get_chain("research", llm).invoke({"topic": "solar"})["summary"]
+
+    def test_unknown_overflow_mode(self):
+        """Verify an unknown on_overflow is rejected"""
+        with pytest.raises(ValueError):
+            with_token_budget(FakeStreamingChatModel(), on_overflow="ignore")
@@ -0,0 +1,96 @@
+import pytest
+import sys
+import os
+import json
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chains import CHAINS
+from src.cluster import ClusterSupervisor, fake_chatbot
+from src.fake_llm import FakeStreamingChatModel
+from src.llm import configure_bedrock_client, get_llm, reset_llm
+from src.memory import list_sessions, memory_store
+from src.server import LabServer
+from src.warmup import bedrock_clients, warm_up
+from langchain_chatbot_lab import get_prompt
+from tests.bedrock_stub import BedrockStub
+from tests.test_server import request, run_with_server
+
+
+class TestWarmUp:
+    """Tests for the startup warm-up"""
+
+    def setup_method(self):
+        memory_store.clear()
+
+    def test_fills_server_caches(self):
+        """Verify prompts and every registered chain are built into the server's caches"""
+        server = LabServer(FakeStreamingChatModel(echo=True), get_prompt)
+        report = server.warm_up()
+        assert report["errors"] == {}
+        assert set(server._prompts) == {"assistant", "summarizer"}
+        assert set(server._chains) == set(CHAINS)
+        assert report["details"]["tools"] == {"tools": 3}
+        assert report["details"]["connect"] == {"clients": 0, "connections": 0}
+        assert set(report["steps"]) == {"connect", "prompts", "chains", "tools"}
+
+    def test_prime_through_memory_chatbot(self):
+        """Verify the priming request leaves no session behind"""
+        llm = FakeStreamingChatModel(echo=True)
+        report = LabServer(llm, get_prompt).warm_up(prime=True)
+        assert report["details"]["prime"] == {"via": "memory_chatbot"}
+        assert list_sessions() == []
+
+    def test_failing_step_is_reported(self):
+        """Verify a failing step is recorded and the others still run"""
+        def broken_prompt(name):
+            raise ValueError("no prompts here")
+
+        report = warm_up(FakeStreamingChatModel(), broken_prompt)
+        assert report["errors"] == {"prompts": "ValueError: no prompts here"}
+        assert report["details"]["chains"] == {"chains": len(CHAINS)}
+
+    def test_server_warms_up_before_listening(self):
+        """Verify LabServer(warm_up=True) reports its warm-up in /health"""
+        status, body = run_with_server(lambda s: request(s.port, "GET", "/health"), warm_up=True)
+        assert status == 200
+        assert json.loads(body)["warmup"]["errors"] == {}
+
+
+    def test_cluster_workers_warm_up(self):
+        """Verify each cluster worker warms up and primes its own chatbot, reported per worker in /health"""
+        with ClusterSupervisor(2, chatbot_factory=fake_chatbot, warm_up=True, prime=True) as cluster:
+            status, body = run_with_server(lambda s: request(s.port, "GET", "/health"), cluster=cluster)
+            assert status == 200
+            workers = json.loads(body)["cluster"]["workers"]
+            assert len(workers) == 2
+            for worker in workers.values():
+                assert worker["warmup"]["errors"] == {}
+                assert worker["warmup"]["details"]["prime"] == {"via": "memory_chatbot"}
+            assert cluster.sessions() == {name: [] for name in workers}
+
+
+class TestBedrockWarmUp:
+    """Tests for warming up Bedrock clients against the local stub"""
+
+    @pytest.fixture(autouse=True)
+    def fake_credentials(self, monkeypatch):
+        monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+        monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+        monkeypatch.delenv("AWS_PROFILE", raising=False)
+        reset_llm()
+        yield
+        reset_llm()
+
+    def test_preconnects_and_primes(self):
+        """Verify pooled connections are opened through the wrappers and the prime reaches the model"""
+        with BedrockStub(reply="ok") as stub:
+            configure_bedrock_client(endpoint_url=stub.url)
+            llm = get_llm()
+            assert len(bedrock_clients(llm)) == 2  # runtime and control-plane clients
+            report = warm_up(llm, get_prompt, prime=True, connections=2)
+            assert report["errors"] == {}
+            assert report["details"]["connect"] == {"clients": 2, "connections": 4}
+            assert report["details"]["prime"] == {"via": "llm"}
+            assert stub.requests == 1